@@ -11,6 +11,7 @@ from PIL import Image
 import base64
 import uuid
 import io
+import time
 
 
 class test_upload_picture_set(unittest.TestCase):
@@ -48,29 +49,66 @@ class test_upload_picture_set(unittest.TestCase):
         self.con.rollback()
         db.end_query(self.con, self.cursor)
 
-    @patch("azure.storage.blob.ContainerClient.upload_blob")
-    @patch("datastore.bin.upload_picture_set.blob.create_folder")
-    @patch("datastore.bin.upload_picture_set.blob.upload_image")
-    def test_upload_picture_set(
-        self, MockUploadBlob, MockCreateFolder, MockUploadImage
-    ):
+    @patch("datastore.bin.upload_picture_set.blob.create_folder", return_value=True)
+    def test_upload_picture_set(self, MockCreateFolder):
         """
         This test checks if the upload_picture_set function runs without issue (not checking the return value)
         """
-        MockCreateFolder.retun_value = True
         zoom_level = 1.0
         nb_seeds = 1
-        picture_set_id = upload_picture_set.upload_picture_set(
-            self.cursor,
-            self.mock_container_client,
-            self.pictures,
-            self.user_id,
-            self.seed_name,
-            zoom_level,
-            nb_seeds,
+        picture_set_id = asyncio.run(
+            upload_picture_set.upload_picture_set(
+                self.cursor,
+                self.mock_container_client,
+                self.pictures,
+                self.user_id,
+                self.seed_name,
+                zoom_level,
+                nb_seeds,
+            )
         )
-        self.assertTrue(True)
         self.assertTrue(picture_query.is_a_picture_set_id(self.cursor, picture_set_id))
+        self.assertEqual(
+            len(picture_query.get_picture_set_pictures(self.cursor, picture_set_id)),
+            len(self.pictures),
+        )
+        # Every picture is uploaded in its picture set folder
+        uploaded = [
+            call.args[0]
+            for call in self.mock_container_client.upload_blob.call_args_list
+        ]
+        self.assertEqual(len(uploaded), len(self.pictures))
+        self.assertTrue(all(name.startswith(str(picture_set_id)) for name in uploaded))
+
+    @patch("datastore.bin.upload_picture_set.blob.create_folder", return_value=True)
+    def test_upload_picture_set_concurrency(self, MockCreateFolder):
+        """
+        This test checks that the uploads overlap, up to max_concurrency at the same time
+        """
+        in_flight = []
+        peak = []
+
+        def slow_upload(name, data, overwrite=True):
+            in_flight.append(name)
+            peak.append(len(in_flight))
+            time.sleep(0.05)
+            in_flight.remove(name)
+            return MagicMock()
+
+        self.mock_container_client.upload_blob.side_effect = slow_upload
+        asyncio.run(
+            upload_picture_set.upload_picture_set(
+                self.cursor,
+                self.mock_container_client,
+                self.pictures,
+                self.user_id,
+                self.seed_name,
+                1.0,
+                1,
+                max_concurrency=2,
+            )
+        )
+        self.assertEqual(max(peak), 2)
 
     def test_upload_picture_set_blob(self):
         """
@@ -82,14 +120,16 @@ class test_upload_picture_set(unittest.TestCase):
         # new_container_client = ContainerClient.from_container_url(container_url=url+sas)
         zoom_level = 1.0
         nb_seeds = 1
-        picture_set_id = upload_picture_set.upload_picture_set(
-            self.cursor,
-            container_client,
-            self.pictures,
-            self.user_id,
-            self.seed_name,
-            zoom_level,
-            nb_seeds,
+        picture_set_id = asyncio.run(
+            upload_picture_set.upload_picture_set(
+                self.cursor,
+                container_client,
+                self.pictures,
+                self.user_id,
+                self.seed_name,
+                zoom_level,
+                nb_seeds,
+            )
         )
         self.assertTrue(picture_query.is_a_picture_set_id(self.cursor, picture_set_id))
 
@@ -163,23 +203,29 @@ class test_upload_picture_set(unittest.TestCase):
                 )
             )
 
-    @patch("datastore.bin.upload_picture_set.picture_query.new_picture")
-    @patch("azure.storage.blob.ContainerClient.upload_blob")
-    def test_upload_picture_set_exception(self, MockNewPicture, MockUploadBlob):
+    @patch("datastore.bin.upload_picture_set.blob.delete_folder")
+    @patch("datastore.bin.upload_picture_set.blob.create_folder", return_value=True)
+    @patch("datastore.bin.upload_picture_set.picture_query.copy_new_pictures")
+    def test_upload_picture_set_exception(
+        self, MockCopyNewPictures, MockCreateFolder, MockDeleteFolder
+    ):
         """
         This test checks if the upload_picture_set function raises an exception when an error occurs
         """
-        MockNewPicture.side_effect = Exception("Connection Error")
+        MockCopyNewPictures.side_effect = Exception("Connection Error")
         with self.assertRaises(upload_picture_set.UploadError):
-            upload_picture_set.upload_picture_set(
-                self.cursor,
-                self.mock_container_client,
-                self.pictures,
-                self.user_id,
-                self.seed_name,
-                1.0,
-                1,
+            asyncio.run(
+                upload_picture_set.upload_picture_set(
+                    self.cursor,
+                    self.mock_container_client,
+                    self.pictures,
+                    self.user_id,
+                    self.seed_name,
+                    1.0,
+                    1,
+                )
             )
+        MockDeleteFolder.assert_called_once()
 
 
 if __name__ == "__main__":
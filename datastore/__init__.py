@@ -3,13 +3,16 @@ This module is responsible for handling the user data in the database
 and the user container in the blob storage.
 """
 
+import contextlib
 import json
 import datastore.db.queries.user as user
 import datastore.db.queries.picture as picture
 import datastore.db.metadata.picture_set as data_picture_set
 import datastore.blob as blob
 import datastore.blob.azure_storage_api as azure_storage
-from azure.storage.blob import BlobServiceClient, ContainerClient
+import datastore.blob.backend as backend
+import datastore.blob.local_storage_api as local_storage_api
+from datastore.db.replica import read_only
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -51,6 +54,96 @@ class User:
         return get_user_container_client(self.id, self.tier)
 
 
+def prepare_picture_objects(cursor, user_id, images: list) -> tuple[list, dict]:
+    """
+    Compute the checksum of each picture and find the ones that are not stored in
+    the user container yet. Must be called before the picture rows are inserted,
+    in their transaction: the objects are locked until it ends.
+
+    Args:
+        cursor: The cursor object to interact with the database.
+        user_id (str): id of the user owning the container
+        images (list): the pictures to store
+
+    Returns:
+        (checksums, objects): the checksum of each picture in order, and the pictures
+        to upload by checksum (one per distinct content not referenced yet)
+    """
+    checksums = [azure_storage.compute_checksum(image) for image in images]
+    # Held until the pictures are committed: a concurrent deletion of the same
+    # objects waits for them (see unreferenced_objects)
+    picture.lock_objects(cursor, user_id, checksums)
+    references = picture.count_object_references(cursor, user_id, checksums)
+    objects = {}
+    for checksum, image in zip(checksums, images):
+        if not references.get(checksum):
+            objects.setdefault(checksum, image)
+    return checksums, objects
+
+
+def unreferenced_objects(connection, user_id):
+    """
+    The guard of azure_storage.delete_objects_after_commit for the objects of a
+    user container. At commit, the objects are locked (see
+    prepare_picture_objects) and only the ones no picture references anymore are
+    deleted, before the lock is released: an upload committed meanwhile keeps its
+    object, and a later upload stores it again.
+
+    Args:
+        connection: The connection of the transaction deleting the pictures
+        user_id (str): id of the user owning the container
+    """
+
+    @contextlib.contextmanager
+    def guard(checksums):
+        with connection.transaction(), connection.cursor() as cursor:
+            picture.lock_objects(cursor, user_id, checksums)
+            references = picture.count_object_references(cursor, user_id, checksums)
+            yield [checksum for checksum in checksums if not references.get(checksum)]
+
+    return guard
+
+
+async def upload_picture_objects(
+    container_client,
+    objects: dict,
+    max_concurrency: int = azure_storage.UPLOAD_CONCURRENCY,
+    renditions: tuple = (),
+) -> dict:
+    """
+    Upload the pictures returned by prepare_picture_objects, and optionally their
+    renditions (see azure_storage.RENDITION_SIZES).
+
+    Returns:
+        The UploadImageError of each checksum that could not be uploaded
+    """
+    responses = await azure_storage.upload_objects(
+        container_client, list(objects.items()), max_concurrency, renditions
+    )
+    return {
+        checksum: response
+        for checksum, response in zip(objects, responses)
+        if isinstance(response, Exception)
+    }
+
+
+async def compress_picture_objects(objects: dict) -> dict:
+    """
+    Recompress losslessly, in place, the pictures returned by
+    prepare_picture_objects (see azure_storage.compress_lossless).
+
+    Returns:
+        The storage metadata of each checksum (compression, original_size, stored_size)
+    """
+    results = await azure_storage.compress_pictures(list(objects.values()))
+    storage = {}
+    for checksum, (stored, picture_storage) in zip(list(objects), results):
+        objects[checksum] = stored
+        storage[checksum] = picture_storage
+    return storage
+
+
+@read_only
 async def get_user(cursor, email) -> User:
     """
     Get a user from the database
@@ -70,7 +163,7 @@ async def new_user(cursor, email, connection_string, tier="user") -> User:
     Parameters:
     - email (str): The email of the user.
     - cursor: The cursor object to interact with the database.
-    - connection_string: The connection string to connect with the Azure storage account
+    - connection_string: The connection string to connect with the Azure storage account, or 'file://{root}' for the local storage
     """
     try:
         # Register the user in the database
@@ -78,7 +171,7 @@ async def new_user(cursor, email, connection_string, tier="user") -> User:
             raise UserAlreadyExistsError("User already exists")
         user_uuid = user.register_user(cursor, email)
         # Create the user container in the blob storage
-        blob_service_client = BlobServiceClient.from_connection_string(
+        blob_service_client = azure_storage.get_blob_service_client(
             connection_string
         )
         container_client = blob_service_client.create_container(
@@ -125,12 +218,16 @@ async def get_user_container_client(user_id, storage_url, account, key, tier="us
 
     Returns: ContainerClient object
     """
-    sas = blob.get_account_sas(account, key)
+    if local_storage_api.is_local_storage(storage_url):
+        # The local storage has no account to sign
+        sas = ""
+    else:
+        sas = blob.get_account_sas(account, key)
     # Get the container client
     container_client = await azure_storage.mount_container(
         storage_url, str(user_id), True, tier, sas
     )
-    if isinstance(container_client, ContainerClient):
+    if isinstance(container_client, backend.StorageContainerClient):
         return container_client
 
 
@@ -189,6 +286,7 @@ async def create_picture_set(
         )
 
 
+@read_only
 async def get_picture_sets_info(cursor, user_id: str):
     """This function retrieves the picture sets names and number of pictures from the database.
 
@@ -209,9 +307,16 @@ async def get_picture_sets_info(cursor, user_id: str):
     return result
 
 
-async def get_picture_set_pictures(cursor, user_id, picture_set_id, container_client):
+@read_only
+async def get_picture_set_pictures(
+    cursor, user_id, picture_set_id, container_client, size: str = None
+):
     """
     This function retrieves the pictures of a picture set from the database.
+
+    Parameters:
+    - size (str): (optional) The rendition to return instead of the original
+      picture, one of azure_storage.RENDITION_SIZES (e.g. "thumbnail").
     """
     try:
         # Check if user exists
@@ -237,14 +342,8 @@ async def get_picture_set_pictures(cursor, user_id, picture_set_id, container_cl
         result = []
         if len(pictures) == 0:
             return result
-        elif len(pictures) != await azure_storage.get_image_count(
-            container_client, str(picture_set_name)
-        ):
-            raise Warning(
-                "The number of pictures in the database '"
-                + str(len(pictures))
-                + "' does not match the number of pictures in the blob storage"
-            )
+        # The consistency of the database with the blob storage is checked in the
+        # background by datastore/bin/reconcile_storage.py, not on each request
         for pic in pictures:
             pic_id = pic[0]
             pic_metadata = pic[1]
@@ -255,7 +354,7 @@ async def get_picture_set_pictures(cursor, user_id, picture_set_id, container_cl
                 blob_link = azure_storage.build_blob_name(
                     str(picture_set_name), str(pic_id), None
                 )
-            blob_obj = azure_storage.get_blob(container_client, blob_link)
+            blob_obj = await azure_storage.get_picture(container_client, blob_link, size)
             pic_metadata.pop("link", None)
             pic_metadata["blob"] = blob_obj
             result.append(pic_metadata)
@@ -306,10 +405,18 @@ async def delete_picture_set_permanently(
                 f"User can't delete the default picture set, user uuid :{user_id}"
             )
 
+        # The objects only referenced by this picture set go with it
+        orphans = picture.get_unreferenced_checksums(cursor, picture_set_id)
         # Delete the folder in the blob storage
         await azure_storage.delete_folder(container_client, str(picture_set_id))
         # Delete the picture set
         picture.delete_picture_set(cursor, picture_set_id)
+        azure_storage.delete_objects_after_commit(
+            cursor,
+            container_client,
+            orphans,
+            unreferenced_objects(cursor.connection, user_id),
+        )
 
         return True
     except (
@@ -325,7 +432,13 @@ async def delete_picture_set_permanently(
 
 
 async def upload_pictures(
-    cursor, user_id, hashed_pictures, container_client, picture_set_id=None
+    cursor,
+    user_id,
+    hashed_pictures,
+    container_client,
+    picture_set_id=None,
+    renditions: tuple = (),
+    compress: bool = False,
 ):
     """
     Upload a picture that we don't know the seed to the user container
@@ -335,6 +448,10 @@ async def upload_pictures(
     - user_id (str): The UUID of the user.
     - hashed_pictures ([str]): The images to upload.
     - container_client: The container client of the user.
+    - renditions (tuple): (optional) The downscaled copies to create with the new
+      pictures, among azure_storage.RENDITION_SIZES (e.g. ("thumbnail",)).
+    - compress (bool): Recompress the new pictures losslessly before storing them.
+      The sizes are recorded in the picture metadata (storage).
     """
     try:
 
@@ -347,16 +464,13 @@ async def upload_pictures(
             user_id, len(hashed_pictures)
         )
 
-        default_picture_set = str(user.get_default_picture_set(cursor, user_id))
-        if picture_set_id is None or str(picture_set_id) == default_picture_set:
-            picture_set_id = default_picture_set
-            folder_name = "General"
-        else:
-            folder_name = picture.get_picture_set_name(cursor, picture_set_id)
-            if folder_name is None:
-                folder_name = str(picture_set_id)
+        if picture_set_id is None:
+            picture_set_id = str(user.get_default_picture_set(cursor, user_id))
+        # Identical pictures share one content-addressed blob in the container
+        checksums, objects = prepare_picture_objects(cursor, user_id, hashed_pictures)
+        storage = await compress_picture_objects(objects) if compress else {}
         pic_ids = []
-        for picture_hash in hashed_pictures:
+        for checksum in checksums:
             # Create picture instance in DB
             picture_id = picture.new_picture_unknown(
                 cursor=cursor,
@@ -364,27 +478,22 @@ async def upload_pictures(
                 nb_objects=len(hashed_pictures),
                 picture_set_id=picture_set_id,
             )
-            # Upload the picture to the Blob Storage
-            response = await azure_storage.upload_image(
-                container_client,
-                str(folder_name),
-                str(picture_set_id),
-                picture_hash,
-                str(picture_id),
-            )
             # Update the picture metadata in the DB
             data = {
-                "link": azure_storage.build_blob_name(folder_name, str(picture_id), None),
+                "link": azure_storage.build_object_name(checksum),
                 "description": "Uploaded through the API",
             }
-
-            if not response:
-                raise BlobUploadError("Error uploading the picture")
-
+            if checksum in storage:
+                data["storage"] = storage[checksum]
             picture.update_picture_metadata(
-                cursor, str(picture_id), json.dumps(data), len(hashed_pictures)
+                cursor, str(picture_id), json.dumps(data), len(hashed_pictures), checksum
             )
             pic_ids.append(picture_id)
+        # Upload the pictures that are not in the Blob Storage yet
+        if await upload_picture_objects(
+            container_client, objects, renditions=renditions
+        ):
+            raise BlobUploadError("Error uploading the picture")
         return pic_ids
     except BlobUploadError or azure_storage.UploadImageError:
         raise BlobUploadError("Error uploading the picture")
@@ -0,0 +1,117 @@
+"""
+This module writes ZIP and TAR archives as a stream of bytes.
+
+The entries are written chunk by chunk and the bytes of the archive are taken with
+`drain()` as they are produced, so neither the entries nor the archive are ever
+held in memory. The size of an entry must be known when it begins (TAR headers and
+ZIP64 need it).
+"""
+
+import io
+import tarfile
+import time
+import zipfile
+
+ARCHIVE_FORMATS = ("zip", "tar")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class _Sink(io.RawIOBase):
+    """A non seekable file collecting what is written until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ArchiveWriter:
+    """
+    Write an archive entry by entry: begin_entry, write (any number of times),
+    end_entry, and close once every entry is written.
+
+    Parameters:
+    - archive_format (str): One of ARCHIVE_FORMATS.
+    """
+
+    def __init__(self, archive_format: str = "zip"):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ArchiveError(f"Unknown archive format: {archive_format}")
+        self.archive_format = archive_format
+        self._sink = _Sink()
+        self._entry = None
+        self._size = 0
+        self._written = 0
+        self._zip = None
+        if archive_format == "zip":
+            self._zip = zipfile.ZipFile(self._sink, "w", zipfile.ZIP_STORED)
+
+    def begin_entry(self, name: str, size: int):
+        if self._entry is not None:
+            raise ArchiveError(f"Entry not ended: {self._entry}")
+        self._size = size
+        self._written = 0
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.file_size = size
+            self._entry = self._zip.open(info, "w")
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._sink.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+            self._entry = name
+
+    def write(self, data):
+        self._written += len(data)
+        if self._written > self._size:
+            raise ArchiveError(f"Entry larger than announced: {self._size} bytes")
+        if self._zip is not None:
+            self._entry.write(data)
+        else:
+            self._sink.write(data)
+
+    def end_entry(self):
+        if self._written != self._size:
+            raise ArchiveError(
+                f"Entry of {self._written} bytes, {self._size} announced"
+            )
+        if self._zip is not None:
+            self._entry.close()
+        else:
+            # The entries are padded to a whole block
+            remainder = self._size % tarfile.BLOCKSIZE
+            if remainder:
+                self._sink.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+        self._entry = None
+
+    def add(self, name: str, data: bytes):
+        """Write a whole entry at once."""
+        self.begin_entry(name, len(data))
+        self.write(data)
+        self.end_entry()
+
+    def close(self):
+        """Write the end of the archive (ZIP central directory, TAR end blocks)."""
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._sink.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+
+    def drain(self) -> bytes:
+        """Return the bytes of the archive written since the last call."""
+        return self._sink.drain()
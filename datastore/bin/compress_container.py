@@ -0,0 +1,225 @@
+"""
+This script recompresses losslessly the pictures already stored in a container
+(see azure_storage_api.compress_lossless) and records their sizes in the
+metadata of the pictures in the database.
+
+A recompressed blob keeps its name and its tags and is marked with a
+'compression' blob metadata, so a second run skips it. A blob that can not be
+recompressed (not a TIFF, or not made smaller) is marked too, with the
+'none' compression. A blob modified while the script runs is left untouched.
+
+Parameters:
+- storage_url: the url of the storage account
+- container_name: the name of the container, '<tier>-<user uuid>'
+- --project: the project of the database ({PROJECT}_DB_URL and {PROJECT}_SCHEMA)
+- --dry-run: only report the savings
+- --workers: the number of processes compressing the pictures
+- --batch-size: the number of pictures downloaded at once
+"""
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError
+
+import datastore.blob as blob_api
+import datastore.blob.azure_storage_api as azure_storage
+import datastore.db as db
+import datastore.db.queries.picture as picture
+from datastore.db.metadata import validator
+
+BATCH_SIZE = 32
+# The compression metadata of the blobs that can not be recompressed
+UNCOMPRESSIBLE = "none"
+
+
+def list_pictures(container_client) -> list:
+    """
+    Return the names of the pictures of the container that were not recompressed.
+    The folder json files and the renditions are not pictures.
+    """
+    return [
+        blob.name
+        for blob in container_client.list_blobs(include=["metadata"])
+        if blob.name.split(".")[-1] != "json"
+        and not azure_storage.is_rendition_name(blob.name)
+        and not (blob.metadata or {}).get("compression")
+    ]
+
+
+def download(container_client, blob_name):
+    """Return the content of a blob and its etag."""
+    downloader = container_client.get_blob_client(blob_name).download_blob()
+    return downloader.readall(), downloader.properties.etag
+
+
+def replace(container_client, blob_name, data, etag, storage: dict) -> bool:
+    """
+    Replace the content of a blob if it was not modified since it was downloaded,
+    keeping its tags. Return False if it was modified.
+    """
+    blob_client = container_client.get_blob_client(blob_name)
+    tags = blob_client.get_blob_tags()
+    try:
+        blob_client.upload_blob(
+            data,
+            overwrite=True,
+            metadata={key: str(value) for key, value in storage.items()},
+            etag=etag,
+            match_condition=MatchConditions.IfNotModified,
+        )
+    except ResourceModifiedError:
+        return False
+    blob_client.set_blob_tags(tags)
+    return True
+
+
+def mark_uncompressible(container_client, blob_name, etag) -> bool:
+    """
+    Mark a blob that can not be recompressed, so the next runs skip it, if it was
+    not modified since it was downloaded. Return False if it was modified.
+    """
+    blob_client = container_client.get_blob_client(blob_name)
+    metadata = dict(blob_client.get_blob_properties().metadata or {})
+    metadata["compression"] = UNCOMPRESSIBLE
+    try:
+        blob_client.set_blob_metadata(
+            metadata, etag=etag, match_condition=MatchConditions.IfNotModified
+        )
+    except ResourceModifiedError:
+        return False
+    return True
+
+
+def record_storage(cursor, owner_id, blob_name: str, storage: dict):
+    """Record the sizes of a recompressed picture in the database."""
+    if azure_storage.is_object_name(blob_name):
+        checksum = blob_name.split("/")[-1]
+        picture.update_object_storage(cursor, owner_id, checksum, storage)
+    elif validator.is_valid_uuid(blob_name.split("/")[-1]):
+        picture.update_picture_storage(cursor, blob_name.split("/")[-1], storage)
+
+
+async def compress_container(
+    container_client,
+    cursor=None,
+    owner_id=None,
+    dry_run: bool = False,
+    workers: int = None,
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """
+    Recompress losslessly the pictures of a container. The pictures are downloaded
+    and uploaded in threads and compressed in a pool of processes, by batches. The
+    database changes are committed after each batch.
+
+    Parameters:
+    - container_client: the Azure container client
+    - cursor: (optional) the cursor used to record the sizes in the database
+    - owner_id: the UUID of the user owning the container
+    - dry_run: only report the savings, nothing is written
+    - workers: the number of processes, one per CPU by default
+    - batch_size: the number of pictures downloaded at once
+
+    Returns: the number of pictures, the number recompressed, and their total
+    original and stored sizes
+    """
+    report = {"pictures": 0, "compressed": 0, "original_size": 0, "stored_size": 0}
+    names = list_pictures(container_client)
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(names), batch_size):
+            batch = names[start : start + batch_size]
+            downloads = await asyncio.gather(
+                *(asyncio.to_thread(download, container_client, name) for name in batch)
+            )
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, azure_storage.compress_lossless, data)
+                    for data, _ in downloads
+                )
+            )
+            for name, (_, etag), (stored, storage) in zip(batch, downloads, results):
+                report["pictures"] += 1
+                report["original_size"] += storage["original_size"]
+                report["stored_size"] += storage["stored_size"]
+                if storage["compression"] is None:
+                    if not dry_run:
+                        await asyncio.to_thread(
+                            mark_uncompressible, container_client, name, etag
+                        )
+                    continue
+                report["compressed"] += 1
+                if dry_run:
+                    continue
+                if not await asyncio.to_thread(
+                    replace, container_client, name, stored, etag, storage
+                ):
+                    print(f"{name} was modified, it is skipped")
+                    report["compressed"] -= 1
+                    report["stored_size"] += (
+                        storage["original_size"] - storage["stored_size"]
+                    )
+                    continue
+                if cursor is not None:
+                    record_storage(cursor, owner_id, name, storage)
+            if cursor is not None and not dry_run:
+                cursor.connection.commit()
+            print(
+                f"{report['pictures']}/{len(names)} pictures, "
+                f"{report['compressed']} recompressed"
+            )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Recompress losslessly the pictures stored in a container"
+    )
+    parser.add_argument("storage_url")
+    parser.add_argument("container_name")
+    parser.add_argument("--project", default="nachet", choices=["nachet", "fertiscan"])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    blob_service_client = blob_api.create_BlobServiceClient(args.storage_url)
+    container_client = blob_api.create_container_client(
+        blob_service_client, args.container_name
+    )
+    owner_id = args.container_name.split("-", 1)[-1]
+    connection = cursor = None
+    if not args.dry_run and validator.is_valid_uuid(owner_id):
+        project = args.project.upper()
+        connection = db.connect_db(
+            os.environ.get(f"{project}_DB_URL"), os.environ.get(f"{project}_SCHEMA")
+        )
+        cursor = db.cursor(connection)
+    try:
+        report = asyncio.run(
+            compress_container(
+                container_client,
+                cursor,
+                owner_id,
+                args.dry_run,
+                args.workers,
+                args.batch_size,
+            )
+        )
+    finally:
+        if connection is not None:
+            db.end_query(connection, cursor)
+    saved = report["original_size"] - report["stored_size"]
+    print(
+        f"{report['compressed']}/{report['pictures']} pictures recompressed, "
+        f"{saved / 1024**2:.1f} MiB saved"
+        + (" (dry run)" if args.dry_run else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
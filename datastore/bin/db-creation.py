@@ -46,8 +46,9 @@ def create_db(DB_URL, SCHEMA: str):
 
 def loop_for_sql_files(cursor, folder_path):
     # Loop through all files in the specified folder
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
+    # Sorted so the files run in the same order on every setup
+    for root, dirs, files in sorted(os.walk(folder_path)):
+        for file in sorted(files):
             if file.endswith(".sql"):
                 file_path = os.path.join(root, file)
                 execute_sql_file(cursor, file_path)
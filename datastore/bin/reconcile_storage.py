@@ -0,0 +1,131 @@
+"""
+This script reconciles the pictures of the database with the blobs of the user
+containers (see datastore.reconciliation) and reports, for each user, the
+orphaned blobs, the dangling pictures, the unknown links and the missing folders.
+
+Each container is listed once and each user's pictures are read with one query.
+It is meant to run in the background (e.g. nightly), the request path does not
+check the consistency of the storage.
+
+Parameters:
+- storage_url: the url of the storage account, or 'file://<root>'
+- --user-id: the users to reconcile (default: all the users)
+- --project: the project of the database ({PROJECT}_DB_URL and {PROJECT}_SCHEMA)
+- --tier: the tier of the containers
+- --repair: delete the orphaned blobs and create the missing folders
+- --delete-dangling-pictures: delete the pictures without blob from the database
+  (never the pictures whose link is unknown)
+- --min-age: the hours under which an orphaned blob is not deleted
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+
+import datastore.blob.azure_storage_api as azure_storage
+import datastore.db as db
+import datastore.db.queries.user as user
+import datastore.reconciliation as reconciliation
+
+
+async def reconcile_storage(
+    cursor,
+    blob_service_client,
+    user_ids: list,
+    tier: str = "user",
+    repair: bool = False,
+    delete_pictures: bool = False,
+    min_age: datetime.timedelta = reconciliation.MIN_AGE,
+) -> dict:
+    """
+    Reconcile the containers of the users, committing after each user.
+
+    Returns: the reports by user id
+    """
+    reports = {}
+    for user_id in user_ids:
+        container_client = blob_service_client.get_container_client(
+            azure_storage.build_container_name(str(user_id), tier)
+        )
+        try:
+            report = await reconciliation.reconcile_container(
+                cursor,
+                container_client,
+                str(user_id),
+                repair,
+                delete_pictures,
+                min_age,
+            )
+            cursor.connection.commit()
+        except Exception as error:
+            cursor.connection.rollback()
+            print(f"Error reconciling the user {user_id}: {error}")
+            continue
+        reports[str(user_id)] = report
+        print(
+            f"{user_id}: {report['blobs']} blobs, {report['pictures']} pictures, "
+            f"{len(report['orphaned_blobs'])} orphaned blobs "
+            f"({len(report['recent_blobs'])} recent), "
+            f"{len(report['dangling_pictures'])} dangling pictures, "
+            f"{len(report['unknown_links'])} unknown links, "
+            f"{len(report['missing_folders'])} missing folders, "
+            f"{len(report['unreferenced_folders'])} unreferenced folders"
+        )
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reconcile the pictures of the database with the blob storage"
+    )
+    parser.add_argument("storage_url")
+    parser.add_argument("--user-id", action="append", default=None)
+    parser.add_argument("--project", default="nachet", choices=["nachet", "fertiscan"])
+    parser.add_argument("--tier", default="user")
+    parser.add_argument("--repair", action="store_true")
+    parser.add_argument("--delete-dangling-pictures", action="store_true")
+    parser.add_argument(
+        "--min-age",
+        type=float,
+        default=reconciliation.MIN_AGE.total_seconds() / 3600,
+        help="hours",
+    )
+    parser.add_argument("--output", help="write the reports to this json file")
+    args = parser.parse_args(argv)
+
+    blob_service_client = azure_storage.get_blob_service_client(args.storage_url)
+    project = args.project.upper()
+    connection = db.connect_db(
+        os.environ.get(f"{project}_DB_URL"), os.environ.get(f"{project}_SCHEMA")
+    )
+    cursor = db.cursor(connection)
+    try:
+        user_ids = args.user_id or user.get_all_user_ids(cursor)
+        reports = asyncio.run(
+            reconcile_storage(
+                cursor,
+                blob_service_client,
+                user_ids,
+                args.tier,
+                args.repair,
+                args.delete_dangling_pictures,
+                datetime.timedelta(hours=args.min_age),
+            )
+        )
+    finally:
+        db.end_query(connection, cursor)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(reports, file, indent=2)
+    print(
+        f"{len(reports)}/{len(user_ids)} users reconciled, "
+        f"{sum(len(r['orphaned_blobs']) for r in reports.values())} orphaned blobs, "
+        f"{sum(len(r['dangling_pictures']) for r in reports.values())} dangling pictures"
+        + ("" if args.repair or args.delete_dangling_pictures else " (report only)")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,14 @@ import datastore.db.queries.user as user
 import datastore.db.metadata.picture_set as picture_set_metadata
 import nachet.db.metadata.picture as picture_metadata
 import datastore.db.queries.picture as picture_query
+import datastore.db as db
+import datastore
 from datastore.blob import azure_storage_api as blob
+import argparse
 import asyncio
-import json
+import os
+import time
+import uuid
 
 
 class AlreadyExistingFolderError(Exception):
@@ -16,7 +21,17 @@ class UploadError(Exception):
     pass
 
 
-def upload_picture_set(
+def format_throughput(nb_pictures: int, nb_bytes: int, seconds: float) -> str:
+    """Return the throughput summary of an upload."""
+    seconds = max(seconds, 1e-9)
+    mib = nb_bytes / 1024**2
+    return (
+        f"Uploaded {nb_pictures} picture(s), {mib:.1f} MiB in {seconds:.2f}s: "
+        f"{nb_pictures / seconds:.1f} pictures/s, {mib / seconds:.1f} MiB/s"
+    )
+
+
+async def upload_picture_set(
     cursor,
     container_client,
     pictures,
@@ -24,22 +39,34 @@ def upload_picture_set(
     seed_name: str,
     zoom_level: float,
     nb_seeds: int,
+    max_concurrency: int = blob.UPLOAD_CONCURRENCY,
+    renditions: tuple = (),
+    compress: bool = False,
     **kwargs,
 ):
     """
     Upload a set of pictures to the Azure storage account and the database.
 
+    The container is listed once, the picture rows are inserted in one batch and the
+    blobs are uploaded concurrently, at most max_concurrency at the same time.
+
     Args:
         cursor (obj): cursor object to interact with the database
-        connection_string (str): URL to connect to the Azure storage account
-        pictures (str): list picture in a string format
+        container_client (obj): the Azure container client of the user
+        pictures (list): pictures as raw bytes or base64 strings
         user_id (str): uuid of the user
         seed_name (str): name of the seed
         zoom_level (float): zoom level of the picture
         nb_seeds (int): number of seeds in the picture
+        max_concurrency (int): maximum number of uploads in flight
+        renditions (tuple): downscaled copies to create, among blob.RENDITION_SIZES
+        compress (bool): recompress the pictures losslessly before storing them
         kwargs: additional arguments
     """
+    folder_created = False
+    picture_set_id = None
     try:
+        start = time.perf_counter()
         if not seed.is_seed_registered(cursor=cursor, seed_name=seed_name):
             raise seed.SeedNotFoundError(
                 f"Seed not found based on the given name: {seed_name}"
@@ -56,44 +83,54 @@ def upload_picture_set(
             cursor=cursor, picture_set_metadata=picture_set, user_id=user_id
         )
 
-        folder_created = asyncio.run(
-            blob.create_folder(container_client, str(picture_set_id))
+        # The container is listed once for the whole picture set
+        folders = await blob.get_folder_names(container_client)
+        folder_created = await blob.create_folder(
+            container_client, str(picture_set_id), folders=folders
         )
-        print(folder_created)
         if not folder_created:
             raise AlreadyExistingFolderError(f"Folder already exists: {picture_set_id}")
         folder_url = container_client.url + "/" + str(picture_set_id)
-        picture_uploaded = []
-        for picture_encoded in pictures:
-
-            # Create picture instance in DB
-            empty_picture = json.dumps([])
-            picture_id = picture_query.new_picture(
-                cursor=cursor,
-                picture=empty_picture,
-                picture_set_id=picture_set_id,
-                seed_id=seed_id,
-            )
-            # Upload picture to Azure and retrieve link
-            asyncio.run(
-                blob.upload_image(
-                    container_client, picture_set_id, picture_encoded, picture_id
-                )
-            )
-            picture_link = folder_url + "/" + str(picture_id)
-            picture_uploaded.append(picture_link)
-            # Create picture metadata and update DB instance (with link to Azure blob)
+
+        if compress:
+            compressed = await blob.compress_pictures(pictures)
+        else:
+            compressed = [(picture_encoded, None) for picture_encoded in pictures]
+
+        # The ids are known beforehand, so the metadata (with the link to the Azure
+        # blob) is built before the rows are inserted, in one batch
+        rows = []
+        uploads = []
+        for picture_encoded, (stored, storage) in zip(pictures, compressed):
+            picture_id = uuid.uuid4()
             picture = picture_metadata.build_picture(
                 pic_encoded=picture_encoded,
-                link=picture_link,
+                link=folder_url + "/" + str(picture_id),
                 nb_seeds=nb_seeds,
                 zoom=zoom_level,
                 description="upload_picture_set script",
+                storage=storage,
             )
-            picture_query.update_picture_metadata(
-                cursor=cursor, picture_id=picture_id, metadata=picture
+            rows.append((picture_id, picture, 0))
+            uploads.append((picture_set_id, picture_set_id, stored, picture_id))
+        picture_query.copy_new_pictures(cursor, rows, picture_set_id, seed_id)
+
+        results = await blob.upload_images(
+            container_client, uploads, max_concurrency, renditions
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise blob.UploadImageError(
+                f"{len(errors)} picture(s) not uploaded: {errors[0]}"
             )
 
+        print(
+            format_throughput(
+                len(pictures),
+                sum(len(stored) for stored, _ in compressed),
+                time.perf_counter() - start,
+            )
+        )
         return picture_set_id
     except (seed.SeedNotFoundError) as e:
         raise e
@@ -102,12 +139,72 @@ def upload_picture_set(
     except AlreadyExistingFolderError as e:
         raise e
     except Exception:
-        if folder_url is not None:
-            #arg = f""""picture_set_uuid":'{picture_set_id}'"""
-            #blobs = asyncio.run(blob.get_blobs_from_tag(container_client, arg))
-            blobs = container_client.list_blobs()
-            container_client.delete_blobs(blobs)
+        if folder_created:
+            await blob.delete_folder(container_client, str(picture_set_id))
         raise UploadError("An error occured during the upload of the picture set")
 
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Upload the .tiff pictures of a folder as a new picture set"
+    )
+    parser.add_argument("picture_folder")
+    parser.add_argument("user_id")
+    parser.add_argument("seed_name")
+    parser.add_argument("zoom_level", type=float)
+    parser.add_argument("nb_seeds", type=int)
+    parser.add_argument(
+        "--concurrency", type=int, default=blob.UPLOAD_CONCURRENCY,
+        help="maximum number of uploads in flight",
+    )
+    parser.add_argument(
+        "--renditions", nargs="*", default=[], choices=list(blob.RENDITION_SIZES),
+        help="downscaled copies to create next to each picture",
+    )
+    parser.add_argument(
+        "--compress", action="store_true",
+        help="recompress the pictures losslessly before storing them",
+    )
+    args = parser.parse_args(argv)
+
+    pictures = []
+    with os.scandir(args.picture_folder) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.is_file() and entry.name.lower().endswith((".tiff", ".tif")):
+                with open(entry.path, "rb") as file:
+                    pictures.append(file.read())
+
+    connection = db.connect_db(
+        os.environ.get("NACHET_DB_URL"), os.environ.get("NACHET_SCHEMA")
+    )
+    cursor = db.cursor(connection)
+    try:
+        container_client = await datastore.get_user_container_client(
+            args.user_id,
+            os.environ.get("NACHET_STORAGE_URL"),
+            os.environ.get("NACHET_BLOB_ACCOUNT"),
+            os.environ.get("NACHET_BLOB_KEY"),
+        )
+        picture_set_id = await upload_picture_set(
+            cursor,
+            container_client,
+            pictures,
+            args.user_id,
+            args.seed_name,
+            args.zoom_level,
+            args.nb_seeds,
+            max_concurrency=args.concurrency,
+            renditions=tuple(args.renditions),
+            compress=args.compress,
+        )
+        print(f"Picture set created with the following uuid: {picture_set_id}")
+        db.end_query(connection, cursor)
+    finally:
+        if not connection.closed:
+            connection.rollback()
+            cursor.close()
+            connection.close()
+
+
 if __name__ == "__main__":
-    upload_picture_set()
+    asyncio.run(main())
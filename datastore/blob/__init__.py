@@ -6,6 +6,8 @@ from azure.storage.blob import (
 )
 from datetime import timedelta, datetime
 
+from datastore.blob import local_storage_api
+
 class ConnectionStringError(Exception):
     pass
 
@@ -15,12 +17,16 @@ def create_BlobServiceClient(storage_url):
     This function creates a BlobServiceClient object
 
     Parameters:
-    - storage_url: the url of the storage account
+    - storage_url: the url of the storage account, or 'file://{root}' for the local storage
 
     Returns: BlobServiceClient object
     """
     try:
         # Create a blob service client
+        if local_storage_api.is_local_storage(storage_url):
+            return local_storage_api.LocalBlobServiceClient.from_connection_string(
+                conn_str=storage_url
+            )
         blob_service_client = BlobServiceClient.from_connection_string(conn_str=storage_url)
         return blob_service_client
     except ValueError as e:
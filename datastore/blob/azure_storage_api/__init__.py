@@ -1,9 +1,16 @@
+import asyncio
+import base64
 import datetime
 import hashlib
+import io
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 from azure.storage.blob import BlobServiceClient, ContainerClient, BlobProperties
+from PIL import Image, ImageSequence
+
+from datastore.blob import local_storage_api
 
 
 class GenerateHashError(Exception):
@@ -42,6 +49,29 @@ class ConnectionStringError(Exception):
     pass
 
 
+class RenditionError(Exception):
+    pass
+
+
+# Maximum number of blob uploads running at the same time in upload_images
+UPLOAD_CONCURRENCY = 8
+
+# Folder of the content-addressed pictures: each one is stored once per container,
+# under the sha256 of its content, whatever the number of pictures referencing it
+OBJECT_FOLDER = "objects"
+
+# Size of the chunks read when hashing a stream
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Downscaled JPEG copies of a picture, stored next to it as '{blob_name}.{size}.jpg'.
+# The value is the longest edge, in pixels.
+RENDITION_SIZES = {"thumbnail": 256, "preview": 1024}
+RENDITION_QUALITY = 85
+
+# Compression of the TIFF pictures recompressed losslessly before being stored
+LOSSLESS_COMPRESSION = "tiff_adobe_deflate"
+
+
 """
 ---- user-container based structure -----
 - container name is user id
@@ -54,13 +84,41 @@ the image inference results
 """
 
 
+def compute_checksum(image, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    computes the sha256 of an image chunk by chunk, without copying it
+
+    Parameters:
+    - image: the image as bytes, a memoryview, a base64 str or a binary file
+      object. A file object is read from its current position and rewound after.
+    - chunk_size: the size of the chunks read from a file object
+
+    Returns: the hexadecimal sha256 of the image content: a base64 str is
+    decoded first, so the checksum of a picture does not depend on how it was
+    given (it is also the image_checksum of its metadata)
+    """
+    digest = hashlib.sha256()
+    if hasattr(image, "read"):
+        start = image.tell() if image.seekable() else None
+        for chunk in iter(lambda: image.read(chunk_size), b""):
+            digest.update(chunk)
+        if start is not None:
+            image.seek(start)
+    else:
+        if isinstance(image, str):
+            image = _decode_picture(image)
+        view = memoryview(image).cast("B")
+        for offset in range(0, len(view), chunk_size):
+            digest.update(view[offset : offset + chunk_size])
+    return digest.hexdigest()
+
+
 async def generate_hash(image):
     """
     generates a hash value for the image to be used as the image name in the container
     """
     try:
-        hash = hashlib.sha256(image).hexdigest()
-        return hash
+        return compute_checksum(image)
 
     except TypeError as error:
         print(error.__str__())
@@ -103,6 +161,183 @@ def build_blob_name(folder_path: str, blob_name: str, file_type: str = None)-> s
         return "{}/{}".format(folder_path, blob_name)
 
 
+def build_object_name(checksum: str) -> str:
+    """
+    This function builds the content-addressed blob name of a picture
+
+    Parameters:
+    - checksum (str): the sha256 of the picture
+    """
+    return build_blob_name(OBJECT_FOLDER, checksum)
+
+
+def is_object_name(blob_name: str) -> bool:
+    """
+    This function checks if a blob name is a content-addressed picture
+    """
+    return str(blob_name).startswith(OBJECT_FOLDER + "/")
+
+
+def build_rendition_name(blob_name: str, size: str) -> str:
+    """
+    This function builds the blob name of a rendition of a picture
+
+    Parameters:
+    - blob_name (str): the blob name of the original picture
+    - size (str): one of RENDITION_SIZES
+    """
+    if size not in RENDITION_SIZES:
+        raise RenditionError(f"Unknown rendition size: {size}")
+    return "{}.{}.jpg".format(blob_name, size)
+
+
+def is_rendition_name(blob_name: str) -> bool:
+    """
+    This function checks if a blob name is a rendition of a picture
+    """
+    parts = str(blob_name).rsplit(".", 2)
+    return len(parts) == 3 and parts[1] in RENDITION_SIZES and parts[2] == "jpg"
+
+
+def _decode_picture(image) -> bytes:
+    """
+    returns the bytes of an image given as bytes, a memoryview or a base64 str
+    """
+    if isinstance(image, str):
+        # Drop the header of a data URL (data:image/...;base64,)
+        return base64.b64decode(image.split(",", 1)[-1])
+    return bytes(image)
+
+
+def _frames(data: bytes) -> list:
+    """
+    returns the mode, size and pixels of every frame of an image
+    """
+    with Image.open(io.BytesIO(data)) as picture:
+        return [
+            (frame.mode, frame.size, frame.tobytes())
+            for frame in ImageSequence.Iterator(picture)
+        ]
+
+
+def compress_lossless(image) -> tuple:
+    """
+    recompresses a TIFF picture losslessly (LOSSLESS_COMPRESSION). The pixels of
+    every frame are checked against the original: the original is kept if they
+    differ, if the picture is not a TIFF or if it is not made smaller.
+
+    Parameters:
+    - image: the image as bytes, a memoryview or a base64 str
+
+    Returns: (stored image, storage) where the stored image is a base64 str if the
+    given one is, bytes otherwise, and storage is {"compression", "original_size", "stored_size"}, the
+    sizes being the ones in bytes of the given and stored pictures (decoded, for a
+    base64 str)
+    """
+    storage = {
+        "compression": None,
+        "original_size": len(image),
+        "stored_size": len(image),
+    }
+    try:
+        data = _decode_picture(image)
+        storage["original_size"] = storage["stored_size"] = len(data)
+        with Image.open(io.BytesIO(data)) as picture:
+            if picture.format != "TIFF":
+                return image, storage
+            frames = [frame.copy() for frame in ImageSequence.Iterator(picture)]
+            options = {"dpi": picture.info["dpi"]} if "dpi" in picture.info else {}
+            if "icc_profile" in picture.info:
+                options["icc_profile"] = picture.info["icc_profile"]
+        output = io.BytesIO()
+        frames[0].save(
+            output,
+            format="TIFF",
+            compression=LOSSLESS_COMPRESSION,
+            save_all=True,
+            append_images=frames[1:],
+            **options,
+        )
+        compressed = output.getvalue()
+        if _frames(compressed) != _frames(data):
+            print("Lossless compression round trip failed, the original is kept")
+            return image, storage
+    except Exception as error:
+        print(f"Error compressing the picture, the original is kept: {error}")
+        return image, storage
+
+    if len(compressed) >= len(data):
+        return image, storage
+    if isinstance(image, str):
+        header = image.split(",", 1)[0] + "," if "," in image else ""
+        stored = header + base64.b64encode(compressed).decode()
+    else:
+        stored = compressed
+    storage["compression"] = LOSSLESS_COMPRESSION
+    storage["stored_size"] = len(compressed)
+    return stored, storage
+
+
+async def compress_pictures(images: list, max_workers: int = None) -> list:
+    """
+    recompresses pictures losslessly (see compress_lossless), in a pool of
+    processes when there is more than one
+
+    Parameters:
+    - images: the images as bytes, memoryviews or base64 str
+    - max_workers: (optional) the number of processes, one per CPU by default
+
+    Returns: a list with, for each image in order, its (stored image, storage)
+    """
+    # A memoryview can not be sent to another process
+    images = [bytes(i) if isinstance(i, memoryview) else i for i in images]
+    if len(images) <= 1:
+        return [await asyncio.to_thread(compress_lossless, image) for image in images]
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return await asyncio.gather(
+            *(loop.run_in_executor(pool, compress_lossless, image) for image in images)
+        )
+
+
+def make_rendition(image, size: str) -> bytes:
+    """
+    creates a downscaled JPEG copy of an image. The image is never upscaled.
+
+    Parameters:
+    - image: the image as bytes, a memoryview or a base64 str
+    - size: one of RENDITION_SIZES
+
+    Returns: the JPEG bytes
+    """
+    if size not in RENDITION_SIZES:
+        raise RenditionError(f"Unknown rendition size: {size}")
+    edge = RENDITION_SIZES[size]
+    with Image.open(io.BytesIO(_decode_picture(image))) as picture:
+        # Lets the JPEG decoder skip the pixels the rendition does not need
+        picture.draft("RGB", (edge, edge))
+        picture.thumbnail((edge, edge))
+        if picture.mode != "RGB":
+            picture = picture.convert("RGB")
+        output = io.BytesIO()
+        picture.save(output, format="JPEG", quality=RENDITION_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def get_blob_service_client(connection_string, credentials=""):
+    """
+    Creates the blob service client of a connection string: the local storage for
+    a 'file://{root}' connection string, Azure otherwise.
+    """
+    if local_storage_api.is_local_storage(connection_string):
+        return local_storage_api.LocalBlobServiceClient.from_connection_string(
+            conn_str=connection_string
+        )
+    return BlobServiceClient.from_connection_string(
+        conn_str=connection_string, credential=credentials
+    )
+
+
 async def mount_container(
     connection_string,
     container_uuid,
@@ -114,7 +349,7 @@ async def mount_container(
     Creates a container_client as an object that can be used in other functions.
 
     Parameters:
-    - connection_string: the connection string to the azure storage account
+    - connection_string: the connection string to the azure storage account, or 'file://{root}' for the local storage
     - container_uuid: the uuid of the container (usually the user uuid)
     - create_container: a boolean value to specify if the container should be created if it doesnt exist (default is True)
     - tier: the tier of the container (default is user, should be changed if the structure changes to accomodate other type of containers)
@@ -123,9 +358,7 @@ async def mount_container(
     - container_client: the container client object
     """
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(
-            conn_str=connection_string, credential=credentials
-        )
+        blob_service_client = get_blob_service_client(connection_string, credentials)
         if blob_service_client:
             container_name = build_container_name(str(container_uuid), tier)
             container_client = blob_service_client.get_container_client(container_name)
@@ -168,8 +401,32 @@ async def get_blob(container_client, blob_name):
         raise GetBlobError(str(error) + "\nError getting blob:" + blob_name)
 
 
+async def get_picture(container_client, blob_name, size: str = None):
+    """
+    gets a picture, or one of its renditions. The original is returned when the
+    rendition was not created (e.g. for the pictures uploaded before)
+
+    Parameters:
+    - container_client: the Azure container client
+    - blob_name: the blob name of the original picture
+    - size: (optional) one of RENDITION_SIZES, None for the original
+    """
+    if size is not None:
+        try:
+            return await get_blob(container_client, build_rendition_name(blob_name, size))
+        except GetBlobError:
+            pass
+    return await get_blob(container_client, blob_name)
+
+
 async def upload_image(
-    container_client, folder_name, folder_uuid, image: str, image_uuid
+    container_client,
+    folder_name,
+    folder_uuid,
+    image: str,
+    image_uuid,
+    folders: set = None,
+    renditions: tuple = (),
 ):
     """
     uploads the image to the specified folder within the user's container,
@@ -180,9 +437,15 @@ async def upload_image(
     - folder_name: the name of the destination folder
     - folder_uuid : uuid of the picture_set
     - image:
+    - folders: (optional) the folder names returned by get_folder_names, used instead of listing the container
+    - renditions: (optional) the RENDITION_SIZES to create next to the image
     """
     try:
-        if not await is_a_folder(container_client, folder_name):
+        if folders is not None:
+            folder_exists = str(folder_name) in folders
+        else:
+            folder_exists = await is_a_folder(container_client, folder_name)
+        if not folder_exists:
             raise CreateDirectoryError(f"Folder:{folder_name} does not exist")
         else:
             blob_name = build_blob_name(str(folder_name), str(image_uuid))
@@ -190,8 +453,11 @@ async def upload_image(
                 "picture_uuid": f"{str(image_uuid)}",
                 "picture_set_uuid": f"{str(folder_uuid)}",
             }
-            blob_client = container_client.upload_blob(blob_name, image, overwrite=True)
-            blob_client.set_blob_tags(metadata)
+            blob_name = _upload_tagged_blob(container_client, blob_name, image, metadata)
+            if renditions:
+                await upload_renditions(
+                    container_client, [(blob_name, image, metadata)], renditions
+                )
             return blob_name
     except CreateDirectoryError or UploadImageError as e:
         raise e
@@ -200,6 +466,228 @@ async def upload_image(
         raise Exception("Datastore.blob.azure_storage unHandled Error")
 
 
+async def upload_images(
+    container_client,
+    images: list,
+    max_concurrency: int = UPLOAD_CONCURRENCY,
+    renditions: tuple = (),
+) -> list:
+    """
+    uploads many images at once, running at most max_concurrency uploads at the same time.
+    The folders are expected to exist already.
+
+    Parameters:
+    - container_client: the Azure container client
+    - images: list of (folder_name, folder_uuid, image, image_uuid) tuples
+    - max_concurrency: the maximum number of uploads in flight
+    - renditions: (optional) the RENDITION_SIZES to create next to each uploaded image
+
+    Returns: a list with, for each image in order, its blob name or the UploadImageError raised
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def upload(folder_name, folder_uuid, image, image_uuid):
+        blob_name = build_blob_name(str(folder_name), str(image_uuid))
+        metadata = {
+            "picture_uuid": f"{str(image_uuid)}",
+            "picture_set_uuid": f"{str(folder_uuid)}",
+        }
+        async with semaphore:
+            try:
+                # The sync client blocks, so each upload runs in a worker thread
+                return await asyncio.to_thread(
+                    _upload_tagged_blob, container_client, blob_name, image, metadata
+                )
+            except Exception as error:
+                return UploadImageError(f"Error uploading {blob_name}: {error}")
+
+    results = await asyncio.gather(*(upload(*image) for image in images))
+    if renditions:
+        await upload_renditions(
+            container_client,
+            [
+                (
+                    result,
+                    image,
+                    {"picture_uuid": str(image_uuid), "picture_set_uuid": str(folder_uuid)},
+                )
+                for result, (_, folder_uuid, image, image_uuid) in zip(results, images)
+                if not isinstance(result, Exception)
+            ],
+            renditions,
+            max_concurrency,
+        )
+    return results
+
+
+async def upload_objects(
+    container_client,
+    objects: list,
+    max_concurrency: int = UPLOAD_CONCURRENCY,
+    renditions: tuple = (),
+) -> list:
+    """
+    uploads content-addressed pictures, running at most max_concurrency uploads at
+    the same time. The caller only gives the pictures that are not referenced yet:
+    an object is written again with the same content if it already exists.
+
+    Parameters:
+    - container_client: the Azure container client
+    - objects: list of (checksum, image) tuples
+    - max_concurrency: the maximum number of uploads in flight
+    - renditions: (optional) the RENDITION_SIZES to create next to each uploaded object
+
+    Returns: a list with, for each object in order, its blob name or the UploadImageError raised
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def upload(checksum, image):
+        blob_name = build_object_name(checksum)
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(
+                    _upload_tagged_blob,
+                    container_client,
+                    blob_name,
+                    image,
+                    {"checksum": checksum},
+                )
+            except Exception as error:
+                return UploadImageError(f"Error uploading {blob_name}: {error}")
+
+    results = await asyncio.gather(*(upload(*obj) for obj in objects))
+    if renditions:
+        await upload_renditions(
+            container_client,
+            [
+                (result, image, {"checksum": checksum})
+                for result, (checksum, image) in zip(results, objects)
+                if not isinstance(result, Exception)
+            ],
+            renditions,
+            max_concurrency,
+        )
+    return results
+
+
+async def upload_renditions(
+    container_client,
+    images: list,
+    sizes: tuple = tuple(RENDITION_SIZES),
+    max_concurrency: int = UPLOAD_CONCURRENCY,
+) -> list:
+    """
+    creates and uploads the renditions of uploaded pictures. The pictures are
+    downscaled in worker threads, at most max_concurrency at the same time.
+    A rendition that can not be created is skipped: the original is served instead.
+
+    Parameters:
+    - container_client: the Azure container client
+    - images: list of (blob_name, image, tags) tuples, blob_name being the original
+    - sizes: the RENDITION_SIZES to create
+    - max_concurrency: the maximum number of renditions in flight
+
+    Returns: a list with, for each picture and size, its blob name or the RenditionError raised
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def upload(blob_name, image, tags, size):
+        rendition_name = build_rendition_name(blob_name, size)
+        async with semaphore:
+            try:
+                data = await asyncio.to_thread(make_rendition, image, size)
+                return await asyncio.to_thread(
+                    _upload_tagged_blob,
+                    container_client,
+                    rendition_name,
+                    data,
+                    {**tags, "rendition": size},
+                )
+            except Exception as error:
+                print(f"Error creating {rendition_name}: {error}")
+                return RenditionError(f"Error creating {rendition_name}: {error}")
+
+    unknown = set(sizes) - set(RENDITION_SIZES)
+    if unknown:
+        raise RenditionError(f"Unknown rendition sizes: {sorted(unknown)}")
+    return await asyncio.gather(
+        *(upload(*image, size) for image in images for size in sizes)
+    )
+
+
+async def delete_objects(container_client, checksums) -> int:
+    """
+    deletes the content-addressed pictures that are not referenced anymore, with
+    their renditions
+
+    Parameters:
+    - container_client: the Azure container client
+    - checksums: the sha256 of the pictures to delete
+
+    Returns: the number of objects deleted
+    """
+    return _delete_objects(container_client, checksums)
+
+
+def delete_objects_after_commit(cursor, container_client, checksums, guard=None):
+    """
+    deletes the content-addressed pictures that are not referenced anymore once
+    the transaction of the cursor is committed: before, a rollback would bring
+    back pictures without their object. Nothing is deleted if it is rolled back.
+
+    The end of the transaction is known for the connections of
+    datastore.db.connect_db; with another connection the objects are left to the
+    reconciliation job (datastore.reconciliation).
+
+    Parameters:
+    - cursor: the cursor of the transaction deleting the pictures
+    - container_client: the Azure container client
+    - checksums: the sha256 of the pictures to delete
+    - guard: (optional) called at commit with the checksums, a context manager
+      giving the ones that may still be deleted; they are deleted before it exits
+      (see datastore.unreferenced_objects)
+    """
+    checksums = list(checksums)
+    on_commit = getattr(cursor.connection, "on_commit", None)
+    if not checksums or on_commit is None:
+        return
+
+    def delete():
+        if guard is None:
+            return _delete_objects(container_client, checksums)
+        with guard(checksums) as deletable:
+            return _delete_objects(container_client, deletable)
+
+    on_commit(delete)
+
+
+def _delete_objects(container_client, checksums) -> int:
+    deleted = 0
+    for checksum in checksums:
+        try:
+            object_name = build_object_name(checksum)
+            for size in RENDITION_SIZES:
+                try:
+                    container_client.delete_blob(build_rendition_name(object_name, size))
+                except Exception:
+                    # The rendition was not created
+                    pass
+            container_client.delete_blob(object_name)
+            deleted += 1
+        except Exception as error:
+            print(f"Error deleting object {checksum}: {error}")
+    return deleted
+
+
+def _upload_tagged_blob(container_client, blob_name, data, tags: dict):
+    """
+    uploads a blob and sets its tags
+    """
+    blob_client = container_client.upload_blob(blob_name, data, overwrite=True)
+    blob_client.set_blob_tags(tags)
+    return blob_name
+
+
 async def is_a_folder(container_client, folder_name):
     """
     This function checks if a folder exists in the container
@@ -225,7 +713,9 @@ async def is_a_folder(container_client, folder_name):
         raise Exception("Datastore.blob.azure_storage : Unhandled Error")
 
 
-async def create_folder(container_client, folder_uuid=None, folder_name=None):
+async def create_folder(
+    container_client, folder_uuid=None, folder_name=None, folders: set = None
+):
     """
     creates a folder in the user's container
 
@@ -233,6 +723,8 @@ async def create_folder(container_client, folder_uuid=None, folder_name=None):
     - container_client: the container client object to interact with the Azure storage account
     - folder_uuid: the uuid of the folder to be created
     - folder_name: the name of the folder to be created (usually it's uuid)
+    - folders: (optional) the folder names returned by get_folder_names, used instead of
+      listing the container. The new folder is added to it.
     """
     try:
         # We want to enable 2 types of folder creation
@@ -243,7 +735,11 @@ async def create_folder(container_client, folder_uuid=None, folder_name=None):
         # Until we allow user to manually create folder and name them
         if folder_name is None:
             folder_name = folder_uuid
-        if not await is_a_folder(container_client, folder_name):
+        if folders is not None:
+            folder_exists = str(folder_name) in folders
+        else:
+            folder_exists = await is_a_folder(container_client, folder_name)
+        if not folder_exists:
             folder_data = {
                 "folder_name": folder_name,
                 "date_created": str(
@@ -260,6 +756,8 @@ async def create_folder(container_client, folder_uuid=None, folder_name=None):
             )
             metadata = {"picture_set_uuid": f"{str(folder_uuid)}"}
             blob_client.set_blob_tags(metadata)
+            if folders is not None:
+                folders.add(str(folder_name))
             return True
         else:
             raise CreateDirectoryError("Folder already exists")
@@ -394,8 +892,10 @@ async def get_image_count(container_client, folder_name):
             count = 0
             for blob in blob_list:
 
-                if (blob.name.split("/")[0] == folder_name) and (
-                    blob.name.split(".")[-1] != "json"
+                if (
+                    (blob.name.split("/")[0] == folder_name)
+                    and (blob.name.split(".")[-1] != "json")
+                    and not is_rendition_name(blob.name)
                 ):
                     count += 1
             return count
@@ -434,6 +934,27 @@ async def get_directories(container_client):
         raise FolderListError(f"Error getting directories: {str(error)}")
 
 
+async def get_folder_names(container_client) -> set:
+    """
+    returns the names of the folders in the user's container with a single listing.
+    A folder is identified by its '{folder_name}/{folder_name}.json' blob, so
+    the folder json files do not need to be downloaded.
+    """
+    try:
+        folders = set()
+        for blob in container_client.list_blobs():
+            if (
+                blob.name.split(".")[-1] == "json"
+                and blob.name.count("/") == 1
+                and blob.name.split("/")[0] == blob.name.split("/")[1][: -len(".json")]
+            ):
+                folders.add(blob.name.split("/")[0])
+        return folders
+    except Exception as error:
+        print(error)
+        raise FolderListError(f"Error getting folder names: {str(error)}")
+
+
 async def download_container(container_client, container_name, local_dir):
     """
     This function downloads all the files from a container in a storage account
@@ -540,19 +1061,46 @@ async def move_blob(
     - container_client_destination : the Azure container client where the blob will be moved
     """
     try:
-        blob_client = container_client_source.get_blob_client(blob_name_source)
-
-        blob = blob_client.download_blob().readall()
-
-        blob_client_destination = container_client_destination.get_blob_client(
-            blob_name_dest
+        await copy_blob(
+            blob_name_source,
+            blob_name_dest,
+            folder_uuid,
+            container_client_source,
+            container_client_destination,
         )
-
-        blob_client_destination.upload_blob(blob, overwrite=True)
-        metadata = {"picture_set_uuid": f"{str(folder_uuid)}"}
-        blob_client_destination.set_blob_tags(metadata)
-
         container_client_source.delete_blob(blob_name_source)
         return True
     except Exception as e:
         raise Exception(f"Error moving blob: {e}")
+
+
+async def copy_blob(
+    blob_name_source,
+    blob_name_dest,
+    folder_uuid,
+    container_client_source,
+    container_client_destination,
+):
+    """
+    This function copies a blob from a container to another, the source is kept.
+    Used for the content-addressed pictures that other pictures may still reference.
+
+    Parameters:
+    - blob_name_source: the name of the blob to copy
+    - blob_name_dest: the name of the copy
+    - folder_uuid: the uuid of the picture set the copy is tagged with
+    - container_client_source: the Azure container client where the blob is
+    - container_client_destination : the Azure container client where the blob will be copied
+    """
+    blob_client = container_client_source.get_blob_client(blob_name_source)
+
+    blob = blob_client.download_blob().readall()
+
+    blob_client_destination = container_client_destination.get_blob_client(
+        blob_name_dest
+    )
+
+    blob_client_destination.upload_blob(blob, overwrite=True)
+    metadata = {"picture_set_uuid": f"{str(folder_uuid)}"}
+    blob_client_destination.set_blob_tags(metadata)
+    return True
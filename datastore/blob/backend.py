@@ -0,0 +1,69 @@
+"""
+This module describes the storage backend the blob functions work with.
+
+The functions of azure_storage_api take a container client and only use the
+operations below: upload, download (whole or by chunks), listing by prefix with
+the tags or the metadata, tags, delete and copy (download then upload). The
+Azure ContainerClient provides them, and so does the local filesystem backend
+(datastore.blob.local_storage_api), so either can be given to those functions.
+"""
+
+from typing import Iterator, Optional, Protocol, runtime_checkable
+
+
+@runtime_checkable
+class StorageDownloader(Protocol):
+    """The download of a blob, as returned by BlobClient.download_blob."""
+
+    size: int
+    properties: object
+
+    def readall(self) -> bytes: ...
+
+    def readinto(self, stream) -> int: ...
+
+    def chunks(self) -> Iterator[bytes]: ...
+
+
+@runtime_checkable
+class StorageBlobClient(Protocol):
+    """A blob of a container, as returned by ContainerClient.get_blob_client."""
+
+    def upload_blob(self, data, overwrite: bool = False, **kwargs): ...
+
+    def download_blob(self, **kwargs) -> StorageDownloader: ...
+
+    def get_blob_tags(self, **kwargs) -> dict: ...
+
+    def set_blob_tags(self, tags: Optional[dict] = None, **kwargs): ...
+
+    def delete_blob(self, **kwargs): ...
+
+    def exists(self, **kwargs) -> bool: ...
+
+
+@runtime_checkable
+class StorageContainerClient(Protocol):
+    """
+    A container of blobs. The listed blobs have a name, a size, their tags (with
+    include=["tags"]) and their metadata (with include=["metadata"]), read as
+    attributes or with get().
+    """
+
+    url: str
+
+    def exists(self, **kwargs) -> bool: ...
+
+    def create_container(self, **kwargs): ...
+
+    def delete_container(self, **kwargs): ...
+
+    def get_blob_client(self, blob, **kwargs) -> StorageBlobClient: ...
+
+    def upload_blob(self, name, data, overwrite: bool = False, **kwargs) -> StorageBlobClient: ...
+
+    def list_blobs(self, name_starts_with: Optional[str] = None, include=None, **kwargs) -> Iterator: ...
+
+    def find_blobs_by_tags(self, filter_expression: str, **kwargs) -> Iterator: ...
+
+    def delete_blob(self, blob, **kwargs): ...
@@ -0,0 +1,466 @@
+"""
+This module is a local filesystem storage backend with the API of the Azure
+ContainerClient used by azure_storage_api (see datastore.blob.backend), so the
+same functions run against a directory for the development, the tests and the
+on-premise deployments.
+
+---- layout -----
+- the storage root holds one directory per container
+- a blob is a file of its container, at the path of its name: the blob
+  'General/{picture_uuid}' is the file '{root}/{container}/General/{picture_uuid}'
+- the tags and the metadata of a blob are in a sidecar json file of the same
+  path under '{root}/{container}/.index/'
+- listing a prefix only walks the directory of that prefix, not the container
+
+The downloads are read through mmap, and written to a file with os.sendfile, so
+the content of a blob is not copied in Python to be saved. The writes are atomic:
+a blob is written to a temporary file then renamed, and a reader sees either the
+old or the new content.
+
+The storage is selected with a 'file://{root}' connection string, in place of the
+Azure connection string.
+"""
+
+import datetime
+import io
+import json
+import mmap
+import os
+import shutil
+import tempfile
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+)
+
+# Connection strings starting with this scheme use the local storage
+LOCAL_STORAGE_SCHEME = "file://"
+
+# Directory of the sidecar files (tags and metadata) of a container
+INDEX_FOLDER = ".index"
+
+# Prefix of the temporary files written before being renamed to their blob
+TEMPORARY_PREFIX = ".tmp-"
+
+# Size of the chunks returned by LocalBlobDownloader.chunks
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class LocalStorageError(Exception):
+    pass
+
+
+def is_local_storage(connection_string) -> bool:
+    """Check if a connection string targets the local storage."""
+    return isinstance(connection_string, str) and connection_string.startswith(
+        LOCAL_STORAGE_SCHEME
+    )
+
+
+def _etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _to_bytes(data) -> bytes:
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return data
+    if hasattr(data, "read"):
+        return _to_bytes(data.read())
+    return b"".join(_to_bytes(chunk) for chunk in data)
+
+
+class LocalBlobProperties(dict):
+    """
+    The properties of a blob, read as attributes or with get() like the Azure
+    BlobProperties.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class LocalBlobDownloader:
+    """The download of a blob, read through mmap."""
+
+    def __init__(self, path: str, properties: LocalBlobProperties):
+        # The file is opened when the download starts: a blob replaced since is a
+        # new file, the opened one is read unchanged
+        self._file = open(path, "rb")
+        self.name = properties.name
+        self.properties = properties
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def readall(self) -> bytes:
+        if not self.size:
+            return b""
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return view[: self.size]
+
+    def chunks(self):
+        if not self.size:
+            return
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for offset in range(0, self.size, CHUNK_SIZE):
+                yield view[offset : offset + CHUNK_SIZE]
+
+    def readinto(self, stream) -> int:
+        """
+        Write the content of the blob to a stream. A file is written by the
+        kernel with os.sendfile.
+
+        Returns: the number of bytes written
+        """
+        try:
+            stream.flush()
+            out_fd = stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            out_fd = None
+        if out_fd is not None and hasattr(os, "sendfile"):
+            offset = 0
+            while offset < self.size:
+                sent = os.sendfile(
+                    out_fd, self._file.fileno(), offset, self.size - offset
+                )
+                if not sent:
+                    break
+                offset += sent
+            # Keep the position of the stream after the written content
+            stream.seek(0, os.SEEK_END)
+            return offset
+        written = 0
+        for chunk in self.chunks():
+            stream.write(chunk)
+            written += len(chunk)
+        return written
+
+
+class LocalBlobClient:
+    """A blob of a LocalContainerClient."""
+
+    def __init__(self, container_client, blob_name: str):
+        self.container_client = container_client
+        self.container_name = container_client.container_name
+        self.blob_name = blob_name
+        self._path = container_client._blob_path(blob_name)
+        self._index_path = container_client._index_path(blob_name)
+        self.url = f"{container_client.url}/{blob_name}"
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self._index_path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, index: dict):
+        self.container_client._write_file(
+            self._index_path, json.dumps(index).encode("utf-8")
+        )
+
+    def _stat(self) -> os.stat_result:
+        try:
+            stat = os.stat(self._path)
+        except (FileNotFoundError, NotADirectoryError):
+            stat = None
+        if stat is None or not os.path.isfile(self._path):
+            raise ResourceNotFoundError(f"The blob {self.blob_name} does not exist")
+        return stat
+
+    def get_blob_properties(self, **kwargs) -> LocalBlobProperties:
+        stat = self._stat()
+        index = self._read_index()
+        return LocalBlobProperties(
+            name=self.blob_name,
+            container=self.container_name,
+            size=stat.st_size,
+            etag=_etag(stat),
+            last_modified=datetime.datetime.fromtimestamp(
+                stat.st_mtime, datetime.timezone.utc
+            ),
+            metadata=index.get("metadata", {}),
+            tag_count=len(index.get("tags", {})),
+        )
+
+    def exists(self, **kwargs) -> bool:
+        return os.path.isfile(self._path)
+
+    def _check_not_modified(self, etag: str, match_condition) -> bool:
+        """
+        Raise ResourceModifiedError if the IfNotModified condition is given and not
+        met. Return True if it was given.
+        """
+        if etag is None or match_condition != MatchConditions.IfNotModified:
+            return False
+        try:
+            current = _etag(self._stat())
+        except ResourceNotFoundError:
+            current = None
+        if current != etag:
+            raise ResourceModifiedError(f"The blob {self.blob_name} was modified")
+        return True
+
+    def upload_blob(
+        self,
+        data,
+        overwrite: bool = False,
+        metadata: dict = None,
+        tags: dict = None,
+        etag: str = None,
+        match_condition=None,
+        **kwargs,
+    ):
+        conditional = self._check_not_modified(etag, match_condition)
+        if not conditional and not overwrite and self.exists():
+            raise ResourceExistsError(f"The blob {self.blob_name} already exists")
+        self.container_client._write_file(self._path, _to_bytes(data))
+        # Like Azure, an upload replaces the tags and the metadata of the blob
+        self._write_index({"tags": dict(tags or {}), "metadata": dict(metadata or {})})
+        return {"etag": _etag(self._stat())}
+
+    def download_blob(self, **kwargs) -> LocalBlobDownloader:
+        properties = self.get_blob_properties()
+        try:
+            return LocalBlobDownloader(self._path, properties)
+        except FileNotFoundError:
+            # Deleted since its properties were read
+            raise ResourceNotFoundError(f"The blob {self.blob_name} does not exist")
+
+    def get_blob_tags(self, **kwargs) -> dict:
+        self._stat()
+        return dict(self._read_index().get("tags", {}))
+
+    def set_blob_tags(self, tags: dict = None, **kwargs):
+        self._stat()
+        index = self._read_index()
+        index["tags"] = {str(key): str(value) for key, value in (tags or {}).items()}
+        self._write_index(index)
+
+    def set_blob_metadata(
+        self, metadata: dict = None, etag: str = None, match_condition=None, **kwargs
+    ):
+        self._stat()
+        self._check_not_modified(etag, match_condition)
+        index = self._read_index()
+        index["metadata"] = dict(metadata or {})
+        self._write_index(index)
+
+    def delete_blob(self, **kwargs):
+        self._stat()
+        os.remove(self._path)
+        try:
+            os.remove(self._index_path)
+        except FileNotFoundError:
+            pass
+        self.container_client._prune(os.path.dirname(self._path))
+        self.container_client._prune(os.path.dirname(self._index_path))
+
+
+class LocalContainerClient:
+    """A container of the local storage: a directory of the storage root."""
+
+    def __init__(self, root: str, container_name: str):
+        self.root = os.path.abspath(root)
+        self.container_name = container_name
+        self._path = os.path.join(self.root, container_name)
+        self._index_root = os.path.join(self._path, INDEX_FOLDER)
+        self.url = LOCAL_STORAGE_SCHEME + self._path
+
+    def _check_name(self, blob_name: str) -> list:
+        parts = str(blob_name).split("/")
+        if (
+            not blob_name
+            or any(part in ("", ".", "..") for part in parts)
+            or parts[0] == INDEX_FOLDER
+            or parts[-1].startswith(TEMPORARY_PREFIX)
+        ):
+            raise LocalStorageError(f"Invalid blob name: {blob_name}")
+        return parts
+
+    def _blob_path(self, blob_name: str) -> str:
+        return os.path.join(self._path, *self._check_name(blob_name))
+
+    def _index_path(self, blob_name: str) -> str:
+        return os.path.join(self._index_root, *self._check_name(blob_name)) + ".json"
+
+    def _write_file(self, path: str, data: bytes):
+        directory = os.path.dirname(path)
+        # An empty directory can be pruned by a delete running at the same time
+        for attempt in range(3):
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd, temporary = tempfile.mkstemp(prefix=TEMPORARY_PREFIX, dir=directory)
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _prune(self, directory: str):
+        # Remove the directories left empty by a delete, up to the container
+        while directory not in (self._path, self._index_root) and directory.startswith(
+            self._path
+        ):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def exists(self, **kwargs) -> bool:
+        return os.path.isdir(self._path)
+
+    def create_container(self, **kwargs):
+        if self.exists():
+            raise ResourceExistsError(
+                f"The container {self.container_name} already exists"
+            )
+        os.makedirs(self._path)
+        return self
+
+    def delete_container(self, **kwargs):
+        if not self.exists():
+            raise ResourceNotFoundError(
+                f"The container {self.container_name} does not exist"
+            )
+        shutil.rmtree(self._path)
+
+    def get_blob_client(self, blob=None, **kwargs) -> LocalBlobClient:
+        blob_name = getattr(blob, "name", blob)
+        return LocalBlobClient(self, str(blob_name))
+
+    def upload_blob(self, name, data, overwrite: bool = False, **kwargs):
+        blob_client = self.get_blob_client(name)
+        blob_client.upload_blob(data, overwrite=overwrite, **kwargs)
+        return blob_client
+
+    def delete_blob(self, blob, **kwargs):
+        self.get_blob_client(blob).delete_blob()
+
+    def _walk(self, directory: str, prefix: str, name_start: str = ""):
+        # Yield the files in the order of their blob name, like Azure: the
+        # entries are sorted as their name followed by '/' for a directory
+        try:
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        entries = [
+            (entry.name + ("/" if entry.is_dir() else ""), entry)
+            for entry in entries
+            if entry.name.startswith(name_start)
+            and not entry.name.startswith(TEMPORARY_PREFIX)
+            and not (directory == self._path and entry.name == INDEX_FOLDER)
+        ]
+        for key, entry in sorted(entries, key=lambda e: e[0]):
+            if entry.is_dir():
+                yield from self._walk(entry.path, prefix + key)
+            else:
+                yield prefix + entry.name
+
+    def list_blob_names(self, name_starts_with: str = None, **kwargs):
+        """
+        Yield the names of the blobs starting with a prefix. Only the directory
+        of the prefix is walked.
+        """
+        directory, _, name_start = (name_starts_with or "").rpartition("/")
+        if directory:
+            self._check_name(directory)
+            yield from self._walk(
+                os.path.join(self._path, *directory.split("/")),
+                directory + "/",
+                name_start,
+            )
+        else:
+            yield from self._walk(self._path, "", name_start)
+
+    def list_blobs(self, name_starts_with: str = None, include=None, **kwargs):
+        """
+        Yield the properties of the blobs starting with a prefix, with their
+        tags when include has "tags" and their metadata when it has "metadata".
+        """
+        include = [include] if isinstance(include, str) else (include or [])
+        for blob_name in self.list_blob_names(name_starts_with):
+            blob_client = self.get_blob_client(blob_name)
+            try:
+                properties = blob_client.get_blob_properties()
+            except ResourceNotFoundError:
+                # Deleted while listing
+                continue
+            if "metadata" not in include:
+                properties["metadata"] = None
+            properties["tags"] = (
+                blob_client._read_index().get("tags", {}) if "tags" in include else None
+            )
+            yield properties
+
+    def find_blobs_by_tags(self, filter_expression: str, **kwargs):
+        """
+        Yield the blobs with the given tags. Only the equality filters joined
+        with AND are supported: "\\"key\\"='value' AND ...".
+        """
+        wanted = {}
+        for condition in filter_expression.split(" AND "):
+            key, _, value = condition.partition("=")
+            wanted[key.strip().strip('"')] = value.strip().strip("'")
+        for blob in self.list_blobs(include=["tags"]):
+            if all(blob.tags.get(key) == value for key, value in wanted.items()):
+                yield blob
+
+
+class LocalBlobServiceClient:
+    """The local storage: a directory holding one directory per container."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.url = LOCAL_STORAGE_SCHEME + self.root
+
+    @classmethod
+    def from_connection_string(cls, conn_str: str, credential=None, **kwargs):
+        if not is_local_storage(conn_str):
+            raise ValueError(
+                f"A local storage connection string starts with {LOCAL_STORAGE_SCHEME}"
+            )
+        root = conn_str[len(LOCAL_STORAGE_SCHEME) :]
+        if not root:
+            raise ValueError("The local storage connection string has no directory")
+        os.makedirs(root, exist_ok=True)
+        return cls(root)
+
+    def get_container_client(self, container) -> LocalContainerClient:
+        return LocalContainerClient(self.root, getattr(container, "name", container))
+
+    def create_container(self, name, **kwargs) -> LocalContainerClient:
+        return self.get_container_client(name).create_container()
+
+    def delete_container(self, container, **kwargs):
+        self.get_container_client(container).delete_container()
+
+    def list_containers(self, name_starts_with: str = None, **kwargs):
+        for entry in sorted(os.scandir(self.root), key=lambda e: e.name):
+            if entry.is_dir() and entry.name.startswith(name_starts_with or ""):
+                yield LocalBlobProperties(name=entry.name)
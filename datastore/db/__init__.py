@@ -2,19 +2,87 @@
 This module contains the function interacting with the database directly.
 """
 
+import logging
+
 import psycopg
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+class Connection(psycopg.Connection):
+    """
+    A connection that knows its schema and runs callbacks when its transaction
+    ends (used by datastore.single_flight), or only once it is committed (e.g.
+    to delete the blobs of the deleted pictures).
+
+    Only the commit(), rollback() and close() calls end the transaction here.
+    """
+
+    schema = None
+
+    def on_transaction_end(self, callback):
+        """Run the callback once the current transaction is committed or rolled back."""
+        if self._idle():
+            callback()
+            return
+        self.__dict__.setdefault("_transaction_callbacks", []).append(callback)
+
+    def on_commit(self, callback):
+        """Run the callback once the current transaction is committed, never if it is rolled back."""
+        if self.closed:
+            return
+        if self._idle():
+            callback()
+            return
+        self.__dict__.setdefault("_commit_callbacks", []).append(callback)
+
+    def _idle(self) -> bool:
+        return self.closed or self.info.transaction_status == psycopg.pq.TransactionStatus.IDLE
+
+    def _end_transaction(self, committed: bool = False):
+        callbacks = self.__dict__.pop("_transaction_callbacks", [])
+        commit_callbacks = self.__dict__.pop("_commit_callbacks", [])
+        if committed:
+            callbacks += commit_callbacks
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # The transaction already ended: the caller must not see it failing
+                logger.exception("Error in a callback of the end of the transaction")
+
+    def commit(self):
+        try:
+            super().commit()
+        except Exception:
+            self._end_transaction()
+            raise
+        self._end_transaction(committed=True)
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._end_transaction()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._end_transaction()
+
 
 def connect_db(conn_str: str, schema: str):
     """Connect to the postgresql database and return the connection."""
-    connection = psycopg.connect(
+    connection = Connection.connect(
         conninfo=conn_str,
         autocommit=False,
         options=f"-c search_path={schema},public",
     )
+    connection.schema = schema
     assert connection.info.encoding == "utf-8", (
         "Encoding is not UTF8: " + connection.info.encoding
     )
@@ -37,6 +105,8 @@ def end_query(connection, cursor):
 def create_search_path(connection, cur, schema):
     cur.execute(f"""SET search_path TO "{schema}";""")
     connection.commit()
+    if isinstance(connection, Connection):
+        connection.schema = schema
 
 
 if __name__ == "__main__":
@@ -21,22 +21,22 @@ def build_picture_set_metadata(user_id: str, nb_picture: int):
     - The picture_set in a string dict format.
     """
 
-    image_metadata = validator.ImageDataPictureSet(number_of_images=nb_picture)
-
-    sysData = validator.AuditTrail(
-        upload_date=date.today(),
-        edited_by=str(user_id),
-        edit_date=date.today(),
-        change_log="picture_set created",
-        access_log="picture_set accessed",
-        privacy_flag=False,
-    )
-
-    picture_set_data = validator.ProcessedPictureSet(
-        image_data_picture_set=image_metadata, audit_trail=sysData
-    )
+    today = date.today()
+    picture_set_data = {
+        "image_data_picture_set": {"number_of_images": nb_picture},
+        "audit_trail": {
+            "upload_date": today,
+            "edited_by": str(user_id),
+            "edit_date": today,
+            "change_log": "picture_set created",
+            "access_log": "picture_set accessed",
+            "privacy_flag": False,
+        },
+    }
     try:
-        validator.ProcessedPictureSet(**picture_set_data.model_dump())
+        picture_set = validator.dump_json(
+            validator.ProcessedPictureSet, picture_set_data
+        )
     except validator.ValidationError as e:
         raise PictureSetCreationError("Error picture_set not created:"+ str(e)) from None
-    return picture_set_data.model_dump_json()
+    return picture_set.decode()
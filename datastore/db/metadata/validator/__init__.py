@@ -1,5 +1,6 @@
 from datetime import date
-from pydantic import BaseModel, ValidationError
+from functools import lru_cache
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from typing import Optional
 import uuid
 
@@ -52,6 +53,12 @@ class QualityCheck(BaseModel):
     quality_score: float
 
 
+class Storage(BaseModel):
+    compression: Optional[str] = None
+    original_size: int
+    stored_size: int
+
+
 class UserData(BaseModel):
     description: str
     number_of_seeds: Optional[int] = None
@@ -77,6 +84,7 @@ class ProcessedPicture(BaseModel):
     metadata: Metadata
     image_data: ImageData
     quality_check: QualityCheck
+    storage: Optional[Storage] = None
 
 
 class ClientFeedback(BaseModel):
@@ -84,6 +92,27 @@ class ClientFeedback(BaseModel):
     historicalComparison: str
 
 
+@lru_cache(maxsize=None)
+def get_type_adapter(model) -> TypeAdapter:
+    """
+    This returns the cached TypeAdapter of a model so its validator and
+    serializer are only built once per process.
+    """
+    return TypeAdapter(model)
+
+
+def dump_json(model, data: dict) -> bytes:
+    """
+    This validates the raw data against the model in a single pass and
+    serializes the result straight to JSON bytes.
+
+    Raises:
+    - ValidationError: If the data does not match the model.
+    """
+    adapter = get_type_adapter(model)
+    return adapter.dump_json(adapter.validate_python(data))
+
+
 def is_valid_uuid(val):
     """
     This validates if a given string is a UUID
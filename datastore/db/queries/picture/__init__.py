@@ -1,3 +1,6 @@
+import json
+
+
 class PictureUploadError(Exception):
     pass
 
@@ -30,6 +33,10 @@ class PictureSetDeleteError(Exception):
     pass
 
 
+class PictureDeleteError(Exception):
+    pass
+
+
 """
 This module contains all the queries related to the Picture and PictureSet tables.
 """
@@ -129,6 +136,31 @@ def new_picture(cursor, picture, picture_set_id: str, seed_id: str, nb_objects=0
         raise PictureUploadError("Error: Picture not uploaded")
 
 
+def copy_new_pictures(cursor, pictures: list, picture_set_id: str, seed_id: str):
+    """
+    This function uploads a batch of NEW PICTURES to the database with COPY instead
+    of one INSERT per picture. The ids are generated beforehand since COPY can not
+    return them.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - pictures (list): The Picture METADATA to upload, as (picture_id, picture, nb_objects).
+    - picture_set_id (str): The UUID of the Picture_set the pictures are in.
+    - seed_id (str): The UUID of the seed the pictures are linked to.
+    """
+    try:
+        with cursor.copy(
+            "COPY picture (id, picture, picture_set_id, nb_obj) FROM STDIN"
+        ) as copy:
+            for picture_id, picture, nb_objects in pictures:
+                copy.write_row((picture_id, picture, picture_set_id, nb_objects))
+        with cursor.copy("COPY picture_seed (picture_id, seed_id) FROM STDIN") as copy:
+            for picture_id, _, _ in pictures:
+                copy.write_row((picture_id, seed_id))
+    except Exception:
+        raise PictureUploadError("Error: Pictures not uploaded")
+
+
 def new_picture_unknown(cursor, picture, picture_set_id: str, nb_objects=0):
     """
     This function uploads a NEW PICTURE to the database.
@@ -221,6 +253,64 @@ def get_picture_set_name(cursor, picture_set_id: str):
         raise PictureSetNotFoundError(f"Error: PictureSet not found:{picture_set_id}")
 
 
+def get_user_picture_set_by_name(cursor, user_id: str, name: str):
+    """
+    This function retrieves the latest PictureSet of a user with the given name.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - user_id (str): The UUID of the owner.
+    - name (str): The name of the PictureSet.
+
+    Returns:
+    - The UUID of the PictureSet, None if the user has none with this name.
+    """
+    try:
+        query = """
+            SELECT
+                id
+            FROM
+                picture_set
+            WHERE
+                owner_id = %s
+                AND name = %s
+            ORDER BY
+                upload_date DESC
+            LIMIT 1
+                """
+        cursor.execute(query, (user_id, name))
+        result = cursor.fetchone()
+        return result[0] if result is not None else None
+    except Exception:
+        raise GetPictureSetError(f"Error: could not retrieve the PictureSet {name}")
+
+
+def get_picture_set_sources(cursor, picture_set_id: str) -> set:
+    """
+    This function retrieves the source links of the pictures of a PictureSet, as
+    recorded in their metadata.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - picture_set_id (str): The UUID of the PictureSet.
+    """
+    try:
+        query = """
+            SELECT
+                picture->'image_data'->>'source'
+            FROM
+                picture
+            WHERE
+                picture_set_id = %s
+                """
+        cursor.execute(query, (picture_set_id,))
+        return {row[0] for row in cursor.fetchall() if row[0] is not None}
+    except Exception:
+        raise GetPictureError(
+            f"Error: could not retrieve the pictures of picture_set:{picture_set_id}"
+        )
+
+
 def get_user_picture_sets(cursor, user_id: str):
     """
     This function retrieves all the PictureSets of a specific user from the database.
@@ -328,6 +418,44 @@ def get_picture_set_pictures(cursor, picture_set_id: str):
         )
 
 
+def iter_picture_set_checksums(cursor, picture_set_id: str, itersize: int = 1000):
+    """
+    This function iterates over the pictures of a picture_set with a server-side
+    cursor, so the rows are fetched itersize at a time instead of all at once.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database. Its connection is used.
+    - picture_set_id (str): The UUID of the PictureSet.
+    - itersize (int): The number of rows fetched at a time.
+
+    Yields:
+    - (picture_id, checksum), the checksum being None for the pictures stored in
+      the picture_set folder.
+    """
+    try:
+        with cursor.connection.cursor(name=f"picture_set_{picture_set_id}") as rows:
+            rows.itersize = itersize
+            rows.execute(
+                """
+                SELECT
+                    id,
+                    checksum
+                FROM
+                    picture
+                WHERE
+                    picture_set_id = %s
+                ORDER BY
+                    upload_date, id
+                """,
+                (picture_set_id,),
+            )
+            yield from rows
+    except Exception:
+        raise GetPictureError(
+            f"Error: Error while getting pictures for picture_set:{picture_set_id}"
+        )
+
+
 def get_validated_pictures(cursor, picture_set_id: str):
     """
     This functions select pictures from a picture set that have been validated. Therefore, there should exists picture_seed entity for this picture.
@@ -482,7 +610,9 @@ def get_user_latest_picture_set(cursor, user_id: str):
         )
 
 
-def update_picture_metadata(cursor, picture_id: str, metadata: dict, nb_objects: int):
+def update_picture_metadata(
+    cursor, picture_id: str, metadata: dict, nb_objects: int, checksum: str = None
+):
     """
     This function updates the metadata of a picture in the database.
 
@@ -490,6 +620,7 @@ def update_picture_metadata(cursor, picture_id: str, metadata: dict, nb_objects:
     - cursor (cursor): The cursor of the database.
     - picture_id (str): The UUID of the picture to update.
     - metadata (dict): The metadata to update. Must be formatted as a json.
+    - checksum (str): (optional) The sha256 of the picture content. Kept as is if None.
 
     Returns:
     - None
@@ -500,11 +631,12 @@ def update_picture_metadata(cursor, picture_id: str, metadata: dict, nb_objects:
                 picture
             SET
                 picture = %s,
-                nb_obj = %s
+                nb_obj = %s,
+                checksum = COALESCE(%s, checksum)
             WHERE
                 id = %s
             """
-        cursor.execute(query, (metadata, nb_objects, picture_id))
+        cursor.execute(query, (metadata, nb_objects, checksum, picture_id))
     except Exception:
         raise PictureUpdateError(f"Error: Picture metadata not updated:{picture_id}")
 
@@ -584,6 +716,252 @@ def get_picture_picture_set_id(cursor, picture_id):
         raise PictureNotFoundError(f"Error: Picture not found:{picture_id}")
 
 
+def get_picture_checksum(cursor, picture_id):
+    """
+    This function retrieves the checksum of a picture, None if its content is
+    stored in its picture set folder instead of a content-addressed object.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - picture_id (str): The UUID of the picture.
+    """
+    try:
+        query = """
+            SELECT
+                checksum
+            FROM
+                picture
+            WHERE
+                id = %s
+            """
+        cursor.execute(query, (picture_id,))
+        return cursor.fetchone()[0]
+    except Exception:
+        raise PictureNotFoundError(f"Error: Picture not found:{picture_id}")
+
+
+def count_object_references(cursor, owner_id, checksums: list) -> dict:
+    """
+    This function counts the pictures of a user referencing content-addressed objects.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - owner_id (str): The UUID of the user owning the container of the objects.
+    - checksums (list): The sha256 of the objects.
+
+    Returns:
+    - A dict with the number of references of each checksum, 0 if it has none.
+    """
+    try:
+        query = """
+            SELECT
+                wanted.checksum,
+                COUNT(picture.id)
+            FROM
+                unnest(%s::text[]) AS wanted(checksum)
+            LEFT JOIN
+                (picture JOIN picture_set ON picture_set.id = picture.picture_set_id
+                    AND picture_set.owner_id = %s)
+                ON picture.checksum = wanted.checksum
+            GROUP BY
+                wanted.checksum
+            """
+        cursor.execute(query, (list(set(checksums)), owner_id))
+        return dict(cursor.fetchall())
+    except Exception:
+        raise GetPictureError("Error: could not count the references of the objects")
+
+
+def lock_objects(cursor, owner_id, checksums: list):
+    """
+    This function locks content-addressed objects of a user until the end of the
+    transaction. The upload of an object (skipped when it is referenced) and its
+    deletion (once nothing references it) both take the lock before counting the
+    references, so they never interleave.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - owner_id (str): The UUID of the user owning the container of the objects.
+    - checksums (list): The sha256 of the objects.
+    """
+    try:
+        query = """
+            SELECT
+                pg_advisory_xact_lock(hashtextextended(%s || '/' || wanted.checksum, 0))
+            FROM
+                unnest(%s::text[]) WITH ORDINALITY AS wanted(checksum, position)
+            ORDER BY
+                wanted.position
+            """
+        # Always in the same order: two transactions never wait for each other
+        cursor.execute(query, (str(owner_id), sorted(set(checksums))))
+    except Exception:
+        raise GetPictureError("Error: could not lock the objects")
+
+
+def set_picture_checksum(cursor, picture_id, checksum: str = None):
+    """
+    This function sets the checksum of a picture. None means the picture content is
+    not a content-addressed object of its owner's container (e.g. once archived).
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - picture_id (str): The UUID of the picture.
+    - checksum (str): The sha256 of the object, or None.
+    """
+    try:
+        query = """
+            UPDATE
+                picture
+            SET
+                checksum = %s
+            WHERE
+                id = %s
+            """
+        cursor.execute(query, (checksum, picture_id))
+    except Exception:
+        raise PictureUpdateError(f"Error: Picture checksum not updated:{picture_id}")
+
+
+def update_picture_storage(cursor, picture_id, storage: dict):
+    """
+    This function records how a picture is stored (compression, original_size,
+    stored_size) in its metadata.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - picture_id (str): The UUID of the picture.
+    - storage (dict): The storage metadata.
+    """
+    try:
+        query = """
+            UPDATE
+                picture
+            SET
+                picture = (picture::jsonb || jsonb_build_object('storage', %s::jsonb))::json
+            WHERE
+                id = %s
+                AND json_typeof(picture) = 'object'
+            """
+        cursor.execute(query, (json.dumps(storage), picture_id))
+    except Exception:
+        raise PictureUpdateError(f"Error: Picture storage not updated:{picture_id}")
+
+
+def update_object_storage(cursor, owner_id, checksum: str, storage: dict) -> int:
+    """
+    This function records how a content-addressed object is stored (compression,
+    original_size, stored_size) in the metadata of the pictures referencing it.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - owner_id (str): The UUID of the user owning the container of the object.
+    - checksum (str): The sha256 of the object.
+    - storage (dict): The storage metadata.
+
+    Returns:
+    - The number of pictures updated.
+    """
+    try:
+        query = """
+            UPDATE
+                picture
+            SET
+                picture = (picture::jsonb || jsonb_build_object('storage', %s::jsonb))::json
+            FROM
+                picture_set
+            WHERE
+                picture_set.id = picture.picture_set_id
+                AND picture_set.owner_id = %s
+                AND picture.checksum = %s
+                AND json_typeof(picture.picture) = 'object'
+            """
+        cursor.execute(query, (json.dumps(storage), owner_id, checksum))
+        return cursor.rowcount
+    except Exception:
+        raise PictureUpdateError(f"Error: Object storage not updated:{checksum}")
+
+
+def get_unreferenced_checksums(cursor, picture_set_id) -> list:
+    """
+    This function retrieves the objects referenced only by the pictures of a
+    picture_set: they can be deleted with it.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - picture_set_id (str): The UUID of the picture_set about to be deleted.
+    """
+    try:
+        query = """
+            SELECT DISTINCT
+                picture.checksum
+            FROM
+                picture
+            JOIN
+                picture_set ON picture_set.id = picture.picture_set_id
+            WHERE
+                picture.picture_set_id = %s
+                AND picture.checksum IS NOT NULL
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM picture AS other
+                    JOIN picture_set AS other_set ON other_set.id = other.picture_set_id
+                    WHERE other.checksum = picture.checksum
+                        AND other.picture_set_id <> picture.picture_set_id
+                        AND other_set.owner_id = picture_set.owner_id
+                )
+            """
+        cursor.execute(query, (picture_set_id,))
+        return [row[0] for row in cursor.fetchall()]
+    except Exception:
+        raise GetPictureError(
+            f"Error: could not retrieve the objects of picture_set:{picture_set_id}"
+        )
+
+
+def get_user_picture_storage(cursor, owner_id) -> list:
+    """
+    This function retrieves in one query where the picture_sets and the pictures
+    of a user are stored: the folder of each picture_set (General for the
+    default picture_set, its name or its id otherwise) and the checksum and the
+    link of each picture. Used to reconcile the database with the container.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - owner_id (str): The UUID of the user.
+
+    Returns:
+    - A list of (picture_set_id, folder_name, picture_id, checksum, link). The
+      picture_sets without pictures have a single row with picture_id None.
+    """
+    try:
+        query = """
+            SELECT
+                picture_set.id,
+                CASE
+                    WHEN picture_set.id = users.default_set_id THEN 'General'
+                    ELSE COALESCE(picture_set.name, picture_set.id::text)
+                END,
+                picture.id,
+                picture.checksum,
+                picture.picture->>'link'
+            FROM
+                picture_set
+            JOIN
+                users ON users.id = picture_set.owner_id
+            LEFT JOIN
+                picture ON picture.picture_set_id = picture_set.id
+            WHERE
+                picture_set.owner_id = %s
+            """
+        cursor.execute(query, (owner_id,))
+        return cursor.fetchall()
+    except Exception:
+        raise GetPictureError(
+            f"Error: could not retrieve the pictures of the user:{owner_id}"
+        )
+
+
 def get_picture_set_owner_id(cursor, picture_set_id):
     """
     This function retrieves the owner_id of a picture_set.
@@ -652,6 +1030,57 @@ def delete_picture_set(cursor, picture_set_id):
         raise PictureSetDeleteError(f"Error: PictureSet not deleted:{picture_set_id}")
 
 
+def delete_picture_set_with_pictures(cursor, picture_set_id):
+    """
+    This function deletes a picture_set and all the pictures it contains from the database.
+
+    parameters:
+    - cursor (cursor) : The cursor of the database.
+    - picture_set_id (str) : The UUID of the picture_set to delete.
+    """
+    try:
+        query = """
+            DELETE FROM
+                picture
+            WHERE
+                picture_set_id = %s
+            """
+        cursor.execute(query, (picture_set_id,))
+        query = """
+            DELETE FROM
+                picture_set
+            WHERE
+                id = %s
+            """
+        cursor.execute(query, (picture_set_id,))
+    except Exception:
+        raise PictureSetDeleteError(f"Error: PictureSet not deleted:{picture_set_id}")
+
+
+def delete_pictures(cursor, picture_ids: list) -> int:
+    """
+    This function deletes pictures from the database.
+
+    parameters:
+    - cursor (cursor) : The cursor of the database.
+    - picture_ids (list) : The UUIDs of the pictures to delete.
+
+    Returns:
+    - The number of pictures deleted.
+    """
+    try:
+        query = """
+            DELETE FROM
+                picture
+            WHERE
+                id = ANY(%s::uuid[])
+            """
+        cursor.execute(query, ([str(id) for id in picture_ids],))
+        return cursor.rowcount
+    except Exception:
+        raise PictureDeleteError("Error: pictures not deleted")
+
+
 def get_picture_in_picture_set(cursor, picture_set_id):
     """
     This function retrieves all the pictures of a specific picture_set from the database.
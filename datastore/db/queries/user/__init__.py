@@ -107,6 +107,31 @@ def get_user_id(cursor, email: str) -> str:
         raise Exception("Unhandled Error")
 
 
+def get_all_user_ids(cursor) -> list:
+    """
+    This function retrieves the ids of all the users.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+
+    Returns:
+    - The list of the UUIDs of the users.
+    """
+    try:
+        query = """
+            SELECT
+                id
+            FROM
+                users
+            ORDER BY
+                registration_date, id
+            """
+        cursor.execute(query)
+        return [row[0] for row in cursor.fetchall()]
+    except Exception:
+        raise Exception("Error: could not retrieve the users")
+
+
 def register_user(cursor, email: str) -> UUID:
     """
     This function registers a user in the database.
@@ -0,0 +1,232 @@
+"""
+This module routes the database work between the primary and an optional replica.
+
+The writes always go to the primary. The read-only entry points (marked with
+`read_only`) go to the replica when one is configured, unless the replica has not
+replayed the last write of the session yet (read-your-writes). The comparison is
+done on the WAL position (LSN) recorded after the last commit on the primary.
+"""
+
+import inspect
+import queue
+import threading
+from contextlib import contextmanager
+
+from psycopg import Connection
+
+from datastore.db import connect_db
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+# The replica is considered caught up when it replayed the given LSN. On a server
+# that is not in recovery (the primary used as its own replica) there is nothing to
+# replay, so its current position is used.
+REPLICA_CAUGHT_UP_QUERY = """
+    SELECT COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn()) >= %s::pg_lsn
+    """
+
+
+def read_only(func):
+    """Mark an entry point as safe to run on a replica."""
+    func.read_only = True
+    return func
+
+
+def is_read_only(func) -> bool:
+    """Return True if the entry point is marked with `read_only`."""
+    return getattr(func, "read_only", False)
+
+
+class ConnectionPool:
+    """
+    A small thread safe pool of connections to one server.
+
+    Connections are opened lazily up to max_size. A connection given back with an
+    open transaction is rolled back, a broken one is discarded.
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        schema: str,
+        max_size: int = 4,
+        timeout: float = 30.0,
+        read_only: bool = False,
+    ):
+        self.conn_str = conn_str
+        self.schema = schema
+        self.max_size = max_size
+        self.timeout = timeout
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Connection:
+        connection = connect_db(self.conn_str, self.schema)
+        connection.read_only = self.read_only
+        return connection
+
+    def getconn(self) -> Connection:
+        """Return an idle connection, opening one if the pool is not full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._size < self.max_size
+            if can_open:
+                self._size += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(
+                f"No connection available after {self.timeout} seconds"
+            )
+
+    def putconn(self, connection: Connection):
+        """Give a connection back to the pool."""
+        if not connection.closed and not connection.broken:
+            try:
+                connection.rollback()
+                self._idle.put(connection)
+                return
+            except Exception:
+                connection.close()
+        with self._lock:
+            self._size -= 1
+
+    def close(self):
+        """Close the idle connections."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self._lock:
+                self._size -= 1
+
+    @contextmanager
+    def connection(self):
+        connection = self.getconn()
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+
+class Database:
+    """
+    The primary and, optionally, the replica of a database.
+
+    Parameters:
+    - conn_str (str): The connection string of the primary.
+    - schema (str): The schema to use.
+    - replica_conn_str (str): (optional) The connection string of the replica.
+      Every read goes to the primary if None.
+    - max_size (int): The maximum number of connections of each pool.
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        schema: str,
+        replica_conn_str: str = None,
+        max_size: int = 4,
+    ):
+        self.primary = ConnectionPool(conn_str, schema, max_size)
+        self.replica = None
+        if replica_conn_str:
+            self.replica = ConnectionPool(
+                replica_conn_str, schema, max_size, read_only=True
+            )
+
+    def session(self, lsn: str = None) -> "Session":
+        """
+        Start a session. The LSN of a previous session (e.g. kept in the user's
+        cookie) can be given so its writes stay visible.
+        """
+        return Session(self, lsn)
+
+    def close(self):
+        self.primary.close()
+        if self.replica is not None:
+            self.replica.close()
+
+
+class Session:
+    """
+    A sequence of reads and writes of one user.
+
+    `lsn` is the WAL position of the last write of the session on the primary.
+    A read is only sent to the replica once the replica replayed it.
+    """
+
+    def __init__(self, database: Database, lsn: str = None):
+        self.database = database
+        self.lsn = lsn
+
+    @contextmanager
+    def write(self):
+        """
+        Yield a cursor on the primary. The transaction is committed at the end of
+        the block, or rolled back on error, and the LSN of the session is updated.
+        """
+        with self.database.primary.connection() as connection:
+            with connection.cursor() as cursor:
+                try:
+                    yield cursor
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                cursor.execute("SELECT pg_current_wal_lsn()::text")
+                self.lsn = cursor.fetchone()[0]
+                connection.commit()
+
+    def replica_is_caught_up(self, cursor) -> bool:
+        """Return True if the replica replayed the last write of the session."""
+        if self.lsn is None:
+            return True
+        cursor.execute(REPLICA_CAUGHT_UP_QUERY, (self.lsn,))
+        return bool(cursor.fetchone()[0])
+
+    @contextmanager
+    def read(self):
+        """
+        Yield a cursor for read-only work: on the replica when it is configured and
+        caught up with the session, on the primary otherwise. Nothing is committed.
+        """
+        replica = self.database.replica
+        if replica is not None:
+            with replica.connection() as connection:
+                with connection.cursor() as cursor:
+                    if self.replica_is_caught_up(cursor):
+                        yield cursor
+                        return
+        with self.database.primary.connection() as connection:
+            with connection.cursor() as cursor:
+                yield cursor
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Call an entry point with a cursor as its first argument. The entry points
+        marked with `read_only` are routed with `read`, the others with `write`.
+        """
+        route = self.read if is_read_only(func) else self.write
+        with route() as cursor:
+            result = func(cursor, *args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
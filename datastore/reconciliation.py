@@ -0,0 +1,275 @@
+"""
+This module reconciles the pictures of a user in the database with the blobs of
+their container.
+
+The database is read with one query per user (picture.get_user_picture_storage)
+and the container with one listing, then both sides are compared in memory:
+
+- An orphaned blob is a blob no picture nor picture_set of the database refers
+  to: a picture whose row was never committed or was deleted without its blob, a
+  content-addressed object no picture references anymore, or a rendition of one
+  of those.
+- A dangling picture is a picture row whose blob is not in the container.
+- An unknown link is the link of a picture which names neither its object nor a
+  blob named by its id in its folder (e.g. the paths of the mass-imported
+  pictures): its blob can not be told, the picture is reported but never
+  counted dangling, and a blob with that name is never orphaned.
+- A missing folder is a picture_set without its folder json file.
+
+The folder of a picture_set is not always at the root of the container: the
+sets archived in the dev container are in {user_id}/{folder}/, next to the
+{user_id}/{user_id}.json folder of the user. The folder of a picture_set is
+taken from the links of its pictures, and a folder json file no picture_set
+refers to is reported as an unreferenced folder, never deleted.
+
+The database is read before the container is listed, so a picture committed
+meanwhile has its blob listed. A blob uploaded after the query, whose row was
+committed after it too, looks orphaned: the orphaned blobs modified less than
+min_age ago are reported but never deleted.
+"""
+
+import datetime
+import re
+
+import datastore.blob.azure_storage_api as azure_storage
+import datastore.db.queries.picture as picture
+
+# The orphaned blobs more recent than this are left alone (see above)
+MIN_AGE = datetime.timedelta(hours=1)
+CHECKSUM = re.compile("[0-9a-f]{64}")
+
+
+class ReconciliationError(Exception):
+    pass
+
+
+def picture_blob_name(folder_path: str, picture_id, checksum: str, link: str) -> str:
+    """
+    Return the name of the blob of a picture: its content-addressed object, or
+    the blob named by its id in the folder of its picture_set. The link is only
+    trusted when it names one of them (objects/<sha256> or
+    <folder>/<picture_id>.<ext>), as a blob name or at the end of the url of the
+    container. None is returned for the other links (e.g. the paths of the
+    mass-imported pictures): the blob of the picture is unknown.
+    """
+    if checksum is not None:
+        return azure_storage.build_object_name(checksum)
+    if not link:
+        return azure_storage.build_blob_name(folder_path, str(picture_id))
+    directory, _, file_name = link.rpartition("/")
+    parent = directory.rpartition("/")[2]
+    if parent == azure_storage.OBJECT_FOLDER and CHECKSUM.fullmatch(file_name):
+        return azure_storage.build_object_name(file_name)
+    in_folder = (
+        directory.endswith("/" + folder_path)
+        if "://" in link
+        else directory == folder_path
+    )
+    if in_folder and file_name.partition(".")[0] == str(picture_id):
+        return azure_storage.build_blob_name(folder_path, file_name)
+    return None
+
+
+def folder_path(folder_name: str, link: str) -> str:
+    """
+    Return the folder of a picture_set from the link of one of its pictures: the
+    directory of a link without scheme (e.g. {user_id}/{folder} in the dev
+    container), the folder name at the root of the container otherwise.
+    """
+    if (
+        link
+        and "://" not in link
+        and "/" in link
+        and not azure_storage.is_object_name(link)
+    ):
+        return link.rsplit("/", 1)[0]
+    return str(folder_name)
+
+
+def is_folder_file(blob_name: str) -> bool:
+    """Return True for a folder json file: <path>/<folder>/<folder>.json."""
+    directory, _, file_name = blob_name.rpartition("/")
+    return bool(directory) and file_name == f"{directory.rpartition('/')[2]}.json"
+
+
+def rendition_source(blob_name: str) -> str:
+    """Return the name of the picture of a rendition, None for other blobs."""
+    for size in azure_storage.RENDITION_SIZES:
+        suffix = f".{size}.jpg"
+        if blob_name.endswith(suffix):
+            return blob_name[: -len(suffix)]
+    return None
+
+
+def diff_storage(rows: list, blobs: dict) -> dict:
+    """
+    Compare the pictures of a user with the blobs of their container.
+
+    Parameters:
+    - rows: The rows of picture.get_user_picture_storage.
+    - blobs: The blobs of the container, by name: {name: last_modified}.
+
+    Returns: a dict with
+    - orphaned_blobs: the names of the blobs nothing refers to, sorted
+    - dangling_pictures: the (picture_id, blob_name) of the pictures without blob
+    - unknown_links: the (picture_id, link) of the pictures whose blob is unknown
+    - missing_folders: the (picture_set_id, folder_name, folder_path) of the
+      picture_sets without folder
+    - unreferenced_folders: the folder json files no picture_set refers to,
+      sorted. They are not orphaned blobs: the dev container has folders of
+      users, not of picture_sets.
+    """
+    # The folder of a picture_set whose pictures have no link is at the root
+    paths = {}
+    for picture_set_id, folder_name, _, _, link in rows:
+        path = folder_path(folder_name, link)
+        if path != str(folder_name) or picture_set_id not in paths:
+            paths[picture_set_id] = path
+
+    expected = set()
+    folders = {}
+    dangling = []
+    unknown = []
+    for picture_set_id, folder_name, picture_id, checksum, link in rows:
+        path = paths[picture_set_id]
+        folder_blob = azure_storage.build_blob_name(path, str(folder_name), "json")
+        folders[folder_blob] = (str(picture_set_id), str(folder_name), path)
+        if picture_id is None:
+            continue
+        blob_name = picture_blob_name(path, picture_id, checksum, link)
+        if blob_name is None:
+            unknown.append((str(picture_id), link))
+            if "://" not in link:
+                expected.add(link)
+            continue
+        expected.add(blob_name)
+        if blob_name not in blobs:
+            dangling.append((str(picture_id), blob_name))
+    expected.update(folders)
+
+    orphaned = []
+    unreferenced = []
+    for blob_name in blobs:
+        if blob_name in expected:
+            continue
+        if is_folder_file(blob_name):
+            unreferenced.append(blob_name)
+            continue
+        # A rendition goes with its picture
+        if rendition_source(blob_name) in expected:
+            continue
+        orphaned.append(blob_name)
+
+    return {
+        "orphaned_blobs": sorted(orphaned),
+        "unreferenced_folders": sorted(unreferenced),
+        "dangling_pictures": sorted(dangling),
+        "unknown_links": sorted(unknown),
+        "missing_folders": sorted(
+            folder for name, folder in folders.items() if name not in blobs
+        ),
+    }
+
+
+def list_container(container_client) -> dict:
+    """
+    List the blobs of a container once.
+
+    Returns: {name: last_modified}, empty when the container does not exist
+    """
+    if not container_client.exists():
+        return {}
+    return {
+        blob.name: blob.get("last_modified")
+        for blob in container_client.list_blobs()
+    }
+
+
+async def reconcile_container(
+    cursor,
+    container_client,
+    owner_id: str,
+    repair: bool = False,
+    delete_pictures: bool = False,
+    min_age: datetime.timedelta = MIN_AGE,
+    now: datetime.datetime = None,
+) -> dict:
+    """
+    Reconcile the pictures of a user with the blobs of their container and
+    optionally repair them.
+
+    Parameters:
+    - cursor: The cursor object to interact with the database.
+    - container_client: The container client of the user.
+    - owner_id (str): The UUID of the user.
+    - repair (bool): Delete the orphaned blobs older than min_age and create the
+      missing folders at the root of the container or, for the sets archived in
+      the dev container, in the folder of their user.
+    - delete_pictures (bool): Delete the dangling picture rows (and, by cascade,
+      their inferences). The caller commits.
+    - min_age (timedelta): The age under which an orphaned blob is kept.
+    - now (datetime): The time the ages are computed from (default: now).
+
+    Returns: the report of diff_storage, with the numbers of blobs and pictures,
+    the orphaned blobs too recent to be deleted (recent_blobs) and the number of
+    deleted_blobs, created_folders and deleted_pictures.
+    """
+    try:
+        rows = picture.get_user_picture_storage(cursor, owner_id)
+        blobs = list_container(container_client)
+    except Exception as error:
+        raise ReconciliationError(
+            f"Error reading the storage of the user {owner_id}: {error}"
+        )
+    report = diff_storage(rows, blobs)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    report["recent_blobs"] = [
+        name
+        for name in report["orphaned_blobs"]
+        if blobs[name] is not None and now - blobs[name] < min_age
+    ]
+    report.update(
+        {
+            "blobs": len(blobs),
+            "pictures": sum(1 for row in rows if row[2] is not None),
+            "deleted_blobs": 0,
+            "created_folders": 0,
+            "deleted_pictures": 0,
+        }
+    )
+
+    if repair and container_client.exists():
+        recent = set(report["recent_blobs"])
+        for name in report["orphaned_blobs"]:
+            if name in recent:
+                continue
+            try:
+                container_client.delete_blob(name)
+                report["deleted_blobs"] += 1
+            except Exception as error:
+                # Deleted meanwhile, or with its picture when it is a rendition
+                print(f"Error deleting the blob {name}: {error}")
+        folders = set()
+        for picture_set_id, folder_name, path in report["missing_folders"]:
+            user_id, _, name = path.rpartition("/")
+            try:
+                if path == folder_name:
+                    await azure_storage.create_folder(
+                        container_client, picture_set_id, folder_name, folders
+                    )
+                elif name == folder_name and user_id and "/" not in user_id:
+                    await azure_storage.create_dev_container_folder(
+                        container_client, picture_set_id, folder_name, user_id
+                    )
+                else:
+                    print(f"Unknown layout of the folder {path}, not created")
+                    continue
+                report["created_folders"] += 1
+            except azure_storage.CreateDirectoryError as error:
+                print(f"Error creating the folder {path}: {error}")
+
+    if delete_pictures and report["dangling_pictures"]:
+        report["deleted_pictures"] = picture.delete_pictures(
+            cursor, [picture_id for picture_id, _ in report["dangling_pictures"]]
+        )
+    return report
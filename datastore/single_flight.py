@@ -0,0 +1,221 @@
+"""
+This module collapses concurrent identical calls of hot read entry points.
+
+While a call is in flight, the identical calls (same arguments and same database
+and schema, the cursor aside) wait for its result instead of querying the database
+again. The result is then kept for a short TTL. The write entry points invalidate the
+keys they change, once when they write and again when their transaction ends.
+
+The cached results are shared between the callers: each caller receives a deep copy.
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+import time
+from dataclasses import dataclass
+from uuid import UUID
+
+
+@dataclass
+class KeyStats:
+    """The metrics of one key."""
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    invalidations: int = 0
+
+
+def _freeze(value):
+    if isinstance(value, UUID):
+        return str(value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _scope(cursor) -> tuple:
+    """The database and schema of a cursor: the results are not shared across them."""
+    connection = getattr(cursor, "connection", None)
+    info = getattr(connection, "info", None)
+    return (
+        getattr(info, "host", None),
+        getattr(info, "port", None),
+        getattr(info, "dbname", None),
+        getattr(connection, "schema", None),
+    )
+
+
+def _matches(match: dict, arguments: tuple) -> bool:
+    return all(item in arguments for item in match.items())
+
+
+class SingleFlight:
+    """
+    The single-flight and TTL cache wrapper of an async entry point whose first
+    parameter is the cursor.
+
+    Parameters:
+    - func: The entry point.
+    - ttl (float): How long a result is kept, in seconds. 0 disables the cache, the
+      concurrent calls are still collapsed.
+    - max_size (int): The maximum number of keys kept in the cache and the metrics.
+    - clock: The clock, time.monotonic by default.
+    """
+
+    def __init__(self, func, ttl: float, max_size: int = 1024, clock=time.monotonic):
+        self.func = func
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._signature = inspect.signature(func)
+        self._cursor_name = next(iter(self._signature.parameters))
+        self._entries = {}
+        self._in_flight = {}
+        self._stats = {}
+        self._generation = 0
+        # The invalidations waiting for the end of the transaction of their write
+        self._pending = []
+        functools.update_wrapper(self, func)
+
+    def _key(self, cursor, *args, **kwargs) -> tuple:
+        """Return the (scope, arguments) key of a call, the metrics use the arguments."""
+        bound = self._signature.bind(cursor, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(
+            (name, _freeze(value))
+            for name, value in bound.arguments.items()
+            if name != self._cursor_name
+        )
+        return _scope(cursor), arguments
+
+    def _key_stats(self, key) -> KeyStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_size:
+                # Drop the metrics of the oldest key
+                del self._stats[next(iter(self._stats))]
+            stats = self._stats[key] = KeyStats()
+        return stats
+
+    def _store(self, key, result):
+        if len(self._entries) >= self.max_size:
+            now = self.clock()
+            for old_key, (expires_at, _) in list(self._entries.items()):
+                if expires_at <= now:
+                    del self._entries[old_key]
+            if len(self._entries) >= self.max_size:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (self.clock() + self.ttl, result)
+
+    async def _load(self, key, generation, cursor, *args, **kwargs):
+        try:
+            result = await self.func(cursor, *args, **kwargs)
+        except Exception:
+            self._key_stats(key[1]).errors += 1
+            raise
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+        # Nothing is cached if a write invalidated the cache while the call was in flight,
+        # nor while a write is not committed: the result may be the data of before it
+        if (
+            self.ttl > 0
+            and generation == self._generation
+            and not any(_matches(match, key[1]) for match in self._pending)
+        ):
+            self._store(key, result)
+        return result
+
+    async def __call__(self, cursor, *args, **kwargs):
+        key = self._key(cursor, *args, **kwargs)
+        stats = self._key_stats(key[1])
+
+        if any(_matches(match, key[1]) for match in self._pending):
+            # A write of the key is not committed: the call may be the writer reading
+            # its own changes, or a reader which must not see them. Neither can share
+            # the result of the other, so the call runs alone and is not cached.
+            stats.misses += 1
+            return await self.func(cursor, *args, **kwargs)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > self.clock():
+                stats.hits += 1
+                return copy.deepcopy(result)
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            stats.misses += 1
+            task = asyncio.ensure_future(
+                self._load(key, self._generation, cursor, *args, **kwargs)
+            )
+            # Retrieve the exception even if every caller was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        else:
+            stats.coalesced += 1
+        # A cancelled caller does not cancel the call the others are waiting for
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def invalidate(self, cursor=None, **arguments):
+        """
+        Forget the cached results whose arguments match the given ones, or every
+        result if none is given. The calls in flight are not cached when they end.
+
+        With the cursor of the write, the matching calls are neither collapsed nor
+        cached until its transaction ends, and the results are forgotten again then: a
+        concurrent reader could otherwise cache the data of before the commit for the
+        whole TTL, or the writer receive the result of a reader of another connection. The end of
+        the transaction is known from the connections of datastore.db.connect_db.
+
+        Example: get_full_inspection_json.invalidate(cursor, inspection_id=inspection_id)
+        """
+        match = {name: _freeze(value) for name, value in arguments.items()}
+        self._forget(match)
+        connection = getattr(cursor, "connection", None)
+        on_transaction_end = getattr(connection, "on_transaction_end", None)
+        if on_transaction_end is None:
+            return
+        self._pending.append(match)
+
+        def end():
+            self._pending.remove(match)
+            self._forget(match)
+
+        on_transaction_end(end)
+
+    def _forget(self, match: dict):
+        self._generation += 1
+        for key in set(self._entries) | set(self._in_flight):
+            if _matches(match, key[1]):
+                self._entries.pop(key, None)
+                self._in_flight.pop(key, None)
+                self._key_stats(key[1]).invalidations += 1
+
+    def stats(self) -> dict:
+        """Return the metrics of every key, as {key: KeyStats}."""
+        return {key: copy.copy(stats) for key, stats in self._stats.items()}
+
+
+def single_flight(ttl: float = 5.0, max_size: int = 1024):
+    """
+    Decorator wrapping an async entry point in a SingleFlight.
+
+    Parameters:
+    - ttl (float): How long a result is kept, in seconds.
+    - max_size (int): The maximum number of keys kept.
+    """
+
+    def decorator(func):
+        return SingleFlight(func, ttl, max_size)
+
+    return decorator
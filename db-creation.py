@@ -4,6 +4,8 @@ from psycopg import sql
 
 DB_URL = os.environ.get("FERTISCAN_DB_URL_TESTING")
 SCHEMA = os.environ.get("FERTISCAN_SCHEMA_TESTING")
+NACHET_DB_URL = os.environ.get("NACHET_DB_URL_TESTING")
+NACHET_SCHEMA = os.environ.get("NACHET_SCHEMA_TESTING")
 
 def create_db(DB_URL, SCHEMA : str):
 
@@ -19,6 +21,24 @@ def create_db(DB_URL, SCHEMA : str):
         path = "fertiscan/db/bytebase/schema_" + schema_number + ".sql"
         #execute_sql_file(cur, path)
 
+        path = "fertiscan/db/bytebase/location_address_key.sql"
+        execute_sql_file(cur, path)
+
+        path = "fertiscan/db/bytebase/picture_checksum.sql"
+        execute_sql_file(cur, path)
+
+        path = "fertiscan/db/bytebase/sub_label_empty_text.sql"
+        execute_sql_file(cur, path)
+
+        path = "fertiscan/db/bytebase/label_child_ordinal.sql"
+        execute_sql_file(cur, path)
+
+        path = "fertiscan/db/bytebase/reference_version.sql"
+        execute_sql_file(cur, path)
+
+        path = "fertiscan/db/bytebase/index_" + schema_number + ".sql"
+        execute_sql_file(cur, path)
+
         # Create the functions
         path = "fertiscan/db/bytebase/new_inspection"
         loop_for_sql_files(cur, path)
@@ -26,6 +46,9 @@ def create_db(DB_URL, SCHEMA : str):
         path = "fertiscan/db/bytebase/new_inspection_function.sql"
         execute_sql_file(cur, path)
 
+        path = "fertiscan/db/bytebase/new_inspections_function.sql"
+        execute_sql_file(cur, path)
+
         path = "fertiscan/db/bytebase/get_inspection"
         loop_for_sql_files(cur, path)
 
@@ -38,6 +61,10 @@ def create_db(DB_URL, SCHEMA : str):
         path = "fertiscan/db/bytebase/delete_inspection_function.sql"
         execute_sql_file(cur, path)
 
+        # Shared by the triggers of the OLAP folder
+        path = "fertiscan/db/bytebase/label_dimension_refresh_function.sql"
+        execute_sql_file(cur, path)
+
         path = "fertiscan/db/bytebase/OLAP"
         loop_for_sql_files(cur, path)
     except Exception as e:
@@ -46,10 +73,27 @@ def create_db(DB_URL, SCHEMA : str):
     
     db.end_query(connection=conn, cursor=cur)
 
+def create_nachet_db(DB_URL, SCHEMA : str):
+
+    conn = db.connect_db(DB_URL, SCHEMA)
+    cur = db.cursor(connection=conn)
+    db.create_search_path(connection=conn, cur=cur, schema=SCHEMA)
+
+    # The tables are created by the bytebase migrations, only the indexes here
+    try:
+        path = "nachet/db/bytebase/index_" + SCHEMA + ".sql"
+        execute_sql_file(cur, path)
+    except Exception as e:
+        conn.rollback()
+        print(e)
+
+    db.end_query(connection=conn, cursor=cur)
+
 def loop_for_sql_files(cursor, folder_path):
     # Loop through all files in the specified folder
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
+    # Sorted so the files run in the same order on every setup
+    for root, dirs, files in sorted(os.walk(folder_path)):
+        for file in sorted(files):
             if file.endswith('.sql'):
                 file_path = os.path.join(root, file)
                 execute_sql_file(cursor, file_path)
@@ -66,3 +110,5 @@ def execute_sql_file(cursor,sql_file):
 
 if __name__ == "__main__":
     create_db(DB_URL=DB_URL, SCHEMA=SCHEMA)
+    if NACHET_DB_URL and NACHET_SCHEMA:
+        create_nachet_db(DB_URL=NACHET_DB_URL, SCHEMA=NACHET_SCHEMA)
@@ -1,4 +1,6 @@
+import json
 import os
+from datetime import datetime
 from uuid import UUID
 
 from azure.storage.blob import ContainerClient
@@ -6,8 +8,12 @@ from dotenv import load_dotenv
 from psycopg import Cursor
 
 import datastore
+import datastore.blob.azure_storage_api as azure_storage
+import datastore.db.metadata.picture_set as data_picture_set
 import datastore.db.queries.picture as picture
 import datastore.db.queries.user as user
+from datastore.db.replica import read_only
+from datastore.single_flight import single_flight
 import fertiscan.db.metadata.inspection as data_inspection
 import fertiscan.db.queries.inspection as inspection
 
@@ -74,6 +80,136 @@ async def register_analysis(
     return analysis_db
 
 
+async def register_analyses(
+    cursor: Cursor,
+    container_client: ContainerClient,
+    user_id,
+    analyses: list,
+    max_concurrency: int = azure_storage.UPLOAD_CONCURRENCY,
+) -> list[dict]:
+    """
+    Register many analyses in the database within the current transaction.
+
+    The container folders are listed once, the pictures of every analysis are
+    uploaded concurrently and all the inspections are created with a single
+    call to the new_inspections function. An analysis that fails is rolled
+    back on its own and reported without stopping the others.
+
+    Parameters:
+    - cursor: The cursor object to interact with the database.
+    - container_client: The container client of the user.
+    - user_id: The UUID of the user.
+    - analyses (list): (hashed_pictures, analysis_dict) tuples to register.
+    - max_concurrency (int): The maximum number of picture uploads in flight.
+
+    Returns:
+    - A list with, for each analysis in order, a dict with the registered
+      "inspection" (None on failure) and the "error" message (None on success).
+    """
+    if not user.is_a_user_id(cursor=cursor, user_id=user_id):
+        raise user.UserNotFoundError(f"User not found based on the given id: {user_id}")
+    if not container_client.exists():
+        raise datastore.ContainerCreationError(
+            f"Container not found based on the given user_id: {user_id}"
+        )
+
+    results = [{"inspection": None, "error": None} for _ in analyses]
+    picture_set_ids = {}
+    formatted_analyses = {}
+    analysis_checksums = {}
+    objects = {}
+
+    # Create the picture sets and the picture rows of each analysis
+    folders = await azure_storage.get_folder_names(container_client)
+    for index, (hashed_pictures, analysis_dict) in enumerate(analyses):
+        folder_created = False
+        try:
+            formatted_analysis = data_inspection.build_inspection_import(
+                analysis_dict, user_id
+            )
+            nb_pictures = len(hashed_pictures)
+            picture_set_metadata = data_picture_set.build_picture_set_metadata(
+                user_id, nb_pictures
+            )
+            # Savepoint: a failing analysis does not roll back the others
+            with cursor.connection.transaction():
+                picture_set_id = picture.new_picture_set(
+                    cursor, picture_set_metadata, user_id
+                )
+                folder_created = await azure_storage.create_folder(
+                    container_client, str(picture_set_id), folders=folders
+                )
+                # Identical pictures (e.g. retries) share one content-addressed blob
+                checksums, new_objects = datastore.prepare_picture_objects(
+                    cursor, user_id, hashed_pictures
+                )
+                for checksum in checksums:
+                    picture_id = picture.new_picture_unknown(
+                        cursor, picture_set_metadata, picture_set_id, nb_pictures
+                    )
+                    data = {
+                        "link": azure_storage.build_object_name(checksum),
+                        "description": "Uploaded through the API",
+                    }
+                    picture.update_picture_metadata(
+                        cursor, str(picture_id), json.dumps(data), nb_pictures, checksum
+                    )
+            picture_set_ids[index] = picture_set_id
+            formatted_analyses[index] = formatted_analysis
+            analysis_checksums[index] = set(checksums)
+            objects.update(new_objects)
+        except Exception as e:
+            results[index]["error"] = str(e)
+            # The savepoint rolled back the picture set, not its folder
+            if folder_created:
+                await azure_storage.delete_folder(container_client, str(picture_set_id))
+                folders.discard(str(picture_set_id))
+
+    # Upload every new picture of the batch concurrently, once per content
+    upload_errors = await datastore.upload_picture_objects(
+        container_client, objects, max_concurrency
+    )
+    failed = set()
+    for checksum, error in upload_errors.items():
+        for index, checksums in analysis_checksums.items():
+            if checksum in checksums and index not in failed:
+                failed.add(index)
+                results[index]["error"] = str(error)
+
+    # Register the inspections of the analyses with all their pictures uploaded
+    registered = [index for index in formatted_analyses if index not in failed]
+    if registered:
+        rows = inspection.new_inspections(
+            cursor,
+            user_id,
+            [picture_set_ids[index] for index in registered],
+            [formatted_analyses[index] for index in registered],
+        )
+        for item_index, inspection_json, error in rows:
+            index = registered[item_index]
+            if error is None:
+                results[index]["inspection"] = inspection_json
+            else:
+                failed.add(index)
+                results[index]["error"] = error
+
+    # Remove what was created for the failed analyses
+    for index in failed:
+        picture_set_id = picture_set_ids[index]
+        with cursor.connection.transaction():
+            orphans = picture.get_unreferenced_checksums(cursor, picture_set_id)
+            picture.delete_picture_set_with_pictures(cursor, picture_set_id)
+        await azure_storage.delete_folder(container_client, str(picture_set_id))
+        azure_storage.delete_objects_after_commit(
+            cursor,
+            container_client,
+            orphans,
+            datastore.unreferenced_objects(cursor.connection, user_id),
+        )
+
+    return results
+
+
 async def update_inspection(
     cursor: Cursor,
     inspection_id: str | UUID,
@@ -114,9 +250,12 @@ async def update_inspection(
     updated_result = inspection.update_inspection(
         cursor, inspection_id, user_id, updated_data.model_dump()
     )
+    get_full_inspection_json.invalidate(cursor, inspection_id=inspection_id)
     return data_inspection.Inspection.model_validate(updated_result)
 
 
+@read_only
+@single_flight(ttl=5.0)
 async def get_full_inspection_json(
     cursor: Cursor,
     inspection_id,
@@ -132,93 +271,68 @@ async def get_full_inspection_json(
     Parameters:
     - cursor: The cursor object to interact with the database.
     - inspection_id: The inspection id of the inspection.
+    - user_id, picture_set_id, label_info_id, company_info_id, manufacturer_info_id:
+      Optional ids checked against the inspection. A Warning is raised on mismatch.
 
     Returns:
     - The inspection json.
     """
-    if not inspection.is_a_inspection_id(cursor=cursor, inspection_id=inspection_id):
+    # Load the inspection row and all its foreign keys once
+    db_inspection = inspection.get_inspection_with_fk(cursor, inspection_id)
+    if db_inspection is None:
         raise inspection.InspectionNotFoundError(
             f"Inspection not found based on the given id: {inspection_id}"
         )
 
-    # Check Ids
-    if (
-        (
-            picture_set_id is None
-            or picture_set_id == ""
-            or not picture.is_a_picture_set_id(
-                cursor=cursor, picture_set_id=picture_set_id
-            )
-        )
-        or (
-            user_id is None
-            or user_id == ""
-            or not user.is_a_user_id(cursor=cursor, user_id=user_id)
-        )
-        or (label_info_id is None or label_info_id == "")
-        or (company_info_id is None or company_info_id == "")
-        or (manufacturer_info_id is None or manufacturer_info_id == "")
-    ):
-        ids = inspection.get_inspection_fk(cursor, inspection_id)
-        picture_set_id = ids[2]
-        label_info_id = ids[0]
-        company_info_id = ids[3]
-        manufacturer_info_id = ids[4]
-        user_id = ids[1]
-    else:
-        if not picture.is_a_picture_set_id(
-            cursor=cursor, picture_set_id=picture_set_id
-        ):
-            raise picture.PictureSetNotFoundError(
-                f"Picture set not found based on the given id: {picture_set_id}"
-            )
-        if not user.is_a_user_id(cursor=cursor, user_id=user_id):
-            raise user.UserNotFoundError(
-                f"User not found based on the given id: {user_id}"
-            )
-        ids = inspection.get_inspection_fk(cursor, inspection_id)
-        if not picture_set_id == ids[2]:
-            raise Warning(
-                "Picture set id does not match the picture_set_id in the inspection for the given inspection_id"
-            )
-        if not label_info_id == ids[0]:
+    # Check the given ids against the inspection row. The row references
+    # existing records, so no extra existence query is needed.
+    given_ids = {
+        "picture_set_id": ("Picture set id", picture_set_id),
+        "label_info_id": ("Label info id", label_info_id),
+        "company_info_id": ("Company info id", company_info_id),
+        "manufacturer_info_id": ("Manufacturer info id", manufacturer_info_id),
+        "inspector_id": ("User id", user_id),
+    }
+    for column, (label, given_id) in given_ids.items():
+        if given_id is None or given_id == "":
+            continue
+        if str(given_id) != str(db_inspection[column]):
             raise Warning(
-                "Label info id does not match the label_info_id in the inspection for the given inspection_id"
-            )
-        if not company_info_id == ids[3]:
-            raise Warning(
-                "Company info id does not match the company_info_id in the inspection for the given inspection_id"
-            )
-        if not manufacturer_info_id == ids[4]:
-            raise Warning(
-                "Manufacturer info id does not match the manufacturer_info_id in the inspection for the given inspection_id"
-            )
-        if not user_id == ids[1]:
-            raise Warning(
-                "User id does not match the user_id in the inspection for the given inspection_id"
+                f"{label} does not match the {column} in the inspection for the given inspection_id"
             )
 
-    # Retrieve pictures
-    # pictures_ids = picture.get_picture_in_picture_set(cursor, picture_set_id)
-
     # Retrieve label_info
     inspection_metadata = data_inspection.build_inspection_export(
-        cursor, inspection_id
+        cursor, inspection_id, db_inspection
     )
 
     return inspection_metadata
 
 
-async def get_user_analysis_by_verified(cursor: Cursor, user_id, verified: bool):
+@read_only
+async def get_user_analysis_by_verified(
+    cursor: Cursor,
+    user_id,
+    verified: bool,
+    limit: int = None,
+    after: tuple = None,
+    start_date: datetime = None,
+    end_date: datetime = None,
+):
     """
-    This function fetch all the inspection of a user
+    This function fetch the inspections of a user, from the most recent to the oldest
 
     Parameters:
     - cursor: The cursor object to interact with the database.
     - user_id: The user id of the user.
+    - verified: The verified status of the inspections to fetch.
+    - limit: (optional) The page size. Every inspection is returned if None.
+    - after: (optional) The (upload_date, inspection_id) of the last row of the previous page.
+    - start_date: (optional) Only keep the inspections uploaded at or after this date.
+    - end_date: (optional) Only keep the inspections uploaded before this date.
 
     Returns:
-    - List of unverified analysis.
+    - List of analysis.
     [
         inspection.id,
         inspection.upload_date,
@@ -227,16 +341,24 @@ async def get_user_analysis_by_verified(cursor: Cursor, user_id, verified: bool)
         inspection.picture_set_id,
         label_info.id as label_info_id,
         label_info.product_name,
-        label_info.company_info_id,
-        label_info.manufacturer_info_id
+        label_info.manufacturer_info_id,
         company_info.id as company_info_id,
-        company_info.company_name
+        company_info.company_name,
+        inspection.verified
     ]
     """
 
     if not user.is_a_user_id(cursor=cursor, user_id=user_id):
         raise user.UserNotFoundError(f"User not found based on the given id: {user_id}")
-    return inspection.get_all_user_inspection_filter_verified(cursor, user_id, verified)
+    return inspection.get_user_inspection_page(
+        cursor,
+        user_id,
+        verified=verified,
+        start_date=start_date,
+        end_date=end_date,
+        after=after,
+        limit=limit,
+    )
 
 
 async def delete_inspection(
@@ -265,6 +387,7 @@ async def delete_inspection(
     # Delete the inspection and get the returned data
     deleted_inspection = inspection.delete_inspection(cursor, inspection_id, user_id)
     deleted_inspection = data_inspection.DBInspection.model_validate(deleted_inspection)
+    get_full_inspection_json.invalidate(cursor, inspection_id=inspection_id)
 
     await datastore.delete_picture_set_permanently(
         cursor, str(user_id), str(deleted_inspection.picture_set_id), container_client
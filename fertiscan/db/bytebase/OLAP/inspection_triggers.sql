@@ -1,47 +1,66 @@
+-- One time_dimension row per date: merge the duplicates left by the previous row-level trigger
+UPDATE "fertiscan_0.0.17".inspection_factual AS f
+SET time_id = kept.id
+FROM "fertiscan_0.0.17".time_dimension AS t
+JOIN (
+    SELECT DISTINCT ON (date_value) id, date_value
+    FROM "fertiscan_0.0.17".time_dimension
+    ORDER BY date_value, id
+) AS kept ON kept.date_value = t.date_value
+WHERE f.time_id = t.id AND t.id != kept.id;
+
+DELETE FROM "fertiscan_0.0.17".time_dimension
+WHERE id NOT IN (
+    SELECT DISTINCT ON (date_value) id
+    FROM "fertiscan_0.0.17".time_dimension
+    ORDER BY date_value, id
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS time_dimension_date_value_idx ON "fertiscan_0.0.17".time_dimension (date_value);
 
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_inspection_creation()
 RETURNS TRIGGER AS $$
 DECLARE
     time_id UUID;
 BEGIN
-    IF (TG_OP = 'INSERT') THEN
-        IF (NEW.id IS NOT NULL) AND (NEW.label_info_id IS NOT NULL) THEN
-        	-- Time Dimension
-            INSERT INTO "fertiscan_0.0.17".time_dimension (
-                date_value, year,month,day) 
-            VALUES (
-                CURRENT_DATE,
-                EXTRACT(YEAR FROM CURRENT_DATE),
-                EXTRACT(MONTH FROM CURRENT_DATE),
-                EXTRACT(DAY FROM CURRENT_DATE)	
-            ) RETURNING id INTO time_id;
-            -- Create the Inspection_factual entry
-            INSERT INTO "fertiscan_0.0.17".inspection_factual (
-                inspection_id, inspector_id, label_info_id, time_id, sample_id, company_id, manufacturer_id, picture_set_id, original_dataset
-            ) VALUES (
-                NEW.id,
-                NEW.inspector_id,
-                NEW.label_info_id,
-                time_id,
-                NULL, -- NOT handled yet
-                NULL, -- IS not defined yet
-                NULL, -- IS not defined yet
-                NEW.picture_set_id,
-                NULL
-            );
-        ELSE
-            -- Raise a warning if the condition is not met
-            RAISE WARNING 'The OLAP dimension of this inspection is not updated because the condition is not met';
-        END IF;
+    IF NOT EXISTS (SELECT 1 FROM new_rows WHERE label_info_id IS NOT NULL) THEN
+        RETURN NULL;
     END IF;
-    RETURN NEW;
+    -- Time Dimension: reuse the row of the current date
+    INSERT INTO "fertiscan_0.0.17".time_dimension (
+        date_value, year, month, day)
+    VALUES (
+        CURRENT_DATE,
+        EXTRACT(YEAR FROM CURRENT_DATE),
+        EXTRACT(MONTH FROM CURRENT_DATE),
+        EXTRACT(DAY FROM CURRENT_DATE)
+    ) ON CONFLICT (date_value) DO NOTHING;
+    SELECT id INTO time_id FROM "fertiscan_0.0.17".time_dimension WHERE date_value = CURRENT_DATE;
+    -- Create the Inspection_factual entries
+    INSERT INTO "fertiscan_0.0.17".inspection_factual (
+        inspection_id, inspector_id, label_info_id, time_id, sample_id, company_id, manufacturer_id, picture_set_id, original_dataset
+    )
+    SELECT
+        new_rows.id,
+        new_rows.inspector_id,
+        new_rows.label_info_id,
+        time_id,
+        NULL, -- NOT handled yet
+        NULL, -- IS not defined yet
+        NULL, -- IS not defined yet
+        new_rows.picture_set_id,
+        NULL
+    FROM new_rows
+    WHERE new_rows.id IS NOT NULL AND new_rows.label_info_id IS NOT NULL;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 DROP TRIGGER IF EXISTS inspection_creation ON "fertiscan_0.0.17".inspection;
 CREATE TRIGGER inspection_creation
 AFTER INSERT ON "fertiscan_0.0.17".inspection
-FOR EACH ROW
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
 EXECUTE FUNCTION olap_inspection_creation();
 
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_inspection_update()
@@ -72,21 +91,15 @@ EXECUTE FUNCTION olap_inspection_update();
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_inspection_deletion()
 RETURNS TRIGGER AS $$
 BEGIN
-    IF (TG_OP = 'DELETE') THEN
-        IF (OLD.id IS NOT NULL) THEN
-        DELETE FROM "fertiscan_0.0.17".inspection_factual 
-        WHERE inspection_id = OLD.id;
-        ELSE
-            -- Raise a warning if the condition is not met
-            RAISE WARNING 'The OLAP dimension of this inspection is not updated because the condition is not met';
-        END IF;
-    END IF;
-    RETURN OLD;
+    DELETE FROM "fertiscan_0.0.17".inspection_factual
+    WHERE inspection_id IN (SELECT id FROM old_rows);
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 DROP TRIGGER IF EXISTS inspection_deletion ON "fertiscan_0.0.17".inspection;
 CREATE TRIGGER inspection_deletion
 AFTER DELETE ON "fertiscan_0.0.17".inspection
-FOR EACH ROW
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
 EXECUTE FUNCTION olap_inspection_deletion();
@@ -1,27 +1,21 @@
-
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_label_information_creation()
 RETURNS TRIGGER AS $$
 BEGIN
-    IF (TG_OP = 'INSERT') THEN
-        IF (NEW.id IS NOT NULL) THEN
-        INSERT INTO "fertiscan_0.0.17"."label_dimension" (
-            label_id, company_info_id, manufacturer_info_id
-        ) VALUES (
-            NEW.id, NEW.company_info_id, NEW.manufacturer_info_id
-        );
-        ELSE
-            -- Raise a warning if the condition is not met
-            RAISE WARNING 'The OLAP dimension of this label_information is not updated because the condition is not met';
-        END IF;
-    END IF;
-    RETURN NEW;
+    INSERT INTO "fertiscan_0.0.17"."label_dimension" (
+        label_id, company_info_id, manufacturer_info_id
+    )
+    SELECT id, company_info_id, manufacturer_info_id
+    FROM new_rows
+    WHERE id IS NOT NULL;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 DROP TRIGGER IF EXISTS label_information_creation ON "fertiscan_0.0.17".label_information;
 CREATE TRIGGER label_information_creation
 AFTER INSERT ON "fertiscan_0.0.17".label_information
-FOR EACH ROW
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
 EXECUTE FUNCTION olap_label_information_creation();
 
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_label_information_update()
@@ -52,21 +46,15 @@ EXECUTE FUNCTION olap_label_information_update();
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_label_information_deletion()
 RETURNS TRIGGER AS $$
 BEGIN
-    IF (TG_OP = 'DELETE') THEN
-        IF (OLD.id IS NOT NULL) THEN
-        DELETE FROM "fertiscan_0.0.17"."label_dimension" 
-        WHERE label_id = OLD.id;
-        ELSE
-            -- Raise a warning if the condition is not met
-            RAISE WARNING 'The OLAP dimension of this label_information is not updated because the condition is not met';
-        END IF;
-    END IF;
-    RETURN OLD;
+    DELETE FROM "fertiscan_0.0.17"."label_dimension"
+    WHERE label_id IN (SELECT id FROM old_rows);
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 DROP TRIGGER IF EXISTS label_information_deletion ON "fertiscan_0.0.17".label_information;
 CREATE TRIGGER label_information_deletion
 AFTER DELETE ON "fertiscan_0.0.17".label_information
-FOR EACH ROW
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
 EXECUTE FUNCTION olap_label_information_deletion();
@@ -1,48 +1,18 @@
-
-CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_micronutrient_creation()
-RETURNS TRIGGER AS $$
-BEGIN
-    IF (TG_OP = 'INSERT') THEN
-        IF (NEW.id IS NOT NULL) AND (NEW.label_id IS NOT NULL) THEN
-        -- Update the label_dimension table with the new micronutrient_analysis_id
-            UPDATE "fertiscan_0.0.17"."label_dimension" 
-            SET micronutrient_ids = array_append(micronutrient_ids, NEW.id)
-            WHERE label_dimension.label_id = NEW.label_id;
-        ELSE
-            -- Raise a warning if the condition is not met
-            RAISE WARNING 'The OLAP dimension of this micronutrient is not updated because the condition is not met';
-        END IF;
-    END IF;
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
+-- The label_dimension arrays are refreshed once per statement, see ../label_dimension_refresh_function.sql
+-- (loaded before this folder by db-creation.py)
+DROP FUNCTION IF EXISTS "fertiscan_0.0.17".olap_micronutrient_creation() CASCADE;
+DROP FUNCTION IF EXISTS "fertiscan_0.0.17".olap_micronutrient_deletion() CASCADE;
 
 DROP TRIGGER IF EXISTS micronutrient_creation ON "fertiscan_0.0.17".micronutrient;
 CREATE TRIGGER micronutrient_creation
 AFTER INSERT ON "fertiscan_0.0.17".micronutrient
-FOR EACH ROW
-EXECUTE FUNCTION olap_micronutrient_creation();
-
-CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_micronutrient_deletion()
-RETURNS TRIGGER AS $$
-BEGIN
-    IF (TG_OP = 'DELETE') THEN
-        IF (OLD.id IS NOT NULL) AND (OLD.label_id IS NOT NULL) THEN
-            -- Update the label_dimension table with the new micronutrient_analysis_id
-            UPDATE "fertiscan_0.0.17"."label_dimension" 
-            SET micronutrient_ids = array_remove(micronutrient_ids, OLD.id)
-            WHERE label_dimension.label_id = OLD.label_id;
-        ELSE
-            -- Raise a warning if the condition is not met
-            RAISE WARNING 'The OLAP dimension of this micronutrient is not updated because the condition is not met';
-        END IF;
-    END IF;
-    RETURN OLD;
-END;
-$$ LANGUAGE plpgsql;
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION olap_label_children_refresh();
 
 DROP TRIGGER IF EXISTS micronutrient_deletion ON "fertiscan_0.0.17".micronutrient;
 CREATE TRIGGER micronutrient_deletion
 AFTER DELETE ON "fertiscan_0.0.17".micronutrient
-FOR EACH ROW
-EXECUTE FUNCTION olap_micronutrient_deletion();
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION olap_label_children_refresh();
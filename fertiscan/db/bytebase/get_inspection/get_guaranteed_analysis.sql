@@ -16,7 +16,7 @@ BEGIN
                 'value', guaranteed.value,
                 'unit', guaranteed.unit,
                 'edited', guaranteed.edited
-            )
+            ) ORDER BY guaranteed.ordinal
         ) FILTER (WHERE guaranteed.language = 'en'), '[]'::jsonb), 
         'fr', COALESCE(jsonb_agg(
             jsonb_build_object(
@@ -24,7 +24,7 @@ BEGIN
                 'value', guaranteed.value,
                 'unit', guaranteed.unit,
                 'edited', guaranteed.edited
-            )
+            ) ORDER BY guaranteed.ordinal
         ) FILTER (WHERE guaranteed.language = 'fr'), '[]'::jsonb)
     )
     INTO result_json
@@ -27,7 +27,7 @@ BEGIN
                     'value', COALESCE(ingredient.value,Null),
                     'unit', COALESCE(ingredient.unit,Null),
                     'edited', COALESCE(ingredient.edited,Null)
-                )
+                ) ORDER BY ingredient.ordinal
             ) FILTER (WHERE ingredient.language = 'en'), '[]'::jsonb), 
             'fr', COALESCE(jsonb_agg(
                 jsonb_build_object(
@@ -35,7 +35,7 @@ BEGIN
                     'value', COALESCE(ingredient.value,Null),
                     'unit', COALESCE(ingredient.unit,Null),
                     'edited', COALESCE(ingredient.edited,Null)
-                )
+                ) ORDER BY ingredient.ordinal
             ) FILTER (WHERE ingredient.language = 'fr'), '[]'::jsonb)
         )
     )
@@ -12,7 +12,8 @@ BEGIN
             metric.metric_type,
             metric.value,
             unit.unit,
-            metric.edited
+            metric.edited,
+            metric.ordinal
         FROM 
             metric
         JOIN 
@@ -20,7 +21,7 @@ BEGIN
         WHERE 
             metric.label_id = label_info_id 
         ORDER BY 
-            metric.metric_type
+            metric.metric_type, metric.ordinal
     ),
     weight_data AS (
         SELECT 
@@ -29,7 +30,7 @@ BEGIN
                     jsonb_build_object(
                         'unit', COALESCE(unit, Null),
                         'value', COALESCE(value, Null)
-                    )
+                    ) ORDER BY ordinal
                 ), '[]'::jsonb
             ) AS weight
         FROM 
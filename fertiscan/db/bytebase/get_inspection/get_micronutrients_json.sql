@@ -16,7 +16,7 @@ BEGIN
                             'unit', COALESCE(micronutrient.unit,Null),
                             'value', COALESCE(micronutrient.value,Null),
                             'edited', COALESCE(micronutrient.edited,Null)
-                        )
+                        ) ORDER BY micronutrient.ordinal
                     ) FILTER (WHERE micronutrient.language = 'en'), '[]'::jsonb), 
                     'fr', COALESCE(jsonb_agg(
                         jsonb_build_object(
@@ -24,7 +24,7 @@ BEGIN
                             'unit', COALESCE(micronutrient.unit,Null),
                             'value', COALESCE(micronutrient.value,Null),
                             'edited', COALESCE(micronutrient.edited,Null)
-                        )
+                        ) ORDER BY micronutrient.ordinal
                     ) FILTER (WHERE micronutrient.language = 'fr'), '[]'::jsonb)
                 )
            )
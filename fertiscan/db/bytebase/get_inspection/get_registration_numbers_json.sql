@@ -14,7 +14,7 @@ BEGIN
                             'registration_number', COALESCE(registration_number_information.identifier,Null),
                             'is_an_ingredient', COALESCE(registration_number_information.is_an_ingredient,Null),
                             'edited', COALESCE(registration_number_information.edited,Null)
-                        )
+                        ) ORDER BY registration_number_information.ordinal
                     ), '[]'::jsonb)
            )
     INTO result_json
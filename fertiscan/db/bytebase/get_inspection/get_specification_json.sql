@@ -14,7 +14,7 @@ BEGIN
                     'humidity', COALESCE(specification.humidity,Null),
                     'solubility', COALESCE(specification.solubility,Null),
                     'edited', COALESCE(specification.edited,Null)
-                )
+                ) ORDER BY specification.ordinal
             ) FILTER (WHERE specification.language = 'en'), '[]'::jsonb), 
             'fr', COALESCE(jsonb_agg(
                 jsonb_build_object(
@@ -22,7 +22,7 @@ BEGIN
                     'humidity', COALESCE(specification.humidity,Null),
                     'solubility', COALESCE(specification.solubility,Null),
                     'edited', COALESCE(specification.edited,Null)
-                )
+                ) ORDER BY specification.ordinal
             ) FILTER (WHERE specification.language = 'fr'), '[]'::jsonb)
         )
     )
@@ -0,0 +1,37 @@
+--Secondary indexes for "fertiscan_0.0.17"
+-- Every foreign key and lookup column filtered by the query functions gets an index
+-- so the lookups do not scan the whole table. Run once after the schema creation;
+-- the statements are idempotent.
+
+-- Users and pictures
+CREATE INDEX IF NOT EXISTS picture_set_owner_id_idx ON "fertiscan_0.0.17".picture_set (owner_id);
+CREATE INDEX IF NOT EXISTS picture_picture_set_id_idx ON "fertiscan_0.0.17".picture (picture_set_id);
+
+-- Inspection (the listing is keyset paginated on upload_date, id)
+CREATE INDEX IF NOT EXISTS inspection_inspector_id_upload_date_idx ON "fertiscan_0.0.17".inspection (inspector_id, upload_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS inspection_label_info_id_idx ON "fertiscan_0.0.17".inspection (label_info_id);
+CREATE INDEX IF NOT EXISTS inspection_picture_set_id_idx ON "fertiscan_0.0.17".inspection (picture_set_id);
+CREATE INDEX IF NOT EXISTS inspection_fertilizer_id_idx ON "fertiscan_0.0.17".inspection (fertilizer_id);
+CREATE INDEX IF NOT EXISTS fertilizer_latest_inspection_id_idx ON "fertiscan_0.0.17".fertilizer (latest_inspection_id);
+
+-- Label information and its children
+CREATE INDEX IF NOT EXISTS label_information_company_info_id_idx ON "fertiscan_0.0.17".label_information (company_info_id);
+CREATE INDEX IF NOT EXISTS label_information_manufacturer_info_id_idx ON "fertiscan_0.0.17".label_information (manufacturer_info_id);
+CREATE INDEX IF NOT EXISTS metric_label_id_idx ON "fertiscan_0.0.17".metric (label_id);
+CREATE INDEX IF NOT EXISTS metric_unit_id_idx ON "fertiscan_0.0.17".metric (unit_id);
+CREATE INDEX IF NOT EXISTS sub_label_label_id_idx ON "fertiscan_0.0.17".sub_label (label_id);
+CREATE INDEX IF NOT EXISTS guaranteed_label_id_idx ON "fertiscan_0.0.17".guaranteed (label_id);
+CREATE INDEX IF NOT EXISTS ingredient_label_id_idx ON "fertiscan_0.0.17".ingredient (label_id);
+CREATE INDEX IF NOT EXISTS micronutrient_label_id_idx ON "fertiscan_0.0.17".micronutrient (label_id);
+CREATE INDEX IF NOT EXISTS specification_label_id_idx ON "fertiscan_0.0.17".specification (label_id);
+CREATE INDEX IF NOT EXISTS registration_number_information_label_id_idx ON "fertiscan_0.0.17".registration_number_information (label_id);
+
+-- Organizations and locations
+CREATE INDEX IF NOT EXISTS organization_information_location_id_idx ON "fertiscan_0.0.17".organization_information (location_id);
+CREATE INDEX IF NOT EXISTS organization_information_id_idx ON "fertiscan_0.0.17".organization (information_id);
+CREATE INDEX IF NOT EXISTS location_region_id_idx ON "fertiscan_0.0.17".location (region_id);
+CREATE INDEX IF NOT EXISTS location_owner_id_idx ON "fertiscan_0.0.17".location (owner_id);
+CREATE INDEX IF NOT EXISTS region_province_id_idx ON "fertiscan_0.0.17".region (province_id);
+
+-- Reference data
+CREATE INDEX IF NOT EXISTS unit_unit_idx ON "fertiscan_0.0.17".unit (unit);
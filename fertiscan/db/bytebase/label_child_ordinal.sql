@@ -0,0 +1,39 @@
+--Position of the rows of the lists of a label in "fertiscan_0.0.17"
+-- metric, specification, ingredient, micronutrient, guaranteed, sub_label and
+-- registration_number_information store the entries of the lists of a label document.
+-- Their uuid ids are random, so the ordinal column keeps the order the entries were
+-- written in: every insert takes the next value of the sequence, the get_* functions read
+-- the rows in ordinal order and the update_* functions pair the stored rows with the
+-- incoming ones by position. Adding the column numbers the existing rows in their storage
+-- order, the order they were read in before.
+-- Run once after the schema creation; the statements are idempotent.
+
+CREATE SEQUENCE IF NOT EXISTS "fertiscan_0.0.17".label_child_ordinal_seq;
+
+ALTER TABLE "fertiscan_0.0.17".metric
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
+
+ALTER TABLE "fertiscan_0.0.17".specification
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
+
+ALTER TABLE "fertiscan_0.0.17".ingredient
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
+
+ALTER TABLE "fertiscan_0.0.17".micronutrient
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
+
+ALTER TABLE "fertiscan_0.0.17".guaranteed
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
+
+ALTER TABLE "fertiscan_0.0.17".sub_label
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
+
+ALTER TABLE "fertiscan_0.0.17".registration_number_information
+    ADD COLUMN IF NOT EXISTS "ordinal" bigint NOT NULL
+    DEFAULT nextval('"fertiscan_0.0.17".label_child_ordinal_seq');
@@ -0,0 +1,69 @@
+-- Loaded by db-creation.py before the OLAP folder: the statement-level triggers of
+-- OLAP/*_triggers.sql execute olap_label_children_refresh().
+-- Recompute the id arrays of the label_dimension rows of the given labels from the child tables.
+-- The statement-level triggers of the child tables call it once per statement with every
+-- label touched by the statement, instead of appending/removing one id per row.
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_refresh_label_dimension(label_ids uuid[])
+RETURNS VOID AS $$
+BEGIN
+    IF label_ids IS NULL OR cardinality(label_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE "fertiscan_0.0.17"."label_dimension" AS ld
+    SET
+        (instructions_ids, cautions_ids, first_aid_ids, warranties_ids) = (
+            SELECT
+                COALESCE(array_agg(sl.id) FILTER (WHERE st.type_en = 'instructions'), '{}'),
+                COALESCE(array_agg(sl.id) FILTER (WHERE st.type_en = 'cautions'), '{}'),
+                COALESCE(array_agg(sl.id) FILTER (WHERE st.type_en = 'first_aid'), '{}'),
+                COALESCE(array_agg(sl.id) FILTER (WHERE st.type_en = 'warranties'), '{}')
+            FROM "fertiscan_0.0.17".sub_label AS sl
+            JOIN "fertiscan_0.0.17".sub_type AS st ON st.id = sl.sub_type_id
+            WHERE sl.label_id = ld.label_id
+        ),
+        (weight_ids, volume_ids, density_ids) = (
+            SELECT
+                COALESCE(array_agg(m.id) FILTER (WHERE m.metric_type = 'weight'), '{}'),
+                COALESCE(array_agg(m.id) FILTER (WHERE m.metric_type = 'volume'), '{}'),
+                COALESCE(array_agg(m.id) FILTER (WHERE m.metric_type = 'density'), '{}')
+            FROM "fertiscan_0.0.17".metric AS m
+            WHERE m.label_id = ld.label_id
+        ),
+        specification_ids = ARRAY(
+            SELECT id FROM "fertiscan_0.0.17".specification WHERE label_id = ld.label_id
+        ),
+        ingredient_ids = ARRAY(
+            SELECT id FROM "fertiscan_0.0.17".ingredient WHERE label_id = ld.label_id
+        ),
+        micronutrient_ids = ARRAY(
+            SELECT id FROM "fertiscan_0.0.17".micronutrient WHERE label_id = ld.label_id
+        ),
+        guaranteed_ids = ARRAY(
+            SELECT id FROM "fertiscan_0.0.17".guaranteed WHERE label_id = ld.label_id
+        ),
+        registration_number_ids = ARRAY(
+            SELECT id FROM "fertiscan_0.0.17".registration_number_information WHERE label_id = ld.label_id
+        )
+    WHERE ld.label_id = ANY(label_ids);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function shared by the child tables of label_information.
+-- The transition tables must be declared as new_rows (INSERT) and old_rows (DELETE).
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".olap_label_children_refresh()
+RETURNS TRIGGER AS $$
+DECLARE
+    label_ids uuid[];
+BEGIN
+    IF (TG_OP = 'INSERT') THEN
+        SELECT array_agg(DISTINCT label_id) INTO label_ids
+        FROM new_rows WHERE label_id IS NOT NULL;
+    ELSIF (TG_OP = 'DELETE') THEN
+        SELECT array_agg(DISTINCT label_id) INTO label_ids
+        FROM old_rows WHERE label_id IS NOT NULL;
+    END IF;
+    PERFORM "fertiscan_0.0.17".olap_refresh_label_dimension(label_ids);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,23 @@
+--Normalized address key for "fertiscan_0.0.17".location
+-- Organizations are linked to an existing location when their address matches. The match
+-- used to be an unanchored ILIKE over the whole table; it now compares a normalized key
+-- (lowercase, punctuation and whitespace collapsed) served by a btree index, and a trigram
+-- index is available for fuzzy searches. Run once after the schema creation; the statements
+-- are idempotent.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;
+
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".normalize_address(address text)
+RETURNS text AS $$
+    SELECT btrim(regexp_replace(regexp_replace(lower(address), '[[:punct:]]+', ' ', 'g'), '\s+', ' ', 'g'));
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE "fertiscan_0.0.17".location
+    ADD COLUMN IF NOT EXISTS "address_key" text
+    GENERATED ALWAYS AS ("fertiscan_0.0.17".normalize_address(address)) STORED;
+
+-- Exact match of the new and update inspection paths
+CREATE INDEX IF NOT EXISTS location_address_key_idx ON "fertiscan_0.0.17".location (address_key);
+
+-- Fuzzy match (address_key % normalize_address(...))
+CREATE INDEX IF NOT EXISTS location_address_key_trgm_idx ON "fertiscan_0.0.17".location USING gin (address_key public.gin_trgm_ops);
@@ -25,7 +25,7 @@ END IF;
         -- Check if organization location exists by address
         SELECT id INTO location_id
         FROM location
-        WHERE location.address ILIKE address_str
+        WHERE location.address_key = normalize_address(address_str)
         LIMIT 1;
     
         IF location_id IS NULL THEN 
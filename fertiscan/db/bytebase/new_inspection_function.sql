@@ -1,3 +1,42 @@
+-- Drop the ids resolve_labels (fertiscan.db.queries.reference) adds to a label: the unit_id
+-- of the metrics and the element_id of the guaranteed analysis. They are lookups for the
+-- inspection functions, not part of the label document that is stored and returned.
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".strip_label_references(label jsonb)
+ RETURNS jsonb
+ LANGUAGE plpgsql
+ IMMUTABLE
+AS $function$
+DECLARE
+	metric_type text;
+	lang text;
+BEGIN
+	IF jsonb_typeof(label #> '{product,metrics,weight}') = 'array' THEN
+		label := jsonb_set(label, '{product,metrics,weight}', (
+			SELECT COALESCE(jsonb_agg(
+				CASE WHEN jsonb_typeof(w) = 'object' THEN w - 'unit_id' ELSE w END
+				ORDER BY ord), '[]'::jsonb)
+			FROM jsonb_array_elements(label #> '{product,metrics,weight}') WITH ORDINALITY AS e(w, ord)
+		));
+	END IF;
+	FOREACH metric_type IN ARRAY ARRAY['density', 'volume'] LOOP
+		IF jsonb_typeof(label #> ARRAY['product', 'metrics', metric_type]) = 'object' THEN
+			label := label #- ARRAY['product', 'metrics', metric_type, 'unit_id'];
+		END IF;
+	END LOOP;
+	FOREACH lang IN ARRAY ARRAY['en', 'fr'] LOOP
+		IF jsonb_typeof(label #> ARRAY['guaranteed_analysis', lang]) = 'array' THEN
+			label := jsonb_set(label, ARRAY['guaranteed_analysis', lang], (
+				SELECT COALESCE(jsonb_agg(
+					CASE WHEN jsonb_typeof(g) = 'object' THEN g - 'element_id' ELSE g END
+					ORDER BY ord), '[]'::jsonb)
+				FROM jsonb_array_elements(label #> ARRAY['guaranteed_analysis', lang]) WITH ORDINALITY AS e(g, ord)
+			));
+		END IF;
+	END LOOP;
+	RETURN label;
+END;
+$function$;
+
 
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".new_inspection(user_id uuid, picture_set_id uuid, input_json jsonb)
  RETURNS jsonb
@@ -6,42 +45,13 @@ AS $function$
 DECLARE
     label_info_id uuid;
     sub_type_rec RECORD;
-    fr_values jsonb;
-    en_values jsonb;
-    record jsonb;
     inspection_id_value uuid;
     company_id uuid;
-    location_id uuid;
-	weight_id uuid;
-	density_id uuid;
-	volume_id uuid;
-	micronutrient_id uuid;
-    manufacturer_location_id uuid;
     manufacturer_id uuid;
-	ingredient_id uuid;
-	guaranteed_analysis_id uuid;
-	registration_number_id uuid;
-	time_id uuid;
-    unit_id uuid;
-    specification_id uuid;
-    sub_label_id uuid;
-    metric_type_id uuid;
-	key_string text;
-    read_value text;
-    read_unit text;
-    read_language text;
-    value_float float;
-    ingredient_language text;
-	micronutrient_language text;
 	name_string text;
 	address_string text;
 	website_string text;
 	phone_number_string text;
-    result_json jsonb := '{}';
-	guaranteed_analysis_language text;
-	max_length int;
-    fr_value text;
-    en_value text;
 BEGIN
 	
 -- COMPANY
@@ -113,243 +123,163 @@ BEGIN
 
 --LABEL END
 
---WEIGHT
-	-- Loop through each element in the 'weight' array
-    FOR record IN SELECT * FROM jsonb_array_elements(input_json-> 'product' -> 'metrics' -> 'weight')
-    LOOP
-        -- Extract the value and unit from the current weight record
-        read_value := record->>'value';
-       -- CHECK IF ANY FIELD IS NOT NULL
-		IF COALESCE(read_value,
-			record->>'unit',
-			'') <> '' 
-		THEN
-			-- Insert the new weight
-			weight_id = "fertiscan_0.0.17".new_metric_unit(
-				read_value::float,
-				record->>'unit',
-				label_info_id,
-				'weight'::"fertiscan_0.0.17".metric_type,
-				FALSE
-			);
-		END IF;
-	 END LOOP;
--- Weight end
-	
---DENSITY
- 	read_value := input_json -> 'product' -> 'metrics' ->'density'->> 'value';
- 	read_unit := input_json -> 'product' -> 'metrics' -> 'density'->> 'unit';
-	-- Check if density_value is not null and handle density_unit
-	IF read_value IS NOT NULL THEN
-	    --CHECK IS ANY FIELD IS NOT NULL
-		IF COALESCE(read_value,
-			read_unit,
-			'') <> ''
-		THEN
-			density_id := "fertiscan_0.0.17".new_metric_unit(
-				read_value::float,
-				read_unit,
-				label_info_id,
-				'density'::"fertiscan_0.0.17".metric_type,
-				FALSE
-			);
-		END IF;
-	END IF;
--- DENSITY END
+-- METRICS
+	-- Register the units that are not known yet, once per unit
+	-- (the unit_id is given when the caller resolved it through the reference cache)
+	INSERT INTO "fertiscan_0.0.17".unit (unit, to_si_unit)
+	SELECT DISTINCT ON (lower(m.unit)) m.unit, NULL
+	FROM (
+		SELECT w.unit, w.unit_id
+		FROM jsonb_to_recordset(input_json -> 'product' -> 'metrics' -> 'weight') AS w(value text, unit text, unit_id uuid)
+		WHERE COALESCE(w.value, w.unit, '') <> ''
+		UNION ALL
+		SELECT
+			input_json -> 'product' -> 'metrics' -> t ->> 'unit',
+			(input_json -> 'product' -> 'metrics' -> t ->> 'unit_id')::uuid
+		FROM unnest(ARRAY['density', 'volume']) AS t
+		WHERE input_json -> 'product' -> 'metrics' -> t ->> 'value' IS NOT NULL
+	) AS m
+	WHERE m.unit IS NOT NULL AND m.unit_id IS NULL
+		AND NOT EXISTS (SELECT 1 FROM "fertiscan_0.0.17".unit AS u WHERE u.unit ILIKE m.unit)
+	ORDER BY lower(m.unit);
+
+	-- Insert every metric in one statement, resolving its unit with a join
+	INSERT INTO "fertiscan_0.0.17".metric (value, unit_id, edited, metric_type, label_id)
+	SELECT
+		NULLIF(m.value, '')::float,
+		COALESCE(
+			m.unit_id,
+			(SELECT u.id FROM "fertiscan_0.0.17".unit AS u WHERE u.unit ILIKE m.unit LIMIT 1)
+		),
+		FALSE,
+		m.metric_type,
+		label_info_id
+	FROM (
+		SELECT 'weight'::"fertiscan_0.0.17".metric_type AS metric_type, w.value, w.unit, w.unit_id, w.ord
+		FROM ROWS FROM (
+			jsonb_to_recordset(input_json -> 'product' -> 'metrics' -> 'weight')
+				AS (value text, unit text, unit_id uuid)
+		) WITH ORDINALITY AS w(value, unit, unit_id, ord)
+		WHERE COALESCE(w.value, w.unit, '') <> ''
+		UNION ALL
+		SELECT
+			t::"fertiscan_0.0.17".metric_type,
+			input_json -> 'product' -> 'metrics' -> t ->> 'value',
+			input_json -> 'product' -> 'metrics' -> t ->> 'unit',
+			(input_json -> 'product' -> 'metrics' -> t ->> 'unit_id')::uuid,
+			t_ord
+		FROM unnest(ARRAY['density', 'volume']) WITH ORDINALITY AS d(t, t_ord)
+		-- The density and the volume are only registered when they have a value
+		WHERE input_json -> 'product' -> 'metrics' -> t ->> 'value' IS NOT NULL
+	) AS m
+	ORDER BY m.metric_type, m.ord;
+-- METRICS END
 
---VOLUME
- 	read_value := input_json -> 'product' -> 'metrics' -> 'volume'->> 'value';
- 	read_unit := input_json -> 'product' -> 'metrics' -> 'volume'->> 'unit';
-	-- Check if density_value is not null and handle density_unit
-	IF read_value IS NOT NULL THEN
-		value_float = read_value::float;
-	  	-- CHECK IF ANY FIELD IS NOT NULL
-		IF COALESCE(read_value,
-			read_unit,
-			'') <> '' 
-		THEN
-			-- Insert the new volume
-			volume_id := "fertiscan_0.0.17".new_metric_unit(
-				value_float,
-				read_unit,
-				label_info_id,
-				'volume'::"fertiscan_0.0.17".metric_type,
-				FALSE
-			);
-		END IF;
-	END IF;
--- Volume end
-   
 -- SPECIFICATION
---	FOR ingredient_language IN SELECT * FROM jsonb_object_keys(input_json->'specifications')
---	LOOP
---		FOR record IN SELECT * FROM jsonb_array_elements(input_json->'specifications'->ingredient_language)
---		LOOP
---			-- Check if any of the fields are not null
---			IF COALESCE(record->>'humidity', 
---				record->>'ph', 
---				record->>'solubility',
---				'') <> '' 
---			THEN
---				-- Insert the new specification
---				specification_id := "fertiscan_0.0.17".new_specification(
---					(record->>'humidity')::float,
---					(record->>'ph')::float,
---					(record->>'solubility')::float,
---					ingredient_language::"fertiscan_0.0.17".language,
---					label_info_id,
---					FALSE
---				);	
---			END IF;
---		END LOOP;
---	END LOOP;
+	-- Not handled yet
 -- SPECIFICATION END
 
--- --INGREDIENTS
- 	-- Loop through each language ('en' and 'fr')
- 	FOR ingredient_language  IN SELECT * FROM jsonb_object_keys(input_json->'ingredients')
- 	LOOP
-        -- Loop through each ingredient in the current language
-        FOR record IN SELECT * FROM jsonb_array_elements(input_json->'ingredients'->ingredient_language )
-        LOOP
-			-- Extract values from the current ingredient record
-			read_value := record->> 'value';
-				read_unit := record ->> 'unit';
-			-- Check if ANY field is not null
-			IF COALESCE(record->>'name', 
-				read_value, 
-				read_unit,
-				'') <> '' 
-			THEN
-				-- Insert the new ingredient
-				ingredient_id := "fertiscan_0.0.17".new_ingredient(
-					record->>'name',
-					read_value::float,
-					read_unit,
-					label_info_id,
-					ingredient_language::"fertiscan_0.0.17".language,
-					NULL, --We cant tell atm
-					NULL,  --We cant tell atm
-					FALSE  --preset
-				);
-			END IF;
-    	END LOOP;
- 	END LOOP;
+-- INGREDIENTS
+	-- Every language and every ingredient in one statement
+	INSERT INTO "fertiscan_0.0.17".ingredient (
+		organic, active, name, value, unit, edited, label_id, language
+	)
+	SELECT
+		NULL, --We cant tell atm
+		NULL, --We cant tell atm
+		i.name,
+		NULLIF(i.value, '')::float,
+		i.unit,
+		FALSE,
+		label_info_id,
+		l.key::"fertiscan_0.0.17".language
+	FROM jsonb_each(input_json -> 'ingredients') AS l(key, items),
+		ROWS FROM (
+			jsonb_to_recordset(l.items) AS (name text, value text, unit text)
+		) WITH ORDINALITY AS i(name, value, unit, ord)
+	WHERE COALESCE(i.name, i.value, i.unit, '') <> ''
+	ORDER BY l.key, i.ord;
 -- INGREDIENTS ENDS
 
 -- SUB LABELS
-	-- Loop through each sub_type
-   FOR sub_type_rec IN SELECT id, type_en FROM sub_type
+	-- Report the sub types where the French and English arrays do not match
+	FOR sub_type_rec IN
+		SELECT
+			s.type_en,
+			jsonb_array_length(COALESCE(input_json -> s.type_en -> 'en', '[]'::jsonb)) AS en_length,
+			jsonb_array_length(COALESCE(input_json -> s.type_en -> 'fr', '[]'::jsonb)) AS fr_length
+		FROM "fertiscan_0.0.17".sub_type AS s
 	LOOP
-		-- Extract the French and English arrays for the current sub_type
-		key_string := sub_type_rec.type_en;
-		en_values := COALESCE(input_json -> key_string -> 'en', '[]'::jsonb);
-		fr_values := COALESCE(input_json -> key_string -> 'fr', '[]'::jsonb);
-
-		-- Determine the maximum length of the arrays
-		max_length := GREATEST(
-			jsonb_array_length(fr_values),
-			jsonb_array_length(en_values)
-		);
-
-		-- Check if lengths are not equal, and raise a notice
-		IF jsonb_array_length(en_values) != jsonb_array_length(fr_values) THEN
-			RAISE NOTICE 'Array length mismatch for sub_type: %, EN length: %, FR length: %', 
-				sub_type_rec.type_en, jsonb_array_length(en_values), jsonb_array_length(fr_values);
+		IF sub_type_rec.en_length != sub_type_rec.fr_length THEN
+			RAISE NOTICE 'Array length mismatch for sub_type: %, EN length: %, FR length: %',
+				sub_type_rec.type_en, sub_type_rec.en_length, sub_type_rec.fr_length;
 		END IF;
-
-		-- Loop through the indices up to the maximum length
-		FOR i IN 0..(max_length - 1)
-		LOOP
-			-- Extract values or set to empty string if not present
-			fr_value := fr_values->>i;
-			en_value := en_values->>i;
-
-			-- Insert sub-label without deleting existing data
-			sub_label_id := "fertiscan_0.0.17".new_sub_label(
-				fr_value,
-				en_value,
-				label_info_id,
-				sub_type_rec.id,
-				FALSE
-			);
-		END LOOP;
 	END LOOP;
+
+	-- Pair the French and English values by position, for every sub type at once
+	INSERT INTO "fertiscan_0.0.17".sub_label (
+		text_content_fr, text_content_en, label_id, edited, sub_type_id
+	)
+	SELECT
+		COALESCE(input_json -> s.type_en -> 'fr', '[]'::jsonb) ->> i,
+		COALESCE(input_json -> s.type_en -> 'en', '[]'::jsonb) ->> i,
+		label_info_id,
+		FALSE,
+		s.id
+	FROM "fertiscan_0.0.17".sub_type AS s,
+		generate_series(
+			0,
+			GREATEST(
+				jsonb_array_length(COALESCE(input_json -> s.type_en -> 'fr', '[]'::jsonb)),
+				jsonb_array_length(COALESCE(input_json -> s.type_en -> 'en', '[]'::jsonb))
+			) - 1
+		) AS i
+	ORDER BY s.type_en, i;
 -- SUB_LABEL END
-  
-  -- MICRO NUTRIENTS
---		-- Loop through each language ('en' and 'fr')
---    FOR micronutrient_language  IN SELECT * FROM jsonb_object_keys(input_json->'micronutrients')
---	LOOP
---		FOR record IN SELECT * FROM jsonb_array_elements(input_json->'micronutrients'->micronutrient_language)
---		LOOP
---			-- Check if any of the fields are not null
---			IF COALESCE(record->>'name', 
---				record->>'value', 
---				record->>'unit',
---				'') <> '' 
---			THEN
---				-- Insert the new Micronutrient
---				micronutrient_id := "fertiscan_0.0.17".new_micronutrient(
---					record->> 'name',
---					(record->> 'value')::float,
---					record->> 'unit',
---					label_info_id,
---					micronutrient_language::"fertiscan_0.0.17".language
---				);
---			END IF;
---		END LOOP;
---	END LOOP;
---MICRONUTRIENTS ENDS
 
--- GUARANTEED
+-- MICRO NUTRIENTS
+	-- Not handled yet
+-- MICRONUTRIENTS ENDS
 
-		-- Loop through each language ('en' and 'fr')
-    FOR guaranteed_analysis_language  IN SELECT unnest(enum_range(NULL::"fertiscan_0.0.17".LANGUAGE))
-	LOOP
-		FOR record IN SELECT * FROM jsonb_array_elements(input_json->'guaranteed_analysis'->guaranteed_analysis_language)
-		LOOP
-			-- Check if any of the fields are not null
-			IF COALESCE(record->>'name', 
-				record->>'value', 
-				record->>'unit',
-				'') <> '' 
-			THEN
-				-- Insert the new guaranteed_analysis
-				guaranteed_analysis_id := "fertiscan_0.0.17".new_guaranteed_analysis(
-					record->>'name',
-					(record->>'value')::float,
-					record->>'unit',
-					label_info_id,
-					guaranteed_analysis_language::"fertiscan_0.0.17".language,
-					FALSE,
-					NULL -- We arent handeling element_id yet
-				);
-			END IF;
-		END LOOP;
-	END LOOP;
--- GUARANTEED END	
+-- GUARANTEED
+	-- Every language and every nutrient in one statement
+	INSERT INTO "fertiscan_0.0.17".guaranteed (
+		read_name, value, unit, edited, label_id, element_id, language
+	)
+	SELECT
+		g.name,
+		NULLIF(g.value, '')::float,
+		g.unit,
+		FALSE,
+		label_info_id,
+		g.element_id, -- Resolved by the caller through the reference cache, if any
+		l.language
+	FROM unnest(enum_range(NULL::"fertiscan_0.0.17".language)) AS l(language),
+		ROWS FROM (
+			jsonb_to_recordset(input_json -> 'guaranteed_analysis' -> l.language::text)
+				AS (name text, value text, unit text, element_id int)
+		) WITH ORDINALITY AS g(name, value, unit, element_id, ord)
+	WHERE COALESCE(g.name, g.value, g.unit, '') <> ''
+	ORDER BY l.language, g.ord;
+-- GUARANTEED END
 
 -- REGISTRATION NUMBER
-
-	-- Loop through each registration number in the JSON array
-	FOR record IN SELECT * FROM jsonb_array_elements(input_json-> 'product'-> 'registration_numbers')
-	LOOP
-		-- Check make sure we dont create an empty registration number
-		IF COALESCE(record->>'registration_number', 
-					'') <> '' 
-		THEN
-			-- Insert the new registration number
-			registration_number_id := "fertiscan_0.0.17".new_registration_number(
-				record->>'registration_number',
-				label_info_id,
-				(record->>'is_an_ingredient')::BOOLEAN,
-				null,
-				FALSE
-			);
-		END IF;
-	END LOOP;
-
+	-- Skip the empty registration numbers
+	INSERT INTO "fertiscan_0.0.17".registration_number_information (
+		identifier, is_an_ingredient, name, label_id, edited
+	)
+	SELECT
+		r.registration_number,
+		r.is_an_ingredient,
+		NULL,
+		label_info_id,
+		FALSE
+	FROM ROWS FROM (
+		jsonb_to_recordset(input_json -> 'product' -> 'registration_numbers')
+			AS (registration_number text, is_an_ingredient boolean)
+	) WITH ORDINALITY AS r(registration_number, is_an_ingredient, ord)
+	WHERE COALESCE(r.registration_number, '') <> ''
+	ORDER BY r.ord;
 -- REGISTRATION NUMBER END
 
 -- INSPECTION
@@ -367,6 +297,7 @@ BEGIN
 	-- Update input_json with company_id
 	input_json := jsonb_set(input_json, '{inspection_id}', to_jsonb(inspection_id_value));
 	input_json := jsonb_set(input_json, '{inspection_comment}', to_jsonb(''::text));
+	input_json := "fertiscan_0.0.17".strip_label_references(input_json);
 
 	-- TODO: remove olap transactions from Operational transactions
 	-- Update the Inspection_factual entry with the json
@@ -0,0 +1,33 @@
+-- Batch version of new_inspection: registers one inspection per element of the arrays.
+-- Each element runs in its own sub-transaction so a failing label does not roll back
+-- the others. One row is returned per element, in input order.
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".new_inspections(user_id uuid, picture_set_ids uuid[], input_jsons jsonb[])
+ RETURNS TABLE(item_index int, inspection_json jsonb, error text)
+ LANGUAGE plpgsql
+AS $function$
+DECLARE
+    nb_items int := COALESCE(array_length(input_jsons, 1), 0);
+BEGIN
+    IF COALESCE(array_length(picture_set_ids, 1), 0) <> nb_items THEN
+        RAISE EXCEPTION 'picture_set_ids and input_jsons must have the same length (% <> %)',
+            COALESCE(array_length(picture_set_ids, 1), 0), nb_items;
+    END IF;
+
+    FOR i IN 1..nb_items
+    LOOP
+        item_index := i - 1;
+        BEGIN
+            inspection_json := "fertiscan_0.0.17".new_inspection(
+                user_id,
+                picture_set_ids[i],
+                input_jsons[i]
+            );
+            error := NULL;
+        EXCEPTION WHEN OTHERS THEN
+            inspection_json := NULL;
+            error := SQLERRM;
+        END;
+        RETURN NEXT;
+    END LOOP;
+END;
+$function$;
@@ -0,0 +1,12 @@
+--Content-addressed pictures for "fertiscan_0.0.17".picture
+-- The sha256 of each uploaded picture is stored on its row. Pictures with the same content
+-- in the same user container share one blob, stored under objects/<checksum>; the number of
+-- rows referencing a checksum is its reference count. Run once after the schema creation;
+-- the statements are idempotent.
+
+ALTER TABLE "fertiscan_0.0.17".picture
+    ADD COLUMN IF NOT EXISTS "checksum" text;
+
+-- Reference lookups of the upload and delete paths
+CREATE INDEX IF NOT EXISTS picture_checksum_idx ON "fertiscan_0.0.17".picture (checksum)
+    WHERE checksum IS NOT NULL;
@@ -0,0 +1,49 @@
+--Version of the reference tables "fertiscan_0.0.17".element_compound and unit
+-- The in-process reference cache (fertiscan.db.queries.reference) reads this single row
+-- instead of scanning both tables to know if its copy is still current. Every change to
+-- the tables bumps the version; the transaction that made the change is flagged so the
+-- cache does not share its uncommitted rows. Run once after the schema creation; the
+-- statements are idempotent.
+
+CREATE TABLE IF NOT EXISTS "fertiscan_0.0.17".reference_version (
+    "id" boolean PRIMARY KEY DEFAULT TRUE CHECK (id),
+    "version" bigint NOT NULL DEFAULT 0
+);
+
+INSERT INTO "fertiscan_0.0.17".reference_version (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".bump_reference_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE "fertiscan_0.0.17".reference_version SET version = version + 1;
+    -- Transaction local: reverted with the (sub)transaction that changed the tables
+    PERFORM set_config('fertiscan.reference_changed', 'on', TRUE);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row level: the inspection functions run INSERT INTO unit ... statements that usually
+-- insert nothing, they must not bump the version (and lock its row) every time
+DROP TRIGGER IF EXISTS element_compound_reference_version ON "fertiscan_0.0.17".element_compound;
+CREATE TRIGGER element_compound_reference_version
+AFTER INSERT OR UPDATE OR DELETE ON "fertiscan_0.0.17".element_compound
+FOR EACH ROW
+EXECUTE FUNCTION "fertiscan_0.0.17".bump_reference_version();
+
+DROP TRIGGER IF EXISTS element_compound_reference_truncate ON "fertiscan_0.0.17".element_compound;
+CREATE TRIGGER element_compound_reference_truncate
+AFTER TRUNCATE ON "fertiscan_0.0.17".element_compound
+FOR EACH STATEMENT
+EXECUTE FUNCTION "fertiscan_0.0.17".bump_reference_version();
+
+DROP TRIGGER IF EXISTS unit_reference_version ON "fertiscan_0.0.17".unit;
+CREATE TRIGGER unit_reference_version
+AFTER INSERT OR UPDATE OR DELETE ON "fertiscan_0.0.17".unit
+FOR EACH ROW
+EXECUTE FUNCTION "fertiscan_0.0.17".bump_reference_version();
+
+DROP TRIGGER IF EXISTS unit_reference_truncate ON "fertiscan_0.0.17".unit;
+CREATE TRIGGER unit_reference_truncate
+AFTER TRUNCATE ON "fertiscan_0.0.17".unit
+FOR EACH STATEMENT
+EXECUTE FUNCTION "fertiscan_0.0.17".bump_reference_version();
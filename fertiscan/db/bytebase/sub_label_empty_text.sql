@@ -0,0 +1,14 @@
+--Missing sub_label texts of "fertiscan_0.0.17" are stored as ''
+-- The before_insert_sub_label trigger has always replaced a NULL text_content_fr or
+-- text_content_en with '' on insert, and update_sub_labels stores '' too for the rows it
+-- updates in place. This migrates the rows written while the trigger was not installed, so
+-- a missing text is '' on every row and never NULL. Run once after the schema creation;
+-- the statement is idempotent.
+
+UPDATE "fertiscan_0.0.17".sub_label
+SET
+    text_content_fr = COALESCE(text_content_fr, ''),
+    text_content_en = COALESCE(text_content_en, '')
+WHERE
+    text_content_fr IS NULL
+    OR text_content_en IS NULL;
@@ -1,31 +1,48 @@
-
 drop FUNCTION IF EXISTS "fertiscan_0.0.17".update_registration_number;
--- Function to update guaranteed analysis: delete old and insert new
+-- Function to update registration numbers: apply the differences with the existing ones,
+-- paired by position (see label_child_ordinal.sql)
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_registration_number(
     p_label_id uuid,
     new_registration_numbers jsonb
 )
 RETURNS void AS $$
-DECLARE
-    reg_num_record jsonb;
 BEGIN
-    -- Delete existing guaranteed analysis for the given label_id
-    DELETE FROM registration_number_information WHERE label_id = p_label_id;
-
-		FOR reg_num_record IN SELECT * FROM jsonb_array_elements(new_registration_numbers)
-        LOOP
-            INSERT INTO registration_number_information (
-                identifier,
-                is_an_ingredient,
-                label_id,
-                edited
-            )
-            VALUES (
-                reg_num_record->>'registration_number',
-                (reg_num_record->>'is_an_ingredient')::boolean,
-                p_label_id,
-                (reg_num_record->>'edited')::boolean
-            );
-        END LOOP;
+    WITH desired AS (
+        SELECT
+            r->>'registration_number' AS identifier,
+            (r->>'is_an_ingredient')::boolean AS is_an_ingredient,
+            (r->>'edited')::boolean AS edited,
+            ord AS pos
+        FROM jsonb_array_elements(COALESCE(new_registration_numbers, '[]'::jsonb)) WITH ORDINALITY AS e(r, ord)
+    ),
+    existing AS (
+        SELECT t.id,
+            row_number() OVER (ORDER BY t.ordinal, t.id) AS pos
+        FROM registration_number_information AS t
+        WHERE t.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE registration_number_information AS t
+        SET identifier = d.identifier, is_an_ingredient = d.is_an_ingredient, edited = d.edited
+        FROM existing AS e
+        JOIN desired AS d ON d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.identifier, t.is_an_ingredient, t.edited)
+                IS DISTINCT FROM (d.identifier, d.is_an_ingredient, d.edited)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM registration_number_information AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (SELECT 1 FROM desired AS d WHERE d.pos = e.pos)
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO registration_number_information (identifier, is_an_ingredient, label_id, edited)
+    SELECT d.identifier, d.is_an_ingredient, p_label_id, d.edited
+    FROM desired AS d
+    WHERE NOT EXISTS (SELECT 1 FROM existing AS e WHERE e.pos = d.pos)
+    ORDER BY d.pos;
 END;
 $$ LANGUAGE plpgsql;
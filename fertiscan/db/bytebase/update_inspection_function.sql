@@ -50,7 +50,7 @@ BEGIN
             -- Check if organization location exists by address
             SELECT id INTO location_id
             FROM location
-            WHERE location.address ILIKE address_str
+            WHERE location.address_key = normalize_address(address_str)
             LIMIT 1;
                 -- Use upsert_location to insert or update the location
             location_id := upsert_location(location_id, address_str);
@@ -81,268 +81,398 @@ END;
 $$ LANGUAGE plpgsql;
 
 
--- Function to update metrics: delete old and insert new
+-- The update_* functions below apply the incoming jsonb as a diff on the rows of the label.
+-- Within a list (same language / type), the stored rows in ordinal order (see
+-- label_child_ordinal.sql) are paired by position with the incoming rows in array order:
+--   1. a pair with the same values is left untouched,
+--   2. the other pairs are updated in place,
+--   3. the leftover stored rows are deleted, the leftover incoming rows inserted after them.
+-- Saving an unchanged draft therefore writes no row and leaves label_dimension untouched,
+-- and the document read back lists the rows in the order they were sent.
+
+-- Metric rows described by the metrics jsonb ({"weight": [...], "density": {...}, "volume": {...}})
+-- The unit_id is given when the caller resolved the unit through the reference cache
+drop FUNCTION IF EXISTS "fertiscan_0.0.17".metric_rows;
+CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".metric_rows(metrics jsonb)
+RETURNS TABLE (
+    metric_type "fertiscan_0.0.17".metric_type, value float, unit text, unit_id uuid, edited boolean, ord bigint
+) AS $$
+    SELECT
+        'weight'::"fertiscan_0.0.17".metric_type,
+        NULLIF(m->>'value', '')::float,
+        m->>'unit',
+        (m->>'unit_id')::uuid,
+        COALESCE((m->>'edited')::boolean, FALSE),
+        w.ord
+    FROM jsonb_array_elements(COALESCE(metrics->'weight', '[]'::jsonb)) WITH ORDINALITY AS w(m, ord)
+    UNION ALL
+    SELECT
+        t::"fertiscan_0.0.17".metric_type,
+        NULLIF(metrics->t->>'value', '')::float,
+        metrics->t->>'unit',
+        (metrics->t->>'unit_id')::uuid,
+        COALESCE((metrics->t->>'edited')::boolean, FALSE),
+        1
+    FROM unnest(ARRAY['density', 'volume']) AS t
+    WHERE metrics ? t;
+$$ LANGUAGE sql STABLE;
+
+
+-- Function to update metrics: apply the differences with the existing ones
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_metrics(
     p_label_id uuid,
     metrics jsonb
 )
 RETURNS void AS $$
-DECLARE
-    metric_record jsonb;
-    metric_type text;
-    metric_value float;
-    metric_unit text;
-    unit_id uuid;
-    edited_value boolean;
 BEGIN
-    -- Delete existing metrics for the given label_id
-    DELETE FROM metric WHERE label_id = p_label_id;
-
-    -- Handle weight metrics separately
-    IF metrics ? 'weight' THEN
-        FOR metric_record IN SELECT * FROM jsonb_array_elements(metrics->'weight')
-        LOOP
-            metric_value := NULLIF(metric_record->>'value', '')::float;
-            metric_unit := metric_record->>'unit';
-            edited_value := COALESCE((metric_record->>'edited')::boolean, FALSE);
-            
-            -- Proceed only if the value is not NULL
-            IF (metric_value IS NOT NULL) AND (metric_unit IS NOT NULL) THEN
-                -- Check if the metric unit is null
-                IF metric_unit IS NULL THEN
-                    RAISE WARNING 'Metric unit is null';
-                ELSE
-                    -- Fetch or insert the unit ID
-                    SELECT id INTO unit_id FROM unit WHERE unit = metric_unit LIMIT 1;
-                    IF unit_id IS NULL THEN
-                        INSERT INTO unit (unit) VALUES (metric_unit) RETURNING id INTO unit_id;
-                    END IF;
-                END IF;
-                -- Insert metric record for weight
-                INSERT INTO metric (id, value, unit_id, metric_type, label_id,edited)
-                VALUES (public.uuid_generate_v4(), metric_value, unit_id, 'weight'::metric_type, p_label_id,edited_value);
-            END IF;
-        END LOOP;
-    END IF;
-
-    -- Handle density and volume metrics
-    FOREACH metric_type IN ARRAY ARRAY['density', 'volume']
-    LOOP
-        IF metrics ? metric_type THEN
-            metric_record := metrics->metric_type;
-            metric_value := NULLIF(metric_record->>'value', '')::float;
-            metric_unit := metric_record->>'unit';
-            edited_value := COALESCE((metric_record->>'edited')::boolean, FALSE);
-                        -- Proceed only if the value is not NULL
-            IF (metric_value IS NOT NULL) AND (metric_unit IS NOT NULL) THEN
-                -- Check if the metric unit is null
-                IF metric_unit IS NULL THEN
-                    RAISE WARNING 'Metric unit is null';
-                ELSE
-                    -- Fetch or insert the unit ID
-                    SELECT id INTO unit_id FROM unit WHERE unit = metric_unit LIMIT 1;
-                    IF unit_id IS NULL THEN
-                        INSERT INTO unit (unit) VALUES (metric_unit) RETURNING id INTO unit_id;
-                    END IF;
-                END IF;
-                -- Insert metric record for weight
-                INSERT INTO metric (id, value, unit_id, metric_type, label_id,edited)
-                VALUES (public.uuid_generate_v4(), metric_value, unit_id, metric_type::metric_type, p_label_id,edited_value);
-            END IF;
-        END IF;
-    END LOOP;
-
+    -- Register the units that are not known yet
+    INSERT INTO unit (unit)
+    SELECT DISTINCT r.unit
+    FROM metric_rows(metrics) AS r
+    WHERE r.value IS NOT NULL AND r.unit IS NOT NULL AND r.unit_id IS NULL
+        AND NOT EXISTS (SELECT 1 FROM unit WHERE unit.unit = r.unit);
+
+    WITH desired AS (
+        SELECT
+            r.metric_type,
+            r.value,
+            COALESCE(r.unit_id, (SELECT id FROM unit WHERE unit.unit = r.unit LIMIT 1)) AS unit_id,
+            r.edited,
+            row_number() OVER (PARTITION BY r.metric_type ORDER BY r.ord) AS pos
+        FROM metric_rows(metrics) AS r
+        WHERE r.value IS NOT NULL AND r.unit IS NOT NULL
+    ),
+    existing AS (
+        SELECT m.id, m.metric_type,
+            row_number() OVER (PARTITION BY m.metric_type ORDER BY m.ordinal, m.id) AS pos
+        FROM metric AS m
+        WHERE m.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE metric AS t
+        SET value = d.value, unit_id = d.unit_id, edited = d.edited
+        FROM existing AS e
+        JOIN desired AS d ON d.metric_type = e.metric_type AND d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.value, t.unit_id, COALESCE(t.edited, FALSE))
+                IS DISTINCT FROM (d.value, d.unit_id, d.edited)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM metric AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (
+                SELECT 1 FROM desired AS d WHERE d.metric_type = e.metric_type AND d.pos = e.pos
+            )
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO metric (value, unit_id, metric_type, label_id, edited)
+    SELECT d.value, d.unit_id, d.metric_type, p_label_id, d.edited
+    FROM desired AS d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM existing AS e WHERE e.metric_type = d.metric_type AND e.pos = d.pos
+    )
+    ORDER BY d.metric_type, d.pos;
 END;
 $$ LANGUAGE plpgsql;
 
-
--- Function to update specifications: delete old and insert new
+-- Function to update specifications: apply the differences with the existing ones
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_specifications(
     p_label_id uuid,
     new_specifications jsonb
 )
 RETURNS void AS $$
-DECLARE
-    spec_language text;
-    spec_record jsonb;
 BEGIN
-    -- Delete existing specifications for the given label_id
-    DELETE FROM specification WHERE label_id = p_label_id;
+    -- Warn about the records where every value is empty: they are not stored
+    IF EXISTS (
+        SELECT 1
+        FROM jsonb_each(COALESCE(new_specifications, '{}'::jsonb)) AS l(lang, items),
+            jsonb_array_elements(l.items) WITH ORDINALITY AS e(j, ord)
+        WHERE NOT COALESCE(
+            e.j->>'humidity',
+            e.j->>'ph',
+            e.j->>'solubility',
+            '') <> ''
+    ) THEN
+        RAISE WARNING 'ALL SPECIFICATION VALUES WERE NULL';
+    END IF;
 
-    -- Insert new specifications
-    FOR spec_language IN SELECT * FROM jsonb_object_keys(new_specifications)
-    LOOP
-        FOR spec_record IN SELECT * FROM jsonb_array_elements(new_specifications -> spec_language)
-        LOOP
-            -- CHECK IF ANY OF THE VALUES ARE NOT NULL
-            IF COALESCE(
-                spec_record->>'humidity', 
-                spec_record->>'ph', 
-                spec_record->>'solubility',
-                '') <> ''
-            THEN
-                -- Insert each specification record
-                INSERT INTO specification (
-                    humidity, ph, solubility, edited, label_id, language
-                )
-                VALUES (
-                    (spec_record->>'humidity')::float,
-                    (spec_record->>'ph')::float,
-                    (spec_record->>'solubility')::float,
-                    COALESCE(spec_record->>'edited','False')::boolean,
-                    p_label_id,
-                    spec_language::language
-                );
-            ELSE
-                RAISE WARNING 'ALL SPECIFICATION VALUES WERE NULL';
-            END IF;
-        END LOOP;
-    END LOOP;
+    WITH desired AS (
+        SELECT
+            (e.j->>'humidity')::float AS humidity,
+            (e.j->>'ph')::float AS ph,
+            (e.j->>'solubility')::float AS solubility,
+            COALESCE(e.j->>'edited', 'False')::boolean AS edited,
+            l.lang::"fertiscan_0.0.17".language AS language,
+            row_number() OVER (PARTITION BY l.lang ORDER BY e.ord) AS pos
+        FROM
+            jsonb_each(COALESCE(new_specifications, '{}'::jsonb)) AS l(lang, items),
+            jsonb_array_elements(l.items) WITH ORDINALITY AS e(j, ord)
+        WHERE COALESCE(
+            e.j->>'humidity',
+            e.j->>'ph',
+            e.j->>'solubility',
+            '') <> ''
+    ),
+    existing AS (
+        SELECT t.id, t.language,
+            row_number() OVER (PARTITION BY t.language ORDER BY t.ordinal, t.id) AS pos
+        FROM specification AS t
+        WHERE t.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE specification AS t
+        SET humidity = d.humidity, ph = d.ph, solubility = d.solubility, edited = d.edited
+        FROM existing AS e
+        JOIN desired AS d ON d.language = e.language AND d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.humidity, t.ph, t.solubility, t.edited)
+                IS DISTINCT FROM (d.humidity, d.ph, d.solubility, d.edited)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM specification AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (
+                SELECT 1 FROM desired AS d WHERE d.language = e.language AND d.pos = e.pos
+            )
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO specification (humidity, ph, solubility, edited, label_id, language)
+    SELECT d.humidity, d.ph, d.solubility, d.edited, p_label_id, d.language
+    FROM desired AS d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM existing AS e WHERE e.language = d.language AND e.pos = d.pos
+    )
+    ORDER BY d.language, d.pos;
 END;
 $$ LANGUAGE plpgsql;
 
-
--- Function to update ingredients: delete old and insert new
+-- Function to update ingredients: apply the differences with the existing ones
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_ingredients(
     p_label_id uuid,
     new_ingredients jsonb
 )
 RETURNS void AS $$
-DECLARE
-    ingredient_language text;
-    ingredient_record jsonb;
 BEGIN
-    -- Delete existing ingredients for the given label_id
-    DELETE FROM ingredient WHERE label_id = p_label_id;
+    -- Warn about the records where every value is empty: they are not stored
+    IF EXISTS (
+        SELECT 1
+        FROM jsonb_each(COALESCE(new_ingredients, '{}'::jsonb)) AS l(lang, items),
+            jsonb_array_elements(l.items) WITH ORDINALITY AS e(j, ord)
+        WHERE NOT COALESCE(
+            e.j->>'name',
+            e.j->>'value',
+            e.j->>'unit',
+            '') <> ''
+    ) THEN
+        RAISE WARNING 'ALL INGREDIENT VALUES WERE NULL';
+    END IF;
 
-    -- Insert new ingredients
-    FOR ingredient_language IN SELECT * FROM jsonb_object_keys(new_ingredients)
-    LOOP
-        FOR ingredient_record IN SELECT * FROM jsonb_array_elements(new_ingredients -> ingredient_language)
-        LOOP
-            -- CHECK IF ANY OF THE VALUES ARE NOT NULL
-            IF COALESCE(
-                ingredient_record->>'name', 
-                ingredient_record->>'value', 
-                ingredient_record->>'unit',
-                '') <> ''
-            THEN
-                -- Insert each ingredient record
-                INSERT INTO ingredient (
-                    organic, active, name, value, unit, edited, label_id, language
-                )
-                VALUES (
-                    NULL, -- not yet handled
-                    NULL, -- not yet handled
-                    ingredient_record->>'name',
-                    NULLIF(ingredient_record->>'value', '')::float,
-                    ingredient_record->>'unit',
-                    FALSE, -- not yet handled
-                    p_label_id,
-                    ingredient_language::language
-                );
-            ELSE
-                RAISE WARNING 'ALL INGREDIENT VALUES WERE NULL';
-            END IF;
-        END LOOP;
-    END LOOP;
+    WITH desired AS (
+        SELECT
+            e.j->>'name' AS name,
+            NULLIF(e.j->>'value', '')::float AS value,
+            e.j->>'unit' AS unit,
+            l.lang::"fertiscan_0.0.17".language AS language,
+            row_number() OVER (PARTITION BY l.lang ORDER BY e.ord) AS pos
+        FROM
+            jsonb_each(COALESCE(new_ingredients, '{}'::jsonb)) AS l(lang, items),
+            jsonb_array_elements(l.items) WITH ORDINALITY AS e(j, ord)
+        WHERE COALESCE(
+            e.j->>'name',
+            e.j->>'value',
+            e.j->>'unit',
+            '') <> ''
+    ),
+    existing AS (
+        SELECT t.id, t.language,
+            row_number() OVER (PARTITION BY t.language ORDER BY t.ordinal, t.id) AS pos
+        FROM ingredient AS t
+        WHERE t.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE ingredient AS t
+        SET name = d.name, value = d.value, unit = d.unit, organic = NULL, active = NULL, edited = FALSE
+        FROM existing AS e
+        JOIN desired AS d ON d.language = e.language AND d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.name, t.value, t.unit)
+                IS DISTINCT FROM (d.name, d.value, d.unit)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM ingredient AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (
+                SELECT 1 FROM desired AS d WHERE d.language = e.language AND d.pos = e.pos
+            )
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO ingredient (name, value, unit, organic, active, edited, label_id, language)
+    SELECT d.name, d.value, d.unit, NULL, NULL, FALSE, p_label_id, d.language
+    FROM desired AS d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM existing AS e WHERE e.language = d.language AND e.pos = d.pos
+    )
+    ORDER BY d.language, d.pos;
 END;
 $$ LANGUAGE plpgsql;
 
-
--- Function to update micronutrients: delete old and insert new
+-- Function to update micronutrients: apply the differences with the existing ones
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_micronutrients(
     p_label_id uuid,
     new_micronutrients jsonb
 )
 RETURNS void AS $$
-DECLARE
-    nutrient_language text;
-    nutrient_record jsonb;
 BEGIN
-    -- Delete existing micronutrients for the given label_id
-    DELETE FROM micronutrient WHERE label_id = p_label_id;
+    -- Warn about the records where every value is empty: they are not stored
+    IF EXISTS (
+        SELECT 1
+        FROM jsonb_each(COALESCE(new_micronutrients, '{}'::jsonb)) AS l(lang, items),
+            jsonb_array_elements(l.items) WITH ORDINALITY AS e(j, ord)
+        WHERE NOT COALESCE(
+            e.j->>'name',
+            e.j->>'value',
+            e.j->>'unit',
+            '') <> ''
+    ) THEN
+        RAISE WARNING 'ALL MICRONUTRIENT VALUES WERE NULL';
+    END IF;
 
-    -- Insert new micronutrients
-    FOR nutrient_language IN SELECT * FROM jsonb_object_keys(new_micronutrients)
-    LOOP
-        FOR nutrient_record IN SELECT * FROM jsonb_array_elements(new_micronutrients -> nutrient_language)
-        LOOP
-            -- CHECK IF ANY OF THE VALUES ARE NOT NULL
-            IF COALESCE(
-                nutrient_record->>'name', 
-                nutrient_record->>'value', 
-                nutrient_record->>'unit',
-                '') <> ''
-            THEN
-                -- Insert each micronutrient record
-                INSERT INTO micronutrient (
-                    read_name, value, unit, edited, label_id, language
-                )
-                VALUES (
-                    nutrient_record->>'name',
-                    NULLIF(nutrient_record->>'value', '')::float,
-                    nutrient_record->>'unit',
-                    FALSE,  -- not handled
-                    p_label_id,
-                    nutrient_language::language
-                );
-            ELSE
-                RAISE WARNING 'ALL MICRONUTRIENT VALUES WERE NULL';
-            END IF;
-        END LOOP;
-    END LOOP;
+    WITH desired AS (
+        SELECT
+            e.j->>'name' AS read_name,
+            NULLIF(e.j->>'value', '')::float AS value,
+            e.j->>'unit' AS unit,
+            l.lang::"fertiscan_0.0.17".language AS language,
+            row_number() OVER (PARTITION BY l.lang ORDER BY e.ord) AS pos
+        FROM
+            jsonb_each(COALESCE(new_micronutrients, '{}'::jsonb)) AS l(lang, items),
+            jsonb_array_elements(l.items) WITH ORDINALITY AS e(j, ord)
+        WHERE COALESCE(
+            e.j->>'name',
+            e.j->>'value',
+            e.j->>'unit',
+            '') <> ''
+    ),
+    existing AS (
+        SELECT t.id, t.language,
+            row_number() OVER (PARTITION BY t.language ORDER BY t.ordinal, t.id) AS pos
+        FROM micronutrient AS t
+        WHERE t.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE micronutrient AS t
+        SET read_name = d.read_name, value = d.value, unit = d.unit, element_id = NULL, edited = FALSE
+        FROM existing AS e
+        JOIN desired AS d ON d.language = e.language AND d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.read_name, t.value, t.unit)
+                IS DISTINCT FROM (d.read_name, d.value, d.unit)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM micronutrient AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (
+                SELECT 1 FROM desired AS d WHERE d.language = e.language AND d.pos = e.pos
+            )
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO micronutrient (read_name, value, unit, element_id, edited, label_id, language)
+    SELECT d.read_name, d.value, d.unit, NULL, FALSE, p_label_id, d.language
+    FROM desired AS d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM existing AS e WHERE e.language = d.language AND e.pos = d.pos
+    )
+    ORDER BY d.language, d.pos;
 END;
 $$ LANGUAGE plpgsql;
 
 drop FUNCTION IF EXISTS "fertiscan_0.0.17".update_guaranteed;
--- Function to update guaranteed analysis: delete old and insert new
+-- Function to update guaranteed analysis: apply the differences with the existing ones
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_guaranteed(
     p_label_id uuid,
     new_guaranteed jsonb
 )
 RETURNS void AS $$
-DECLARE
-    guaranteed_record jsonb;
-    language_record record;
-    guaranteed_analysis_language text;
 BEGIN
-    -- Delete existing guaranteed analysis for the given label_id
-    DELETE FROM guaranteed WHERE label_id = p_label_id;
-
-	-- Loop through each language ('en' and 'fr')
-    FOR guaranteed_analysis_language  IN SELECT unnest(enum_range(NULL::"fertiscan_0.0.17".LANGUAGE))
-	LOOP
-		FOR guaranteed_record IN SELECT * FROM jsonb_array_elements(new_guaranteed->guaranteed_analysis_language)
-		LOOP
-            --CHECK IF ANY OF THE VALUES ARE NOT NULL
-            IF COALESCE(
-                guaranteed_record->>'name', 
-                guaranteed_record->>'value', 
-                guaranteed_record->>'unit',
-                '') <> ''
-            THEN
-                -- Insert each guaranteed analysis record
-                INSERT INTO guaranteed (
-                    read_name, value, unit, edited, label_id, language
-                )
-                VALUES (
-                    guaranteed_record->>'name',
-                    NULLIF(guaranteed_record->>'value', '')::float,
-                    guaranteed_record->>'unit',
-                    FALSE,  -- not handled
-                    p_label_id,
-                    guaranteed_analysis_language::language
-                );
-            ELSE
-                RAISE EXCEPTION 'ALL GUARANTEED ANALYSIS VALUES WERE NULL';
-            END IF;
-        END LOOP;
-    END LOOP;
+    -- Reject the records where every value is empty
+    IF EXISTS (
+        SELECT 1
+        FROM unnest(enum_range(NULL::"fertiscan_0.0.17".LANGUAGE)) AS l(lang),
+            jsonb_array_elements(COALESCE(new_guaranteed->l.lang::text, '[]'::jsonb)) WITH ORDINALITY AS e(j, ord)
+        WHERE NOT COALESCE(
+            e.j->>'name',
+            e.j->>'value',
+            e.j->>'unit',
+            '') <> ''
+    ) THEN
+        RAISE EXCEPTION 'ALL GUARANTEED ANALYSIS VALUES WERE NULL';
+    END IF;
+
+    WITH desired AS (
+        SELECT
+            e.j->>'name' AS read_name,
+            NULLIF(e.j->>'value', '')::float AS value,
+            e.j->>'unit' AS unit,
+            (e.j->>'element_id')::int AS element_id,
+            l.lang::"fertiscan_0.0.17".language AS language,
+            row_number() OVER (PARTITION BY l.lang ORDER BY e.ord) AS pos
+        FROM
+            unnest(enum_range(NULL::"fertiscan_0.0.17".LANGUAGE)) AS l(lang),
+            jsonb_array_elements(COALESCE(new_guaranteed->l.lang::text, '[]'::jsonb)) WITH ORDINALITY AS e(j, ord)
+        WHERE COALESCE(
+            e.j->>'name',
+            e.j->>'value',
+            e.j->>'unit',
+            '') <> ''
+    ),
+    existing AS (
+        SELECT t.id, t.language,
+            row_number() OVER (PARTITION BY t.language ORDER BY t.ordinal, t.id) AS pos
+        FROM guaranteed AS t
+        WHERE t.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE guaranteed AS t
+        SET read_name = d.read_name, value = d.value, unit = d.unit, element_id = d.element_id, edited = FALSE
+        FROM existing AS e
+        JOIN desired AS d ON d.language = e.language AND d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.read_name, t.value, t.unit)
+                IS DISTINCT FROM (d.read_name, d.value, d.unit)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM guaranteed AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (
+                SELECT 1 FROM desired AS d WHERE d.language = e.language AND d.pos = e.pos
+            )
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO guaranteed (read_name, value, unit, element_id, edited, label_id, language)
+    SELECT d.read_name, d.value, d.unit, d.element_id, FALSE, p_label_id, d.language
+    FROM desired AS d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM existing AS e WHERE e.language = d.language AND e.pos = d.pos
+    )
+    ORDER BY d.language, d.pos;
 END;
 $$ LANGUAGE plpgsql;
 
-
 -- Function to check if both text_content_fr and text_content_en are NULL or empty, and skip insertion if true
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".check_null_or_empty_sub_label()
 RETURNS TRIGGER AS $$
@@ -378,7 +508,7 @@ FOR EACH ROW
 EXECUTE FUNCTION "fertiscan_0.0.17".check_null_or_empty_sub_label();
 
 
--- Function to update sub labels: delete old and insert new
+-- Function to update sub labels: apply the differences with the existing ones
 CREATE OR REPLACE FUNCTION "fertiscan_0.0.17".update_sub_labels(
     p_label_id uuid,
     new_sub_labels jsonb
@@ -388,53 +518,79 @@ DECLARE
     sub_type_rec RECORD;
     fr_values jsonb;
     en_values jsonb;
-    i int;
-    max_length int;
-    fr_value text;
-    en_value text;
 BEGIN
-    -- Delete existing sub labels for the given label_id
-    DELETE FROM sub_label WHERE label_id = p_label_id;
-
-    -- Loop through each sub_type
+    -- Loop through each sub_type to validate the French and English arrays
     FOR sub_type_rec IN SELECT id, type_en FROM sub_type
     LOOP
-        -- Extract the French and English arrays for the current sub_type
         fr_values := COALESCE(new_sub_labels->sub_type_rec.type_en->'fr', '[]'::jsonb);
         en_values := COALESCE(new_sub_labels->sub_type_rec.type_en->'en', '[]'::jsonb);
 
-        -- Determine the maximum length of the arrays
-        max_length := GREATEST(
-            jsonb_array_length(fr_values),
-            jsonb_array_length(en_values)
-        );
-
         -- Check if lengths are not equal, and raise a notice
 		IF jsonb_array_length(en_values) != jsonb_array_length(fr_values) THEN
 			RAISE NOTICE 'Array length mismatch for sub_type: %, EN length: %, FR length: %', 
 				sub_type_rec.type_en, jsonb_array_length(en_values), jsonb_array_length(fr_values);
 		END IF;
 
-        -- Loop through the indices up to the maximum length
-        FOR i IN 0..(max_length - 1)
-        LOOP
-            -- Extract values or set to empty string if not present
-            fr_value := fr_values->>i;
-            en_value := en_values->>i;
+        -- Same rule as the before_insert_sub_label trigger, also enforced for the rows updated in place
+        IF EXISTS (
+            SELECT 1
+            FROM generate_series(0, GREATEST(jsonb_array_length(fr_values), jsonb_array_length(en_values)) - 1) AS i
+            WHERE COALESCE(fr_values->>i, '') = '' AND COALESCE(en_values->>i, '') = ''
+        ) THEN
+            RAISE EXCEPTION 'Skipping insertion because both text_content_fr and text_content_en are NULL or empty';
+        END IF;
+    END LOOP;
 
-            -- Insert sub label record
-            INSERT INTO sub_label (
-                text_content_fr, text_content_en, label_id, edited, sub_type_id
+    -- A missing text is stored as '', like the before_insert_sub_label trigger does on
+    -- insert (see sub_label_empty_text.sql), so the rows updated in place match the others
+    WITH desired AS (
+        SELECT
+            st.id AS sub_type_id,
+            COALESCE(v.fr->>i, '') AS text_content_fr,
+            COALESCE(v.en->>i, '') AS text_content_en,
+            i + 1 AS pos
+        FROM
+            sub_type AS st,
+            LATERAL (
+                SELECT
+                    COALESCE(new_sub_labels->st.type_en->'fr', '[]'::jsonb) AS fr,
+                    COALESCE(new_sub_labels->st.type_en->'en', '[]'::jsonb) AS en
+            ) AS v,
+            generate_series(0, GREATEST(jsonb_array_length(v.fr), jsonb_array_length(v.en)) - 1) AS i
+    ),
+    existing AS (
+        SELECT t.id, t.sub_type_id,
+            row_number() OVER (PARTITION BY t.sub_type_id ORDER BY t.ordinal, t.id) AS pos
+        FROM sub_label AS t
+        WHERE t.label_id = p_label_id
+    ),
+    updated AS (
+        UPDATE sub_label AS t
+        SET text_content_fr = d.text_content_fr, text_content_en = d.text_content_en, edited = NULL
+        FROM existing AS e
+        JOIN desired AS d ON d.sub_type_id = e.sub_type_id AND d.pos = e.pos
+        WHERE t.id = e.id
+            AND (t.text_content_fr, t.text_content_en)
+                IS DISTINCT FROM (d.text_content_fr, d.text_content_en)
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM sub_label AS t
+        USING existing AS e
+        WHERE t.id = e.id
+            AND NOT EXISTS (
+                SELECT 1 FROM desired AS d WHERE d.sub_type_id = e.sub_type_id AND d.pos = e.pos
             )
-            VALUES (
-                fr_value,
-                en_value,
-                p_label_id,
-                NULL,  -- not handled
-                sub_type_rec.id
-            );
-        END LOOP;
-    END LOOP;
+        RETURNING t.id
+    )
+    -- The new rows take the next ordinals, after the rows kept
+    INSERT INTO sub_label (text_content_fr, text_content_en, label_id, edited, sub_type_id)
+    SELECT d.text_content_fr, d.text_content_en, p_label_id, NULL, d.sub_type_id -- edited not handled
+    FROM desired AS d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM existing AS e WHERE e.sub_type_id = d.sub_type_id AND e.pos = d.pos
+    )
+    ORDER BY d.sub_type_id, d.pos;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -672,8 +828,8 @@ BEGIN
         );
     END IF;
 
-    -- Return the updated JSON without fertilizer_id
-    RETURN updated_json;
+    -- Return the updated JSON without fertilizer_id nor the resolved reference ids
+    RETURN strip_label_references(updated_json);
 
 END;
 $$ LANGUAGE plpgsql;
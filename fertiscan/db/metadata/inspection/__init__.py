@@ -9,6 +9,7 @@ from typing import List, Optional
 
 from pydantic import UUID4, BaseModel, ValidationError, model_validator
 
+from datastore.db.metadata import validator
 from fertiscan.db.metadata.errors import (
     BuildInspectionExportError,
     BuildInspectionImportError,
@@ -25,7 +26,7 @@ from fertiscan.db.queries import (
     registration_number,
     ingredient,
 )
-from fertiscan.db.queries.errors import QueryError
+from fertiscan.db.queries.errors import InspectionNotFoundError, QueryError
 
 
 class ValidatedModel(BaseModel):
@@ -193,173 +194,102 @@ def build_inspection_import(analysis_form: dict, user_id) -> str:
 
         npk = extract_npk(analysis_form.get("npk"))
 
-        company = OrganizationInformation(
-            name=analysis_form.get("company_name"),
-            address=analysis_form.get("company_address"),
-            website=analysis_form.get("company_website"),
-            phone_number=analysis_form.get("company_phone_number"),
-        )
-        manufacturer = OrganizationInformation(
-            name=analysis_form.get("manufacturer_name"),
-            address=analysis_form.get("manufacturer_address"),
-            website=analysis_form.get("manufacturer_website"),
-            phone_number=analysis_form.get("manufacturer_phone_number"),
-        )
-
-        weights: list[Metric] = [
-            Metric(
-                unit=weight.get("unit"),
-                value=weight.get("value"),
-            )
+        company = {
+            "name": analysis_form.get("company_name"),
+            "address": analysis_form.get("company_address"),
+            "website": analysis_form.get("company_website"),
+            "phone_number": analysis_form.get("company_phone_number"),
+        }
+        manufacturer = {
+            "name": analysis_form.get("manufacturer_name"),
+            "address": analysis_form.get("manufacturer_address"),
+            "website": analysis_form.get("manufacturer_website"),
+            "phone_number": analysis_form.get("manufacturer_phone_number"),
+        }
+
+        weights = [
+            {"unit": weight.get("unit"), "value": weight.get("value")}
             for weight in analysis_form.get("weight", [])
         ]
 
-        volume_obj = Metric()
+        volume_obj = {}
         if volume := analysis_form.get("volume"):
-            volume_obj = Metric(unit=volume.get("unit"), value=volume.get("value"))
+            volume_obj = {"unit": volume.get("unit"), "value": volume.get("value")}
 
-        density_obj = Metric()
+        density_obj = {}
         if density := analysis_form.get("density"):
-            density_obj = Metric(unit=density.get("unit"), value=density.get("value"))
-
-        metrics = Metrics(weight=weights, volume=volume_obj, density=density_obj)
-
-        reg_numbers = []
-        for reg_number in analysis_form.get("registration_number", []):
-            reg_numbers.append(
-                RegistrationNumber(
-                    registration_number=reg_number.get("identifier"),
-                    is_an_ingredient=(reg_number.get("type") == "Ingredient"),
-                )
-            )
-
-        # record keeping is set as null since the pipeline cant output a value yet
-        product = ProductInformation(
-            name=analysis_form.get("fertiliser_name"),
-            lot_number=analysis_form.get("lot_number"),
-            metrics=metrics,
-            registration_numbers=reg_numbers,
-            npk=analysis_form.get("npk"),
-            warranty=analysis_form.get("warranty"),
-            n=npk[0],
-            p=npk[1],
-            k=npk[2],
-            verified=False,
-            record_keeping=None,
-        )
-
+            density_obj = {"unit": density.get("unit"), "value": density.get("value")}
 
-        cautions = SubLabel(
-            en=analysis_form.get("cautions_en", []),
-            fr=analysis_form.get("cautions_fr", []),
-        )
-
-        instructions = SubLabel(
-            en=analysis_form.get("instructions_en", []),
-            fr=analysis_form.get("instructions_fr", []),
-        )
-
-        # Commented and kept as reference for future implementation, but not used at the moment
-        # micro_en: list[Value] = [
-        #     Value(
-        #         unit=nutrient.get("unit") or None,
-        #         value=nutrient.get("value") or None,
-        #         name=nutrient.get("nutrient"),
-        #     )
-        #     for nutrient in analysis_form.get("micronutrients_en", [])
-        # ]
-        # micro_fr: list[Value] = [
-        #     Value(
-        #         unit=nutrient.get("unit") or None,
-        #         value=nutrient.get("value") or None,
-        #         name=nutrient.get("nutrient"),
-        #     )
-        #     for nutrient in analysis_form.get("micronutrients_fr", [])
-        # ]
-        # micronutrients = ValuesObjects(en=micro_en, fr=micro_fr)
-
-        ingredients_en: list[Value] = [
-            Value(
-                unit=ingredient.get("unit") or None,
-                value=ingredient.get("value") or None,
-                name=ingredient.get("nutrient"),
-            )
-            for ingredient in analysis_form.get("ingredients_en", [])
-        ]
-        ingredients_fr: list[Value] = [
-            Value(
-                unit=ingredient.get("unit") or None,
-                value=ingredient.get("value") or None,
-                name=ingredient.get("nutrient"),
-            )
-            for ingredient in analysis_form.get("ingredients_fr", [])
-        ]
-        ingredients = ValuesObjects(en=ingredients_en, fr=ingredients_fr)
-
-        # specifications = Specifications(
-        #     en=[
-        #         Specification(**s)
-        #         for s in analysis_form.get("specifications_en", [])
-        #         if any(value is not None for _, value in s.items())
-        #     ],
-        #     fr=[
-        #         Specification(**s)
-        #         for s in analysis_form.get("specifications_fr", [])
-        #         if any(value is not None for _, value in s.items())
-        #     ],
-        # )
-
-        # first_aid = SubLabel(
-        #     en=analysis_form.get("first_aid_en", []),
-        #     fr=analysis_form.get("first_aid_fr", []),
-        # )
-
-        guaranteed_fr: list[Value] = [
-            Value(
-                unit=item.get("unit") or None,
-                value=item.get("value") or None,
-                name=item.get("nutrient"),
-            )
-            for item in analysis_form.get("guaranteed_analysis_fr", []).get(
-                "nutrients", []
-            )
-        ]
+        metrics = {"weight": weights, "volume": volume_obj, "density": density_obj}
 
-        guaranteed_en: list[Value] = [
-            Value(
-                unit=item.get("unit") or None,
-                value=item.get("value") or None,
-                name=item.get("nutrient"),
-            )
-            for item in analysis_form.get("guaranteed_analysis_en", []).get(
-                "nutrients", []
-            )
+        reg_numbers = [
+            {
+                "registration_number": reg_number.get("identifier"),
+                "is_an_ingredient": (reg_number.get("type") == "Ingredient"),
+            }
+            for reg_number in analysis_form.get("registration_number", [])
         ]
 
-        guaranteed = GuaranteedAnalysis(
-            title=Title(
-                en=analysis_form.get("guaranteed_analysis_en", {}).get("title"),
-                fr=analysis_form.get("guaranteed_analysis_fr", {}).get("title"),
-            ),
+        # record keeping is set as null since the pipeline cant output a value yet
+        product = {
+            "name": analysis_form.get("fertiliser_name"),
+            "lot_number": analysis_form.get("lot_number"),
+            "metrics": metrics,
+            "registration_numbers": reg_numbers,
+            "npk": analysis_form.get("npk"),
+            "warranty": analysis_form.get("warranty"),
+            "n": npk[0],
+            "p": npk[1],
+            "k": npk[2],
+            "verified": False,
+            "record_keeping": None,
+        }
+
+        cautions = {
+            "en": analysis_form.get("cautions_en", []),
+            "fr": analysis_form.get("cautions_fr", []),
+        }
+
+        instructions = {
+            "en": analysis_form.get("instructions_en", []),
+            "fr": analysis_form.get("instructions_fr", []),
+        }
+
+        # Micronutrients, specifications and first aid are not used at the moment
+        ingredients = {
+            "en": _build_values(analysis_form.get("ingredients_en", [])),
+            "fr": _build_values(analysis_form.get("ingredients_fr", [])),
+        }
+
+        guaranteed_fr = analysis_form.get("guaranteed_analysis_fr", [])
+        guaranteed_en = analysis_form.get("guaranteed_analysis_en", [])
+        guaranteed = {
+            "title": {
+                "en": guaranteed_en.get("title"),
+                "fr": guaranteed_fr.get("title"),
+            },
             # is_minimal=analysis_form.get("guaranteed_analysis_is_minimal"),
-            is_minimal=None,  # Not processed yet by the pipeline
-            en=guaranteed_en,
-            fr=guaranteed_fr,
-        )
-
-        inspection_formatted = Inspection(
-            inspector_id=str(user_id),
-            company=company,
-            manufacturer=manufacturer,
-            product=product,
-            cautions=cautions,
-            instructions=instructions,
-            guaranteed_analysis=guaranteed,
-            registration_numbers=reg_numbers,
-            ingredients=ingredients,
+            "is_minimal": None,  # Not processed yet by the pipeline
+            "en": _build_values(guaranteed_en.get("nutrients", [])),
+            "fr": _build_values(guaranteed_fr.get("nutrients", [])),
+        }
+
+        # The whole document is validated once and serialized straight to JSON
+        inspection_formatted = validator.dump_json(
+            Inspection,
+            {
+                "inspector_id": str(user_id),
+                "company": company,
+                "manufacturer": manufacturer,
+                "product": product,
+                "cautions": cautions,
+                "instructions": instructions,
+                "guaranteed_analysis": guaranteed,
+                "registration_numbers": reg_numbers,
+                "ingredients": ingredients,
+            },
         )
-        Inspection(**inspection_formatted.model_dump())
-        return inspection_formatted.model_dump_json()
+        return inspection_formatted.decode()
     except MetadataError:
         raise
     except ValidationError as e:
@@ -368,14 +298,41 @@ def build_inspection_import(analysis_form: dict, user_id) -> str:
         raise BuildInspectionImportError(f"Unexpected error: {e}") from e
 
 
-def build_inspection_export(cursor, inspection_id) -> str:
+def _build_values(items: list) -> list[dict]:
+    """
+    This function maps the nutrients of the digitalization to Value fields.
+    """
+    return [
+        {
+            "unit": item.get("unit") or None,
+            "value": item.get("value") or None,
+            "name": item.get("nutrient"),
+        }
+        for item in items
+    ]
+
+
+def build_inspection_export(cursor, inspection_id, db_inspection: dict = None) -> str:
     """
     This funtion build an inspection json object from the database.
+
+    Parameters:
+    - cursor: The cursor object to interact with the database.
+    - inspection_id: The UUID of the inspection.
+    - db_inspection: (dict, optional) The inspection row if the caller already fetched it.
+
+    Returns:
+    - The inspection object in a string format.
     """
     try:
-        label_info_id = inspection.get_inspection(cursor, inspection_id)[
-            inspection.LABEL_INFO_ID
-        ]
+        if db_inspection is None:
+            db_inspection = inspection.get_inspection_dict(cursor, inspection_id)
+            if db_inspection is None:
+                raise InspectionNotFoundError(
+                    f"Inspection not found based on the given id: {inspection_id}"
+                )
+        db_inspection = DBInspection.model_validate(db_inspection)
+        label_info_id = db_inspection.label_info_id
         # get the label information
         product_info = label.get_label_information_json(cursor, label_info_id)
         product_info = ProductInformation(**product_info)
@@ -419,10 +376,6 @@ def build_inspection_export(cursor, inspection_id) -> str:
         else:
             ingredients = ValuesObjects(en=[], fr=[])
 
-        # Get the inspection information
-        db_inspection = inspection.get_inspection_dict(cursor, inspection_id)
-        db_inspection = DBInspection.model_validate(db_inspection)
-
         inspection_formatted = Inspection(
             inspection_id=str(inspection_id),
             inspector_id=str(db_inspection.inspector_id),
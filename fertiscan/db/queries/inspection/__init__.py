@@ -4,12 +4,14 @@ This module represent the function for the table inspection:
 """
 
 import json
-from uuid import UUID
+from datetime import datetime
+from uuid import UUID, uuid4
 
-from psycopg import Cursor
+from psycopg import Cursor, Error
 from psycopg.rows import dict_row
-from psycopg.sql import SQL
+from psycopg.sql import SQL, Composed
 
+from fertiscan.db.queries import reference
 from fertiscan.db.queries.errors import (
     InspectionCreationError,
     InspectionDeleteError,
@@ -21,6 +23,14 @@ from fertiscan.db.queries.errors import (
 )
 
 
+def _resolve_references(cursor: Cursor, label_jsons: list) -> list[str]:
+    """Resolve the units and elements of labels in json through the reference cache."""
+    labels = reference.resolve_labels(
+        cursor, [json.loads(label_json) for label_json in label_jsons]
+    )
+    return [json.dumps(label) for label in labels]
+
+
 @handle_query_errors(InspectionCreationError)
 def new_inspection(cursor: Cursor, user_id, picture_set_id, verified=False):
     """
@@ -71,10 +81,47 @@ def new_inspection_with_label_info(cursor: Cursor, user_id, picture_set_id, labe
     query = """
         SELECT new_inspection(%s, %s, %s)
         """
+    (label_json,) = _resolve_references(cursor, [label_json])
     cursor.execute(query, (user_id, picture_set_id, label_json))
     return cursor.fetchone()[0]
 
 
+@handle_query_errors(InspectionCreationError)
+def new_inspections(cursor: Cursor, user_id, picture_set_ids: list, label_jsons: list):
+    """
+    This function calls the new_inspections function within the database to register many inspections at once.
+    Each label is registered in its own sub-transaction so one failing label does not prevent the others.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - user_id (str): The UUID of the user.
+    - picture_set_ids (list): The UUID of the picture set of each label.
+    - label_jsons (list): The label information of each label in a json format.
+
+    Returns:
+    - A list with one (index, inspection json, error message) tuple per label, in input order.
+    """
+    query = """
+        SELECT 
+            item_index,
+            inspection_json,
+            error
+        FROM 
+            new_inspections(%s, %s::uuid[], %s::jsonb[])
+        ORDER BY 
+            item_index
+        """
+    cursor.execute(
+        query,
+        (
+            user_id,
+            [str(picture_set_id) for picture_set_id in picture_set_ids],
+            _resolve_references(cursor, label_jsons),
+        ),
+    )
+    return cursor.fetchall()
+
+
 @handle_query_errors(InspectionQueryError)
 def is_a_inspection_id(cursor: Cursor, inspection_id) -> bool:
     """
@@ -210,7 +257,7 @@ def get_inspection_original_dataset(cursor: Cursor, inspection_id):
         SELECT 
             original_dataset
         FROM 
-            inspection_factial
+            inspection_factual
         WHERE 
             inspection_id = %s
         """
@@ -262,6 +309,41 @@ def get_inspection_fk(cursor: Cursor, inspection_id):
     return cursor.fetchone()
 
 
+@handle_query_errors(InspectionRetrievalError)
+def get_inspection_with_fk(cursor: Cursor, inspection_id: str | UUID):
+    """
+    This function fetches the inspection row and the organization foreign keys
+    of its label information in a single round trip.
+
+    Parameters:
+    - cursor (Cursor): The database cursor.
+    - inspection_id (str): The UUID of the inspection.
+
+    Returns:
+    - The inspection as a dictionary with the extra keys company_info_id and
+      manufacturer_info_id, or None if no record is found.
+    """
+    with cursor.connection.cursor(row_factory=dict_row) as dict_cursor:
+        query = SQL(
+            """
+            SELECT 
+                inspection.*,
+                label_info.company_info_id,
+                label_info.manufacturer_info_id
+            FROM 
+                inspection
+            LEFT JOIN
+                label_information as label_info
+            ON
+                inspection.label_info_id = label_info.id
+            WHERE 
+                inspection.id = %s
+            """
+        )
+        dict_cursor.execute(query, (inspection_id,))
+        return dict_cursor.fetchone()
+
+
 @handle_query_errors(InspectionRetrievalError)
 def get_all_user_inspection_filter_verified(cursor: Cursor, user_id, verified: bool):
     """
@@ -376,6 +458,221 @@ def get_all_organization_inspection(cursor: Cursor, org_id):
     return cursor.fetchall()
 
 
+DEFAULT_PAGE_SIZE = 50
+
+INSPECTION_LISTING_QUERY = """
+    SELECT 
+        inspection.id as inspection_id,
+        inspection.upload_date as upload_date,
+        inspection.updated_at as updated_at,
+        inspection.sample_id as sample_id,
+        inspection.picture_set_id as picture_set_id,
+        label_info.id as label_info_id,
+        label_info.product_name as product_name,
+        label_info.manufacturer_info_id as manufacturer_info_id,
+        company_info.id as company_info_id,
+        company_info.name as company_name,
+        inspection.verified as verified
+    FROM 
+        inspection
+    LEFT JOIN 
+        label_information as label_info
+    ON
+        inspection.label_info_id = label_info.id
+    LEFT JOIN
+        organization_information as company_info
+    ON
+        label_info.company_info_id = company_info.id
+    WHERE 
+        {conditions}
+    ORDER BY 
+        inspection.upload_date DESC, inspection.id DESC
+    """
+
+
+def _build_inspection_listing(
+    owner_condition: str,
+    params: dict,
+    verified: bool | None,
+    start_date: datetime | None,
+    end_date: datetime | None,
+    after: tuple | None,
+    limit: int | None,
+) -> Composed:
+    """
+    This function builds the keyset paginated inspection listing query.
+    Inspections are ordered from the most recent to the oldest on (upload_date, id).
+
+    Parameters:
+    - owner_condition (str): The condition selecting the inspections of the owner.
+    - params (dict): The query parameters, completed with the filters in place.
+    - verified (bool, optional): Only keep the inspections with this verified status.
+    - start_date (datetime, optional): Only keep the inspections uploaded at or after this date.
+    - end_date (datetime, optional): Only keep the inspections uploaded before this date.
+    - after (tuple, optional): The (upload_date, inspection_id) of the last row of the previous page.
+    - limit (int, optional): The maximum number of rows to return. All rows are returned if None.
+
+    Returns:
+    - The query to execute with params.
+    """
+    conditions = [owner_condition]
+    if verified is not None:
+        conditions.append("inspection.verified = %(verified)s")
+        params["verified"] = verified
+    if start_date is not None:
+        conditions.append("inspection.upload_date >= %(start_date)s")
+        params["start_date"] = start_date
+    if end_date is not None:
+        conditions.append("inspection.upload_date < %(end_date)s")
+        params["end_date"] = end_date
+    if after is not None:
+        conditions.append(
+            "(inspection.upload_date, inspection.id) < (%(after_date)s, %(after_id)s)"
+        )
+        params["after_date"], params["after_id"] = after
+    query = SQL(INSPECTION_LISTING_QUERY).format(
+        conditions=SQL(" AND ".join(conditions))
+    )
+    if limit is not None:
+        query += SQL("LIMIT %(limit)s")
+        params["limit"] = limit
+    return query
+
+
+@handle_query_errors(InspectionRetrievalError)
+def get_user_inspection_page(
+    cursor: Cursor,
+    user_id,
+    verified: bool | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    after: tuple | None = None,
+    limit: int | None = DEFAULT_PAGE_SIZE,
+):
+    """
+    This function gets a page of the inspections of a user from the database, from the most recent to the oldest.
+    The next page is fetched by passing the (upload_date, inspection_id) of the last row as after.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - user_id (str): The UUID of the user.
+    - verified (bool, optional): Only keep the inspections with this verified status.
+    - start_date (datetime, optional): Only keep the inspections uploaded at or after this date.
+    - end_date (datetime, optional): Only keep the inspections uploaded before this date.
+    - after (tuple, optional): The (upload_date, inspection_id) of the last row of the previous page.
+    - limit (int, optional): The maximum number of rows to return. All rows are returned if None.
+
+    Returns:
+    - The inspections.
+    [
+        inspection_id,
+        upload_date,
+        updated_at,
+        sample_id,
+        picture_set_id,
+        label_info_id,
+        product_name,
+        manufacturer_info_id,
+        company_info_id,
+        company_name,
+        verified
+    ]
+    """
+    params = {"user_id": user_id}
+    query = _build_inspection_listing(
+        "inspection.inspector_id = %(user_id)s",
+        params,
+        verified,
+        start_date,
+        end_date,
+        after,
+        limit,
+    )
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+@handle_query_errors(InspectionRetrievalError)
+def get_organization_inspection_page(
+    cursor: Cursor,
+    organization_info_id,
+    verified: bool | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    after: tuple | None = None,
+    limit: int | None = DEFAULT_PAGE_SIZE,
+):
+    """
+    This function gets a page of the inspections where an organization is the company or the manufacturer,
+    from the most recent to the oldest.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - organization_info_id (str): The UUID of the organization information.
+    - verified, start_date, end_date, after, limit: See get_user_inspection_page.
+
+    Returns:
+    - The inspections, with the same columns as get_user_inspection_page.
+    """
+    params = {"organization_info_id": organization_info_id}
+    query = _build_inspection_listing(
+        """(label_info.company_info_id = %(organization_info_id)s
+        OR label_info.manufacturer_info_id = %(organization_info_id)s)""",
+        params,
+        verified,
+        start_date,
+        end_date,
+        after,
+        limit,
+    )
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def stream_user_inspection(
+    cursor: Cursor,
+    user_id,
+    verified: bool | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    after: tuple | None = None,
+    itersize: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    This generator yields the inspections of a user, from the most recent to the oldest,
+    through a server-side cursor so only itersize rows are held in memory at a time.
+    It must be consumed within the transaction of the cursor.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - user_id (str): The UUID of the user.
+    - verified, start_date, end_date, after: See get_user_inspection_page.
+    - itersize (int): The number of rows fetched from the server at a time.
+
+    Yields:
+    - The inspections, with the same columns as get_user_inspection_page.
+    """
+    params = {"user_id": user_id}
+    query = _build_inspection_listing(
+        "inspection.inspector_id = %(user_id)s",
+        params,
+        verified,
+        start_date,
+        end_date,
+        after,
+        None,
+    )
+    try:
+        with cursor.connection.cursor(
+            name=f"inspection_listing_{uuid4().hex}"
+        ) as server_cursor:
+            server_cursor.itersize = itersize
+            server_cursor.execute(query, params)
+            yield from server_cursor
+    except Error as db_error:
+        raise InspectionRetrievalError(f"Database error: {db_error}") from db_error
+
+
 @handle_query_errors(InspectionUpdateError)
 def update_inspection(
     cursor: Cursor,
@@ -400,7 +697,8 @@ def update_inspection(
     """
     # Prepare and execute the SQL function call
     query = SQL("SELECT update_inspection(%s, %s, %s)")
-    cursor.execute(query, (inspection_id, user_id, json.dumps(updated_data_dict)))
+    (updated_json,) = _resolve_references(cursor, [json.dumps(updated_data_dict)])
+    cursor.execute(query, (inspection_id, user_id, updated_json))
 
     if result := cursor.fetchone():
         return result[0]
@@ -133,7 +133,7 @@ def get_metric_by_label(cursor: Cursor, label_id):
         WHERE
             label_id = %s
         ORDER BY
-            metric_type
+            metric_type, ordinal
         """
     cursor.execute(query, (label_id,))
     return cursor.fetchall()
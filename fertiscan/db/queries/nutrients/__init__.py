@@ -284,6 +284,8 @@ def get_all_micronutrients(cursor: Cursor, label_id):
             element_compound ec ON m.element_id = ec.id
         WHERE 
             m.label_id = %s
+        ORDER BY
+            m.language, m.ordinal
         """
     cursor.execute(query, (label_id,))
     return cursor.fetchall()
@@ -458,6 +460,8 @@ def get_all_guaranteeds(cursor: Cursor, label_id):
             element_compound ec ON g.element_id = ec.id
         WHERE 
             g.label_id = %s
+        ORDER BY
+            g.language, g.ordinal
         """
     cursor.execute(query, (label_id,))
     return cursor.fetchall()
@@ -516,6 +516,65 @@ def get_location_by_organization(cursor: Cursor, org_id):
     return cursor.fetchall()
 
 
+@handle_query_errors(LocationRetrievalError)
+def get_location_by_address(cursor: Cursor, address):
+    """
+    This function get the locations matching an address from the database.
+    The addresses are compared on their normalized key (case, punctuation and spacing are ignored).
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - address (str): The address of the location.
+
+    Returns:
+    - list: The locations (id, name, address)
+    """
+    query = """
+        SELECT 
+            id, 
+            name, 
+            address
+        FROM 
+            location
+        WHERE 
+            address_key = normalize_address(%s)
+        """
+    cursor.execute(query, (address,))
+    return cursor.fetchall()
+
+
+@handle_query_errors(LocationRetrievalError)
+def search_location_by_address(cursor: Cursor, address, limit: int = 5):
+    """
+    This function get the locations with an address similar to the given one from the database,
+    the most similar first.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - address (str): The address to look for.
+    - limit (int): The maximum number of locations returned.
+
+    Returns:
+    - list: The locations (id, name, address, similarity)
+    """
+    query = """
+        SELECT 
+            id, 
+            name, 
+            address,
+            public.similarity(address_key, normalize_address(%(address)s)) AS score
+        FROM 
+            location
+        WHERE 
+            address_key OPERATOR(public.%%) normalize_address(%(address)s)
+        ORDER BY 
+            score DESC, id
+        LIMIT %(limit)s
+        """
+    cursor.execute(query, {"address": address, "limit": limit})
+    return cursor.fetchall()
+
+
 @handle_query_errors(RegionCreationError)
 def new_region(cursor: Cursor, name, province_id):
     """
@@ -0,0 +1,279 @@
+"""
+This module represent an in-process cache of the reference tables element_compound and unit.
+
+Both tables are small and almost never change, but they are read for every nutrient and
+metric of every label. The cache keeps them in memory per schema, keyed by case and accent
+folded names, and only reloads them when their version (the reference_version row, bumped by
+a trigger on every change) changes. Resolving a whole list of nutrients or units therefore
+costs one query instead of one per item.
+"""
+
+import copy
+import unicodedata
+from dataclasses import dataclass, field
+from threading import Lock
+
+from psycopg import Cursor
+
+from fertiscan.db.queries.errors import (
+    ElementCompoundRetrievalError,
+    UnitCreationError,
+    handle_query_errors,
+)
+
+
+def fold(text: str | None) -> str | None:
+    """
+    Fold a name for comparison: case and accents are ignored and spaces collapsed.
+
+    Parameters:
+    - text (str): The name to fold.
+
+    Returns:
+    - str: The folded name, None if the name is None.
+    """
+    if text is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+@dataclass
+class ReferenceData:
+    """The reference tables of a schema at a given version."""
+
+    version: int
+    element_names: dict = field(default_factory=dict)
+    element_symbols: dict = field(default_factory=dict)
+    units: dict = field(default_factory=dict)
+    to_si_units: dict = field(default_factory=dict)
+
+    def element_id(self, name: str | None) -> int | None:
+        """Return the id of the element matching a name (fr or en) or a symbol."""
+        if name is None:
+            return None
+        name = name.strip()
+        if name in self.element_symbols:
+            return self.element_symbols[name]
+        return self.element_names.get(fold(name))
+
+    def unit_id(self, unit: str | None):
+        """Return the UUID of a unit, None if it is unknown."""
+        return self.units.get(fold(unit))
+
+    def to_si_unit(self, unit: str | None) -> float | None:
+        """Return the SI conversion factor of a unit, None if it is unknown."""
+        return self.to_si_units.get(self.unit_id(unit))
+
+
+# The flag is set by the trigger for the rest of the transaction that changed the tables
+VERSION_QUERY = """
+    SELECT
+        current_schema(),
+        version,
+        COALESCE(current_setting('fertiscan.reference_changed', TRUE), '') = 'on'
+    FROM reference_version
+    """
+
+
+@handle_query_errors(ElementCompoundRetrievalError)
+def _fetch_version(cursor: Cursor) -> tuple:
+    cursor.execute(VERSION_QUERY)
+    return tuple(cursor.fetchone())
+
+
+@handle_query_errors(ElementCompoundRetrievalError)
+def _load(cursor: Cursor, version: int) -> ReferenceData:
+    data = ReferenceData(version=version)
+    cursor.execute("SELECT id, name_fr, name_en, symbol FROM element_compound ORDER BY id")
+    elements = cursor.fetchall()
+    for element_id, name_fr, name_en, symbol in elements:
+        data.element_names.setdefault(fold(name_fr), element_id)
+        data.element_names.setdefault(fold(name_en), element_id)
+        data.element_symbols[symbol] = element_id
+    # Symbols in another case are only used when no name matches
+    for element_id, _, _, symbol in elements:
+        data.element_names.setdefault(fold(symbol), element_id)
+    cursor.execute("SELECT id, unit, to_si_unit FROM unit ORDER BY id")
+    for unit_id, unit, to_si_unit in cursor.fetchall():
+        data.units.setdefault(fold(unit), unit_id)
+        data.to_si_units[unit_id] = to_si_unit
+    return data
+
+
+@handle_query_errors(UnitCreationError)
+def _insert_units(cursor: Cursor, units: list[str]) -> list:
+    query = """
+        INSERT INTO unit (unit)
+        SELECT unnest(%s::text[])
+        RETURNING id, unit
+        """
+    cursor.execute(query, (units,))
+    return cursor.fetchall()
+
+
+class ReferenceCache:
+    """
+    Cache of the reference tables, one entry per schema.
+
+    Every lookup reads the version of the tables and reloads them only when it changed,
+    so rows added or edited by other transactions are never served stale. A transaction
+    that changed the tables itself gets its own copy, which is not shared: its rows are
+    only published once committed, when the other connections read the new version.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = Lock()
+
+    def get(self, cursor: Cursor) -> ReferenceData:
+        """
+        Return the reference data of the schema of the cursor, reloading it if needed.
+
+        Parameters:
+        - cursor (cursor): The cursor of the database.
+
+        Returns:
+        - ReferenceData: The reference data.
+        """
+        schema, version, changed = _fetch_version(cursor)
+        if changed:
+            return _load(cursor, version)
+        with self._lock:
+            data = self._data.get(schema)
+        if data is None or data.version != version:
+            data = _load(cursor, version)
+            with self._lock:
+                self._data[schema] = data
+        return data
+
+    def invalidate(self, schema: str | None = None):
+        """Forget the cached data of a schema, or of every schema."""
+        with self._lock:
+            if schema is None:
+                self._data.clear()
+            else:
+                self._data.pop(schema, None)
+
+
+CACHE = ReferenceCache()
+
+
+def get_unit_ids(cursor: Cursor, units: list, cache: ReferenceCache = CACHE) -> list:
+    """
+    This function resolves a list of units to their UUID.
+    The units that are not in the database yet are inserted in a single query.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - units (list): The units, None entries are kept as None.
+    - cache (ReferenceCache): The cache to use.
+
+    Returns:
+    - list: The UUID of each unit, in the same order.
+    """
+    return _resolve_units(cursor, cache.get(cursor), units)
+
+
+def _resolve_units(cursor: Cursor, data: ReferenceData, units: list) -> list:
+    unknown = {}
+    for unit in units:
+        if unit is not None and data.unit_id(unit) is None:
+            unknown.setdefault(fold(unit), unit)
+    # The inserted ids stay local: the shared data only gets them through a reload
+    # at the version bumped by the insert, once it is committed
+    inserted = {}
+    if unknown:
+        for unit_id, unit in _insert_units(cursor, list(unknown.values())):
+            inserted[fold(unit)] = unit_id
+    return [
+        None if unit is None else data.unit_id(unit) or inserted.get(fold(unit))
+        for unit in units
+    ]
+
+
+def get_element_ids(cursor: Cursor, names: list, cache: ReferenceCache = CACHE) -> list:
+    """
+    This function resolves a list of nutrient names (fr, en or symbol) to their element id.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - names (list): The names of the nutrients.
+    - cache (ReferenceCache): The cache to use.
+
+    Returns:
+    - list: The id of each element, None when the name matches no element.
+    """
+    data = cache.get(cursor)
+    return [data.element_id(name) for name in names]
+
+
+def resolve_nutrients(
+    cursor: Cursor, nutrients: list[dict], cache: ReferenceCache = CACHE
+) -> list[dict]:
+    """
+    This function resolves a guaranteed analysis or micronutrient list in one pass.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - nutrients (list): The nutrients, as dicts with a name and a unit.
+    - cache (ReferenceCache): The cache to use.
+
+    Returns:
+    - list: For each nutrient, a dict with its element_id, unit_id and to_si_unit.
+    """
+    data = cache.get(cursor)
+    units = [nutrient.get("unit") or None for nutrient in nutrients]
+    unit_ids = _resolve_units(cursor, data, units)
+    return [
+        {
+            "element_id": data.element_id(nutrient.get("name")),
+            "unit_id": unit_id,
+            "to_si_unit": data.to_si_units.get(unit_id),
+        }
+        for nutrient, unit_id in zip(nutrients, unit_ids)
+    ]
+
+
+def resolve_labels(
+    cursor: Cursor, labels: list[dict], cache: ReferenceCache = CACHE
+) -> list[dict]:
+    """
+    This function resolves the references of inspection labels before they are sent to the
+    new_inspection, new_inspections or update_inspection functions. The units of every metric
+    and the elements of every guaranteed analysis are resolved in one pass, the functions then
+    use the given ids instead of looking them up row by row.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - labels (list): The labels, as the dicts of the inspection json. They are not modified.
+    - cache (ReferenceCache): The cache to use.
+
+    Returns:
+    - list: A copy of the labels where each metric has a unit_id and each guaranteed
+      nutrient an element_id. The database functions drop these ids from the json they
+      store and return (see strip_label_references).
+    """
+    labels = copy.deepcopy(labels)
+    data = cache.get(cursor)
+    metrics = []
+    nutrients = []
+    for label in labels:
+        label_metrics = (label.get("product") or {}).get("metrics") or {}
+        metrics.extend(label_metrics.get("weight") or [])
+        metrics.extend(
+            label_metrics[metric_type]
+            for metric_type in ("density", "volume")
+            if label_metrics.get(metric_type)
+        )
+        guaranteed = label.get("guaranteed_analysis") or {}
+        for language in ("en", "fr"):
+            nutrients.extend(guaranteed.get(language) or [])
+
+    units = [metric.get("unit") or None for metric in metrics]
+    for metric, unit_id in zip(metrics, _resolve_units(cursor, data, units)):
+        metric["unit_id"] = str(unit_id) if unit_id is not None else None
+    for nutrient in nutrients:
+        nutrient["element_id"] = data.element_id(nutrient.get("name") or None)
+    return labels
@@ -126,7 +126,8 @@ def get_registration_numbers_from_label(cursor: Cursor, label_id: UUID):
             name,
             edited
         FROM registration_number_information
-        WHERE label_id = %s;
+        WHERE label_id = %s
+        ORDER BY ordinal;
     """
     )
     cursor.execute(query, (label_id,))
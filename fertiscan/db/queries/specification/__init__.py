@@ -150,6 +150,8 @@ def get_all_specifications(cursor: Cursor, label_id):
             specification
         WHERE 
             label_id = %s
+        ORDER BY
+            language, ordinal
     """
     cursor.execute(query, (label_id,))
     if result := cursor.fetchall():
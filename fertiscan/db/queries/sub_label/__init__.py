@@ -192,7 +192,7 @@ def get_all_sub_label(cursor: Cursor, label_id):
         WHERE 
             label_id = %s
         ORDER BY
-            sub_type.type_en
+            sub_type.type_en, sub_label.ordinal
     """
     cursor.execute(query, (label_id,))
     return cursor.fetchall()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 
@@ -12,12 +13,20 @@ import nachet.db.queries.inference as inference
 import nachet.db.queries.machine_learning as machine_learning
 import datastore.db.queries.picture as picture
 import nachet.db.queries.seed as seed
+import nachet.evaluation as evaluation
 import datastore.db.queries.user as user
+from datastore.archive import ArchiveWriter
+from datastore.db.replica import read_only
+from datastore.single_flight import single_flight
 from datastore import (
     BlobUploadError,
     FolderCreationError,
     UserNotOwnerError,
+    compress_picture_objects,
     get_user_container_client,
+    prepare_picture_objects,
+    unreferenced_objects,
+    upload_picture_objects,
 )
 
 load_dotenv()
@@ -47,6 +56,14 @@ if NACHET_SCHEMA is None or NACHET_SCHEMA == "":
     raise ValueError("NACHET_SCHEMA is not set")
 
 
+# Number of picture downloads opened ahead of the one being written to an export
+EXPORT_PREFETCH = 4
+# Number of deferred inferences written per transaction, and number of failed
+# attempts after which an inference is left in the outbox
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+
+
 class InferenceCreationError(Exception):
     pass
 
@@ -60,7 +77,13 @@ class MLRetrievalError(Exception):
 
 
 async def upload_picture_unknown(
-    cursor, user_id, picture_hash, container_client, picture_set_id=None
+    cursor,
+    user_id,
+    picture_hash,
+    container_client,
+    picture_set_id=None,
+    renditions: tuple = (),
+    compress: bool = False,
 ):
     """
     Upload a picture that we don't know the seed to the user container
@@ -70,6 +93,10 @@ async def upload_picture_unknown(
     - user_id (str): The UUID of the user.
     - picture (str): The image to upload.
     - container_client: The container client of the user.
+    - renditions (tuple): (optional) The downscaled copies to create, among
+      azure_storage.RENDITION_SIZES (e.g. ("thumbnail",)).
+    - compress (bool): (optional) Recompress the picture losslessly before storing
+      it. The sizes are recorded in the picture metadata (storage).
     """
     try:
 
@@ -80,15 +107,12 @@ async def upload_picture_unknown(
 
         empty_picture = json.dumps([])
 
-        default_picture_set = str(user.get_default_picture_set(cursor, user_id))
-        if picture_set_id is None or str(picture_set_id) == default_picture_set:
-            picture_set_id = default_picture_set
-            folder_name = "General"
-        else:
-            folder_name = picture.get_picture_set_name(cursor, picture_set_id)
-            if folder_name is None:
-                folder_name = str(picture_set_id)
+        if picture_set_id is None:
+            picture_set_id = str(user.get_default_picture_set(cursor, user_id))
 
+        # An identical picture of the user is stored once
+        (checksum,), objects = prepare_picture_objects(cursor, user_id, [picture_hash])
+        storage = await compress_picture_objects(objects) if compress else {}
         # Create picture instance in DB
         picture_id = picture.new_picture_unknown(
             cursor=cursor,
@@ -96,19 +120,21 @@ async def upload_picture_unknown(
             picture_set_id=picture_set_id,
         )
         # Upload the picture to the Blob Storage
-        response = await azure_storage.upload_image(
-            container_client, folder_name, str(picture_set_id), picture_hash, str(picture_id)
-        )
+        if await upload_picture_objects(
+            container_client, objects, renditions=renditions
+        ):
+            raise BlobUploadError("Error uploading the picture")
         # Update the picture metadata in the DB
         data = {
-            "link": azure_storage.build_blob_name(folder_name, str(picture_id)),
+            "link": azure_storage.build_object_name(checksum),
             "description": "Uploaded through the API",
         }
+        if checksum in storage:
+            data["storage"] = storage[checksum]
 
-        if not response:
-            raise BlobUploadError("Error uploading the picture")
-
-        picture.update_picture_metadata(cursor, picture_id, json.dumps(data), 0)
+        picture.update_picture_metadata(
+            cursor, picture_id, json.dumps(data), 0, checksum
+        )
 
         return picture_id
     except BlobUploadError or azure_storage.UploadImageError:
@@ -127,6 +153,8 @@ async def upload_picture_known(
     picture_set_id=None,
     nb_seeds=None,
     zoom_level=None,
+    renditions: tuple = (),
+    compress: bool = False,
 ):
     """
     Upload a picture that the seed is known to the user container
@@ -140,6 +168,10 @@ async def upload_picture_known(
     - picture_set_id: The UUID of the picture set where to add the picture.
     - nb_seeds: The number of seeds on the picture.
     - zoom_level: The zoom level of the picture.
+    - renditions (tuple): (optional) The downscaled copies to create, among
+      azure_storage.RENDITION_SIZES (e.g. ("thumbnail",)).
+    - compress (bool): (optional) Recompress the picture losslessly before storing
+      it. The sizes are recorded in the picture metadata (storage).
     """
     try:
 
@@ -149,6 +181,9 @@ async def upload_picture_known(
             )
 
         empty_picture = json.dumps([])
+        # An identical picture of the user is stored once
+        (checksum,), objects = prepare_picture_objects(cursor, user_id, [picture_hash])
+        storage = await compress_picture_objects(objects) if compress else {}
         # Create picture instance in DB
         if picture_set_id is None:
             picture_set_id = user.get_default_picture_set(cursor, user_id)
@@ -159,17 +194,12 @@ async def upload_picture_known(
             seed_id=seed_id,
         )
         # Upload the picture to the Blob Storage
-        folder_name = picture.get_picture_set_name(cursor, picture_set_id)
-        if folder_name is None:
-            folder_name = str(picture_set_id)
-
-        response = await azure_storage.upload_image(
-            container_client, folder_name, str(picture_set_id), picture_hash, str(picture_id)
-        )
+        if await upload_picture_objects(
+            container_client, objects, renditions=renditions
+        ):
+            raise BlobUploadError("Error uploading the picture")
         picture_link = (
-            container_client.url
-            + "/"
-            + azure_storage.build_blob_name(folder_name, str(picture_id))
+            container_client.url + "/" + azure_storage.build_object_name(checksum)
         )
         # Create picture metadata and update DB instance (with link to Azure blob)
         """
@@ -187,10 +217,11 @@ async def upload_picture_known(
             "zoom": zoom_level,
             "description": "Uploaded through the API",
         }
-        if not response:
-            raise BlobUploadError("Error uploading the picture")
-
-        picture.update_picture_metadata(cursor, picture_id, json.dumps(data), 0)
+        if checksum in storage:
+            data["storage"] = storage[checksum]
+        picture.update_picture_metadata(
+            cursor, picture_id, json.dumps(data), 0, checksum
+        )
 
         return picture_id
     except BlobUploadError or azure_storage.UploadImageError:
@@ -243,6 +274,7 @@ async def upload_pictures(
             else:
                 # create the seed
                 seed_id = str(seed.new_seed(cursor=cursor, seed_name=seed_name))
+                get_seed_info.invalidate(cursor)
 
         pictures_id = []
         for picture_encoded in pictures:
@@ -274,6 +306,7 @@ async def register_inference_result(
     picture_id: str,
     pipeline_id: str,
     type: int = 1,
+    deferred: bool = False,
 ):
     """
     Register an inference result in the database
@@ -284,6 +317,8 @@ async def register_inference_result(
     - inference (str): The inference to register in a dict string (soon to be json loaded).
     - picture_id (str): The UUID of the picture.
     - pipeline_id (str): The UUID of the pipeline.
+    - deferred (bool): Only queue the inference in the outbox, with its ids
+      generated beforehand. Its rows are written by drain_inference_outbox.
 
     Returns:
     - The inference_dict with the inference_id, box_id and top_id added.
@@ -297,6 +332,22 @@ async def register_inference_result(
         )
         inference_dict["pipeline_id"] = str(pipeline_id)
 
+        if deferred:
+            if type != 1:
+                raise inference.InferenceCreationError("Error: type not recognized")
+            # An unknown seed fails now, like the synchronous path, not in the drain
+            _resolve_seed_ids(cursor, inference_dict, {})
+            inference_metadata.assign_inference_ids(inference_dict)
+            inference.new_inference_outbox(
+                cursor,
+                inference_dict["inference_id"],
+                picture_id,
+                user_id,
+                pipeline_id,
+                json.dumps(inference_dict),
+            )
+            return inference_dict
+
         inference_id = inference.new_inference(
             cursor, trimmed_inference, user_id, picture_id, type, pipeline_id
         )
@@ -348,6 +399,15 @@ async def register_inference_result(
             inference.set_inference_object_top_id(cursor, object_inference_id, top_id)
             inference_dict["boxes"][box_index]["top_id"] = str(top_id)
 
+        # Stored for the review queue (see get_review_queue)
+        min_top_score, min_margin = inference_metadata.build_inference_uncertainty(
+            inference_dict["boxes"][:nb_object]
+        )
+        inference.set_inference_uncertainty(
+            cursor, inference_id, min_top_score, min_margin
+        )
+        inference.set_inference_disagreement(cursor, picture_id)
+
         return inference_dict
     except ValueError:
         raise ValueError("The value of 'totalBoxes' is not an integer.")
@@ -356,6 +416,132 @@ async def register_inference_result(
         raise Exception("Unhandled Error")
 
 
+def _resolve_seed_ids(cursor, inference_dict, seed_ids: dict) -> dict:
+    """
+    Resolve the seed id of every label of an inference (its boxes and their topN)
+    into seed_ids, which caches the seed id of each label already resolved.
+    Raise seed.SeedNotFoundError if a label is not a known seed.
+    """
+    for box in inference_dict["boxes"][: int(inference_dict["totalBoxes"])]:
+        for label in [box["label"]] + [top["label"] for top in box.get("topN") or []]:
+            if label not in seed_ids:
+                seed_ids[label] = seed.get_seed_id(cursor, label)
+    return seed_ids
+
+
+def _build_outbox_rows(cursor, outbox_row, seed_ids: dict):
+    """
+    Return the inference, object and seed_obj rows of an inference of the outbox,
+    as register_inference_result would write them. seed_ids caches the seed id of
+    each label.
+    """
+    _, inference_id, picture_id, user_id, pipeline_id, payload = outbox_row
+
+    _resolve_seed_ids(cursor, payload, seed_ids)
+    boxes = payload["boxes"][: int(payload["totalBoxes"])]
+    min_top_score, min_margin = inference_metadata.build_inference_uncertainty(boxes)
+    objects = []
+    seed_objects = []
+    for box in boxes:
+        box_seed_id = seed_ids[box["label"]]
+        objects.append(
+            (
+                box["box_id"],
+                inference_metadata.build_object_import(box),
+                inference_id,
+                1,
+                box["top_id"],
+            )
+        )
+        if box.get("topN"):
+            for top in box["topN"]:
+                seed_objects.append(
+                    (top["object_id"], seed_ids[top["label"]], box["box_id"], top["score"])
+                )
+        else:
+            seed_objects.append(
+                (box["top_id"], box_seed_id, box["box_id"], box["score"])
+            )
+    inference_row = (
+        inference_id,
+        inference_metadata.build_inference_import(payload),
+        picture_id,
+        user_id,
+        pipeline_id,
+        min_top_score,
+        min_margin,
+    )
+    return inference_row, objects, seed_objects
+
+
+async def drain_inference_outbox(
+    cursor,
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    inference_id: str = None,
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+):
+    """
+    Write a batch of the inferences queued by register_inference_result(deferred=True)
+    with COPY, and remove them from the outbox. The caller commits: the rows and
+    the removal from the outbox are in the same transaction.
+
+    An inference which can not be written (e.g. an unknown seed, or its picture
+    was deleted) is skipped and its error recorded in the outbox, so it does not
+    block the others.
+
+    Parameters:
+    - cursor: The cursor object to interact with the database.
+    - batch_size (int): The number of inferences to write.
+    - inference_id (str): (optional) Only write this inference, e.g. before a
+      feedback is given on it.
+    - max_attempts (int): The inferences which failed this many times are left.
+
+    Returns:
+    - The number of inferences written.
+    """
+    outbox = inference.get_inference_outbox(
+        cursor, batch_size, max_attempts, inference_id
+    )
+    seed_ids = {}
+    batch = []
+    for row in outbox:
+        try:
+            batch.append((row, _build_outbox_rows(cursor, row, seed_ids)))
+        except Exception as e:
+            inference.set_inference_outbox_error(cursor, row[0], str(e))
+
+    def write(items):
+        inference.copy_new_inferences(
+            cursor,
+            [rows[0] for _, rows in items],
+            [obj for _, rows in items for obj in rows[1]],
+            [seed_obj for _, rows in items for seed_obj in rows[2]],
+        )
+        for picture_id in {row[2] for row, _ in items}:
+            inference.set_inference_disagreement(cursor, picture_id)
+        inference.delete_inference_outbox(cursor, [row[0] for row, _ in items])
+
+    if not batch:
+        return 0
+    try:
+        # A savepoint, so a failed batch does not abort the caller's transaction
+        with cursor.connection.transaction():
+            write(batch)
+        return len(batch)
+    except Exception:
+        pass
+    # Find the inferences which can not be written, one by one
+    written = 0
+    for item in batch:
+        try:
+            with cursor.connection.transaction():
+                write([item])
+            written += 1
+        except Exception as e:
+            inference.set_inference_outbox_error(cursor, item[0][0], str(e))
+    return written
+
+
 async def new_correction_inference_feedback(cursor, inference_dict, type: int = 1):
     """
     TODO: doc
@@ -377,6 +563,8 @@ async def new_correction_inference_feedback(cursor, inference_dict, type: int =
             raise InferenceFeedbackError(
                 "Error: user_id not found in the given infence_dict"
             )
+        # The inference may still be waiting in the outbox
+        await drain_inference_outbox(cursor, inference_id=inference_id)
         # if infence_dict["totalBoxes"] != len(inference_dict["boxes"] & infence_dict["totalBoxes"] > 0 ):
         #     if len(inference_dict["boxes"]) == 0:
         #         raise InferenceFeedbackError("Error: No boxes found in the given inference_dict")
@@ -412,6 +600,7 @@ async def new_correction_inference_feedback(cursor, inference_dict, type: int =
                     else:
                         # unknown seed
                         seed_id = seed.new_seed(cursor, seed_name)
+                        get_seed_info.invalidate(cursor)
                 # Create the new object
                 object_id = inference.new_inference_object(
                     cursor, inference_id, box_metadata, 1, True
@@ -458,6 +647,7 @@ async def new_correction_inference_feedback(cursor, inference_dict, type: int =
                             seed_id = seed.get_seed_id(cursor, seed_name)
                         else:  # The seed is not known in the database
                             seed_id = seed.new_seed(cursor, seed_name)
+                            get_seed_info.invalidate(cursor)
                             seed_object_id = inference.new_seed_object(
                                 cursor, seed_id, object_id, 0
                             )
@@ -523,6 +713,8 @@ async def new_perfect_inference_feeback(cursor, inference_id, user_id, boxes_id)
             raise user.UserNotFoundError(
                 f"User not found based on the given id: {user_id}"
             )
+        # The inference may still be waiting in the outbox
+        await drain_inference_outbox(cursor, inference_id=inference_id)
         # Check if boxes_id exists
         for box_id in boxes_id:
             if not inference.check_inference_object_exist(cursor, box_id):
@@ -604,8 +796,11 @@ async def import_ml_structure_from_json_version(cursor, ml_version: dict):
         # set the pipeline active if not the test pipeline
         if pipeline_name != "test_pipeline":
             machine_learning.set_active_pipeline(cursor, str(pipeline_id))
+    get_ml_structure.invalidate(cursor)
 
 
+@read_only
+@single_flight(ttl=30.0)
 async def get_ml_structure(cursor):
     """
     This function retrieves the machine learning structure from the database.
@@ -654,6 +849,8 @@ async def get_ml_structure(cursor):
         raise Exception("Datastore Unhandled Error")
 
 
+@read_only
+@single_flight(ttl=30.0)
 async def get_seed_info(cursor):
     """
     This function retrieves the seed information from the database.
@@ -669,6 +866,77 @@ async def get_seed_info(cursor):
     return seed_dict
 
 
+@read_only
+async def get_review_queue(
+    cursor,
+    user_id: str = None,
+    strategy: str = "least_confident",
+    limit: int = 100,
+    after: tuple = None,
+):
+    """
+    This function returns the next unverified inferences to review, the ones the
+    models are the least sure about first.
+
+    Parameters:
+    - cursor: The cursor object to interact with the database.
+    - user_id (str): (optional) Only the inferences of this user.
+    - strategy (str): "least_confident", "margin" or "disagreement" (see
+      inference.get_uncertain_inferences).
+    - limit (int): The number of inferences to return.
+    - after (tuple): (optional) The (value, inference_id) of the last inference of
+      the previous page.
+
+    Returns:
+    - A list of {"inference_id", "picture_id", "value"}.
+    """
+    if user_id is not None and not user.is_a_user_id(cursor=cursor, user_id=user_id):
+        raise user.UserNotFoundError(f"User not found based on the given id: {user_id}")
+    rows = inference.get_uncertain_inferences(cursor, strategy, limit, user_id, after)
+    return [
+        {"inference_id": str(inference_id), "picture_id": str(picture_id), "value": value}
+        for inference_id, picture_id, value in rows
+    ]
+
+
+@read_only
+async def get_evaluation_report(
+    cursor,
+    pipeline_id: str = None,
+    since=None,
+    until=None,
+    top_k: tuple = evaluation.TOP_K,
+    bins: int = evaluation.CALIBRATION_BINS,
+):
+    """
+    This function evaluates the pipelines from the feedback of the reviewers on
+    the verified inferences (see nachet.evaluation).
+
+    Parameters:
+    - cursor: The cursor object to interact with the database.
+    - pipeline_id (str): (optional) Only evaluate this pipeline.
+    - since (datetime): (optional) Only the inferences verified at or after.
+    - until (datetime): (optional) Only the inferences verified before.
+    - top_k (tuple): The k of the top-k accuracies.
+    - bins (int): The number of bins of the score calibration.
+
+    Returns:
+    - A list with the evaluation of each pipeline: the false positive and missed
+      box rates, the top-k accuracies, the precision and recall of each seed, the
+      confusion matrix and the score calibration.
+    """
+    if pipeline_id is not None and not machine_learning.is_a_pipeline(
+        cursor, pipeline_id
+    ):
+        raise MLRetrievalError(f"Pipeline not found based on the given id: {pipeline_id}")
+    objects, seeds, pipelines = evaluation.fetch_evaluation_objects(
+        cursor, pipeline_id, since, until
+    )
+    result = evaluation.evaluate(objects, len(pipelines), len(seeds), top_k, bins)
+    return evaluation.build_evaluation_report(result, seeds, pipelines, top_k)
+
+
+@read_only
 async def get_picture_sets_info(cursor, user_id: str):
     """This function retrieves the picture sets names and number of pictures from the database.
     This also retrieve for each picture in the picture set their name, if an inference exist and if the picture is validated.
@@ -724,6 +992,7 @@ async def get_picture_sets_info(cursor, user_id: str):
         )
 
 
+@read_only
 async def get_picture_inference(
     cursor, user_id: str, picture_id: str = None, inference_id: str = None
 ):
@@ -783,7 +1052,10 @@ async def get_picture_inference(
         raise Exception(f"Datastore Unhandled Error : {e}")
 
 
-async def get_picture_blob(cursor, user_id: str, container_client, picture_id: str):
+@read_only
+async def get_picture_blob(
+    cursor, user_id: str, container_client, picture_id: str, size: str = None
+):
     """
     Retrieves blob of the given picture
 
@@ -791,6 +1063,8 @@ async def get_picture_blob(cursor, user_id: str, container_client, picture_id: s
         cursor: The cursor object to interact with the database.
         user_id (str): id of the user
         picture_id (str): id of the picture set
+        size (str): (optional) the rendition to retrieve instead of the original,
+            one of azure_storage.RENDITION_SIZES (e.g. "thumbnail")
     """
     try:
         # Check if user exists
@@ -809,12 +1083,20 @@ async def get_picture_blob(cursor, user_id: str, container_client, picture_id: s
             raise UserNotOwnerError(
                 f"User can't access this picture, user uuid :{user_id}, picture : {picture_id}"
             )
-        if str(user.get_default_picture_set(cursor, user_id)) == str(picture_set_id):
-            folder_name = "General"
+        checksum = picture.get_picture_checksum(cursor, picture_id)
+        if checksum is not None:
+            blob_name = azure_storage.build_object_name(checksum)
         else:
-            folder_name = picture.get_picture_set_name(cursor, picture_set_id)
-        blob_name = azure_storage.build_blob_name(folder_name, str(picture_id))
-        picture_blob = await azure_storage.get_blob(container_client, blob_name)
+            if str(user.get_default_picture_set(cursor, user_id)) == str(
+                picture_set_id
+            ):
+                folder_name = "General"
+            else:
+                folder_name = picture.get_picture_set_name(cursor, picture_set_id)
+            blob_name = azure_storage.build_blob_name(folder_name, str(picture_id))
+        picture_blob = await azure_storage.get_picture(
+            container_client, blob_name, size
+        )
         return picture_blob
     except (
         user.UserNotFoundError,
@@ -824,6 +1106,123 @@ async def get_picture_blob(cursor, user_id: str, container_client, picture_id: s
         raise e
 
 
+def _open_download(container_client, blob_name):
+    """Start the download of a blob, or return None if it does not exist."""
+    try:
+        return container_client.get_blob_client(blob_name).download_blob()
+    except Exception as error:
+        print(f"Error downloading {blob_name}: {error}")
+        return None
+
+
+async def export_picture_set(
+    cursor,
+    user_id: str,
+    picture_set_id: str,
+    container_client,
+    archive_format: str = "zip",
+    prefetch: int = EXPORT_PREFETCH,
+):
+    """
+    Stream an archive of a picture set. Each picture is an entry named after its id,
+    followed by its rebuilt inference ('<picture_id>.json') if it has one. The
+    pictures whose blob is missing are listed in 'missing.json' at the end.
+
+    The pictures are read from the database and downloaded chunk by chunk, the next
+    `prefetch` downloads being opened while one is written, so the memory used does
+    not depend on the size of the picture set.
+
+    Args:
+        cursor: The cursor object to interact with the database.
+        user_id (str): id of the user
+        picture_set_id (str): id of the picture set
+        container_client: The container client of the user.
+        archive_format (str): "zip" or "tar"
+        prefetch (int): number of downloads opened ahead
+
+    Yields:
+        The bytes of the archive.
+    """
+    if not user.is_a_user_id(cursor=cursor, user_id=user_id):
+        raise user.UserNotFoundError(f"User not found based on the given id: {user_id}")
+    if not picture.is_a_picture_set_id(cursor, picture_set_id):
+        raise picture.PictureSetNotFoundError(
+            f"Picture set not found based on the given id: {picture_set_id}"
+        )
+    if str(picture.get_picture_set_owner_id(cursor, picture_set_id)) != str(user_id):
+        raise UserNotOwnerError(
+            f"User can't access this picture set, user uuid :{user_id}, picture set : {picture_set_id}"
+        )
+    writer = ArchiveWriter(archive_format)
+    if str(user.get_default_picture_set(cursor, user_id)) == str(picture_set_id):
+        folder_name = "General"
+    else:
+        folder_name = picture.get_picture_set_name(cursor, picture_set_id)
+
+    def blob_name(picture_id, checksum):
+        if checksum is not None:
+            return azure_storage.build_object_name(checksum)
+        return azure_storage.build_blob_name(str(folder_name), str(picture_id))
+
+    rows = picture.iter_picture_set_checksums(cursor, picture_set_id)
+    pending = []
+    missing = []
+    try:
+        while True:
+            # Keep `prefetch` downloads opened ahead
+            for picture_id, checksum in rows:
+                pending.append(
+                    (
+                        picture_id,
+                        asyncio.ensure_future(
+                            asyncio.to_thread(
+                                _open_download,
+                                container_client,
+                                blob_name(picture_id, checksum),
+                            )
+                        ),
+                    )
+                )
+                if len(pending) > prefetch:
+                    break
+            if not pending:
+                break
+            picture_id, download = pending.pop(0)
+            downloader = await download
+            if downloader is None:
+                missing.append(str(picture_id))
+                continue
+
+            writer.begin_entry(str(picture_id), downloader.size)
+            chunks = downloader.chunks()
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                writer.write(chunk)
+                data = writer.drain()
+                if data:
+                    yield data
+            writer.end_entry()
+
+            if picture.check_picture_inference_exist(cursor, picture_id):
+                inf = inference_metadata.rebuild_inference(
+                    cursor, inference.get_inference_by_picture_id(cursor, picture_id)
+                )
+                writer.add(f"{picture_id}.json", json.dumps(inf, default=str).encode())
+            yield writer.drain()
+
+        if missing:
+            writer.add("missing.json", json.dumps(missing).encode())
+        writer.close()
+        yield writer.drain()
+    finally:
+        # The export was interrupted (e.g. the client went away)
+        for _, download in pending:
+            download.cancel()
+        rows.close()
+
+
 async def delete_picture_set_with_archive(
     cursor, user_id, picture_set_id, container_client
 ):
@@ -909,16 +1308,28 @@ async def delete_picture_set_with_archive(
             picture.update_picture_picture_set_id(
                 cursor, picture_id, dev_picture_set_id
             )
-            # move the picture to the dev container
-            if not (
-                await azure_storage.move_blob(
+            # A content-addressed picture may be referenced by other pictures of
+            # the user: it is copied, and deleted below if nothing references it
+            checksum = picture.get_picture_checksum(cursor, picture_id)
+            if checksum is not None:
+                picture.set_picture_checksum(cursor, picture_id, None)
+                archive_blob = azure_storage.copy_blob(
+                    azure_storage.build_object_name(checksum),
+                    dev_blob_name,
+                    str(dev_picture_set_id),
+                    container_client,
+                    dev_container_client,
+                )
+            else:
+                archive_blob = azure_storage.move_blob(
                     blob_name,
                     dev_blob_name,
                     str(dev_picture_set_id),
                     container_client,
                     dev_container_client,
                 )
-            ):
+            # move the picture to the dev container
+            if not (await archive_blob):
                 raise BlobUploadError(
                     f"Error while moving the picture : {picture_id} to the dev container"
                 )
@@ -928,10 +1339,18 @@ async def delete_picture_set_with_archive(
                 f"Can't delete the folder, there are still validated pictures in it, folder name : {picture_set_id}"
             )
 
+        # The objects only referenced by this picture set go with it
+        orphans = picture.get_unreferenced_checksums(cursor, picture_set_id)
         # Delete the folder in the blob storage
         await azure_storage.delete_folder(container_client, str(picture_set_id))
         # Delete the picture set
         picture.delete_picture_set(cursor, picture_set_id)
+        azure_storage.delete_objects_after_commit(
+            cursor,
+            container_client,
+            orphans,
+            unreferenced_objects(cursor.connection, user_id),
+        )
 
         return dev_picture_set_id
     except (
@@ -946,6 +1365,7 @@ async def delete_picture_set_with_archive(
         raise Exception("Datastore Unhandled Error")
 
 
+@read_only
 async def find_validated_pictures(cursor, user_id, picture_set_id):
     """
     Find pictures that have been validated by the user in the given picture set
@@ -1,22 +1,31 @@
-import sys
+import argparse
+import json
 import os
-import io
-import base64
+import uuid
 import warnings
-from PIL import Image
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
 import nachet.db.queries.seed as seed
 import datastore.db.queries.user as user
 import datastore.db.queries.picture as picture_query
 import datastore.db.metadata.picture_set as picture_set_metadata
 import nachet.db.metadata.picture as picture_metadata
 import datastore.db.metadata.validator as validator
+import datastore.db as db
 
 """ This script is used to import the missing metadata from an Azure container to the database """
 
 NACHET_DB_URL = os.getenv("NACHET_DB_URL")
+NACHET_SCHEMA = os.getenv("NACHET_SCHEMA")
 # Constants
 CONTAINER_URL = ""
 SEED_ID = ""
+PICTURE_EXTENSIONS = (".tiff", ".tif")
+# Number of pictures written (and committed, by the script) at once
+BATCH_SIZE = 500
+# Number of pictures probed ahead of the writer, per worker
+QUEUE_SIZE_PER_WORKER = 16
 
 
 class NonExistingEmail(Exception):
@@ -35,6 +44,45 @@ class MissingArguments(Exception):
     pass
 
 
+@dataclass
+class PictureSetSource:
+    """A folder of pictures imported as one picture_set."""
+
+    folder: str
+    name: str
+    pictures: list = field(default_factory=list)
+    nb_skipped: int = 0
+
+
+@dataclass
+class ImportReport:
+    """The summary of an importation, or of what it would do with dry_run."""
+
+    dry_run: bool = False
+    picture_sets: int = 0
+    pictures: int = 0
+    imported: int = 0
+    already_imported: int = 0
+    skipped_files: int = 0
+    bytes: int = 0
+    duplicates: int = 0
+    errors: list = field(default_factory=list)
+
+    def __str__(self):
+        lines = [
+            ("Dry run: " if self.dry_run else "")
+            + f"{self.picture_sets} picture_set(s), {self.pictures} picture(s), "
+            + f"{self.bytes / 1024 ** 2:.1f} MiB",
+            f"- {'to import' if self.dry_run else 'imported'}: {self.imported}",
+            f"- already imported: {self.already_imported}",
+            f"- skipped (not .tiff): {self.skipped_files}",
+            f"- duplicated content: {self.duplicates}",
+            f"- errors: {len(self.errors)}",
+        ]
+        lines += [f"  {path}: {error}" for path, error in self.errors]
+        return "\n".join(lines)
+
+
 def json_deletion(picture_folder):
     """
     Function to delete all the .json files in the specified folder in case of a bad importation.
@@ -55,27 +103,180 @@ def json_deletion(picture_folder):
             print("Error: %s : %s" % (file, e.strerror))
 
 
-def local_import(
-    picture_folder: str,
+def discover_picture_sets(root: str, recursive: bool = True) -> list:
+    """
+    Find the folders to import. Every folder containing .tiff pictures is a
+    picture_set, named after its path from the parent of root so the same tree
+    always gives the same names. Each folder is listed once.
+
+    Parameters:
+    - root (str): The folder to import.
+    - recursive (bool): Also import the subfolders of root.
+
+    Returns:
+    - A list of PictureSetSource, the pictures sorted by name.
+    """
+    base = os.path.dirname(os.path.normpath(root))
+    sources = []
+    folders = [root]
+    while folders:
+        folder = folders.pop()
+        source = PictureSetSource(
+            folder=folder,
+            name=os.path.relpath(folder, base or os.curdir).replace(os.sep, "/"),
+        )
+        subfolders = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subfolders.append(entry.path)
+                elif not entry.is_file():
+                    continue
+                elif entry.name.lower().endswith(PICTURE_EXTENSIONS):
+                    source.pictures.append(entry.name)
+                else:
+                    source.nb_skipped += 1
+        if recursive:
+            folders.extend(sorted(subfolders, reverse=True))
+        if source.pictures or source.nb_skipped:
+            source.pictures.sort()
+            sources.append(source)
+    return sources
+
+
+def build_link(folder: str, filename: str) -> str:
+    """Return the link of a picture in the Azure container."""
+    return CONTAINER_URL + folder.rstrip("/") + "/" + filename
+
+
+def probe_picture(path: str, link: str, nb_seeds: int, zoom: float):
+    """
+    Build the metadata of a picture. Run in the worker processes: only the header
+    of the file is parsed and its content is hashed.
+
+    Returns:
+    - (metadata, checksum, size)
+    """
+    metadata = picture_metadata.build_picture(
+        pic_encoded=path,
+        link=link,
+        nb_seeds=nb_seeds,
+        zoom=zoom,
+        description="mass importation",
+    )
+    checksum = json.loads(metadata)["quality_check"]["image_checksum"]
+    return metadata, checksum, os.path.getsize(path)
+
+
+def probe_pictures(jobs, workers: int, queue_size: int):
+    """
+    Probe the pictures in a pool of processes. At most queue_size pictures are in
+    flight, so the memory stays bounded whatever the size of the import.
+
+    Parameters:
+    - jobs: An iterable of (key, path, link, nb_seeds, zoom).
+    - workers (int): The number of processes.
+    - queue_size (int): The maximum number of pictures in flight.
+
+    Yields:
+    - (key, result, error) as they complete, result being the one of probe_picture.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        jobs = iter(jobs)
+        while True:
+            for key, *arguments in jobs:
+                pending[pool.submit(probe_picture, *arguments)] = key
+                if len(pending) >= queue_size:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                error = future.exception()
+                yield key, (None if error else future.result()), error
+
+
+class PictureWriter:
+    """
+    The single writer of the pictures. The pictures are buffered and written with
+    COPY by batches. With commit, each batch is committed: an interrupted import
+    keeps everything written before its last batch. Otherwise the transaction is
+    left to the caller.
+    """
+
+    def __init__(
+        self, cursor, seed_id: str, batch_size: int = BATCH_SIZE, commit: bool = False
+    ):
+        self.cursor = cursor
+        self.seed_id = seed_id
+        self.batch_size = batch_size
+        self.commit = commit
+        self.buffers = {}
+        self.nb_buffered = 0
+        self.nb_written = 0
+
+    def add(self, picture_set_id, picture: str, nb_objects: int = 0):
+        buffer = self.buffers.setdefault(picture_set_id, [])
+        buffer.append((uuid.uuid4(), picture, nb_objects))
+        self.nb_buffered += 1
+        if self.nb_buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for picture_set_id, pictures in self.buffers.items():
+            if pictures:
+                picture_query.copy_new_pictures(
+                    self.cursor, pictures, picture_set_id, self.seed_id
+                )
+                self.nb_written += len(pictures)
+        self.buffers = {}
+        self.nb_buffered = 0
+        if self.commit:
+            self.cursor.connection.commit()
+
+
+def pipeline_import(
+    root: str,
     client_email: str,
     seed_name: str,
     zoom_level: float,
     seed_number: int,
     cur,
-):
+    recursive: bool = True,
+    resume: bool = False,
+    dry_run: bool = False,
+    workers: int = None,
+    batch_size: int = BATCH_SIZE,
+    commit: bool = False,
+) -> ImportReport:
     """
-    Template function to do the importation process of the metadata from the Azure container to the database.
-    The user is prompted to input the client email, the zoom level and the number of seeds for the picture_set.
-    The container needs to be downloaded locally before running this function.
+    Import the metadata of a tree of picture folders. The pictures are probed in a
+    pool of processes and written by a single writer with COPY, by batches.
 
     Parameters:
-    - picture_folder (str): Relative path to the folder we want to import.
+    - root (str): Relative path to the folder we want to import.
     - client_email (str): The email of the client.
     - seed_name (str): The name of the seed
     - zoom_level (float): The zoom level of the picture.
     - seed_number (int): The number of seeds in the picture.
     - cur: The cursor object to interact with the database.
+    - recursive (bool): Import every subfolder containing pictures as a picture_set.
+    - resume (bool): Reuse the picture_set of the user with the same name and skip
+      the pictures it already has, to resume an interrupted import.
+    - dry_run (bool): Probe the pictures and report, without writing anything.
+    - workers (int): The number of processes, os.cpu_count() by default.
+    - batch_size (int): The number of pictures written at once.
+    - commit (bool): Commit the picture_sets, then each batch, so an interrupted
+      import keeps what it wrote (used by the script). By default nothing is
+      committed, the transaction is left to the caller.
+
+    Returns:
+    - The ImportReport.
     """
+    zoom_level = float(zoom_level)
+    seed_number = int(seed_number)
 
     seed_id = seed.get_seed_id(cursor=cur, seed_name=seed_name)
     if seed_id is None or validator.is_valid_uuid(seed_id) is False:
@@ -93,62 +294,156 @@ def local_import(
             f"Error: could not retrieve the user_id with the provided email: {client_email}"
         )
 
-    nb_file = len(
-        [
-            f
-            for f in os.listdir(picture_folder)
-            if os.path.isfile(os.path.join(picture_folder, f))
-        ]
-    )
-    # build picture_set
-    picture_set = picture_set_metadata.build_picture_set_metadata(
-        user_id=user_id, nb_picture=nb_file
-    )
-
-    # upload picture_set to database
-    picture_set_id = picture_query.new_picture_set(
-        cursor=cur, picture_set_metadata=picture_set, user_id=user_id
-    )
-
-    # Get a list of files in the directory
-    files = []
-    for f in os.listdir(picture_folder):
-        if os.path.isfile(os.path.join(picture_folder, f)):
-            files.append(f)
+    report = ImportReport(dry_run=dry_run)
+    writer = PictureWriter(cur, seed_id, batch_size, commit)
+    jobs = []
+    for source in discover_picture_sets(root, recursive):
+        report.skipped_files += source.nb_skipped
+        if not source.pictures:
+            continue
+        report.picture_sets += 1
+        report.pictures += len(source.pictures)
 
-    actual_nb_pic = 0
-    # Loop through each file in the folder
-    for i, filename in enumerate(files):
-        if filename.endswith(".tiff") or filename.endswith(".tif"):
-            img = Image.open(f"{picture_folder}/{filename}")
-            img_byte_array = io.BytesIO()
-            img.save(img_byte_array, format="TIFF")
-            img_encoded = base64.b64encode(img_byte_array.getvalue()).decode("utf8")
-
-            image_metadata = picture_metadata.build_picture(
-                pic_encoded=img_encoded,
-                link=CONTAINER_URL + picture_folder + filename,
-                nb_seeds=seed_number,
-                zoom=zoom_level,
-                description="mass importation",
+        picture_set_id = None
+        imported = set()
+        if resume:
+            picture_set_id = picture_query.get_user_picture_set_by_name(
+                cur, user_id, source.name
+            )
+            if picture_set_id is not None:
+                imported = picture_query.get_picture_set_sources(cur, picture_set_id)
+        if picture_set_id is None and not dry_run:
+            picture_set = picture_set_metadata.build_picture_set_metadata(
+                user_id=user_id, nb_picture=len(source.pictures)
             )
-            picture_query.new_picture(
+            picture_set_id = picture_query.new_picture_set(
                 cursor=cur,
-                picture=image_metadata,
-                picture_set_id=picture_set_id,
-                seed_id=seed_id,
+                picture_set_metadata=picture_set,
+                user_id=user_id,
+                folder_name=source.name,
             )
-            # build_picture(picture_folder, seed_number, zoom_level, filename)
-            # pic_path = f'{picture_folder}/{filename.removesuffix(".tiff")}.json'
-            # upload picture to database
-            # upload_picture_db(pic_path, picture_set_id, seed_id=seed_id,cur=cur,conn=conn)
-            actual_nb_pic = actual_nb_pic + 1
 
-    if actual_nb_pic != nb_file:
+        for filename in source.pictures:
+            link = build_link(source.folder, filename)
+            if link in imported:
+                report.already_imported += 1
+                continue
+            path = os.path.join(source.folder, filename)
+            jobs.append(((picture_set_id, path), path, link, seed_number, zoom_level))
+
+    # The picture_sets are committed before their pictures
+    if commit and not dry_run:
+        cur.connection.commit()
+
+    workers = workers or os.cpu_count() or 1
+    checksums = set()
+    for (picture_set_id, path), result, error in probe_pictures(
+        jobs, workers, workers * QUEUE_SIZE_PER_WORKER
+    ):
+        if error is not None:
+            report.errors.append((path, str(error)))
+            continue
+        metadata, checksum, size = result
+        report.bytes += size
+        if checksum in checksums:
+            report.duplicates += 1
+        checksums.add(checksum)
+        report.imported += 1
+        if not dry_run:
+            writer.add(picture_set_id, metadata)
+    if not dry_run:
+        writer.flush()
+    return report
+
+
+def local_import(
+    picture_folder: str,
+    client_email: str,
+    seed_name: str,
+    zoom_level: float,
+    seed_number: int,
+    cur,
+):
+    """
+    Template function to do the importation process of the metadata from the Azure container to the database.
+    The user is prompted to input the client email, the zoom level and the number of seeds for the picture_set.
+    The container needs to be downloaded locally before running this function.
+
+    Parameters:
+    - picture_folder (str): Relative path to the folder we want to import.
+    - client_email (str): The email of the client.
+    - seed_name (str): The name of the seed
+    - zoom_level (float): The zoom level of the picture.
+    - seed_number (int): The number of seeds in the picture.
+    - cur: The cursor object to interact with the database.
+    """
+    report = pipeline_import(
+        picture_folder,
+        client_email,
+        seed_name,
+        zoom_level,
+        seed_number,
+        cur,
+        recursive=False,
+    )
+    if report.errors:
+        print(report)
+    if report.skipped_files:
         warnings.warn(" invallid file extension found, only the .TIFF files have been processed", UnProcessedFilesWarning)
     else:
         print("importation of " + picture_folder + " complete")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Import the metadata of the pictures of a downloaded container"
+    )
+    parser.add_argument("picture_folder")
+    parser.add_argument("client_email")
+    parser.add_argument("seed_name")
+    parser.add_argument("zoom_level", type=float)
+    parser.add_argument("seed_number", type=int)
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="import every subfolder containing pictures as a picture_set",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="reuse the picture_sets of a previous run and skip their pictures",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="report without writing anything"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    connection = db.connect_db(NACHET_DB_URL, NACHET_SCHEMA)
+    cursor = db.cursor(connection)
+    try:
+        report = pipeline_import(
+            args.picture_folder,
+            args.client_email,
+            args.seed_name,
+            args.zoom_level,
+            args.seed_number,
+            cursor,
+            recursive=args.recursive,
+            resume=args.resume,
+            dry_run=args.dry_run,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            commit=True,
+        )
+        print(report)
+    finally:
+        connection.rollback()
+        cursor.close()
+        connection.close()
 
 
 if __name__ == "__main__":
-    local_import(*sys.argv[1:])
+    main()
@@ -0,0 +1,484 @@
+"""
+This script exports the verified Nachet annotations as a training dataset.
+
+Every verified inference is a sample: the picture and its labels, the verified
+boxes of the inference with the seed they were verified as, and the seeds of the
+picture (picture_seed). The samples are written into tar shards of bounded size
+(WebDataset style, the entries of a sample share the same key) and a
+'manifest.json' lists the shards, the categories and the watermark of the export.
+
+The verified inferences are read with one server-side cursor and the pictures are
+downloaded in threads, a few ahead of the one being written. With --incremental,
+only the inferences verified after the watermark of the previous export are
+exported, as new shards next to the previous ones. The inferences verified in
+the last minutes (--lag) are left to the next export: their transaction may not
+be committed yet, and the watermark must not pass them.
+
+Parameters:
+- output_dir: the folder of the shards and of the manifest
+- --format: the format of the labels, 'coco' (<key>.json) or 'yolo' (<key>.txt)
+- --seed-name, --pipeline-id, --since, --until: filter the inferences
+- --incremental: export from the watermark of the previous export
+- --lag: the minutes under which a verification is not exported yet
+- --shard-size: the maximum size of a shard, in MiB
+- --prefetch: the number of pictures downloaded ahead
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+import datastore
+import datastore.blob.azure_storage_api as azure_storage
+import datastore.db as db
+import nachet.db.metadata.picture as picture_metadata
+import nachet.db.queries.inference as inference
+import nachet.db.queries.seed as seed
+from datastore.archive import ArchiveWriter
+
+LABEL_FORMATS = ("coco", "yolo")
+MANIFEST_NAME = "manifest.json"
+# Maximum size of a shard, a sample is never split between two shards
+SHARD_SIZE = 1024**3
+# Number of picture downloads started ahead of the sample being written
+PREFETCH = 8
+
+
+class ExportError(Exception):
+    pass
+
+
+def category_id(categories: list, seed_id, seed_name: str) -> int:
+    """
+    Return the class index of a seed, adding it to the categories if it is new.
+    The indexes of the known seeds never change, so the labels of an incremental
+    export are consistent with the previous shards.
+    """
+    for category in categories:
+        if category["seed_id"] == str(seed_id):
+            return category["id"]
+    categories.append(
+        {"id": len(categories), "seed_id": str(seed_id), "name": seed_name}
+    )
+    return len(categories) - 1
+
+
+def _corners(box: dict, width: int, height: int):
+    # The boxes are in pixels, clamped to the picture
+    x1 = min(max(float(box["topX"]), 0.0), width)
+    y1 = min(max(float(box["topY"]), 0.0), height)
+    x2 = min(max(float(box["bottomX"]), 0.0), width)
+    y2 = min(max(float(box["bottomY"]), 0.0), height)
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def build_coco_labels(sample: dict, categories: list) -> dict:
+    """
+    Return the COCO labels of a sample: the image and one annotation per verified
+    box, the bbox being [x, y, width, height] in pixels.
+    """
+    annotations = []
+    for box in sample["boxes"]:
+        x1, y1, x2, y2 = _corners(box["box"], sample["width"], sample["height"])
+        annotations.append(
+            {
+                "id": str(box["object_id"]),
+                "image_id": sample["key"],
+                "category_id": category_id(
+                    categories, box["seed_id"], box["seed_name"]
+                ),
+                "bbox": [x1, y1, x2 - x1, y2 - y1],
+                "area": (x2 - x1) * (y2 - y1),
+                "iscrowd": 0,
+            }
+        )
+    return {
+        "image": {
+            "id": sample["key"],
+            "file_name": sample["file_name"],
+            "width": sample["width"],
+            "height": sample["height"],
+        },
+        "annotations": annotations,
+    }
+
+
+def build_yolo_labels(sample: dict, categories: list) -> str:
+    """
+    Return the YOLO labels of a sample: one line per verified box, the class index
+    followed by the center and the size of the box relative to the picture.
+    """
+    width, height = sample["width"], sample["height"]
+    lines = []
+    for box in sample["boxes"]:
+        x1, y1, x2, y2 = _corners(box["box"], width, height)
+        lines.append(
+            f"{category_id(categories, box['seed_id'], box['seed_name'])} "
+            f"{(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+            f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}"
+        )
+    return "".join(line + "\n" for line in lines)
+
+
+def build_sample_entries(sample: dict, data: bytes, label_format: str, categories: list):
+    """
+    Return the (name, content) entries of a sample: the picture, its metadata
+    and labels ('<key>.json') and, for YOLO, the labels ('<key>.txt').
+    """
+    if not sample["width"] or not sample["height"]:
+        sample["width"], sample["height"], _ = picture_metadata.get_image_properties(
+            data
+        )
+    metadata = {
+        "inference_id": sample["inference_id"],
+        "picture_id": sample["picture_id"],
+        "pipeline_id": sample["pipeline_id"],
+        "verified_at": sample["verified_at"],
+        "seeds": sample["seeds"],
+    }
+    entries = [(sample["file_name"], data)]
+    if label_format == "coco":
+        metadata.update(build_coco_labels(sample, categories))
+    else:
+        metadata["image"] = {"width": sample["width"], "height": sample["height"]}
+        entries.append(
+            (f"{sample['key']}.txt", build_yolo_labels(sample, categories).encode())
+        )
+    entries.append((f"{sample['key']}.json", json.dumps(metadata).encode()))
+    return entries
+
+
+def build_sample(row) -> dict:
+    """Return a sample from a row of inference.iter_verified_inferences."""
+    (
+        inference_id,
+        picture_id,
+        pipeline_id,
+        update_at,
+        picture,
+        checksum,
+        owner_id,
+        folder_name,
+        boxes,
+        seeds,
+    ) = row
+    image_data = picture.get("image_data", {}) if isinstance(picture, dict) else {}
+    extension = str(image_data.get("format") or "tiff").lower()
+    if checksum is not None:
+        blob_name = azure_storage.build_object_name(checksum)
+    else:
+        blob_name = azure_storage.build_blob_name(str(folder_name), str(picture_id))
+    return {
+        "key": str(inference_id),
+        "file_name": f"{inference_id}.{extension}",
+        "inference_id": str(inference_id),
+        "picture_id": str(picture_id),
+        "pipeline_id": None if pipeline_id is None else str(pipeline_id),
+        "verified_at": update_at.isoformat(),
+        "owner_id": str(owner_id),
+        "blob_name": blob_name,
+        "width": image_data.get("width") or 0,
+        "height": image_data.get("height") or 0,
+        "boxes": boxes,
+        "seeds": seeds,
+    }
+
+
+class ShardWriter:
+    """
+    Write samples into tar shards named '<prefix>-<index>.tar'. A new shard is
+    started when the next sample would make the current one larger than max_size.
+    A shard is written under a temporary name and renamed once it is complete.
+    """
+
+    def __init__(self, directory: str, max_size: int = SHARD_SIZE, index: int = 0,
+                 prefix: str = "shard"):
+        self.directory = directory
+        self.max_size = max_size
+        self.index = index
+        self.prefix = prefix
+        self._file = None
+        self._archive = None
+        self._size = 0
+        self._samples = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.prefix}-{self.index:06d}.tar"
+
+    def add_sample(self, entries: list):
+        """
+        Write the entries of a sample. Return the record of the shard closed to
+        make room for it, if any.
+        """
+        # Each entry has a 512 bytes header and is padded to a block
+        size = sum(512 + len(data) + (-len(data)) % 512 for _, data in entries)
+        closed = None
+        if self._file is not None and self._size + size > self.max_size:
+            closed = self.close()
+        if self._file is None:
+            self._file = open(os.path.join(self.directory, self.name + ".partial"), "wb")
+            self._archive = ArchiveWriter("tar")
+        for name, data in entries:
+            self._archive.add(name, data)
+            self._file.write(self._archive.drain())
+        self._size += size
+        self._samples += 1
+        return closed
+
+    def close(self):
+        """Complete the current shard and return its record, or None if empty."""
+        if self._file is None:
+            return None
+        self._archive.close()
+        self._file.write(self._archive.drain())
+        self._file.close()
+        path = os.path.join(self.directory, self.name)
+        os.replace(path + ".partial", path)
+        record = {
+            "name": self.name,
+            "samples": self._samples,
+            "size": os.path.getsize(path),
+        }
+        self.index += 1
+        self._file = self._archive = None
+        self._size = self._samples = 0
+        return record
+
+    def abort(self):
+        """Remove the incomplete shard."""
+        if self._file is not None:
+            self._file.close()
+            os.remove(os.path.join(self.directory, self.name + ".partial"))
+            self._file = self._archive = None
+
+
+def load_manifest(directory: str):
+    """Return the manifest of a previous export, or None."""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_manifest(directory: str, manifest: dict):
+    """Write the manifest atomically, so an interrupted export keeps the last one."""
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + ".partial", "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + ".partial", path)
+
+
+def download(container_client, blob_name):
+    """Return the content of a blob, or None if it can not be downloaded."""
+    try:
+        return container_client.get_blob_client(blob_name).download_blob().readall()
+    except Exception as error:
+        print(f"Error downloading {blob_name}: {error}")
+        return None
+
+
+async def export_training_dataset(
+    cursor,
+    output_dir: str,
+    get_container_client,
+    label_format: str = "coco",
+    seed_id: str = None,
+    pipeline_id: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    incremental: bool = False,
+    shard_size: int = SHARD_SIZE,
+    prefetch: int = PREFETCH,
+    lag: timedelta = inference.VERIFIED_LAG,
+) -> dict:
+    """
+    Export the verified inferences as tar shards and a manifest.
+
+    The manifest is written each time a shard is completed, with the watermark of
+    its last sample, so an interrupted export can be continued with incremental.
+
+    Parameters:
+    - cursor: The cursor of the database.
+    - output_dir (str): The folder of the shards and of the manifest.
+    - get_container_client: An async function returning the container client of
+      a user from its id.
+    - label_format (str): One of LABEL_FORMATS.
+    - seed_id, pipeline_id, since, until: (optional) Filter the inferences.
+    - incremental (bool): Only export the inferences verified after the watermark
+      of the previous export.
+    - shard_size (int): The maximum size of a shard, in bytes.
+    - prefetch (int): The number of pictures downloaded ahead.
+    - lag (timedelta): The inferences verified since less than this are not
+      exported (see inference.VERIFIED_LAG).
+
+    Returns: the manifest
+    """
+    if label_format not in LABEL_FORMATS:
+        raise ExportError(f"Unknown label format: {label_format}")
+    os.makedirs(output_dir, exist_ok=True)
+    previous = load_manifest(output_dir)
+    if previous is not None and not incremental:
+        raise ExportError(
+            f"{output_dir} already has an export, use incremental to continue it"
+        )
+    if previous is not None and previous["label_format"] != label_format:
+        raise ExportError(
+            f"The previous export labels are {previous['label_format']}, "
+            f"not {label_format}"
+        )
+    manifest = previous or {
+        "label_format": label_format,
+        "categories": [],
+        "shards": [],
+        "samples": 0,
+        "missing": [],
+        "watermark": None,
+    }
+    manifest["filters"] = {
+        "seed_id": seed_id,
+        "pipeline_id": pipeline_id,
+        "since": None if since is None else since.isoformat(),
+        "until": None if until is None else until.isoformat(),
+    }
+    after = None
+    if manifest["watermark"] is not None:
+        after = (
+            datetime.fromisoformat(manifest["watermark"]["verified_at"]),
+            manifest["watermark"]["inference_id"],
+        )
+
+    container_clients = {}
+
+    async def fetch(sample):
+        owner_id = sample["owner_id"]
+        if owner_id not in container_clients:
+            container_clients[owner_id] = await get_container_client(owner_id)
+        return await asyncio.to_thread(
+            download, container_clients[owner_id], sample["blob_name"]
+        )
+
+    shards = ShardWriter(output_dir, shard_size, len(manifest["shards"]))
+    rows = inference.iter_verified_inferences(
+        cursor, seed_id, pipeline_id, since, until, after, lag=lag
+    )
+    pending = []
+    written = None
+    try:
+        while True:
+            # Keep `prefetch` downloads started ahead
+            for row in rows:
+                sample = build_sample(row)
+                pending.append((sample, asyncio.ensure_future(fetch(sample))))
+                if len(pending) > prefetch:
+                    break
+            if not pending:
+                break
+            sample, download_task = pending.pop(0)
+            data = await download_task
+            if data is None:
+                if sample["picture_id"] not in manifest["missing"]:
+                    manifest["missing"].append(sample["picture_id"])
+            else:
+                closed = shards.add_sample(
+                    build_sample_entries(
+                        sample, data, label_format, manifest["categories"]
+                    )
+                )
+                if closed is not None:
+                    manifest["shards"].append(closed)
+                    manifest["samples"] += closed["samples"]
+                    manifest["watermark"] = written
+                    write_manifest(output_dir, manifest)
+            written = {
+                "verified_at": sample["verified_at"],
+                "inference_id": sample["inference_id"],
+            }
+        closed = shards.close()
+        if closed is not None:
+            manifest["shards"].append(closed)
+            manifest["samples"] += closed["samples"]
+        if written is not None:
+            manifest["watermark"] = written
+        write_manifest(output_dir, manifest)
+        return manifest
+    finally:
+        for _, download_task in pending:
+            download_task.cancel()
+        shards.abort()
+        rows.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the verified Nachet annotations as a training dataset"
+    )
+    parser.add_argument("output_dir")
+    parser.add_argument("--format", default="coco", choices=LABEL_FORMATS)
+    parser.add_argument("--seed-name", default=None)
+    parser.add_argument("--pipeline-id", default=None)
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument(
+        "--shard-size", type=int, default=SHARD_SIZE // 1024**2,
+        help="maximum size of a shard, in MiB",
+    )
+    parser.add_argument("--prefetch", type=int, default=PREFETCH)
+    parser.add_argument(
+        "--lag", type=float, default=inference.VERIFIED_LAG.total_seconds() / 60,
+        help="minutes",
+    )
+    args = parser.parse_args(argv)
+
+    connection = db.connect_db(
+        os.environ.get("NACHET_DB_URL"), os.environ.get("NACHET_SCHEMA")
+    )
+    cursor = db.cursor(connection)
+
+    async def get_container_client(user_id):
+        return await datastore.get_user_container_client(
+            user_id,
+            os.environ.get("NACHET_STORAGE_URL"),
+            os.environ.get("NACHET_BLOB_ACCOUNT"),
+            os.environ.get("NACHET_BLOB_KEY"),
+        )
+
+    try:
+        seed_id = None
+        if args.seed_name is not None:
+            if not seed.is_seed_registered(cursor=cursor, seed_name=args.seed_name):
+                raise seed.SeedNotFoundError(
+                    f"Seed not found based on the given name: {args.seed_name}"
+                )
+            seed_id = str(seed.get_seed_id(cursor=cursor, seed_name=args.seed_name))
+        manifest = asyncio.run(
+            export_training_dataset(
+                cursor,
+                args.output_dir,
+                get_container_client,
+                args.format,
+                seed_id,
+                args.pipeline_id,
+                args.since,
+                args.until,
+                args.incremental,
+                args.shard_size * 1024**2,
+                args.prefetch,
+                timedelta(minutes=args.lag),
+            )
+        )
+    finally:
+        db.end_query(connection, cursor)
+    print(
+        f"{manifest['samples']} samples in {len(manifest['shards'])} shards, "
+        f"{len(manifest['missing'])} missing pictures, "
+        f"watermark: {manifest['watermark']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
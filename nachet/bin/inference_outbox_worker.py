@@ -0,0 +1,72 @@
+"""
+This script writes the inferences queued by register_inference_result(deferred=True).
+
+The outbox is drained by batches, each batch being written and removed from the
+outbox in one transaction. Several workers can run at the same time, the rows
+locked by one are skipped by the others. When the outbox is empty the worker
+waits before looking again.
+
+Parameters:
+- --batch-size: the number of inferences written per transaction
+- --interval: the seconds to wait when the outbox is empty
+- --once: exit once the outbox is empty
+"""
+
+import argparse
+import asyncio
+import os
+
+import datastore.db as db
+import nachet
+
+
+async def run(connection, batch_size: int, interval: float, once: bool = False) -> int:
+    """
+    Drain the outbox until it is empty (once) or forever.
+
+    Returns: the number of inferences written
+    """
+    total = 0
+    cursor = db.cursor(connection)
+    try:
+        while True:
+            try:
+                written = await nachet.drain_inference_outbox(cursor, batch_size)
+                connection.commit()
+            except Exception as error:
+                connection.rollback()
+                print(f"Error draining the inference outbox: {error}")
+                written = 0
+            total += written
+            if written:
+                print(f"{written} inference(s) written, {total} in total")
+            elif once:
+                return total
+            else:
+                await asyncio.sleep(interval)
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write the inferences waiting in the inference outbox"
+    )
+    parser.add_argument("--batch-size", type=int, default=nachet.OUTBOX_BATCH_SIZE)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args(argv)
+
+    connection = db.connect_db(
+        os.environ.get("NACHET_DB_URL"), os.environ.get("NACHET_SCHEMA")
+    )
+    try:
+        asyncio.run(run(connection, args.batch_size, args.interval, args.once))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
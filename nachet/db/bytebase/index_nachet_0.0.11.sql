@@ -0,0 +1,40 @@
+--Secondary indexes for "nachet_0.0.11"
+-- Every foreign key and lookup column filtered by the query functions gets an index
+-- so the lookups do not scan the whole table. Run once after the schema creation;
+-- the statements are idempotent.
+
+-- Users and pictures
+CREATE INDEX IF NOT EXISTS users_email_idx ON "nachet_0.0.11".users (email);
+CREATE INDEX IF NOT EXISTS picture_set_owner_id_idx ON "nachet_0.0.11".picture_set (owner_id);
+CREATE INDEX IF NOT EXISTS picture_picture_set_id_idx ON "nachet_0.0.11".picture (picture_set_id);
+CREATE INDEX IF NOT EXISTS picture_seed_picture_id_idx ON "nachet_0.0.11".picture_seed (picture_id);
+CREATE INDEX IF NOT EXISTS picture_seed_seed_id_idx ON "nachet_0.0.11".picture_seed (seed_id);
+
+-- Seeds: is_seed_registered matches the exact name, get_seed_id an unanchored
+-- ILIKE pattern ('%name') that only a trigram index can serve
+CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;
+CREATE INDEX IF NOT EXISTS seed_name_idx ON "nachet_0.0.11".seed (name);
+CREATE INDEX IF NOT EXISTS seed_name_trgm_idx ON "nachet_0.0.11".seed USING gin (name public.gin_trgm_ops);
+
+-- Inferences
+CREATE INDEX IF NOT EXISTS inference_picture_id_idx ON "nachet_0.0.11".inference (picture_id);
+CREATE INDEX IF NOT EXISTS inference_user_id_idx ON "nachet_0.0.11".inference (user_id);
+CREATE INDEX IF NOT EXISTS inference_pipeline_id_idx ON "nachet_0.0.11".inference (pipeline_id);
+CREATE INDEX IF NOT EXISTS object_inference_id_idx ON "nachet_0.0.11".object (inference_id);
+CREATE INDEX IF NOT EXISTS object_verified_id_idx ON "nachet_0.0.11".object (verified_id);
+CREATE INDEX IF NOT EXISTS object_top_id_idx ON "nachet_0.0.11".object (top_id);
+CREATE INDEX IF NOT EXISTS seed_obj_object_id_idx ON "nachet_0.0.11".seed_obj (object_id);
+CREATE INDEX IF NOT EXISTS seed_obj_seed_id_idx ON "nachet_0.0.11".seed_obj (seed_id);
+
+-- Machine learning structure
+CREATE INDEX IF NOT EXISTS pipeline_model_pipeline_id_idx ON "nachet_0.0.11".pipeline_model (pipeline_id);
+CREATE INDEX IF NOT EXISTS pipeline_model_model_id_idx ON "nachet_0.0.11".pipeline_model (model_id);
+CREATE INDEX IF NOT EXISTS pipeline_default_user_id_idx ON "nachet_0.0.11".pipeline_default (user_id);
+CREATE INDEX IF NOT EXISTS model_version_model_id_idx ON "nachet_0.0.11".model_version (model_id);
+CREATE INDEX IF NOT EXISTS model_name_idx ON "nachet_0.0.11".model (name);
+CREATE INDEX IF NOT EXISTS model_endpoint_name_idx ON "nachet_0.0.11".model (endpoint_name);
+CREATE INDEX IF NOT EXISTS pipeline_name_idx ON "nachet_0.0.11".pipeline (name);
+
+
+-- Training dataset export: the verified inferences in the order they were verified
+CREATE INDEX IF NOT EXISTS inference_verified_update_at_idx ON "nachet_0.0.11".inference (update_at, id) WHERE verified;
@@ -0,0 +1,19 @@
+--Outbox of the deferred inference registrations of "nachet_0.0.11"
+-- register_inference_result(deferred=True) stores the inference, with its ids already
+-- generated, in this table instead of writing the inference, object and seed_obj rows.
+-- drain_inference_outbox writes them later, by batches, and deletes the outbox rows in the
+-- same transaction. A row that can not be written keeps its error and is retried until
+-- attempts reaches the limit of the worker. Run once after the schema creation; the
+-- statements are idempotent.
+
+CREATE TABLE IF NOT EXISTS "nachet_0.0.11"."inference_outbox" (
+    "id" bigserial PRIMARY KEY,
+    "inference_id" uuid NOT NULL UNIQUE,
+    "picture_id" uuid NOT NULL,
+    "user_id" uuid NOT NULL,
+    "pipeline_id" uuid,
+    "payload" json NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "attempts" integer NOT NULL DEFAULT 0,
+    "last_error" text
+);
@@ -0,0 +1,75 @@
+--Uncertainty of the inferences of "nachet_0.0.11", for the review queue
+-- Each inference stores the lowest top score and the smallest margin between the two best
+-- guesses of its boxes, set by register_inference_result, and whether another pipeline
+-- predicted other seeds on the same picture. The next inferences to review are then read
+-- from a partial index of the unverified inferences instead of joining object and seed_obj.
+-- Run once after the schema creation; the statements are idempotent.
+
+ALTER TABLE "nachet_0.0.11".inference
+    ADD COLUMN IF NOT EXISTS "min_top_score" float,
+    ADD COLUMN IF NOT EXISTS "min_margin" float,
+    ADD COLUMN IF NOT EXISTS "disagreement" boolean NOT NULL DEFAULT false;
+
+-- Backfill the inferences registered before the columns existed
+UPDATE "nachet_0.0.11".inference i
+SET
+    min_top_score = u.min_top_score,
+    min_margin = u.min_margin
+FROM (
+    SELECT
+        inference_id,
+        min(top_score) AS min_top_score,
+        min(top_score - second_score) AS min_margin
+    FROM (
+        SELECT
+            o.inference_id,
+            max(so.score) AS top_score,
+            COALESCE(
+                (array_agg(so.score ORDER BY so.score DESC))[2], 0
+            ) AS second_score
+        FROM "nachet_0.0.11".object o
+        JOIN "nachet_0.0.11".seed_obj so ON so.object_id = o.id
+        WHERE NOT o.manual_detection
+        GROUP BY o.id, o.inference_id
+    ) boxes
+    GROUP BY inference_id
+) u
+WHERE i.id = u.inference_id AND i.min_top_score IS NULL;
+
+-- Backfill the disagreement of the pictures inferred by several pipelines
+-- (see inference.set_inference_disagreement)
+WITH tops AS (
+    SELECT
+        i.id,
+        i.picture_id,
+        i.pipeline_id,
+        array_agg(so.seed_id ORDER BY so.seed_id)
+            FILTER (WHERE so.seed_id IS NOT NULL) AS seeds
+    FROM "nachet_0.0.11".inference i
+    LEFT JOIN "nachet_0.0.11".object o ON o.inference_id = i.id
+    LEFT JOIN "nachet_0.0.11".seed_obj so ON so.id = o.top_id
+    GROUP BY i.id, i.picture_id, i.pipeline_id
+)
+UPDATE "nachet_0.0.11".inference
+SET disagreement = true
+WHERE id IN (
+        SELECT a.id
+        FROM tops a
+        JOIN tops b
+        ON a.picture_id = b.picture_id
+            AND a.pipeline_id IS DISTINCT FROM b.pipeline_id
+            AND a.seeds IS DISTINCT FROM b.seeds
+    )
+    AND NOT disagreement;
+
+-- Review queue of each strategy (see inference.get_uncertain_inferences), per user first:
+-- the queue of a user is read in order from its range of the index
+DROP INDEX IF EXISTS "nachet_0.0.11".inference_review_top_score_idx;
+DROP INDEX IF EXISTS "nachet_0.0.11".inference_review_margin_idx;
+DROP INDEX IF EXISTS "nachet_0.0.11".inference_review_disagreement_idx;
+CREATE INDEX IF NOT EXISTS inference_review_user_top_score_idx ON "nachet_0.0.11".inference (user_id, min_top_score, id)
+    WHERE NOT verified;
+CREATE INDEX IF NOT EXISTS inference_review_user_margin_idx ON "nachet_0.0.11".inference (user_id, min_margin, id)
+    WHERE NOT verified;
+CREATE INDEX IF NOT EXISTS inference_review_user_disagreement_idx ON "nachet_0.0.11".inference (user_id, min_margin, id)
+    WHERE NOT verified AND disagreement;
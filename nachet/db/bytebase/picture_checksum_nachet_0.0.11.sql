@@ -0,0 +1,12 @@
+--Content-addressed pictures for "nachet_0.0.11".picture
+-- The sha256 of each uploaded picture is stored on its row. Pictures with the same content
+-- in the same user container share one blob, stored under objects/<checksum>; the number of
+-- rows referencing a checksum is its reference count. Run once after the schema creation;
+-- the statements are idempotent.
+
+ALTER TABLE "nachet_0.0.11".picture
+    ADD COLUMN IF NOT EXISTS "checksum" text;
+
+-- Reference lookups of the upload and delete paths
+CREATE INDEX IF NOT EXISTS picture_checksum_idx ON "nachet_0.0.11".picture (checksum)
+    WHERE checksum IS NOT NULL;
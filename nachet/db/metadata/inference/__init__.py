@@ -5,6 +5,7 @@ The metadata is generated in a json format and is used to store the metadata in
 """
 
 import json
+import uuid
 import nachet.db.queries.seed as seed
 import nachet.db.queries.inference as inference
 import nachet.db.queries.machine_learning as machine_learning
@@ -25,6 +26,8 @@ class Box(BaseModel):
     bottomX : float
     bottomY : float
 
+BOX_COORDINATES = ("topX", "topY", "bottomX", "bottomY")
+
 class Model(BaseModel):
     name: str
     version: str
@@ -98,6 +101,60 @@ def build_object_import(object: dict) -> str:
     }
     return json.dumps(data)
 
+def assign_inference_ids(model_inference: dict) -> dict:
+    """
+    This function generates the ids of an inference before it is written, so the
+    inference can be returned before its rows exist. The ids are added as
+    register_inference_result adds them: inference_id, and for each box its
+    box_id, the object_id of each topN and the top_id (the best of the topN).
+
+    Parameters:
+    - model_inference: (dict) The model inference object.
+
+    Returns:
+    - The model inference with the ids.
+    """
+    model_inference["inference_id"] = str(uuid.uuid4())
+    for box in model_inference["boxes"][: int(model_inference["totalBoxes"])]:
+        box["box_id"] = str(uuid.uuid4())
+        box["object_type_id"] = 1
+        if box.get("topN"):
+            top_score = -1
+            for top in box["topN"]:
+                top["object_id"] = str(uuid.uuid4())
+                if top["score"] > top_score:
+                    top_score = top["score"]
+                    box["top_id"] = top["object_id"]
+        else:
+            box["top_id"] = str(uuid.uuid4())
+    return model_inference
+
+def build_inference_uncertainty(boxes: list) -> tuple:
+    """
+    This function computes how uncertain the model is about an inference, to
+    order the review queue.
+
+    Parameters:
+    - boxes: (list) The boxes of the model inference, with their topN (or only
+      their score).
+
+    Returns:
+    - (min_top_score, min_margin): the lowest top score of the boxes and the
+      smallest difference between the two best scores of a box, None if there is
+      no box.
+    """
+    top_scores = []
+    margins = []
+    for box in boxes:
+        scores = sorted(
+            (float(top["score"]) for top in box.get("topN") or []), reverse=True
+        ) or [float(box["score"])]
+        top_scores.append(scores[0])
+        margins.append(scores[0] - (scores[1] if len(scores) > 1 else 0.0))
+    if not top_scores:
+        return None, None
+    return min(top_scores), min(margins)
+
 def compare_object_metadata(object1:dict , object2:dict) -> bool:
     """
     This function compares two object metadata to check if they are the same.
@@ -110,11 +167,14 @@ def compare_object_metadata(object1:dict , object2:dict) -> bool:
     - True if the objects are the same, False otherwise.
     """
     try :
-        box1 = Box(**object1)
-        box2 = Box(**object2)
-        return box1 == box2
-    except ValidationError as e :
-        raise e
+        return all(
+            float(object1[key]) == float(object2[key]) for key in BOX_COORDINATES
+        )
+    except (KeyError, TypeError, ValueError):
+        # Let the Box model raise the ValidationError describing the bad input
+        Box(**object1)
+        Box(**object2)
+        raise
 
 def rebuild_inference(cursor, inf) :
     """
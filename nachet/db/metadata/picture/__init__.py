@@ -1,11 +1,16 @@
 """ 
 This module contains the function to build the picture metadata needed for the database.
 """
+import base64
+import io
+import os
+from contextlib import contextmanager
 from datetime import date
-from datastore.db.metadata import validator
+
 from PIL import Image
-import io
-import base64
+
+import datastore.blob.azure_storage_api as azure_storage
+from datastore.db.metadata import validator
 
 
 class PictureCreationError(Exception):
@@ -13,70 +18,104 @@ class PictureCreationError(Exception):
 
 
 def build_picture(
-    pic_encoded, link: str, nb_seeds: int, zoom: float, description: str = ""
+    pic_encoded,
+    link: str,
+    nb_seeds: int,
+    zoom: float,
+    description: str = "",
+    storage: dict = None,
 ):
     """
     This function builds the Picture metadata needed for the database.
 
     Parameters:
-    - pic_encoded (str): The picture in a string format.
+    - pic_encoded: The picture as raw bytes, a memoryview, a file path or a
+      base64 string. Only the header is parsed, the pixels are not decoded.
     - link (str): The link to the picture blob.
     - nb_seeds (int): The number of seeds in the picture.
     - zoom (float): The zoom level of the picture.
+    - storage (dict): (optional) How the picture is stored, if it was recompressed
+      (compression, original_size, stored_size).
 
     Returns:
     - The picture metadata in a string dict format.
     """
 
-    user_data = validator.UserData(
-        description=description, number_of_seeds=nb_seeds, zoom=zoom
-    )
-
-    meta_data = validator.Metadata(upload_date=date.today())
-
-    pic_properties = get_image_properties(pic_encoded)
-
-    image_metadata = validator.ImageData(
-        format=pic_properties[2],
-        height=pic_properties[1],
-        width=pic_properties[0],
-        resolution="",
-        source=link,
-        parent="",
-    )
-
-    quality_check_metadata = validator.QualityCheck(
-        image_checksum="",
-        upload_check=True,
-        valid_data=True,
-        error_type="",
-        quality_score=0.0,
-    )
-
-    picture = validator.ProcessedPicture(
-        user_data=user_data,
-        metadata=meta_data,
-        image_data=image_metadata,
-        quality_check=quality_check_metadata,
-    )
+    with open_picture(pic_encoded) as picture_file:
+        pic_properties = _read_properties(picture_file)
+        picture_file.seek(0)
+        checksum = azure_storage.compute_checksum(picture_file)
+
+    picture_data = {
+        "user_data": {
+            "description": description,
+            "number_of_seeds": nb_seeds,
+            "zoom": zoom,
+        },
+        "metadata": {"upload_date": date.today()},
+        "image_data": {
+            "format": pic_properties[2],
+            "height": pic_properties[1],
+            "width": pic_properties[0],
+            "resolution": "",
+            "source": link,
+            "parent": "",
+        },
+        "quality_check": {
+            "image_checksum": checksum,
+            "upload_check": True,
+            "valid_data": True,
+            "error_type": "",
+            "quality_score": 0.0,
+        },
+    }
+    if storage is not None:
+        picture_data["storage"] = storage
     try:
-        validator.ProcessedPicture(**picture.model_dump())
+        picture = validator.dump_json(validator.ProcessedPicture, picture_data)
     except validator.ValidationError as e:
         raise PictureCreationError("Error, Picture not created:"+str(e)) from None
-    return picture.model_dump_json()
+    return picture.decode()
+
 
+@contextmanager
+def open_picture(picture):
+    """
+    Open a picture as a binary file object.
 
-def get_image_properties(pic_encoded: str):
+    Parameters:
+    - picture: Raw bytes, a memoryview, a file path (str or os.PathLike) or a
+      base64 string.
+    """
+    if isinstance(picture, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(picture)
+    elif isinstance(picture, os.PathLike) or (
+        isinstance(picture, str) and os.path.isfile(picture)
+    ):
+        with open(picture, "rb") as picture_file:
+            yield picture_file
+    elif isinstance(picture, str):
+        yield io.BytesIO(base64.b64decode(picture))
+    else:
+        raise PictureCreationError(f"Unsupported picture type: {type(picture)}")
+
+
+def _read_properties(picture_file):
+    # Image.open only parses the header: the pixel data is never decoded
+    with Image.open(picture_file) as img:
+        width, height = img.size
+        return width, height, img.format
+
+
+def get_image_properties(pic_encoded):
     """
-    Function to retrieve an image's properties.
+    Function to retrieve an image's properties from its header.
 
     Parameters:
-    - pic_encoded (str): The image in a string format.
+    - pic_encoded: The image as raw bytes, a memoryview, a file path or a base64 string.
 
     Returns:
     - The image's width, height and format as a tuple.
     """
-    img = Image.open(io.BytesIO(base64.b64decode(pic_encoded)))
-    width, height = img.size
-    img_format = img.format
-    return width, height, img_format
+    with open_picture(pic_encoded) as picture_file:
+        return _read_properties(picture_file)
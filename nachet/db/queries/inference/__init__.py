@@ -3,6 +3,14 @@ This module contains the queries related to the inference related tables.
 
 """
 
+from datetime import timedelta
+
+# The verification time (update_at) is stamped when the row is written, the
+# transaction commits later: the inferences verified within the last VERIFIED_LAG
+# are not read yet, so an iteration resumed from its last update_at never skips a
+# verification committed after it.
+VERIFIED_LAG = timedelta(minutes=5)
+
 class InferenceCreationError(Exception):
     pass
 
@@ -18,6 +26,17 @@ class InferenceObjectNotFoundError(Exception):
 class InferenceAlreadyVerifiedError(Exception):
     pass
 
+class InferenceRetrievalError(Exception):
+    pass
+
+# Order of the review queue of each strategy: the column of the partial index it
+# is read from, and the condition of that index besides not verified
+UNCERTAINTY_STRATEGIES = {
+    "least_confident": ("min_top_score", ""),
+    "margin": ("min_margin", ""),
+    "disagreement": ("min_margin", "AND disagreement"),
+}
+
 """
 
 INFERENCE TABLE QUERIES
@@ -177,7 +196,8 @@ def set_inference_verified(cursor, inference_id, is_verified):
             UPDATE 
                 inference
             SET
-                verified = %s
+                verified = %s,
+                update_at = clock_timestamp()
             WHERE 
                 id = %s
             """
@@ -280,9 +300,524 @@ def check_inference_exist(cursor, inference_id):
         return res is not None
     except Exception:
         raise Exception(f"Error: could not check if inference {inference_id} exists")
+
+def set_inference_uncertainty(cursor, inference_id, min_top_score, min_margin):
+    """
+    This function sets the uncertainty of an inference (see
+    inference_metadata.build_inference_uncertainty).
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - inference_id (str): The UUID of the inference.
+    - min_top_score (float): The lowest top score of the boxes.
+    - min_margin (float): The smallest margin between the two best scores of a box.
+    """
+    try:
+        query = """
+            UPDATE 
+                inference
+            SET
+                min_top_score = %s,
+                min_margin = %s
+            WHERE 
+                id = %s
+            """
+        cursor.execute(query, (min_top_score, min_margin, inference_id))
+    except Exception:
+        raise Exception(f"Error: could not set the uncertainty of inference {inference_id}")
+
+def set_inference_disagreement(cursor, picture_id):
+    """
+    This function flags the inferences of a picture whose top seeds differ from the
+    top seeds predicted by another pipeline on the same picture.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - picture_id (str): The UUID of the picture.
+    """
+    try:
+        query = """
+            WITH tops AS (
+                SELECT
+                    i.id,
+                    i.pipeline_id,
+                    array_agg(so.seed_id ORDER BY so.seed_id)
+                        FILTER (WHERE so.seed_id IS NOT NULL) AS seeds
+                FROM
+                    inference i
+                LEFT JOIN
+                    object o ON o.inference_id = i.id
+                LEFT JOIN
+                    seed_obj so ON so.id = o.top_id
+                WHERE
+                    i.picture_id = %s
+                GROUP BY
+                    i.id, i.pipeline_id
+            )
+            UPDATE
+                inference
+            SET
+                disagreement = true
+            WHERE
+                id IN (
+                    SELECT a.id
+                    FROM tops a
+                    JOIN tops b
+                    ON a.pipeline_id IS DISTINCT FROM b.pipeline_id
+                        AND a.seeds IS DISTINCT FROM b.seeds
+                )
+                AND NOT disagreement
+            """
+        cursor.execute(query, (picture_id,))
+    except Exception:
+        raise Exception(f"Error: could not set the disagreement of picture {picture_id}")
+
+def get_uncertain_inferences(
+    cursor,
+    strategy: str = "least_confident",
+    limit: int = 100,
+    user_id: str = None,
+    after: tuple = None,
+):
+    """
+    This function returns the unverified inferences the models are the least sure
+    about, to be reviewed first. The inferences of a user are read in the order of
+    a partial index on (user_id, value, id) (see UNCERTAINTY_STRATEGIES), so only
+    `limit` rows are read.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - strategy (str): "least_confident" (lowest top score first), "margin"
+      (smallest margin between the two best guesses first) or "disagreement"
+      (predicted differently by another pipeline, smallest margin first).
+    - limit (int): The number of inferences to return.
+    - user_id (str): (optional) Only the inferences of this user.
+    - after (tuple): (optional) The (value, inference_id) of the last inference of
+      the previous page.
+
+    Returns:
+    - list of (inference_id, picture_id, value), value being the top score or the
+      margin.
+    """
+    if strategy not in UNCERTAINTY_STRATEGIES:
+        raise InferenceRetrievalError(f"Error: unknown review strategy {strategy}")
+    column, condition = UNCERTAINTY_STRATEGIES[strategy]
+    conditions = [f"NOT verified {condition}", f"{column} IS NOT NULL"]
+    params = []
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if after is not None:
+        conditions.append(f"({column}, id) > (%s, %s)")
+        params.extend(after)
+    params.append(limit)
+    try:
+        query = f"""
+            SELECT
+                id,
+                picture_id,
+                {column}
+            FROM
+                inference
+            WHERE
+                {" AND ".join(conditions)}
+            ORDER BY
+                {column}, id
+            LIMIT %s
+            """
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    except Exception:
+        raise InferenceRetrievalError(
+            f"Error: could not get the inferences to review ({strategy})"
+        )
+
+def iter_verified_inferences(
+    cursor,
+    seed_id: str = None,
+    pipeline_id: str = None,
+    since=None,
+    until=None,
+    after: tuple = None,
+    itersize: int = 500,
+    lag: timedelta = VERIFIED_LAG,
+):
+    """
+    This function iterates over the verified inferences with a server-side cursor,
+    so the rows are fetched itersize at a time instead of all at once. The
+    inferences are ordered by the time they were verified (update_at) and id.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database. Its connection is used.
+    - seed_id (str): (optional) Only the inferences with a verified box or a
+      picture_seed of this seed.
+    - pipeline_id (str): (optional) Only the inferences of this pipeline.
+    - since (datetime): (optional) Only the inferences verified at or after.
+    - until (datetime): (optional) Only the inferences verified before.
+    - after (tuple): (optional) The (update_at, inference_id) of the last
+      inference already read, the iteration starts after it.
+    - itersize (int): The number of rows fetched at a time.
+    - lag (timedelta): Only the inferences verified before this long ago (see
+      VERIFIED_LAG). None reads them all, e.g. within the verifying transaction.
+
+    Yields:
+    - (inference_id, picture_id, pipeline_id, update_at, picture, checksum,
+      owner_id, folder_name, boxes, seeds). The boxes are the valid objects with
+      their verified seed ({object_id, box, seed_id, seed_name}), the seeds are the
+      picture_seed of the picture ({seed_id, seed_name}).
+    """
+    conditions = ["i.verified"]
+    params = []
+    if pipeline_id is not None:
+        conditions.append("i.pipeline_id = %s")
+        params.append(pipeline_id)
+    if since is not None:
+        conditions.append("i.update_at >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("i.update_at < %s")
+        params.append(until)
+    if after is not None:
+        conditions.append("(i.update_at, i.id) > (%s, %s)")
+        params.extend(after)
+    if lag is not None:
+        conditions.append("i.update_at < clock_timestamp()::timestamp - %s")
+        params.append(lag)
+    if seed_id is not None:
+        conditions.append(
+            """(
+                EXISTS (
+                    SELECT 1
+                    FROM object o
+                    JOIN seed_obj so ON so.id = o.verified_id
+                    WHERE o.inference_id = i.id AND o.valid AND so.seed_id = %s
+                )
+                OR EXISTS (
+                    SELECT 1
+                    FROM picture_seed ps
+                    WHERE ps.picture_id = i.picture_id AND ps.seed_id = %s
+                )
+            )"""
+        )
+        params.extend((seed_id, seed_id))
+    query = f"""
+        SELECT
+            i.id,
+            i.picture_id,
+            i.pipeline_id,
+            i.update_at,
+            p.picture,
+            p.checksum,
+            ps.owner_id,
+            CASE WHEN u.default_set_id = ps.id THEN 'General' ELSE ps.name END,
+            COALESCE(
+                (
+                    SELECT
+                        json_agg(
+                            json_build_object(
+                                'object_id', o.id,
+                                'box', COALESCE(o.box_metadata -> 'box', o.box_metadata),
+                                'seed_id', s.id,
+                                'seed_name', s.name
+                            )
+                            ORDER BY o.upload_date, o.id
+                        )
+                    FROM
+                        object o
+                    JOIN
+                        seed_obj so ON so.id = o.verified_id
+                    JOIN
+                        seed s ON s.id = so.seed_id
+                    WHERE
+                        o.inference_id = i.id AND o.valid
+                ),
+                '[]'::json
+            ),
+            COALESCE(
+                (
+                    SELECT
+                        json_agg(
+                            json_build_object('seed_id', s.id, 'seed_name', s.name)
+                        )
+                    FROM
+                        picture_seed pse
+                    JOIN
+                        seed s ON s.id = pse.seed_id
+                    WHERE
+                        pse.picture_id = i.picture_id
+                ),
+                '[]'::json
+            )
+        FROM
+            inference i
+        JOIN
+            picture p ON p.id = i.picture_id
+        JOIN
+            picture_set ps ON ps.id = p.picture_set_id
+        JOIN
+            users u ON u.id = ps.owner_id
+        WHERE
+            {" AND ".join(conditions)}
+        ORDER BY
+            i.update_at, i.id
+        """
+    try:
+        with cursor.connection.cursor(name="verified_inferences") as rows:
+            rows.itersize = itersize
+            rows.execute(query, params)
+            yield from rows
+    except Exception:
+        raise InferenceRetrievalError("Error: could not get the verified inferences")
+
+def iter_evaluation_objects(
+    cursor,
+    seed_ids: list,
+    pipeline_ids: list,
+    pipeline_id: str = None,
+    since=None,
+    until=None,
+    itersize: int = 10000,
+):
+    """
+    This function iterates over the objects of the verified inferences with what
+    the pipeline predicted and what the reviewer verified, for the evaluation of
+    the pipelines. The rows are read with a server-side cursor and yielded by
+    chunks of itersize. The seeds and the pipelines are returned as their index in
+    seed_ids and pipeline_ids, so the rows only hold numbers.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database. Its connection is used.
+    - seed_ids (list): The UUIDs of the seeds, -1 is returned for the others.
+    - pipeline_ids (list): The UUIDs of the pipelines, -1 for the others.
+    - pipeline_id (str): (optional) Only the inferences of this pipeline.
+    - since (datetime): (optional) Only the inferences verified at or after.
+    - until (datetime): (optional) Only the inferences verified before.
+    - itersize (int): The number of rows yielded at a time.
+
+    Yields:
+    - lists of (pipeline, predicted seed, verified seed, valid, manual_detection,
+      top score, verified rank). The verified rank is the rank of the verified
+      seed in the topN of the object (1 for the top), 0 if the reviewer chose a
+      seed that is not in the topN, -1 if the object has no verified seed.
+    """
+    conditions = ["i.verified"]
+    params = [[str(id) for id in seed_ids], [str(id) for id in pipeline_ids]]
+    if pipeline_id is not None:
+        conditions.append("i.pipeline_id = %s")
+        params.append(pipeline_id)
+    if since is not None:
+        conditions.append("i.update_at >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("i.update_at < %s")
+        params.append(until)
+    query = f"""
+        WITH
+            seeds AS (
+                SELECT id, (idx - 1)::integer AS idx
+                FROM unnest(%s::uuid[]) WITH ORDINALITY AS s(id, idx)
+            ),
+            pipelines AS (
+                SELECT id, (idx - 1)::integer AS idx
+                FROM unnest(%s::uuid[]) WITH ORDINALITY AS p(id, idx)
+            )
+        SELECT
+            COALESCE(pl.idx, -1),
+            COALESCE(ts.idx, -1),
+            COALESCE(vs.idx, -1),
+            o.valid,
+            o.manual_detection,
+            COALESCE(tso.score, 0)::float8,
+            CASE
+                WHEN vso.id IS NULL THEN -1
+                WHEN vso.score <= 0 THEN 0
+                ELSE 1 + (
+                    SELECT count(*)
+                    FROM seed_obj so
+                    WHERE so.object_id = o.id AND so.score > vso.score
+                )::integer
+            END
+        FROM
+            object o
+        JOIN
+            inference i ON i.id = o.inference_id
+        LEFT JOIN
+            pipelines pl ON pl.id = i.pipeline_id
+        LEFT JOIN
+            seed_obj tso ON tso.id = o.top_id
+        LEFT JOIN
+            seeds ts ON ts.id = tso.seed_id
+        LEFT JOIN
+            seed_obj vso ON vso.id = o.verified_id
+        LEFT JOIN
+            seeds vs ON vs.id = vso.seed_id
+        WHERE
+            {" AND ".join(conditions)}
+        """
+    try:
+        with cursor.connection.cursor(name="evaluation_objects") as rows:
+            rows.execute(query, params)
+            while True:
+                chunk = rows.fetchmany(itersize)
+                if not chunk:
+                    break
+                yield chunk
+    except Exception:
+        raise InferenceRetrievalError(
+            "Error: could not get the objects of the verified inferences"
+        )
     
 """
 
+INFERENCE OUTBOX QUERIES
+
+"""
+
+def new_inference_outbox(cursor, inference_id: str, picture_id: str, user_id: str, pipeline_id: str, payload: str):
+    """
+    This function stores an inference to be written later by
+    drain_inference_outbox. Its ids are already generated.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - inference_id (str): The UUID the inference will have.
+    - picture_id (str): The UUID of the picture the inference is related to.
+    - user_id (str): The UUID of the user uploading.
+    - pipeline_id (str): The UUID of the pipeline.
+    - payload (str): The model inference with its ids, formatted as a json.
+    """
+    try:
+        query = """
+            INSERT INTO 
+                inference_outbox(
+                    inference_id,
+                    picture_id,
+                    user_id,
+                    pipeline_id,
+                    payload
+                    )
+            VALUES
+                (%s,%s,%s,%s,%s)
+            """
+        cursor.execute(query, (inference_id, picture_id, user_id, pipeline_id, payload))
+    except Exception:
+        raise InferenceCreationError(f"Error: inference {inference_id} not queued")
+
+def get_inference_outbox(cursor, limit: int, max_attempts: int, inference_id: str = None):
+    """
+    This function locks and returns the oldest inferences of the outbox. The rows
+    locked by another worker are skipped, so several workers can drain the outbox.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - limit (int): The number of inferences to return.
+    - max_attempts (int): The inferences which failed this many times are left.
+    - inference_id (str): (optional) Only this inference. Its row is not skipped
+      if a worker holds it: the call waits for the worker to commit (the row is
+      then gone, the inference written) or to roll back.
+
+    Returns:
+    - list of (id, inference_id, picture_id, user_id, pipeline_id, payload)
+    """
+    try:
+        condition = "" if inference_id is None else "AND inference_id = %s"
+        params = [max_attempts] + ([] if inference_id is None else [inference_id])
+        lock = "FOR UPDATE SKIP LOCKED" if inference_id is None else "FOR UPDATE"
+        query = f"""
+            SELECT
+                id,
+                inference_id,
+                picture_id,
+                user_id,
+                pipeline_id,
+                payload
+            FROM
+                inference_outbox
+            WHERE
+                attempts < %s {condition}
+            ORDER BY
+                id
+            LIMIT %s
+            {lock}
+            """
+        cursor.execute(query, params + [limit])
+        return cursor.fetchall()
+    except Exception:
+        raise InferenceRetrievalError("Error: could not get the inference outbox")
+
+def delete_inference_outbox(cursor, outbox_ids: list):
+    """
+    This function removes written inferences from the outbox.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - outbox_ids (list): The ids of the outbox rows.
+    """
+    try:
+        cursor.execute(
+            "DELETE FROM inference_outbox WHERE id = ANY(%s)", (list(outbox_ids),)
+        )
+    except Exception:
+        raise Exception("Error: could not delete the inference outbox rows")
+
+def set_inference_outbox_error(cursor, outbox_id: int, error: str):
+    """
+    This function records the failure to write an inference of the outbox.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - outbox_id (int): The id of the outbox row.
+    - error (str): The error.
+    """
+    try:
+        query = """
+            UPDATE
+                inference_outbox
+            SET
+                attempts = attempts + 1,
+                last_error = %s
+            WHERE
+                id = %s
+            """
+        cursor.execute(query, (error, outbox_id))
+    except Exception:
+        raise Exception(f"Error: could not set the error of outbox row {outbox_id}")
+
+def copy_new_inferences(cursor, inferences: list, objects: list, seed_objects: list):
+    """
+    This function uploads a batch of NEW INFERENCES with their objects and seed
+    objects with COPY instead of one INSERT per row. The ids are generated
+    beforehand since COPY can not return them.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+    - inferences (list): (id, inference, picture_id, user_id, pipeline_id,
+      min_top_score, min_margin)
+    - objects (list): (id, box_metadata, inference_id, type_id, top_id)
+    - seed_objects (list): (id, seed_id, object_id, score)
+    """
+    try:
+        with cursor.copy(
+            "COPY inference (id, inference, picture_id, user_id, pipeline_id, "
+            "min_top_score, min_margin) FROM STDIN"
+        ) as copy:
+            for row in inferences:
+                copy.write_row(row)
+        with cursor.copy(
+            "COPY object (id, box_metadata, inference_id, type_id, top_id) FROM STDIN"
+        ) as copy:
+            for row in objects:
+                copy.write_row(row)
+        with cursor.copy(
+            "COPY seed_obj (id, seed_id, object_id, score) FROM STDIN"
+        ) as copy:
+            for row in seed_objects:
+                copy.write_row(row)
+    except Exception:
+        raise InferenceCreationError("Error: Inferences not uploaded")
+
+"""
+
 OBJECT TABLE QUERIES
 
 """
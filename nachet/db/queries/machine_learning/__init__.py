@@ -195,6 +195,29 @@ def get_active_pipeline(cursor):
     except(Exception):
         raise PipelineCreationError("Error: pipeline not found")
     
+def get_all_pipelines(cursor):
+    """
+    This function gets all the pipelines from the database.
+
+    Parameters:
+    - cursor (cursor): The cursor of the database.
+
+    Returns:
+    - list of tuple (id, name)
+    """
+    try:
+        query = """
+            SELECT 
+                id,
+                name
+            FROM 
+                pipeline
+            """
+        cursor.execute(query)
+        return cursor.fetchall()
+    except(Exception):
+        raise PipelineCreationError("Error: pipelines not found")
+
 def set_nachet_default_pipeline(cursor,pipeline_id:str):
     """
     This function sets the given pipeline as the default pipeline.
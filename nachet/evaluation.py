@@ -0,0 +1,242 @@
+"""
+This module evaluates the pipelines from the feedback of the reviewers.
+
+The objects of the verified inferences are read once as NumPy arrays: what the
+pipeline predicted (the seed of `object.top_id` and its score, the rank of the
+verified seed in the topN) and what the reviewer verified (`object.verified_id`,
+`valid`, `manual_detection`). Every figure is then computed for all the pipelines
+at once with `np.bincount`, so the evaluation does not loop over the objects.
+
+- A false positive is a box of the pipeline deleted by the reviewer (not valid).
+- A missed box is a box added by the reviewer (manual_detection).
+- The classification figures (confusion matrix, top-k accuracy, calibration) are
+  computed on the valid boxes of the pipeline with a verified seed.
+"""
+
+import numpy as np
+
+import nachet.db.queries.inference as inference
+import nachet.db.queries.machine_learning as machine_learning
+import nachet.db.queries.seed as seed
+
+OBJECT_DTYPE = np.dtype(
+    [
+        ("pipeline", np.int32),
+        ("predicted", np.int32),
+        ("verified", np.int32),
+        ("valid", np.bool_),
+        ("manual", np.bool_),
+        ("score", np.float64),
+        ("rank", np.int32),
+    ]
+)
+TOP_K = (1, 3, 5)
+CALIBRATION_BINS = 10
+
+
+def fetch_evaluation_objects(
+    cursor, pipeline_id: str = None, since=None, until=None
+):
+    """
+    Read the objects of the verified inferences as a structured array of
+    OBJECT_DTYPE. The seeds and the pipelines are their index in the returned
+    lists.
+
+    Returns: (objects, seeds, pipelines), the seeds and the pipelines being lists
+    of (id, name)
+    """
+    seeds = sorted(seed.get_all_seeds(cursor), key=lambda s: (s[1], str(s[0])))
+    pipelines = sorted(
+        machine_learning.get_all_pipelines(cursor), key=lambda p: (p[1], str(p[0]))
+    )
+    chunks = [
+        np.array(chunk, dtype=OBJECT_DTYPE)
+        for chunk in inference.iter_evaluation_objects(
+            cursor,
+            [id for id, _ in seeds],
+            [id for id, _ in pipelines],
+            pipeline_id,
+            since,
+            until,
+        )
+    ]
+    objects = np.concatenate(chunks) if chunks else np.empty(0, dtype=OBJECT_DTYPE)
+    return objects, seeds, pipelines
+
+
+def _ratio(numerator, denominator):
+    # NaN where there is nothing to divide
+    numerator = np.asarray(numerator, dtype=np.float64)
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.full(numerator.shape, np.nan),
+        where=np.asarray(denominator) > 0,
+    )
+
+
+def evaluate(
+    objects,
+    nb_pipelines: int,
+    nb_seeds: int,
+    top_k: tuple = TOP_K,
+    bins: int = CALIBRATION_BINS,
+) -> dict:
+    """
+    Compute the evaluation figures of every pipeline. The objects of an unknown
+    pipeline (index -1) are ignored.
+
+    Parameters:
+    - objects: A structured array of OBJECT_DTYPE.
+    - nb_pipelines (int): The number of pipelines.
+    - nb_seeds (int): The number of seeds.
+    - top_k (tuple): The k of the top-k accuracies.
+    - bins (int): The number of bins of the score calibration.
+
+    Returns: a dict of arrays, indexed by pipeline first
+    - objects, detections, false_positives, missed_boxes, classified
+    - false_positive_rate (of the detections), missed_box_rate (of the valid boxes)
+    - confusion_matrix (pipelines x verified seed x predicted seed)
+    - top_k_accuracy (pipelines x len(top_k))
+    - precision, recall (pipelines x seeds)
+    - calibration_count, calibration_score, calibration_accuracy (pipelines x bins)
+    - expected_calibration_error
+    """
+    objects = objects[(objects["pipeline"] >= 0) & (objects["pipeline"] < nb_pipelines)]
+    pipeline = objects["pipeline"]
+
+    def count(mask):
+        return np.bincount(pipeline[mask], minlength=nb_pipelines)
+
+    detection = ~objects["manual"]
+    valid = objects["valid"]
+    total = np.bincount(pipeline, minlength=nb_pipelines)
+    detections = count(detection)
+    false_positives = count(detection & ~valid)
+    missed_boxes = count(objects["manual"] & valid)
+
+    classified = (
+        detection
+        & valid
+        & (objects["verified"] >= 0)
+        & (objects["predicted"] >= 0)
+    )
+    c_pipeline = pipeline[classified]
+    c_verified = objects["verified"][classified]
+    c_predicted = objects["predicted"][classified]
+    c_rank = objects["rank"][classified]
+    nb_classified = np.bincount(c_pipeline, minlength=nb_pipelines)
+
+    confusion = np.bincount(
+        (c_pipeline.astype(np.int64) * nb_seeds + c_verified) * nb_seeds + c_predicted,
+        minlength=nb_pipelines * nb_seeds * nb_seeds,
+    ).reshape(nb_pipelines, nb_seeds, nb_seeds)
+    true_positives = np.diagonal(confusion, axis1=1, axis2=2)
+
+    top_k_hits = np.stack(
+        [
+            np.bincount(
+                c_pipeline[(c_rank >= 1) & (c_rank <= k)], minlength=nb_pipelines
+            )
+            for k in top_k
+        ],
+        axis=1,
+    ).reshape(nb_pipelines, len(top_k))
+
+    # The top score of each classified box, binned in [0, 1]
+    score = np.clip(objects["score"][classified], 0.0, 1.0)
+    correct = (c_verified == c_predicted).astype(np.float64)
+    index = c_pipeline.astype(np.int64) * bins + np.minimum(
+        (score * bins).astype(np.int64), bins - 1
+    )
+    size = nb_pipelines * bins
+    bin_count = np.bincount(index, minlength=size).reshape(nb_pipelines, bins)
+    bin_score = np.bincount(index, weights=score, minlength=size).reshape(
+        nb_pipelines, bins
+    )
+    bin_correct = np.bincount(index, weights=correct, minlength=size).reshape(
+        nb_pipelines, bins
+    )
+
+    return {
+        "objects": total,
+        "detections": detections,
+        "false_positives": false_positives,
+        "missed_boxes": missed_boxes,
+        "classified": nb_classified,
+        "false_positive_rate": _ratio(false_positives, detections),
+        "missed_box_rate": _ratio(missed_boxes, count(valid)),
+        "confusion_matrix": confusion,
+        "top_k_accuracy": _ratio(top_k_hits, nb_classified[:, None]),
+        "precision": _ratio(true_positives, confusion.sum(axis=1)),
+        "recall": _ratio(true_positives, confusion.sum(axis=2)),
+        "calibration_count": bin_count,
+        "calibration_score": _ratio(bin_score, bin_count),
+        "calibration_accuracy": _ratio(bin_correct, bin_count),
+        "expected_calibration_error": _ratio(
+            np.abs(bin_correct - bin_score).sum(axis=1), nb_classified
+        ),
+    }
+
+
+def _float(value):
+    # NaN is not valid json
+    return None if np.isnan(value) else float(value)
+
+
+def build_evaluation_report(
+    evaluation: dict, seeds: list, pipelines: list, top_k: tuple = TOP_K
+) -> list:
+    """
+    Return the evaluation of each pipeline as a json serializable dict. The
+    pipelines without objects are left out, and so are the seeds that are never
+    verified nor predicted by a pipeline.
+    """
+    report = []
+    for p, (pipeline_id, pipeline_name) in enumerate(pipelines):
+        if not evaluation["objects"][p]:
+            continue
+        confusion = evaluation["confusion_matrix"][p]
+        used = np.flatnonzero(confusion.sum(axis=0) + confusion.sum(axis=1))
+        report.append(
+            {
+                "pipeline_id": str(pipeline_id),
+                "pipeline_name": pipeline_name,
+                "objects": int(evaluation["objects"][p]),
+                "detections": int(evaluation["detections"][p]),
+                "false_positives": int(evaluation["false_positives"][p]),
+                "false_positive_rate": _float(evaluation["false_positive_rate"][p]),
+                "missed_boxes": int(evaluation["missed_boxes"][p]),
+                "missed_box_rate": _float(evaluation["missed_box_rate"][p]),
+                "classified": int(evaluation["classified"][p]),
+                "top_k_accuracy": {
+                    str(k): _float(evaluation["top_k_accuracy"][p][i])
+                    for i, k in enumerate(top_k)
+                },
+                "seeds": [
+                    {
+                        "seed_id": str(seeds[s][0]),
+                        "seed_name": seeds[s][1],
+                        "support": int(confusion[s].sum()),
+                        "precision": _float(evaluation["precision"][p][s]),
+                        "recall": _float(evaluation["recall"][p][s]),
+                    }
+                    for s in used
+                ],
+                # Rows: verified seed, columns: predicted seed, in the order of seeds
+                "confusion_matrix": confusion[np.ix_(used, used)].tolist(),
+                "calibration": {
+                    "count": evaluation["calibration_count"][p].tolist(),
+                    "score": [
+                        _float(v) for v in evaluation["calibration_score"][p]
+                    ],
+                    "accuracy": [
+                        _float(v) for v in evaluation["calibration_accuracy"][p]
+                    ],
+                    "expected_calibration_error": _float(
+                        evaluation["expected_calibration_error"][p]
+                    ),
+                },
+            }
+        )
+    return report
@@ -0,0 +1,70 @@
+"""
+Micro-benchmarks for the metadata builders that run on every upload,
+inference and inspection.
+
+The nachet package reads its settings at import time, so the NACHET_* environment
+variables must be set (any value works since nothing connects).
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_metadata_builders
+"""
+
+import base64
+import io
+import json
+import timeit
+import uuid
+
+from PIL import Image
+
+import datastore.db.metadata.picture_set as picture_set_data
+import fertiscan.db.metadata.inspection as inspection_data
+import nachet.db.metadata.inference as inference_data
+import nachet.db.metadata.picture as picture_data
+
+ANALYSE_PATH = "tests/fertiscan/analyse.json"
+
+
+def bench(name: str, stmt, number: int):
+    """Print the mean per-call cost of stmt in microseconds."""
+    total = min(timeit.repeat(stmt, number=number, repeat=5))
+    print(f"{name:<32} {total / number * 1e6:>10.1f} us/call")
+
+
+def main():
+    user_id = uuid.uuid4()
+    with open(ANALYSE_PATH) as f:
+        analyse = json.load(f)
+
+    image = Image.new("RGB", (1980, 1080), "blue")
+    image_bytes = io.BytesIO()
+    image.save(image_bytes, format="TIFF")
+    pic_encoded = base64.b64encode(image_bytes.getvalue()).decode("utf8")
+
+    box1 = {"topX": 0.1, "topY": 0.2, "bottomX": 0.3, "bottomY": 0.4}
+    box2 = dict(box1)
+
+    bench(
+        "build_picture_set_metadata",
+        lambda: picture_set_data.build_picture_set_metadata(user_id, 3),
+        20000,
+    )
+    bench(
+        "build_picture",
+        lambda: picture_data.build_picture(pic_encoded, "link", 1, 1.0),
+        200,
+    )
+    bench(
+        "build_inspection_import",
+        lambda: inspection_data.build_inspection_import(analyse, user_id),
+        5000,
+    )
+    bench(
+        "compare_object_metadata",
+        lambda: inference_data.compare_object_metadata(box1, box2),
+        100000,
+    )
+
+
+if __name__ == "__main__":
+    main()
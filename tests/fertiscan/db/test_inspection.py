@@ -3,6 +3,7 @@ This is a test script for the database packages.
 It tests the functions in the inspection.
 """
 
+import json
 import os
 import unittest
 
@@ -63,6 +64,24 @@ class test_inspection(unittest.TestCase):
         self.assertEqual(inspection_data[3], self.user_id)
         self.assertEqual(inspection_data[6], self.picture_set_id)
 
+    def test_get_inspection_with_fk(self):
+        inspection_id = inspection.new_inspection(
+            self.cursor, self.user_id, self.picture_set_id, False
+        )
+        inspection_data = inspection.get_inspection_with_fk(self.cursor, inspection_id)
+        self.assertEqual(inspection_data["id"], inspection_id)
+        self.assertEqual(inspection_data["inspector_id"], self.user_id)
+        self.assertEqual(inspection_data["picture_set_id"], self.picture_set_id)
+        self.assertIsNone(inspection_data["company_info_id"])
+        self.assertIsNone(inspection_data["manufacturer_info_id"])
+
+    def test_get_inspection_with_fk_not_found(self):
+        self.assertIsNone(
+            inspection.get_inspection_with_fk(
+                self.cursor, "00000000-0000-0000-0000-000000000000"
+            )
+        )
+
     def test_get_all_user_inspection(self):
         inspection_id = inspection.new_inspection(
             self.cursor, self.user_id, self.picture_set_id, False
@@ -93,6 +112,67 @@ class test_inspection(unittest.TestCase):
         self.assertEqual(len(inspection_data2), 1)
         self.assertEqual(inspection_data2[0][0], inspection_id)
 
+    def test_get_user_inspection_page(self):
+        inspection_ids = [
+            inspection.new_inspection(
+                self.cursor, self.user_id, self.picture_set_id, verified
+            )
+            for verified in (False, True, False)
+        ]
+        first_page = inspection.get_user_inspection_page(
+            self.cursor, self.user_id, limit=2
+        )
+        self.assertEqual(len(first_page), 2)
+        last_row = first_page[-1]
+        second_page = inspection.get_user_inspection_page(
+            self.cursor, self.user_id, after=(last_row[1], last_row[0]), limit=2
+        )
+        self.assertEqual(len(second_page), 1)
+        self.assertCountEqual(
+            [row[0] for row in first_page + second_page], inspection_ids
+        )
+
+        unverified = inspection.get_user_inspection_page(
+            self.cursor, self.user_id, verified=False
+        )
+        self.assertCountEqual(
+            [row[0] for row in unverified], [inspection_ids[0], inspection_ids[2]]
+        )
+        self.assertTrue(all(row[10] is False for row in unverified))
+
+    def test_stream_user_inspection(self):
+        inspection_ids = [
+            inspection.new_inspection(
+                self.cursor, self.user_id, self.picture_set_id, False
+            )
+            for _ in range(3)
+        ]
+        rows = list(
+            inspection.stream_user_inspection(self.cursor, self.user_id, itersize=2)
+        )
+        self.assertCountEqual([row[0] for row in rows], inspection_ids)
+        self.assertEqual(
+            rows, inspection.get_user_inspection_page(self.cursor, self.user_id)
+        )
+
+    def test_new_inspection_with_label_info_references(self):
+        with open("tests/fertiscan/inspection.json") as file:
+            label_json = json.dumps(json.load(file))
+        created = inspection.new_inspection_with_label_info(
+            self.cursor, self.user_id, self.picture_set_id, label_json
+        )
+        (original_dataset,) = inspection.get_inspection_original_dataset(
+            self.cursor, created["inspection_id"]
+        )
+        # The ids resolved through the reference cache are neither returned nor stored
+        for label in (created, original_dataset):
+            metrics = label["product"]["metrics"]
+            for metric in metrics["weight"] + [metrics["density"], metrics["volume"]]:
+                self.assertNotIn("unit_id", metric)
+            guaranteed = label["guaranteed_analysis"]
+            for nutrient in guaranteed["en"] + guaranteed["fr"]:
+                self.assertNotIn("element_id", nutrient)
+
     # Deprecated function at the moment
     # def test_get_all_organization_inspection(self):
     #     company_id = organization.new_organization(
@@ -0,0 +1,130 @@
+"""
+This is a test script for the new_inspection SQL function.
+It checks that the set based inserts register the same rows as the input json.
+"""
+
+import json
+import os
+import unittest
+
+import psycopg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_CONNECTION_STRING = os.environ.get("FERTISCAN_DB_URL_TESTING")
+if not DB_CONNECTION_STRING:
+    raise ValueError("FERTISCAN_DB_URL is not set")
+
+DB_SCHEMA = os.environ.get("FERTISCAN_SCHEMA_TESTING")
+if not DB_SCHEMA:
+    raise ValueError("FERTISCAN_SCHEMA_TESTING is not set")
+
+INPUT_JSON_PATH = "tests/fertiscan/inspection_export.json"
+
+
+class TestNewInspectionFunction(unittest.TestCase):
+    def setUp(self):
+        self.conn = psycopg.connect(
+            DB_CONNECTION_STRING, options=f"-c search_path={DB_SCHEMA},public"
+        )
+        self.conn.autocommit = False
+        self.cursor = self.conn.cursor()
+
+        self.cursor.execute(
+            "INSERT INTO users (email) VALUES (%s) RETURNING id;",
+            ("new_inspection_function@example.com",),
+        )
+        self.inspector_id = self.cursor.fetchone()[0]
+
+        with open(INPUT_JSON_PATH, "r") as file:
+            self.input_json = json.load(file)
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.cursor.close()
+        self.conn.close()
+
+    def new_inspection(self, input_json: dict) -> dict:
+        self.cursor.execute(
+            "SELECT new_inspection(%s, %s, %s);",
+            (self.inspector_id, None, json.dumps(input_json)),
+        )
+        return self.cursor.fetchone()[0]
+
+    def count(self, table: str, label_id) -> int:
+        self.cursor.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE label_id = %s;", (label_id,)
+        )
+        return self.cursor.fetchone()[0]
+
+    def test_children_registered(self):
+        created = self.new_inspection(self.input_json)
+        label_id = created["product"]["label_id"]
+
+        # Ids are written back in the same places as before
+        self.assertIsNotNone(created["inspection_id"])
+        self.assertIsNotNone(created["company"]["id"])
+        self.assertIsNotNone(created["manufacturer"]["id"])
+
+        # Two weights, one density and one volume
+        self.assertEqual(self.count("metric", label_id), 4)
+        # The ingredients without any value are skipped
+        ingredients = [
+            i
+            for items in self.input_json["ingredients"].values()
+            for i in items
+            if i.get("value") is not None or i.get("unit") is not None
+        ]
+        self.assertEqual(self.count("ingredient", label_id), len(ingredients))
+        guaranteed = self.input_json["guaranteed_analysis"]
+        self.assertEqual(
+            self.count("guaranteed", label_id),
+            len(guaranteed["en"]) + len(guaranteed["fr"]),
+        )
+        self.assertEqual(
+            self.count("registration_number_information", label_id),
+            len(self.input_json["product"]["registration_numbers"]),
+        )
+
+    def test_sub_labels_paired_by_position(self):
+        self.input_json["cautions"] = {"en": ["first", "second"], "fr": ["premier"]}
+        created = self.new_inspection(self.input_json)
+
+        self.cursor.execute(
+            """
+            SELECT sl.text_content_en, sl.text_content_fr
+            FROM sub_label AS sl
+            JOIN sub_type AS st ON st.id = sl.sub_type_id
+            WHERE sl.label_id = %s AND st.type_en = 'cautions'
+            ORDER BY sl.text_content_en;
+            """,
+            (created["product"]["label_id"],),
+        )
+        self.assertEqual(
+            self.cursor.fetchall(), [("first", "premier"), ("second", None)]
+        )
+
+    def test_units_resolved_once(self):
+        self.input_json["product"]["metrics"]["weight"] = [
+            {"value": 1.0, "unit": "new_test_unit", "edited": False},
+            {"value": 2.0, "unit": "NEW_TEST_UNIT", "edited": False},
+        ]
+        created = self.new_inspection(self.input_json)
+
+        self.cursor.execute(
+            "SELECT COUNT(*) FROM unit WHERE unit ILIKE 'new_test_unit';"
+        )
+        self.assertEqual(self.cursor.fetchone()[0], 1)
+        self.cursor.execute(
+            """
+            SELECT COUNT(DISTINCT unit_id) FROM metric
+            WHERE label_id = %s AND metric_type = 'weight';
+            """,
+            (created["product"]["label_id"],),
+        )
+        self.assertEqual(self.cursor.fetchone()[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -147,6 +147,24 @@ class test_location(unittest.TestCase):
         self.assertEqual(location_data[3], self.region_name)
         self.assertEqual(location_data[4], self.province_name)
 
+    def test_get_location_by_address(self):
+        location_id = organization.new_location(
+            self.cursor, self.name, "123 Test Street, Ottawa", self.region_id
+        )
+        location_data = organization.get_location_by_address(
+            self.cursor, "123  TEST street ottawa."
+        )
+        self.assertIn(location_id, [location[0] for location in location_data])
+
+    def test_search_location_by_address(self):
+        location_id = organization.new_location(
+            self.cursor, self.name, "123 Test Street, Ottawa", self.region_id
+        )
+        location_data = organization.search_location_by_address(
+            self.cursor, "123 Test Stret Ottawa"
+        )
+        self.assertIn(location_id, [location[0] for location in location_data])
+
     def get_location_by_region(self):
         location_id = organization.new_location(
             self.cursor, self.name, self.address, self.region_id
@@ -0,0 +1,327 @@
+"""
+This is a test script for the database indexes.
+It checks that the lookups of every query function are served by an index
+(see fertiscan/db/bytebase/index_0.0.17.sql).
+"""
+
+import json
+import os
+import unittest
+
+import datastore.db as db
+from datastore.db.metadata import picture_set
+from datastore.db.queries import picture, user
+from fertiscan.db.metadata.inspection import Inspection
+from fertiscan.db.queries import (
+    ingredient,
+    inspection,
+    label,
+    metric,
+    nutrients,
+    organization,
+    reference,
+    registration_number,
+    specification,
+    sub_label,
+)
+from tests.query_plan import find_seq_scans, query_functions, record_statements
+
+DB_CONNECTION_STRING = os.environ.get("FERTISCAN_DB_URL_TESTING")
+if DB_CONNECTION_STRING is None or DB_CONNECTION_STRING == "":
+    raise ValueError("FERTISCAN_DB_URL is not set")
+
+DB_SCHEMA = os.environ.get("FERTISCAN_SCHEMA_TESTING")
+if DB_SCHEMA is None or DB_SCHEMA == "":
+    raise ValueError("FERTISCAN_SCHEMA_TESTING is not set")
+
+INDEXED_TABLES = {
+    "picture",
+    "picture_set",
+    "inspection",
+    "label_information",
+    "metric",
+    "sub_label",
+    "guaranteed",
+    "ingredient",
+    "micronutrient",
+    "specification",
+    "registration_number_information",
+    "organization_information",
+    "organization",
+    "location",
+}
+
+QUERY_MODULES = (
+    ingredient,
+    inspection,
+    label,
+    metric,
+    nutrients,
+    organization,
+    reference,
+    registration_number,
+    specification,
+    sub_label,
+)
+
+# The query functions which send no statement to explain
+NOT_EXPLAINED = {
+    "fertiscan.db.queries.label.new_label_information_complete": "not implemented",
+    "fertiscan.db.queries.reference.fold": "no query",
+    # inspection has no company_id nor manufacturer_id (see inspection_factual)
+    "fertiscan.db.queries.inspection.get_all_organization_inspection": "broken",
+}
+
+
+class test_query_plans(unittest.TestCase):
+    def setUp(self):
+        self.con = db.connect_db(DB_CONNECTION_STRING, DB_SCHEMA)
+        self.cursor = self.con.cursor()
+        db.create_search_path(self.con, self.cursor, DB_SCHEMA)
+
+        self.user_id = user.register_user(self.cursor, "test-query-plan@email")
+        self.picture_set_id = picture.new_picture_set(
+            self.cursor,
+            picture_set.build_picture_set_metadata(self.user_id, 1),
+            self.user_id,
+            "test-folder",
+        )
+
+        self.province_id = organization.new_province(self.cursor, "test-province")
+        self.region_id = organization.new_region(
+            self.cursor, "test-region", self.province_id
+        )
+        self.location_id = organization.new_location(
+            self.cursor, "test-location", "test-address", self.region_id
+        )
+        self.org_info_id = organization.new_organization_info(
+            self.cursor, "test-org", "www.test.com", "123456789", self.location_id
+        )
+        self.organization_id = organization.new_organization(
+            self.cursor, self.org_info_id, self.location_id
+        )
+
+        self.label_id = label.new_label_information(
+            self.cursor,
+            "product_name",
+            "lot_number",
+            "npk",
+            10.0,
+            20.0,
+            30.0,
+            None,
+            None,
+            False,
+            self.org_info_id,
+            self.org_info_id,
+            None,
+        )
+        self.inspection_id = inspection.new_inspection(
+            self.cursor, self.user_id, self.picture_set_id, False
+        )
+
+        metric.new_unit(self.cursor, "test-unit", None)
+        self.metric_id = metric.new_metric(
+            self.cursor, 10, "test-unit", self.label_id, "weight"
+        )
+        self.element_id = nutrients.new_element(
+            self.cursor, 700, "test-nutriment", "test-nutrient", "Xy"
+        )
+        self.micronutrient_id = nutrients.new_micronutrient(
+            self.cursor, "test-nutrient", 1.0, "%", self.label_id, "en", self.element_id
+        )
+        self.guaranteed_id = nutrients.new_guaranteed_analysis(
+            self.cursor, "test-nutrient", 1.0, "%", self.label_id, "en", self.element_id
+        )
+        self.specification_id = specification.new_specification(
+            self.cursor, 1.0, 7.0, 1.0, self.label_id, "en"
+        )
+        self.sub_type_id = sub_label.new_sub_type(
+            self.cursor, "test-type-fr", "test-type-en"
+        )
+        self.sub_label_id = sub_label.new_sub_label(
+            self.cursor, "text_fr", "text_en", self.label_id, self.sub_type_id
+        )
+
+        # A complete inspection, with its label children and its OLAP rows
+        with open("tests/fertiscan/inspection.json") as file:
+            self.label_json = json.dumps(json.load(file))
+        created = inspection.new_inspection_with_label_info(
+            self.cursor, self.user_id, self.picture_set_id, self.label_json
+        )
+        self.full_inspection = Inspection.model_validate(created)
+        self.full_inspection_id = str(created["inspection_id"])
+        self.full_label_id = str(created["product"]["label_id"])
+
+    def tearDown(self):
+        self.con.rollback()
+        db.end_query(self.con, self.cursor)
+
+    def query_calls(self) -> list:
+        """The calls to explain, as (function, args, kwargs)."""
+        label_id = self.label_id
+        cache = reference.ReferenceCache()
+        return [
+            # ingredient
+            (ingredient.new_ingredient, (
+                "test", 1.0, "%", label_id, "en", False, False), {}),
+            (ingredient.get_ingredient_json, (label_id,), {}),
+            # inspection
+            (inspection.new_inspection, (
+                self.user_id, self.picture_set_id, False), {}),
+            (inspection.new_inspection_with_label_info, (
+                self.user_id, self.picture_set_id, self.label_json), {}),
+            (inspection.new_inspections, (
+                self.user_id, [self.picture_set_id], [self.label_json]), {}),
+            (inspection.is_a_inspection_id, (self.inspection_id,), {}),
+            (inspection.is_inspection_verified, (self.inspection_id,), {}),
+            (inspection.get_inspection, (self.inspection_id,), {}),
+            (inspection.get_inspection_dict, (self.inspection_id,), {}),
+            (inspection.get_inspection_original_dataset, (
+                self.full_inspection_id,), {}),
+            (inspection.get_inspection_fk, (self.full_inspection_id,), {}),
+            (inspection.get_inspection_with_fk, (self.inspection_id,), {}),
+            (inspection.get_all_user_inspection_filter_verified, (
+                self.user_id, False), {}),
+            (inspection.get_all_user_inspection, (self.user_id,), {}),
+            (inspection.get_user_inspection_page, (self.user_id,), {}),
+            (inspection.get_user_inspection_page, (self.user_id,), {
+                "verified": False}),
+            (inspection.get_organization_inspection_page, (self.org_info_id,), {}),
+            (inspection.stream_user_inspection, (self.user_id,), {}),
+            (inspection.update_inspection, (
+                self.full_inspection_id,
+                self.user_id,
+                self.full_inspection.model_dump(),
+            ), {}),
+            (inspection.delete_inspection, (
+                self.full_inspection_id, self.user_id), {}),
+            (inspection.get_inspection_factual, (self.full_inspection_id,), {}),
+            # label
+            (label.new_label_information, (
+                "name", "lot", "npk", 1.0, 2.0, 3.0, None, None, False,
+                None, None, None), {}),
+            (label.get_label_information, (label_id,), {}),
+            (label.get_label_information_json, (label_id,), {}),
+            (label.get_label_dimension, (self.full_label_id,), {}),
+            # metric
+            (metric.is_a_metric, (self.metric_id,), {}),
+            (metric.new_metric, (20, "test-unit", label_id, "weight"), {}),
+            (metric.get_metric, (self.metric_id,), {}),
+            (metric.get_metric_by_label, (label_id,), {}),
+            (metric.get_metrics_json, (label_id,), {}),
+            (metric.get_full_metric, (self.metric_id,), {}),
+            (metric.new_unit, ("test-unit-2", None), {}),
+            (metric.is_a_unit, ("test-unit",), {}),
+            (metric.get_unit_id, ("test-unit",), {}),
+            # nutrients
+            (nutrients.new_element, (701, "autre", "other", "Xz"), {}),
+            (nutrients.get_element_id_full_search, ("test-nutrient",), {}),
+            (nutrients.get_element_id_name, ("test-nutrient",), {}),
+            (nutrients.get_element_id_symbol, ("Xy",), {}),
+            (nutrients.new_micronutrient, (
+                "test-nutrient", 2.0, "%", label_id, "fr", self.element_id), {}),
+            (nutrients.get_micronutrient, (self.micronutrient_id,), {}),
+            (nutrients.get_micronutrient_json, (label_id,), {}),
+            (nutrients.get_full_micronutrient, (self.micronutrient_id,), {}),
+            (nutrients.get_all_micronutrients, (label_id,), {}),
+            (nutrients.new_guaranteed_analysis, (
+                "test-nutrient", 2.0, "%", label_id, "fr", self.element_id), {}),
+            (nutrients.get_guaranteed, (self.guaranteed_id,), {}),
+            (nutrients.get_guaranteed_analysis_json, (label_id,), {}),
+            (nutrients.get_full_guaranteed, (self.guaranteed_id,), {}),
+            (nutrients.get_all_guaranteeds, (label_id,), {}),
+            # organization
+            (organization.new_organization, (
+                self.org_info_id, self.location_id), {}),
+            (organization.new_organization_info_located, (
+                "other-address", "other-org", "www.other.com", "987654321"), {}),
+            (organization.new_organization_info, (
+                "other-org", "www.other.com", "987654321", self.location_id), {}),
+            (organization.get_organization_info, (self.org_info_id,), {}),
+            (organization.get_organizations_info_json, (label_id,), {}),
+            (organization.update_organization, (
+                self.organization_id, self.org_info_id, self.location_id), {}),
+            (organization.update_organization_info, (
+                self.org_info_id, "test-org", "www.test.com", "123456789"), {}),
+            (organization.get_organization, (self.organization_id,), {}),
+            (organization.get_full_organization, (self.organization_id,), {}),
+            (organization.new_location, (
+                "other-location", "other-address", self.region_id), {}),
+            (organization.get_location, (self.location_id,), {}),
+            (organization.get_full_location, (self.location_id,), {}),
+            (organization.get_location_by_region, (self.region_id,), {}),
+            (organization.get_location_by_organization, (self.org_info_id,), {}),
+            (organization.get_location_by_address, ("test-address",), {}),
+            (organization.search_location_by_address, ("test address",), {}),
+            (organization.new_region, ("other-region", self.province_id), {}),
+            (organization.get_region, (self.region_id,), {}),
+            (organization.get_full_region, (self.region_id,), {}),
+            (organization.get_region_by_province, (self.province_id,), {}),
+            (organization.new_province, ("other-province",), {}),
+            (organization.get_province, (self.province_id,), {}),
+            (organization.get_all_province, (), {}),
+            # reference
+            (reference.get_unit_ids, (["test-unit", "new-unit"],), {"cache": cache}),
+            (reference.get_element_ids, (["test-nutrient"],), {"cache": cache}),
+            (reference.resolve_nutrients, (
+                [{"name": "test-nutrient", "unit": "%"}],), {"cache": cache}),
+            (reference.resolve_labels, (
+                [json.loads(self.label_json)],), {"cache": cache}),
+            # registration_number
+            (registration_number.new_registration_number, (
+                "1234567", label_id, False, "test"), {}),
+            (registration_number.get_registration_numbers_json, (label_id,), {}),
+            (registration_number.update_registration_number, (
+                json.dumps([{
+                    "registration_number": "1234567",
+                    "is_an_ingredient": False,
+                    "edited": False,
+                }]),
+                label_id,
+            ), {}),
+            (registration_number.get_registration_numbers_from_label, (
+                label_id,), {}),
+            # specification
+            (specification.new_specification, (
+                2.0, 6.0, 2.0, label_id, "fr"), {}),
+            (specification.get_specification, (self.specification_id,), {}),
+            (specification.has_specification, (label_id,), {}),
+            (specification.get_specification_json, (label_id,), {}),
+            (specification.get_all_specifications, (label_id,), {}),
+            # sub_label
+            (sub_label.new_sub_label, (
+                "text_fr_2", "text_en_2", label_id, self.sub_type_id), {}),
+            (sub_label.get_sub_label, (self.sub_label_id,), {}),
+            (sub_label.has_sub_label, (label_id,), {}),
+            (sub_label.get_sub_label_json, (label_id,), {}),
+            (sub_label.get_full_sub_label, (self.sub_label_id,), {}),
+            (sub_label.get_all_sub_label, (label_id,), {}),
+            (sub_label.update_sub_label, (
+                self.sub_label_id, "new_text_fr", "new_text_en"), {}),
+            (sub_label.new_sub_type, ("other-type-fr", "other-type-en"), {}),
+            (sub_label.get_sub_type_id, ("test-type-en",), {}),
+            # The datastore queries used by fertiscan
+            (picture.get_user_picture_sets, (self.user_id,), {}),
+            (picture.get_picture_set_pictures, (self.picture_set_id,), {}),
+        ]
+
+    def test_query_plans(self):
+        for func, args, kwargs in self.query_calls():
+            # Each call runs in a savepoint rolled back once it is explained
+            with self.subTest(func.__name__), self.con.transaction(
+                force_rollback=True
+            ):
+                statements = record_statements(self.cursor, func, *args, **kwargs)
+                self.assertTrue(statements, f"{func.__name__} sent no statement")
+                self.assertEqual(
+                    find_seq_scans(self.cursor, statements, INDEXED_TABLES), []
+                )
+
+    def test_every_query_function_is_explained(self):
+        explained = {
+            f"{func.__module__}.{func.__name__}" for func, _, _ in self.query_calls()
+        }
+        self.assertEqual(
+            query_functions(*QUERY_MODULES) - explained - set(NOT_EXPLAINED), set()
+        )
@@ -0,0 +1,122 @@
+"""
+This is a test script for the database packages.
+It tests the reference data cache of the element_compound and unit tables.
+"""
+
+import copy
+import os
+import unittest
+
+import datastore.db as db
+from fertiscan.db.queries import metric, nutrients, reference
+
+DB_CONNECTION_STRING = os.environ.get("FERTISCAN_DB_URL_TESTING")
+if DB_CONNECTION_STRING is None or DB_CONNECTION_STRING == "":
+    raise ValueError("FERTISCAN_DB_URL is not set")
+
+DB_SCHEMA = os.environ.get("FERTISCAN_SCHEMA_TESTING")
+if DB_SCHEMA is None or DB_SCHEMA == "":
+    raise ValueError("FERTISCAN_SCHEMA_TESTING is not set")
+
+
+class test_reference(unittest.TestCase):
+    def setUp(self):
+        self.con = db.connect_db(DB_CONNECTION_STRING, DB_SCHEMA)
+        self.cursor = self.con.cursor()
+        db.create_search_path(self.con, self.cursor, DB_SCHEMA)
+
+        self.cache = reference.ReferenceCache()
+
+    def new_element(self):
+        # Changes the reference tables: the data of this transaction is no longer shared
+        return nutrients.new_element(
+            self.cursor, 700, "test-nutriment-éléments", "test-nutrient", "Xy"
+        )
+
+    def tearDown(self):
+        self.con.rollback()
+        db.end_query(self.con, self.cursor)
+
+    def test_fold(self):
+        self.assertEqual(reference.fold("  Azote   TOTAL "), "azote total")
+        self.assertEqual(reference.fold("Élément"), "element")
+        self.assertIsNone(reference.fold(None))
+
+    def test_get_element_ids(self):
+        self.element_id = self.new_element()
+        element_ids = reference.get_element_ids(
+            self.cursor,
+            ["TEST-NUTRIENT", "test-nutriment-elements", "Xy", "xy", "not-an-element"],
+            self.cache,
+        )
+        self.assertEqual(element_ids[:4], [self.element_id] * 4)
+        self.assertIsNone(element_ids[4])
+
+    def test_get_unit_ids(self):
+        unit_id = metric.new_unit(self.cursor, "test-unit", 1.0)
+        unit_ids = reference.get_unit_ids(
+            self.cursor, ["TEST-unit", "test-new-unit", None, "Test-New-Unit"], self.cache
+        )
+        self.assertEqual(unit_ids[0], unit_id)
+        self.assertIsNone(unit_ids[2])
+        # The unknown unit is inserted once
+        self.assertEqual(unit_ids[1], unit_ids[3])
+        self.assertEqual(metric.get_unit_id(self.cursor, "test-new-unit"), unit_ids[1])
+
+    def test_cache_reload(self):
+        data = self.cache.get(self.cursor)
+        self.assertIs(self.cache.get(self.cursor), data)
+
+        # A new row changes the version of the tables
+        with self.con.transaction(force_rollback=True):
+            metric.new_unit(self.cursor, "test-unit", None)
+            reloaded = self.cache.get(self.cursor)
+            self.assertIsNot(reloaded, data)
+            self.assertIsNotNone(reloaded.unit_id("test-unit"))
+        # The uncommitted row was never shared: once rolled back the cached data is current
+        self.assertIs(self.cache.get(self.cursor), data)
+        self.assertIsNone(data.unit_id("test-unit"))
+
+    def test_resolve_nutrients(self):
+        self.element_id = self.new_element()
+        resolved = reference.resolve_nutrients(
+            self.cursor,
+            [
+                {"name": "test-nutrient", "value": "20", "unit": "%"},
+                {"name": "unknown", "value": "1", "unit": None},
+            ],
+            self.cache,
+        )
+        self.assertEqual(resolved[0]["element_id"], self.element_id)
+        self.assertIsNotNone(resolved[0]["unit_id"])
+        self.assertIsNone(resolved[1]["element_id"])
+        self.assertIsNone(resolved[1]["unit_id"])
+
+    def test_resolve_labels(self):
+        self.element_id = self.new_element()
+        unit_id = metric.new_unit(self.cursor, "test-unit", 1.0)
+        label = {
+            "product": {
+                "metrics": {
+                    "weight": [{"value": 1, "unit": "TEST-UNIT"}, {"value": 2, "unit": None}],
+                    "density": {"value": 3, "unit": "test-new-unit"},
+                }
+            },
+            "guaranteed_analysis": {
+                "en": [{"name": "test-nutrient", "value": 1, "unit": "%"}],
+                "fr": [{"name": "inconnu", "value": 1, "unit": "%"}],
+            },
+        }
+        original = copy.deepcopy(label)
+        (resolved,) = reference.resolve_labels(self.cursor, [label], self.cache)
+        self.assertEqual(label, original)
+        label = resolved
+        weight = label["product"]["metrics"]["weight"]
+        self.assertEqual(weight[0]["unit_id"], str(unit_id))
+        self.assertIsNone(weight[1]["unit_id"])
+        self.assertEqual(
+            label["product"]["metrics"]["density"]["unit_id"],
+            str(metric.get_unit_id(self.cursor, "test-new-unit")),
+        )
+        self.assertEqual(label["guaranteed_analysis"]["en"][0]["element_id"], self.element_id)
+        self.assertIsNone(label["guaranteed_analysis"]["fr"][0]["element_id"])
@@ -133,3 +133,26 @@ class test_registration_number(unittest.TestCase):
             new_data["registration_numbers"][0]["registration_number"],
             self.registration_number,
         )
+
+    def test_update_registration_number_order(self):
+        numbers = [
+            {"registration_number": number, "is_an_ingredient": False, "edited": False}
+            for number in ("1111111", "2222222", "3333333")
+        ]
+        registration_number.update_registration_number(
+            self.cursor, json.dumps(numbers), self.label_id
+        )
+
+        # Reverse the list and insert a number in the middle
+        numbers.reverse()
+        numbers.insert(
+            1,
+            {"registration_number": "4444444", "is_an_ingredient": True, "edited": True},
+        )
+        registration_number.update_registration_number(
+            self.cursor, json.dumps(numbers), self.label_id
+        )
+        new_data = registration_number.get_registration_numbers_json(
+            self.cursor, self.label_id
+        )
+        self.assertEqual(new_data["registration_numbers"], numbers)
@@ -127,6 +127,89 @@ class TestUpdateGuaranteedFunction(unittest.TestCase):
         for value in updated_data.en:
             self.assertEqual(value.value, 22)
 
+    def _guaranteed_ids(self):
+        self.cursor.execute(
+            "SELECT id FROM guaranteed WHERE label_id = %s ORDER BY id;",
+            (self.label_id,),
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def test_update_guaranteed_unchanged(self):
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, self.sample_guaranteed),
+        )
+        ids = self._guaranteed_ids()
+
+        # Saving the same analysis again keeps the existing rows
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, self.sample_guaranteed),
+        )
+        self.assertEqual(self._guaranteed_ids(), ids)
+
+    def test_update_guaranteed_edit_in_place(self):
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, self.sample_guaranteed),
+        )
+        ids = self._guaranteed_ids()
+
+        # A corrected value updates the row instead of replacing it
+        edited = json.loads(self.sample_guaranteed)
+        edited["en"][0]["value"] = 99
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, json.dumps(edited)),
+        )
+        self.assertEqual(self._guaranteed_ids(), ids)
+        self.assertEqual(self._read_guaranteed(), self._expected(edited))
+
+    def test_update_guaranteed_order(self):
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, self.sample_guaranteed),
+        )
+        self.assertEqual(
+            self._read_guaranteed(), self._expected(json.loads(self.sample_guaranteed))
+        )
+
+        # The document read back keeps the order of the lists sent
+        reordered = json.loads(self.sample_guaranteed)
+        reordered["en"].reverse()
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, json.dumps(reordered)),
+        )
+        self.assertEqual(self._read_guaranteed(), self._expected(reordered))
+
+        # A nutrient inserted in the middle of the list stays there
+        reordered["fr"].insert(1, {"name": "Soufre (S)", "value": "5", "unit": "%"})
+        self.cursor.execute(
+            "SELECT update_guaranteed(%s, %s);",
+            (self.label_id, json.dumps(reordered)),
+        )
+        self.assertEqual(self._read_guaranteed(), self._expected(reordered))
+        self.assertEqual(len(self._guaranteed_ids()), self.nb_guaranteed + 1)
+
+    def _read_guaranteed(self):
+        data = GuaranteedAnalysis.model_validate(
+            guaranteed.get_guaranteed_analysis_json(self.cursor, self.label_id)
+        )
+        return {
+            "en": [(value.name, value.value, value.unit) for value in data.en],
+            "fr": [(value.name, value.value, value.unit) for value in data.fr],
+        }
+
+    def _expected(self, analysis):
+        return {
+            language: [
+                (value["name"], float(value["value"]), value["unit"])
+                for value in analysis[language]
+            ]
+            for language in ("en", "fr")
+        }
+
 
 if __name__ == "__main__":
     unittest.main()
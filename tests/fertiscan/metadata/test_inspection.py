@@ -594,7 +594,7 @@ class TestInspectionExport(unittest.TestCase):
         self.assertEqual(inspection_data["manufacturer"]["name"], test_str)
         self.assertEqual(inspection_data["company"]["website"], test_str)
 
-    @patch("fertiscan.db.queries.inspection.get_inspection")
+    @patch("fertiscan.db.queries.inspection.get_inspection_dict")
     def test_query_error(self, mock_get_inspection):
         # Simulate QueryError being raised
         mock_get_inspection.side_effect = QueryError("Simulated query error")
@@ -608,7 +608,7 @@ class TestInspectionExport(unittest.TestCase):
         self.assertIn("Error fetching data", str(context.exception))
         self.assertIn("Simulated query error", str(context.exception))
 
-    @patch("fertiscan.db.queries.inspection.get_inspection")
+    @patch("fertiscan.db.queries.inspection.get_inspection_dict")
     def test_unexpected_error(self, mock_get_inspection):
         mock_get_inspection.side_effect = TypeError("Simulated unexpected error")
 
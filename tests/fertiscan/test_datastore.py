@@ -8,6 +8,7 @@ import io
 import json
 import os
 import unittest
+from unittest.mock import patch
 
 from PIL import Image
 
@@ -298,6 +299,67 @@ class TestDatastore(unittest.IsolatedAsyncioTestCase):
         # Make sure the inspection data is either a empty array or None
         # self.assertTrue(loop_into_empty_dict(inspection_data))
 
+    def test_register_analyses(self):
+        results = asyncio.run(
+            fertiscan.register_analyses(
+                self.cursor,
+                self.container_client,
+                self.user.id,
+                [
+                    ([self.pic_encoded, self.pic_encoded], self.analysis_json),
+                    ([self.pic_encoded], {}),
+                    ([self.pic_encoded], self.analysis_json),
+                ],
+            )
+        )
+        self.assertEqual(len(results), 3)
+
+        # The invalid analysis is reported without stopping the others
+        self.assertIsNone(results[1]["inspection"])
+        self.assertIsNotNone(results[1]["error"])
+        for result in (results[0], results[2]):
+            self.assertIsNone(result["error"])
+            inspection_id = result["inspection"]["inspection_id"]
+            self.assertTrue(validator.is_valid_uuid(inspection_id))
+            self.assertTrue(inspection.is_a_inspection_id(self.cursor, inspection_id))
+        self.assertNotEqual(
+            results[0]["inspection"]["inspection_id"],
+            results[2]["inspection"]["inspection_id"],
+        )
+
+        # The inspections of the same day share one time_dimension row
+        time_ids = {
+            inspection.get_inspection_factual(
+                self.cursor, result["inspection"]["inspection_id"]
+            )[3]
+            for result in (results[0], results[2])
+        }
+        self.assertEqual(len(time_ids), 1)
+
+    def test_register_analyses_removes_folder(self):
+        folders = asyncio.run(
+            datastore.azure_storage.get_folder_names(self.container_client)
+        )
+        with patch.object(
+            picture, "new_picture_unknown", side_effect=Exception("insert failed")
+        ):
+            results = asyncio.run(
+                fertiscan.register_analyses(
+                    self.cursor,
+                    self.container_client,
+                    self.user.id,
+                    [([self.pic_encoded], self.analysis_json)],
+                )
+            )
+        self.assertEqual(results[0]["error"], "insert failed")
+        # The folder created before the failing insert is removed
+        self.assertEqual(
+            asyncio.run(
+                datastore.azure_storage.get_folder_names(self.container_client)
+            ),
+            folders,
+        )
+
     def test_register_analysis_invalid_user(self):
         with self.assertRaises(Exception):
             asyncio.run(
@@ -341,6 +403,38 @@ class TestDatastore(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(data["inspection_id"], str(inspection_id))
         self.assertEqual(data["inspector_id"], str(self.user.id))
 
+    def test_get_full_inspection_json_with_ids(self):
+        formatted_analysis = metadata.build_inspection_import(self.analysis_json, self.user.id)
+        picture_set_id = picture.new_picture_set(
+            self.cursor, json.dumps({}), self.user.id
+        )
+
+        inspection_dict = inspection.new_inspection_with_label_info(
+            self.cursor, self.user.id, picture_set_id, formatted_analysis
+        )
+        inspection_id = inspection_dict["inspection_id"]
+
+        data = asyncio.run(
+            fertiscan.get_full_inspection_json(
+                self.cursor,
+                inspection_id,
+                user_id=str(self.user.id),
+                picture_set_id=str(picture_set_id),
+            )
+        )
+        data = json.loads(data)
+        self.assertEqual(data["inspection_id"], str(inspection_id))
+
+        other_picture_set_id = picture.new_picture_set(
+            self.cursor, json.dumps({}), self.user.id
+        )
+        with self.assertRaises(Warning):
+            asyncio.run(
+                fertiscan.get_full_inspection_json(
+                    self.cursor, inspection_id, picture_set_id=other_picture_set_id
+                )
+            )
+
     def test_delete_inspection(self):
         # Create a new inspection to delete later
         with open(TEST_INSPECTION_JSON_PATH, "r") as file:
@@ -402,6 +402,174 @@ class test_inference_functions(unittest.TestCase):
         verified = inference.is_inference_verified(self.cursor, inference_id)
         self.assertTrue(verified, "The inference should be fully verified")
 
+    def test_iter_verified_inferences(self):
+        """
+        Test if iter_verified_inferences returns the verified inferences with their
+        verified boxes and the seeds of the picture
+        """
+        inference_id = inference.new_inference(
+            self.cursor, self.inference_trim, self.user_id, self.picture_id, self.type, self.pipeline_id
+        )
+        inference_obj_id = inference.new_inference_object(
+            self.cursor, inference_id, json.dumps(self.inference["boxes"][0]), self.type
+        )
+        seed_obj_id = inference.new_seed_object(
+            self.cursor, self.seed_id, inference_obj_id, 0.9
+        )
+        inference.set_inference_object_verified_id(
+            self.cursor, inference_obj_id, seed_obj_id
+        )
+        self.assertNotIn(
+            inference_id,
+            [row[0] for row in inference.iter_verified_inferences(self.cursor, lag=None)],
+        )
+        inference.set_inference_verified(self.cursor, inference_id, True)
+        # Verified just now: left to a later iteration by default
+        self.assertNotIn(
+            inference_id,
+            [row[0] for row in inference.iter_verified_inferences(self.cursor)],
+        )
+
+        rows = [
+            row
+            for row in inference.iter_verified_inferences(
+                self.cursor, seed_id=self.seed_id, pipeline_id=self.pipeline_id, lag=None
+            )
+            if row[0] == inference_id
+        ]
+        self.assertEqual(len(rows), 1)
+        _, picture_id, pipeline_id, update_at, _, _, owner_id, _, boxes, seeds = rows[0]
+        self.assertEqual(picture_id, self.picture_id)
+        self.assertEqual(pipeline_id, self.pipeline_id)
+        self.assertEqual(owner_id, self.user_id)
+        self.assertEqual(len(boxes), 1)
+        self.assertEqual(boxes[0]["object_id"], str(inference_obj_id))
+        self.assertEqual(boxes[0]["seed_name"], self.seed_name)
+        self.assertEqual(boxes[0]["box"], self.inference["boxes"][0]["box"])
+        self.assertEqual(seeds[0]["seed_id"], str(self.seed_id))
+
+        after = list(
+            inference.iter_verified_inferences(
+                self.cursor, after=(update_at, inference_id), lag=None
+            )
+        )
+        self.assertNotIn(inference_id, [row[0] for row in after])
+
+    def test_iter_evaluation_objects(self):
+        """
+        Test if iter_evaluation_objects returns the prediction and the verification
+        of the objects of the verified inferences
+        """
+        inference_id = inference.new_inference(
+            self.cursor, self.inference_trim, self.user_id, self.picture_id, self.type, self.pipeline_id
+        )
+        inference_obj_id = inference.new_inference_object(
+            self.cursor, inference_id, json.dumps(self.inference["boxes"][0]), self.type
+        )
+        other_seed_id = seed.new_seed(self.cursor, "test other seed")
+        top_id = inference.new_seed_object(
+            self.cursor, self.seed_id, inference_obj_id, 0.9
+        )
+        verified_id = inference.new_seed_object(
+            self.cursor, other_seed_id, inference_obj_id, 0.1
+        )
+        inference.set_inference_object_top_id(self.cursor, inference_obj_id, top_id)
+        inference.set_inference_object_verified_id(
+            self.cursor, inference_obj_id, verified_id
+        )
+        inference.set_inference_verified(self.cursor, inference_id, True)
+
+        rows = [
+            row
+            for chunk in inference.iter_evaluation_objects(
+                self.cursor,
+                [self.seed_id, other_seed_id],
+                [self.pipeline_id],
+                pipeline_id=self.pipeline_id,
+            )
+            for row in chunk
+        ]
+        self.assertEqual(rows, [(0, 0, 1, True, False, 0.9, 2)])
+
+    def test_get_uncertain_inferences(self):
+        """
+        Test if get_uncertain_inferences returns the unverified inferences ordered
+        by their uncertainty
+        """
+        inference_ids = []
+        for min_top_score, min_margin in ((0.5, 0.4), (0.3, 0.1)):
+            inference_id = inference.new_inference(
+                self.cursor, self.inference_trim, self.user_id, self.picture_id, self.type, self.pipeline_id
+            )
+            inference.set_inference_uncertainty(
+                self.cursor, inference_id, min_top_score, min_margin
+            )
+            inference_ids.append(inference_id)
+
+        rows = inference.get_uncertain_inferences(
+            self.cursor, "least_confident", 10, self.user_id
+        )
+        self.assertEqual([row[0] for row in rows], inference_ids[::-1])
+        self.assertEqual(rows[0][1], self.picture_id)
+        self.assertAlmostEqual(rows[0][2], 0.3)
+
+        rows = inference.get_uncertain_inferences(
+            self.cursor, "margin", 1, self.user_id, after=(0.1, inference_ids[1])
+        )
+        self.assertEqual([row[0] for row in rows], [inference_ids[0]])
+
+        inference.set_inference_verified(self.cursor, inference_ids[1], True)
+        rows = inference.get_uncertain_inferences(
+            self.cursor, "margin", 10, self.user_id
+        )
+        self.assertEqual([row[0] for row in rows], [inference_ids[0]])
+
+        with self.assertRaises(inference.InferenceRetrievalError):
+            inference.get_uncertain_inferences(self.cursor, "unknown")
+
+    def test_set_inference_disagreement(self):
+        """
+        Test if set_inference_disagreement flags the inferences of a picture whose
+        top seeds differ between pipelines
+        """
+        other_pipeline_id = machine_learning.new_pipeline(
+            self.cursor, json.dumps({}), "test_other_pipeline", [self.model_id], False
+        )
+        other_seed_id = seed.new_seed(self.cursor, "test other seed")
+        inference_ids = []
+        for pipeline_id, seed_id in (
+            (self.pipeline_id, self.seed_id),
+            (other_pipeline_id, self.seed_id),
+        ):
+            inference_id = inference.new_inference(
+                self.cursor, self.inference_trim, self.user_id, self.picture_id, self.type, pipeline_id
+            )
+            object_id = inference.new_inference_object(
+                self.cursor, inference_id, json.dumps(self.inference["boxes"][0]), self.type
+            )
+            top_id = inference.new_seed_object(self.cursor, seed_id, object_id, 0.9)
+            inference.set_inference_object_top_id(self.cursor, object_id, top_id)
+            inference.set_inference_uncertainty(self.cursor, inference_id, 0.9, 0.5)
+            inference_ids.append((inference_id, object_id))
+
+        inference.set_inference_disagreement(self.cursor, self.picture_id)
+        self.assertEqual(
+            inference.get_uncertain_inferences(self.cursor, "disagreement", 10, self.user_id),
+            [],
+        )
+
+        # The second pipeline predicts another seed
+        inference_id, object_id = inference_ids[1]
+        top_id = inference.new_seed_object(self.cursor, other_seed_id, object_id, 0.95)
+        inference.set_inference_object_top_id(self.cursor, object_id, top_id)
+        inference.set_inference_disagreement(self.cursor, self.picture_id)
+        rows = inference.get_uncertain_inferences(
+            self.cursor, "disagreement", 10, self.user_id
+        )
+        self.assertEqual(
+            sorted(row[0] for row in rows), sorted(i for i, _ in inference_ids)
+        )
+
     def test_get_seed_object_id(self):
         """
         Test if get_seed_object_id function correctly returns the seed object id
@@ -4,6 +4,8 @@ import nachet.db.metadata.machine_learning as ml_data
 import json
 import unittest
 
+from pydantic import ValidationError
+
 PIC_LINK = "test.com"
 
 PIC_PATH = "img/test_image.tiff"
@@ -70,6 +72,58 @@ class test_inference_functions(unittest.TestCase):
                 f"{key} should be {value}",
             )
 
+    def test_compare_object_metadata(self):
+        """
+        This test checks if the compare_object_metadata function compares the box coordinates
+        """
+        box = self.boxes[0]["box"]
+        same_box = dict(box)
+        other_box = dict(box, topX=box["topX"] + 1)
+        self.assertTrue(inference.compare_object_metadata(box, same_box))
+        self.assertFalse(inference.compare_object_metadata(box, other_box))
+        with self.assertRaises(ValidationError):
+            inference.compare_object_metadata(box, {"topX": 0.0})
+
+
+    def test_build_inference_uncertainty(self):
+        """
+        This test checks if build_inference_uncertainty returns the lowest top score
+        and the smallest margin of the boxes
+        """
+        min_top_score, min_margin = inference.build_inference_uncertainty(self.boxes)
+        self.assertAlmostEqual(min_top_score, min(
+            max(top["score"] for top in box["topN"]) for box in self.boxes
+        ))
+        self.assertAlmostEqual(
+            inference.build_inference_uncertainty(
+                [{"score": 0.6}, {"score": 0.9, "topN": [{"score": 0.9}, {"score": 0.7}]}]
+            )[1],
+            0.2,
+        )
+        self.assertEqual(inference.build_inference_uncertainty([]), (None, None))
+
+    def test_assign_inference_ids(self):
+        """
+        This test checks if assign_inference_ids adds the ids register_inference_result
+        returns, the top_id being the best guess of the box
+        """
+        inference_tested = inference.assign_inference_ids(
+            json.loads(json.dumps(self.inference_exemple))
+        )
+        self.assertIn("inference_id", inference_tested)
+        for box in inference_tested["boxes"][: self.total_boxes]:
+            best = max(box["topN"], key=lambda top: top["score"])
+            self.assertEqual(box["top_id"], best["object_id"])
+            self.assertEqual(box["object_type_id"], 1)
+        ids = [inference_tested["inference_id"]] + [
+            box["box_id"] for box in inference_tested["boxes"][: self.total_boxes]
+        ]
+        self.assertEqual(len(ids), len(set(ids)))
+
+        box = inference.assign_inference_ids(
+            {"totalBoxes": 1, "boxes": [{"label": "seed", "score": 0.5}]}
+        )["boxes"][0]
+        self.assertNotEqual(box["top_id"], box["box_id"])
 
 class test_machine_learning_functions(unittest.TestCase):
     def setUp(self):
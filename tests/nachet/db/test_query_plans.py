@@ -0,0 +1,311 @@
+"""
+This is a test script for the database indexes.
+It checks that the lookups of every query function are served by an index
+(see nachet/db/bytebase/index_nachet_0.0.11.sql).
+"""
+
+import unittest
+import os
+import json
+import uuid
+from PIL import Image
+import io
+import base64
+
+import datastore.db.__init__ as db
+from nachet.db.metadata import picture as picture_data
+from datastore.db.metadata import picture_set as picture_set_data
+from datastore.db.queries import picture, user
+from nachet.db.queries import inference, machine_learning, seed
+from tests.query_plan import find_seq_scans, query_functions, record_statements
+
+DB_CONNECTION_STRING = os.environ.get("NACHET_DB_URL")
+if DB_CONNECTION_STRING is None or DB_CONNECTION_STRING == "":
+    raise ValueError("NACHET_DB_URL is not set")
+
+DB_SCHEMA = os.environ.get("NACHET_SCHEMA_TESTING")
+if DB_SCHEMA is None or DB_SCHEMA == "":
+    raise ValueError("NACHET_SCHEMA_TESTING is not set")
+
+INDEXED_TABLES = {
+    "users",
+    "picture",
+    "picture_set",
+    "picture_seed",
+    "inference",
+    "object",
+    "seed_obj",
+    "model",
+    "seed",
+}
+
+QUERY_MODULES = (picture, user, inference, machine_learning, seed)
+
+# The query functions which send no statement to explain
+NOT_EXPLAINED = {
+    "datastore.db.queries.picture.copy_new_pictures": "COPY only",
+    "nachet.db.queries.inference.copy_new_inferences": "COPY only",
+}
+
+
+class test_query_plans(unittest.TestCase):
+    def setUp(self):
+        self.con = db.connect_db(DB_CONNECTION_STRING, DB_SCHEMA)
+        self.cursor = db.cursor(self.con)
+        db.create_search_path(self.con, self.cursor, DB_SCHEMA)
+
+        self.user_email = "test-query-plan@email"
+        self.user_id = user.register_user(self.cursor, self.user_email)
+        self.seed_name = "test seed"
+        self.seed_id = seed.new_seed(self.cursor, self.seed_name)
+
+        image = Image.new("RGB", (1980, 1080), "blue")
+        image_byte_array = io.BytesIO()
+        image.save(image_byte_array, format="TIFF")
+        pic_encoded = base64.b64encode(image_byte_array.getvalue()).decode("utf8")
+        self.picture_metadata = picture_data.build_picture(
+            pic_encoded, "www.link.com", 1, 1.0, ""
+        )
+        self.picture_set_id = picture.new_picture_set(
+            self.cursor,
+            picture_set_data.build_picture_set_metadata(self.user_id, 1),
+            self.user_id,
+            "test-folder",
+        )
+        self.empty_picture_set_id = picture.new_picture_set(
+            self.cursor,
+            picture_set_data.build_picture_set_metadata(self.user_id, 0),
+            self.user_id,
+            "test-empty-folder",
+        )
+        self.picture_id = picture.new_picture(
+            self.cursor,
+            self.picture_metadata,
+            self.picture_set_id,
+            self.seed_id,
+            1,
+        )
+        self.checksum = "0" * 64
+        picture.set_picture_checksum(self.cursor, self.picture_id, self.checksum)
+
+        self.task_id = machine_learning.new_task(self.cursor, "test_task")
+        self.model_name = "test_model"
+        self.model_id = machine_learning.new_model(
+            self.cursor, self.model_name, "test-endpoint", self.task_id
+        )
+        self.other_model_id = machine_learning.new_model(
+            self.cursor, "test_other_model", "test-other-endpoint", self.task_id
+        )
+        self.model_version_id = machine_learning.new_model_version(
+            self.cursor, self.model_id, "1", json.dumps({})
+        )
+        self.pipeline_name = "test_pipeline"
+        self.pipeline_id = machine_learning.new_pipeline(
+            self.cursor, json.dumps({}), self.pipeline_name, [self.model_id], False
+        )
+
+        inference_trim = '{"filename": "inference_example", "totalBoxes": 1}'
+        self.inference_id = inference.new_inference(
+            self.cursor,
+            inference_trim,
+            self.user_id,
+            self.picture_id,
+            1,
+            self.pipeline_id,
+        )
+        self.box_metadata = json.dumps({"topX": 0, "topY": 0, "bottomX": 1, "bottomY": 1})
+        self.object_id = inference.new_inference_object(
+            self.cursor, self.inference_id, self.box_metadata, 1
+        )
+        self.seed_object_id = inference.new_seed_object(
+            self.cursor, self.seed_id, self.object_id, 0.9
+        )
+        inference.set_inference_object_top_id(
+            self.cursor, self.object_id, self.seed_object_id
+        )
+
+    def tearDown(self):
+        self.con.rollback()
+        db.end_query(self.con, self.cursor)
+
+    def query_calls(self) -> list:
+        """The calls to explain, as (function, args, kwargs)."""
+        user_id = self.user_id
+        picture_set_id = self.picture_set_id
+        picture_id = self.picture_id
+        inference_id = self.inference_id
+        object_id = self.object_id
+        calls = [
+            # user
+            (user.is_user_registered, (self.user_email,), {}),
+            (user.is_a_user_id, (user_id,), {}),
+            (user.get_user_id, (self.user_email,), {}),
+            (user.get_all_user_ids, (), {}),
+            (user.register_user, ("test-query-plan-2@email",), {}),
+            (user.link_container, (user_id, "https://test.container"), {}),
+            (user.get_container_url, (user_id,), {}),
+            (user.set_default_picture_set, (user_id, picture_set_id), {}),
+            (user.get_default_picture_set, (user_id,), {}),
+            # picture
+            (picture.new_picture_set, (
+                picture_set_data.build_picture_set_metadata(user_id, 1),
+                user_id,
+                "test-other-folder",
+            ), {}),
+            (picture.new_picture, (
+                self.picture_metadata, picture_set_id, self.seed_id, 1), {}),
+            (picture.new_picture_unknown, (
+                self.picture_metadata, picture_set_id, 1), {}),
+            (picture.get_picture_set, (picture_set_id,), {}),
+            (picture.get_picture_set_name, (picture_set_id,), {}),
+            (picture.get_user_picture_set_by_name, (user_id, "test-folder"), {}),
+            (picture.get_picture_set_sources, (picture_set_id,), {}),
+            (picture.get_user_picture_sets, (user_id,), {}),
+            (picture.get_picture, (picture_id,), {}),
+            (picture.count_pictures, (picture_set_id,), {}),
+            (picture.get_picture_set_pictures, (picture_set_id,), {}),
+            (picture.iter_picture_set_checksums, (picture_set_id,), {}),
+            (picture.get_validated_pictures, (picture_set_id,), {}),
+            (picture.is_picture_validated, (picture_id,), {}),
+            (picture.check_picture_inference_exist, (picture_id,), {}),
+            (picture.change_picture_set_id, (
+                user_id, picture_set_id, self.empty_picture_set_id), {}),
+            (picture.get_user_latest_picture_set, (user_id,), {}),
+            (picture.update_picture_metadata, (
+                picture_id, self.picture_metadata, 1), {}),
+            (picture.is_a_picture_set_id, (picture_set_id,), {}),
+            (picture.is_a_picture_id, (picture_id,), {}),
+            (picture.get_picture_picture_set_id, (picture_id,), {}),
+            (picture.get_picture_checksum, (picture_id,), {}),
+            (picture.count_object_references, (user_id, [self.checksum]), {}),
+            (picture.lock_objects, (user_id, [self.checksum]), {}),
+            (picture.set_picture_checksum, (picture_id, self.checksum), {}),
+            (picture.update_picture_storage, (
+                picture_id, {"compression": "none"}), {}),
+            (picture.update_object_storage, (
+                user_id, self.checksum, {"compression": "none"}), {}),
+            (picture.get_unreferenced_checksums, (picture_set_id,), {}),
+            (picture.get_user_picture_storage, (user_id,), {}),
+            (picture.get_picture_set_owner_id, (picture_set_id,), {}),
+            (picture.update_picture_picture_set_id, (
+                picture_id, self.empty_picture_set_id), {}),
+            (picture.delete_picture_set, (self.empty_picture_set_id,), {}),
+            (picture.delete_picture_set_with_pictures, (
+                self.empty_picture_set_id,), {}),
+            (picture.delete_pictures, ([picture_id],), {}),
+            (picture.get_picture_in_picture_set, (picture_set_id,), {}),
+            # inference
+            (inference.new_inference, (
+                '{"filename": "inference_example", "totalBoxes": 1}',
+                user_id,
+                picture_id,
+                1,
+                self.pipeline_id,
+            ), {}),
+            (inference.get_inference, (inference_id,), {}),
+            (inference.get_inference_picture_id, (inference_id,), {}),
+            (inference.get_inference_by_picture_id, (picture_id,), {}),
+            (inference.set_inference_feedback_user_id, (inference_id, user_id), {}),
+            (inference.set_inference_verified, (inference_id, True), {}),
+            (inference.is_inference_verified, (inference_id,), {}),
+            (inference.is_object_verified, (object_id,), {}),
+            (inference.get_inference_object_verified_id, (object_id,), {}),
+            (inference.verify_inference_status, (inference_id, user_id), {}),
+            (inference.check_inference_exist, (inference_id,), {}),
+            (inference.set_inference_uncertainty, (inference_id, 0.5, 0.1), {}),
+            (inference.set_inference_disagreement, (picture_id,), {}),
+            (inference.iter_verified_inferences, (), {
+                "seed_id": self.seed_id, "pipeline_id": self.pipeline_id}),
+            (inference.iter_evaluation_objects, (
+                [self.seed_id], [self.pipeline_id]), {}),
+            (inference.new_inference_outbox, (
+                str(uuid.uuid4()),
+                picture_id,
+                user_id,
+                self.pipeline_id,
+                json.dumps({}),
+            ), {}),
+            (inference.get_inference_outbox, (10, 3), {}),
+            (inference.get_inference_outbox, (10, 3), {
+                "inference_id": inference_id}),
+            (inference.delete_inference_outbox, ([1],), {}),
+            (inference.set_inference_outbox_error, (1, "error"), {}),
+            (inference.new_inference_object, (
+                inference_id, self.box_metadata, 1), {}),
+            (inference.get_inference_object, (object_id,), {}),
+            (inference.get_objects_by_inference, (inference_id,), {}),
+            (inference.set_inference_object_top_id, (
+                object_id, self.seed_object_id), {}),
+            (inference.get_inference_object_top_id, (object_id,), {}),
+            (inference.set_inference_object_verified_id, (
+                object_id, self.seed_object_id), {}),
+            (inference.set_inference_object_valid, (object_id, True), {}),
+            (inference.check_inference_object_exist, (object_id,), {}),
+            (inference.new_seed_object, (self.seed_id, object_id, 0.5), {}),
+            (inference.set_object_box_metadata, (object_id, self.box_metadata), {}),
+            (inference.get_seed_object_id, (self.seed_id, object_id), {}),
+            (inference.get_seed_object_by_object_id, (object_id,), {}),
+            # machine_learning
+            (machine_learning.new_pipeline, (
+                json.dumps({}), "test_other_pipeline", [self.model_id]), {}),
+            (machine_learning.is_a_pipeline, (self.pipeline_id,), {}),
+            (machine_learning.get_pipeline_id, (self.pipeline_name,), {}),
+            (machine_learning.get_pipeline, (self.pipeline_id,), {}),
+            (machine_learning.set_active_pipeline, (self.pipeline_id,), {}),
+            (machine_learning.get_active_pipeline, (), {}),
+            (machine_learning.get_all_pipelines, (), {}),
+            (machine_learning.set_nachet_default_pipeline, (self.pipeline_id,), {}),
+            (machine_learning.new_pipeline_model, (
+                self.pipeline_id, self.other_model_id), {}),
+            (machine_learning.get_pipeline_id_from_model_name, (
+                self.model_name,), {}),
+            (machine_learning.new_model, (
+                "test_new_model", "test-new-endpoint", self.task_id), {}),
+            (machine_learning.set_active_model, (
+                self.model_id, self.model_version_id), {}),
+            (machine_learning.is_a_model, (self.model_id,), {}),
+            (machine_learning.get_model_id_from_name, (self.model_name,), {}),
+            (machine_learning.get_model_id_from_endpoint, ("test-endpoint",), {}),
+            (machine_learning.get_model, (self.model_id,), {}),
+            (machine_learning.new_model_version, (
+                self.model_id, "2", json.dumps({})), {}),
+            (machine_learning.is_a_model_version, (self.model_version_id,), {}),
+            (machine_learning.get_task_id, ("test_task",), {}),
+            (machine_learning.new_task, ("test_other_task",), {}),
+            # seed
+            (seed.get_all_seeds_names, (), {}),
+            (seed.get_all_seeds, (), {}),
+            (seed.get_seed_id, (self.seed_name,), {}),
+            (seed.get_seed_name, (self.seed_id,), {}),
+            (seed.new_seed, ("test other seed",), {}),
+            (seed.is_seed_registered, (self.seed_name,), {}),
+            (seed.get_seed_object_seed_id, (self.seed_object_id,), {}),
+        ]
+        # The review queue is read from a different partial index per strategy
+        for strategy in inference.UNCERTAINTY_STRATEGIES:
+            calls.append((inference.get_uncertain_inferences, (strategy, 100), {}))
+            calls.append(
+                (inference.get_uncertain_inferences, (strategy, 100), {
+                    "user_id": user_id, "after": (0.5, inference_id)})
+            )
+        return calls
+
+    def test_query_plans(self):
+        for func, args, kwargs in self.query_calls():
+            # Each call runs in a savepoint rolled back once it is explained
+            with self.subTest(func.__name__), self.con.transaction(
+                force_rollback=True
+            ):
+                statements = record_statements(self.cursor, func, *args, **kwargs)
+                self.assertTrue(statements, f"{func.__name__} sent no statement")
+                self.assertEqual(
+                    find_seq_scans(self.cursor, statements, INDEXED_TABLES), []
+                )
+
+    def test_every_query_function_is_explained(self):
+        explained = {
+            f"{func.__module__}.{func.__name__}" for func, _, _ in self.query_calls()
+        }
+        self.assertEqual(
+            query_functions(*QUERY_MODULES) - explained - set(NOT_EXPLAINED), set()
+        )
@@ -5,6 +5,8 @@ It tests the functions in the __init__.py files of the datastore packages.
 
 import io
 import os
+import tarfile
+import zipfile
 import unittest
 from unittest.mock import MagicMock
 from PIL import Image, ImageChops
@@ -16,6 +18,7 @@ import datastore.__init__ as datastore
 import nachet.__init__ as nachet
 import datastore.db.metadata.validator as validator
 import nachet.db.queries.seed as seed_query
+import nachet.db.queries.inference as inference_query
 from copy import deepcopy
 
 
@@ -187,6 +190,70 @@ class test_picture(unittest.TestCase):
         # self.cursor.execute("SELECT result FROM inference WHERE picture_id=%s AND model_id=%s",(picture_id,model_id,))
         self.assertTrue(validator.is_valid_uuid(result["inference_id"]))
 
+    def test_register_inference_result_deferred(self):
+        """
+        Test the deferred registration: the ids returned are the ids of the rows
+        written when the outbox is drained.
+        """
+        picture_id = asyncio.run(
+            nachet.upload_picture_unknown(
+                self.cursor, self.user_id, self.pic_encoded, self.container_client
+            )
+        )
+        result = asyncio.run(
+            nachet.register_inference_result(
+                self.cursor,
+                self.user_id,
+                self.inference,
+                picture_id,
+                "test_model_id",
+                deferred=True,
+            )
+        )
+        inference_id = result["inference_id"]
+        self.assertTrue(validator.is_valid_uuid(inference_id))
+        self.assertFalse(inference_query.check_inference_exist(self.cursor, inference_id))
+
+        written = asyncio.run(nachet.drain_inference_outbox(self.cursor))
+        self.assertEqual(written, 1)
+        self.assertTrue(inference_query.check_inference_exist(self.cursor, inference_id))
+        objects = inference_query.get_objects_by_inference(self.cursor, inference_id)
+        self.assertEqual(
+            sorted(str(obj[0]) for obj in objects),
+            sorted(box["box_id"] for box in result["boxes"]),
+        )
+        top_ids = {str(obj[0]): str(obj[6]) for obj in objects}
+        for box in result["boxes"]:
+            self.assertEqual(top_ids[box["box_id"]], box["top_id"])
+        self.assertEqual(asyncio.run(nachet.drain_inference_outbox(self.cursor)), 0)
+
+    def test_register_inference_result_deferred_unknown_seed(self):
+        """
+        Test the deferred registration of an inference with an unknown seed: it
+        fails like the synchronous registration and nothing is queued.
+        """
+        picture_id = asyncio.run(
+            nachet.upload_picture_unknown(
+                self.cursor, self.user_id, self.pic_encoded, self.container_client
+            )
+        )
+        inference = deepcopy(self.inference)
+        inference["boxes"][0]["label"] = "not a seed name"
+        with self.assertRaises(Exception):
+            asyncio.run(
+                nachet.register_inference_result(
+                    self.cursor,
+                    self.user_id,
+                    inference,
+                    picture_id,
+                    "test_model_id",
+                    deferred=True,
+                )
+            )
+        self.assertEqual(
+            inference_query.get_inference_outbox(self.cursor, 10, 1000), []
+        )
+
     def test_upload_picture_known(self):
         """
         Test the upload picture function with a known seed
@@ -1019,6 +1086,62 @@ class test_picture_set(unittest.TestCase):
                 )
             )
 
+    def export(self, archive_format, user_id=None):
+        async def collect():
+            archive = io.BytesIO()
+            async for chunk in nachet.export_picture_set(
+                self.cursor,
+                str(user_id or self.user_id),
+                str(self.picture_set_id),
+                self.container_client,
+                archive_format,
+                prefetch=1,
+            ):
+                archive.write(chunk)
+            archive.seek(0)
+            return archive
+
+        return asyncio.run(collect())
+
+    def test_export_picture_set(self):
+        """
+        This test checks that the export contains every picture and the inference
+        of the pictures that have one
+        """
+        asyncio.run(
+            nachet.register_inference_result(
+                self.cursor,
+                self.user_id,
+                self.inference,
+                self.pictures_ids[0],
+                "test_model_id",
+            )
+        )
+        expected = sorted(
+            [str(pid) for pid in self.pictures_ids] + [f"{self.pictures_ids[0]}.json"]
+        )
+
+        with zipfile.ZipFile(self.export("zip")) as archive:
+            self.assertEqual(sorted(archive.namelist()), expected)
+            self.assertEqual(
+                archive.read(str(self.pictures_ids[1])), self.pic_encoded
+            )
+            inference = json.loads(archive.read(f"{self.pictures_ids[0]}.json"))
+            self.assertIn("boxes", inference)
+
+        with tarfile.open(fileobj=self.export("tar")) as archive:
+            self.assertEqual(sorted(archive.getnames()), expected)
+
+    def test_export_picture_set_error_not_owner(self):
+        """
+        This test checks if the export_picture_set function correctly raise an exception if the user is not the owner
+        """
+        not_owner_user_id = datastore.user.register_user(
+            self.cursor, "notowner@email"
+        )
+        with self.assertRaises(nachet.UserNotOwnerError):
+            self.export("zip", not_owner_user_id)
+
 
 class test_feedback(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,95 @@
+"""
+This is a test script for the discovery and the probing steps of the mass import.
+They do not need the database (the writer is given a mocked cursor).
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+
+from nachet.bin import deployment_mass_import as mass_import
+
+
+class test_deployment_mass_import(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, "container")
+        for folder, names in {
+            "set_a": ["1.tiff", "2.tif", "notes.txt"],
+            "set_a/sub": ["3.tiff"],
+            "empty": [],
+        }.items():
+            os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+            for name in names:
+                path = os.path.join(self.root, folder, name)
+                if name.endswith(".txt"):
+                    with open(path, "w") as file:
+                        file.write("not a picture")
+                else:
+                    Image.new("RGB", (8, 4)).save(path, format="TIFF")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_discover_tree(self):
+        sources = mass_import.discover_picture_sets(self.root)
+        self.assertEqual(
+            [(s.name, s.pictures, s.nb_skipped) for s in sources],
+            [
+                ("container/set_a", ["1.tiff", "2.tif"], 1),
+                ("container/set_a/sub", ["3.tiff"], 0),
+            ],
+        )
+
+    def test_discover_folder(self):
+        folder = os.path.join(self.root, "set_a")
+        sources = mass_import.discover_picture_sets(folder, recursive=False)
+        self.assertEqual(len(sources), 1)
+        self.assertEqual(sources[0].name, "set_a")
+
+    def test_probe_pictures(self):
+        folder = os.path.join(self.root, "set_a")
+        jobs = [
+            (name, os.path.join(folder, name), name, 1, 1.0)
+            for name in ("1.tiff", "2.tif", "notes.txt")
+        ]
+        results = {
+            key: (result, error)
+            for key, result, error in mass_import.probe_pictures(jobs, 2, 2)
+        }
+        self.assertEqual(set(results), {"1.tiff", "2.tif", "notes.txt"})
+        self.assertIsNotNone(results["notes.txt"][1])
+
+        metadata, checksum, size = results["1.tiff"][0]
+        picture = json.loads(metadata)
+        self.assertEqual(picture["image_data"]["source"], "1.tiff")
+        self.assertEqual(picture["quality_check"]["image_checksum"], checksum)
+        # Both pictures have the same content
+        self.assertEqual(checksum, results["2.tif"][0][1])
+        self.assertEqual(size, os.path.getsize(os.path.join(folder, "1.tiff")))
+
+    @patch("nachet.bin.deployment_mass_import.picture_query")
+    def test_writer_commit(self, picture_query):
+        cursor = MagicMock()
+        writer = mass_import.PictureWriter(cursor, "seed", batch_size=2)
+        for picture in ("a", "b", "c"):
+            writer.add("set", picture)
+        writer.flush()
+        self.assertEqual(writer.nb_written, 3)
+        self.assertEqual(picture_query.copy_new_pictures.call_count, 2)
+        # The transaction is left to the caller
+        cursor.connection.commit.assert_not_called()
+
+        writer = mass_import.PictureWriter(cursor, "seed", batch_size=2, commit=True)
+        for picture in ("a", "b", "c"):
+            writer.add("set", picture)
+        writer.flush()
+        self.assertEqual(cursor.connection.commit.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
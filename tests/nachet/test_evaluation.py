@@ -0,0 +1,100 @@
+"""
+This is a test script for the evaluation of the pipelines. The objects are built
+in memory, it does not need the database.
+"""
+
+import json
+import unittest
+
+import numpy as np
+
+from nachet import evaluation
+
+
+def build_objects(rows):
+    return np.array(rows, dtype=evaluation.OBJECT_DTYPE)
+
+
+class test_evaluation(unittest.TestCase):
+    def setUp(self):
+        # (pipeline, predicted, verified, valid, manual, score, rank)
+        self.objects = build_objects(
+            [
+                (0, 0, 0, True, False, 0.95, 1),  # correct
+                (0, 0, 1, True, False, 0.85, 2),  # second guess was right
+                (0, 1, 1, True, False, 0.55, 1),  # correct
+                (0, 1, 0, True, False, 0.45, 0),  # reviewer seed not in the topN
+                (0, 1, -1, False, False, 0.30, -1),  # false positive
+                (0, -1, 1, True, True, 0.0, 0),  # missed box
+                (1, 1, 1, True, False, 0.99, 1),
+                (-1, 0, 0, True, False, 0.90, 1),  # unknown pipeline
+            ]
+        )
+        self.seeds = [("s0", "seed 0"), ("s1", "seed 1"), ("s2", "seed 2")]
+        self.pipelines = [("p0", "pipeline 0"), ("p1", "pipeline 1"), ("p2", "empty")]
+
+    def test_evaluate(self):
+        result = evaluation.evaluate(self.objects, 3, 3, top_k=(1, 3), bins=10)
+        np.testing.assert_array_equal(result["objects"], [6, 1, 0])
+        np.testing.assert_array_equal(result["detections"], [5, 1, 0])
+        np.testing.assert_array_equal(result["false_positives"], [1, 0, 0])
+        np.testing.assert_array_equal(result["missed_boxes"], [1, 0, 0])
+        np.testing.assert_array_equal(result["classified"], [4, 1, 0])
+        self.assertAlmostEqual(result["false_positive_rate"][0], 1 / 5)
+        self.assertAlmostEqual(result["missed_box_rate"][0], 1 / 5)
+        self.assertTrue(np.isnan(result["false_positive_rate"][2]))
+
+        np.testing.assert_array_equal(
+            result["confusion_matrix"][0], [[1, 1, 0], [1, 1, 0], [0, 0, 0]]
+        )
+        np.testing.assert_allclose(result["top_k_accuracy"][0], [0.5, 0.75])
+        np.testing.assert_allclose(result["top_k_accuracy"][1], [1.0, 1.0])
+        np.testing.assert_allclose(result["precision"][0][:2], [0.5, 0.5])
+        np.testing.assert_allclose(result["recall"][0][:2], [0.5, 0.5])
+        self.assertTrue(np.isnan(result["precision"][0][2]))
+
+        np.testing.assert_array_equal(
+            result["calibration_count"][0], [0, 0, 0, 0, 1, 1, 0, 0, 1, 1]
+        )
+        np.testing.assert_allclose(
+            result["calibration_accuracy"][0][[4, 5, 8, 9]], [0, 1, 0, 1]
+        )
+        # |0 - 0.45| + |1 - 0.55| + |0 - 0.85| + |1 - 0.95|, over 4 boxes
+        self.assertAlmostEqual(
+            result["expected_calibration_error"][0], (0.45 + 0.45 + 0.85 + 0.05) / 4
+        )
+
+    def test_evaluate_empty(self):
+        result = evaluation.evaluate(build_objects([]), 2, 3)
+        np.testing.assert_array_equal(result["objects"], [0, 0])
+        self.assertEqual(result["confusion_matrix"].shape, (2, 3, 3))
+
+    def test_build_evaluation_report(self):
+        result = evaluation.evaluate(self.objects, 3, 3)
+        report = evaluation.build_evaluation_report(result, self.seeds, self.pipelines)
+        # The pipeline without objects is left out and the report is json
+        self.assertEqual([p["pipeline_id"] for p in report], ["p0", "p1"])
+        json.dumps(report, allow_nan=False)
+        self.assertEqual([s["seed_id"] for s in report[0]["seeds"]], ["s0", "s1"])
+        self.assertEqual(report[0]["confusion_matrix"], [[1, 1], [1, 1]])
+        self.assertEqual(report[1]["seeds"][0]["seed_id"], "s1")
+        self.assertEqual(report[0]["top_k_accuracy"]["1"], 0.5)
+
+    def test_evaluate_large(self):
+        # Millions of objects are evaluated without a loop over them
+        rng = np.random.default_rng(0)
+        size = 1_000_000
+        objects = np.zeros(size, dtype=evaluation.OBJECT_DTYPE)
+        objects["pipeline"] = rng.integers(0, 4, size)
+        objects["predicted"] = rng.integers(0, 200, size)
+        objects["verified"] = objects["predicted"]
+        objects["valid"] = True
+        objects["score"] = rng.random(size)
+        objects["rank"] = 1
+        result = evaluation.evaluate(objects, 4, 200)
+        self.assertEqual(result["classified"].sum(), size)
+        np.testing.assert_allclose(result["top_k_accuracy"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
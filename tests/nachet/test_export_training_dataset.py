@@ -0,0 +1,159 @@
+"""
+This is a test script for the training dataset export. The verified inferences
+and the blobs are mocked, it does not need the database.
+"""
+
+import asyncio
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from nachet.bin import export_training_dataset as export
+
+
+def build_row(verified_at, seed_id, width=100, checksum=None):
+    return (
+        uuid.uuid4(),
+        uuid.uuid4(),
+        None,
+        verified_at,
+        {"image_data": {"format": "TIFF", "width": width, "height": 50}},
+        checksum,
+        uuid.uuid4(),
+        "General",
+        [
+            {
+                "object_id": str(uuid.uuid4()),
+                "box": {"topX": 10, "topY": 5, "bottomX": 30, "bottomY": 25},
+                "seed_id": seed_id,
+                "seed_name": "seed " + seed_id,
+            }
+        ],
+        [{"seed_id": seed_id, "seed_name": "seed " + seed_id}],
+    )
+
+
+class test_export_training_dataset(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = self.directory.name
+        start = datetime(2024, 1, 1)
+        self.rows = [
+            build_row(start + timedelta(minutes=i), str(i % 2)) for i in range(5)
+        ]
+        self.container_client = MagicMock()
+        self.container_client.get_blob_client.return_value.download_blob.return_value.readall.return_value = (
+            b"x" * 1000
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_export(self, rows, **kwargs):
+        async def get_container_client(user_id):
+            return self.container_client
+
+        def iter_verified_inferences(
+            cursor, seed_id, pipeline_id, since, until, after, lag
+        ):
+            self.after = after
+            self.lag = lag
+            yield from rows
+
+        with patch.object(
+            export.inference, "iter_verified_inferences", iter_verified_inferences
+        ):
+            return asyncio.run(
+                export.export_training_dataset(
+                    None, self.output, get_container_client, **kwargs
+                )
+            )
+
+    def read_shard(self, name):
+        with tarfile.open(os.path.join(self.output, name)) as shard:
+            return {
+                member.name: shard.extractfile(member).read()
+                for member in shard.getmembers()
+            }
+
+    def test_labels(self):
+        categories = []
+        sample = export.build_sample(self.rows[0])
+        self.assertEqual(sample["blob_name"], f"General/{sample['picture_id']}")
+        coco = export.build_coco_labels(sample, categories)
+        self.assertEqual(coco["annotations"][0]["bbox"], [10.0, 5.0, 20.0, 20.0])
+        self.assertEqual(export.build_yolo_labels(sample, categories),
+                         "0 0.200000 0.300000 0.200000 0.400000\n")
+        self.assertEqual(len(categories), 1)
+
+        sample = export.build_sample(build_row(datetime.now(), "1", checksum="abc"))
+        self.assertEqual(sample["blob_name"], "objects/abc")
+        coco = export.build_coco_labels(sample, categories)
+        self.assertEqual(coco["annotations"][0]["category_id"], 1)
+
+    def test_export_shards(self):
+        # A sample (3 entries with their headers) is about 3.5 KiB, two fit in a shard
+        manifest = self.run_export(self.rows, label_format="yolo", shard_size=8000)
+        self.assertEqual(manifest["samples"], 5)
+        self.assertEqual([s["samples"] for s in manifest["shards"]], [2, 2, 1])
+        self.assertEqual(len(manifest["categories"]), 2)
+        self.assertEqual(
+            manifest["watermark"]["inference_id"], str(self.rows[-1][0])
+        )
+        self.assertEqual(export.load_manifest(self.output), manifest)
+
+        entries = self.read_shard("shard-000000.tar")
+        key = str(self.rows[0][0])
+        self.assertEqual(
+            sorted(entries), sorted(f"{k}.{e}" for k in (key, str(self.rows[1][0]))
+                                    for e in ("tiff", "txt", "json"))
+        )
+        self.assertEqual(entries[f"{key}.tiff"], b"x" * 1000)
+        self.assertEqual(json.loads(entries[f"{key}.json"])["picture_id"],
+                         str(self.rows[0][1]))
+        self.assertFalse(
+            [name for name in os.listdir(self.output) if name.endswith(".partial")]
+        )
+
+    def test_export_incremental(self):
+        self.run_export(self.rows[:3], shard_size=8000)
+        with self.assertRaises(export.ExportError):
+            self.run_export(self.rows[3:])
+        with self.assertRaises(export.ExportError):
+            self.run_export(self.rows[3:], label_format="yolo", incremental=True)
+
+        manifest = self.run_export(self.rows[3:], shard_size=8000, incremental=True)
+        self.assertEqual(
+            self.after, (self.rows[2][3], str(self.rows[2][0]))
+        )
+        # The recent verifications are left to the next export
+        self.assertEqual(self.lag, export.inference.VERIFIED_LAG)
+        self.assertEqual(manifest["samples"], 5)
+        self.assertEqual(
+            [s["name"] for s in manifest["shards"]],
+            ["shard-000000.tar", "shard-000001.tar", "shard-000002.tar"],
+        )
+
+    def test_export_missing_picture(self):
+        self.container_client.get_blob_client.return_value.download_blob.side_effect = [
+            Exception("BlobNotFound"),
+            MagicMock(readall=MagicMock(return_value=b"x")),
+        ]
+        manifest = self.run_export(self.rows[:2])
+        self.assertEqual(manifest["missing"], [str(self.rows[0][1])])
+        self.assertEqual(manifest["samples"], 1)
+
+    def test_shard_writer_abort(self):
+        shards = export.ShardWriter(self.output, 6000)
+        shards.add_sample([("a.txt", b"a")])
+        shards.abort()
+        self.assertEqual(os.listdir(self.output), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
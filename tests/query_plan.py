@@ -0,0 +1,162 @@
+"""
+Helpers to check the query plans of the datastore query functions.
+
+A query function is run against a recording cursor which keeps every statement
+it executes, including the ones of the cursors it opens on the connection
+(cursor.connection.cursor(), e.g. a server-side cursor). Each recorded statement
+is then explained with sequential scans disabled: if the planner still picks a
+sequential scan on one of the watched tables, no index can serve the lookup.
+
+Statements executed inside PL/pgSQL functions are not visible from here; only
+the statements sent by the Python query functions are explained. COPY has no
+plan: it is recorded but not explained.
+"""
+
+import inspect
+
+from psycopg import sql
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class RecordingCursor:
+    """Forward everything to a cursor and keep the executed statements."""
+
+    def __init__(self, cursor, statements: list = None):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "statements", [] if statements is None else statements)
+
+    def execute(self, query, params=None, **kwargs):
+        self.statements.append((query, params))
+        return self._cursor.execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        params_seq = list(params_seq)
+        # One plan for the batch: the statement is the same for every row
+        if params_seq:
+            self.statements.append((query, params_seq[0]))
+        return self._cursor.executemany(query, params_seq, **kwargs)
+
+    def copy(self, statement, params=None, **kwargs):
+        self.statements.append((statement, params))
+        return self._cursor.copy(statement, params, **kwargs)
+
+    @property
+    def connection(self):
+        return RecordingConnection(self._cursor.connection, self.statements)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. itersize, set on the cursor itself
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._cursor.__exit__(*exc_info)
+
+
+class RecordingConnection:
+    """Forward everything to a connection; its cursors record into statements."""
+
+    def __init__(self, connection, statements: list):
+        self._connection = connection
+        self.statements = statements
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(
+            self._connection.cursor(*args, **kwargs), self.statements
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def _as_composable(query):
+    if isinstance(query, sql.Composable):
+        return query
+    return sql.SQL(query)
+
+
+def _is_explainable(cursor, query) -> bool:
+    if isinstance(query, sql.Composable):
+        query = query.as_string(cursor)
+    return query.lstrip().upper().startswith(EXPLAINABLE)
+
+
+def _seq_scans(plan: dict):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from _seq_scans(child)
+
+
+def explain(cursor, query, params=None) -> dict:
+    """
+    Return the JSON plan of a statement, planned with sequential scans disabled.
+
+    The statement is not executed; the setting is local to the transaction.
+    """
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute(
+        sql.SQL("EXPLAIN (FORMAT JSON) {}").format(_as_composable(query)), params
+    )
+    plan = cursor.fetchone()[0]
+    cursor.execute("SET LOCAL enable_seqscan = on")
+    return plan[0]["Plan"]
+
+
+def record_statements(cursor, func, *args, **kwargs) -> list:
+    """
+    Run a query function and return the (statement, params) it executed.
+
+    Parameters:
+    - cursor: The cursor of the database.
+    - func: The query function, called as func(cursor, *args, **kwargs).
+    """
+    recorder = RecordingCursor(cursor)
+    result = func(recorder, *args, **kwargs)
+    if inspect.isgenerator(result):
+        # Generators only run their statements once consumed
+        list(result)
+    return recorder.statements
+
+
+def find_seq_scans(cursor, statements: list, tables: set) -> list:
+    """
+    List the sequential scans the recorded statements need.
+
+    Parameters:
+    - cursor: The cursor of the database.
+    - statements (list): The statements of record_statements.
+    - tables (set): The tables which must be read through an index.
+
+    Returns:
+    - A list of (statement, table) for every sequential scan found on a watched
+      table.
+    """
+    found = []
+    for query, params in statements:
+        if not _is_explainable(cursor, query):
+            continue
+        for table in _seq_scans(explain(cursor, query, params)):
+            if table in tables:
+                found.append((query, table))
+    return found
+
+
+def query_functions(*modules) -> set:
+    """Return the names of the public functions defined in the query modules."""
+    return {
+        f"{module.__name__}.{name}"
+        for module in modules
+        for name, func in inspect.getmembers(module, inspect.isfunction)
+        if func.__module__ == module.__name__ and not name.startswith("_")
+    }
@@ -1,4 +1,5 @@
 import asyncio
+import base64
 import io
 import os
 import unittest
@@ -16,7 +17,10 @@ from datastore.blob.azure_storage_api import (
     GetBlobError,
     GetFolderUUIDError,
     MountContainerError,
+    RenditionError,
     build_blob_name,
+    build_rendition_name,
+    compress_lossless,
     build_container_name,
     create_folder,
     generate_hash,
@@ -29,6 +33,8 @@ from datastore.blob.azure_storage_api import (
     move_blob,
     upload_image,
     get_image_count,
+    is_rendition_name,
+    make_rendition,
 )
 
 BLOB_CONNECTION_STRING = os.environ["NACHET_STORAGE_URL_TESTING"]
@@ -273,6 +279,73 @@ class TestCreateFolder(unittest.TestCase):
             asyncio.run(create_folder(mock_container_client, folder_name))
 
 
+class TestRendition(unittest.TestCase):
+    def setUp(self):
+        self.image = Image.new("RGB", (1980, 1080), "blue")
+        self.image_byte_array = io.BytesIO()
+        self.image.save(self.image_byte_array, format="TIFF")
+
+    def test_make_rendition(self):
+        original = self.image_byte_array.getvalue()
+        rendition = make_rendition(original, "thumbnail")
+        with Image.open(io.BytesIO(rendition)) as thumbnail:
+            self.assertEqual(thumbnail.format, "JPEG")
+            self.assertEqual(max(thumbnail.size), 256)
+        self.assertLess(len(rendition), len(original) / 100)
+
+    def test_make_rendition_never_upscales(self):
+        small = io.BytesIO()
+        Image.new("L", (100, 50)).save(small, format="PNG")
+        with Image.open(io.BytesIO(make_rendition(small.getvalue(), "preview"))) as preview:
+            self.assertEqual(preview.size, (100, 50))
+            self.assertEqual(preview.mode, "RGB")
+
+    def test_rendition_name(self):
+        name = build_rendition_name("objects/abc", "thumbnail")
+        self.assertEqual(name, "objects/abc.thumbnail.jpg")
+        self.assertTrue(is_rendition_name(name))
+        self.assertFalse(is_rendition_name("objects/abc"))
+        self.assertFalse(is_rendition_name("folder/folder.json"))
+
+    def test_unknown_size(self):
+        with self.assertRaises(RenditionError):
+            build_rendition_name("objects/abc", "huge")
+
+
+class TestCompressLossless(unittest.TestCase):
+    def setUp(self):
+        self.image = Image.new("RGB", (1980, 1080), "blue")
+        self.image_byte_array = io.BytesIO()
+        self.image.save(self.image_byte_array, format="TIFF")
+        self.original = self.image_byte_array.getvalue()
+
+    def test_compress_lossless(self):
+        stored, storage = compress_lossless(self.original)
+        self.assertEqual(storage["compression"], "tiff_adobe_deflate")
+        self.assertEqual(storage["original_size"], len(self.original))
+        self.assertEqual(storage["stored_size"], len(stored))
+        self.assertLess(len(stored), len(self.original))
+        with Image.open(io.BytesIO(stored)) as picture:
+            self.assertEqual(picture.tobytes(), self.image.tobytes())
+
+    def test_compress_lossless_base64(self):
+        encoded = base64.b64encode(self.original).decode()
+        stored, storage = compress_lossless(encoded)
+        self.assertIsInstance(stored, str)
+        # The sizes are the ones of the decoded pictures
+        self.assertEqual(storage["original_size"], len(self.original))
+        self.assertEqual(storage["stored_size"], len(base64.b64decode(stored)))
+        with Image.open(io.BytesIO(base64.b64decode(stored))) as picture:
+            self.assertEqual(picture.tobytes(), self.image.tobytes())
+
+    def test_not_a_tiff_is_kept(self):
+        png = io.BytesIO()
+        self.image.save(png, format="PNG")
+        stored, storage = compress_lossless(png.getvalue())
+        self.assertEqual(stored, png.getvalue())
+        self.assertIsNone(storage["compression"])
+
+
 class TestGenerateHash(unittest.TestCase):
     def setUp(self):
         self.image = Image.new("RGB", (1980, 1080), "blue")
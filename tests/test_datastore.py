@@ -220,19 +220,111 @@ class test_picture(unittest.TestCase):
         self.assertTrue(
             all([validator.is_valid_uuid(picture_id) for picture_id in picture_ids])
         )
+        # The identical pictures share one content-addressed blob
+        checksum = datastore.azure_storage.compute_checksum(self.pic_encoded)
+        blob_names = [blob.name for blob in self.container_client.list_blobs()]
+        self.assertIn(
+            datastore.azure_storage.build_object_name(checksum), blob_names
+        )
         self.assertEqual(
-            len(pictures),
+            0,
             asyncio.run(
                 datastore.azure_storage.get_image_count(
                     self.container_client, str(picture_set_id)
                 )
             ),
         )
+        self.assertEqual(
+            {checksum: len(pictures)},
+            datastore.picture.count_object_references(
+                self.cursor, self.user_id, [checksum]
+            ),
+        )
         self.assertTrue(
             len(pictures),
             (datastore.picture.count_pictures(self.cursor, picture_set_id)),
         )
 
+    def test_upload_pictures_skips_referenced_objects(self):
+        """
+        Test that a picture already in the container is not uploaded again
+        """
+        picture_set_id = asyncio.run(
+            datastore.create_picture_set(
+                self.cursor, self.container_client, 0, self.user_id
+            )
+        )
+        asyncio.run(
+            datastore.upload_pictures(
+                self.cursor,
+                self.user_id,
+                [self.pic_encoded],
+                self.container_client,
+                picture_set_id,
+            )
+        )
+        with patch.object(
+            datastore.azure_storage,
+            "upload_objects",
+            wraps=datastore.azure_storage.upload_objects,
+        ) as upload_objects:
+            asyncio.run(
+                datastore.upload_pictures(
+                    self.cursor,
+                    self.user_id,
+                    [self.pic_encoded],
+                    self.container_client,
+                    picture_set_id,
+                )
+            )
+        self.assertEqual(upload_objects.call_args.args[1], [])
+
+    def test_delete_picture_set_keeps_referenced_objects(self):
+        """
+        Test that an object is only deleted with its last reference
+        """
+        checksum = datastore.azure_storage.compute_checksum(self.pic_encoded)
+        object_name = datastore.azure_storage.build_object_name(checksum)
+        picture_set_ids = []
+        for _ in range(2):
+            picture_set_id = asyncio.run(
+                datastore.create_picture_set(
+                    self.cursor, self.container_client, 0, self.user_id
+                )
+            )
+            asyncio.run(
+                datastore.upload_pictures(
+                    self.cursor,
+                    self.user_id,
+                    [self.pic_encoded],
+                    self.container_client,
+                    picture_set_id,
+                )
+            )
+            picture_set_ids.append(picture_set_id)
+
+        asyncio.run(
+            datastore.delete_picture_set_permanently(
+                self.cursor,
+                str(self.user_id),
+                str(picture_set_ids[0]),
+                self.container_client,
+            )
+        )
+        blob_names = [blob.name for blob in self.container_client.list_blobs()]
+        self.assertIn(object_name, blob_names)
+
+        asyncio.run(
+            datastore.delete_picture_set_permanently(
+                self.cursor,
+                str(self.user_id),
+                str(picture_set_ids[1]),
+                self.container_client,
+            )
+        )
+        blob_names = [blob.name for blob in self.container_client.list_blobs()]
+        self.assertNotIn(object_name, blob_names)
+
     def test_upload_pictures_error_user_not_found(self):
         """
         This test checks if the upload_picture_known function correctly raise an exception if the user given doesn't exist in db
@@ -671,6 +671,38 @@ class test_pictures_functions(unittest.TestCase):
                 self.cursor, str(uuid.uuid4()), old_picture_set_id, new_picture_set_id
             )
 
+    def test_get_user_picture_storage(self):
+        default_set_id = picture.new_picture_set(
+            self.cursor, self.picture_set, self.user_id, "General"
+        )
+        user.set_default_picture_set(self.cursor, self.user_id, default_set_id)
+        picture_set_id = picture.new_picture_set(
+            self.cursor, self.picture_set, self.user_id, self.folder_name
+        )
+        empty_set_id = picture.new_picture_set(
+            self.cursor, self.picture_set, self.user_id
+        )
+        picture_id = picture.new_picture_unknown(
+            self.cursor, self.picture, picture_set_id, self.nb_seed
+        )
+        picture.set_picture_checksum(self.cursor, picture_id, "abc")
+
+        rows = picture.get_user_picture_storage(self.cursor, self.user_id)
+        folders = {str(row[0]): row[1] for row in rows}
+        self.assertEqual(
+            folders,
+            {
+                str(default_set_id): "General",
+                str(picture_set_id): self.folder_name,
+                str(empty_set_id): str(empty_set_id),
+            },
+        )
+        pictures = [row[2:] for row in rows if row[2] is not None]
+        self.assertEqual(pictures, [(picture_id, "abc", None)])
+
+        self.assertEqual(picture.delete_pictures(self.cursor, [picture_id]), 1)
+        self.assertFalse(picture.is_a_picture_id(self.cursor, picture_id))
+
 
 if __name__ == "__main__":
     unittest.main()
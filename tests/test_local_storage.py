@@ -0,0 +1,303 @@
+"""
+This is a test script for the local filesystem storage backend. The storage is a
+temporary directory, it does not need Azure.
+"""
+
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import uuid
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+)
+from PIL import Image
+
+import datastore.blob as blob
+import datastore.blob.azure_storage_api as azure_storage
+from datastore.bin import compress_container
+from datastore.blob import backend, local_storage_api
+
+
+class test_local_storage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.connection_string = "file://" + self.directory.name
+        self.service_client = blob.create_BlobServiceClient(self.connection_string)
+        self.container_client = self.service_client.create_container("test-container")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_protocol(self):
+        self.assertIsInstance(self.container_client, backend.StorageContainerClient)
+        self.container_client.upload_blob("a/b", b"data")
+        blob_client = self.container_client.get_blob_client("a/b")
+        self.assertIsInstance(blob_client, backend.StorageBlobClient)
+        self.assertIsInstance(blob_client.download_blob(), backend.StorageDownloader)
+
+    def test_upload_download(self):
+        self.container_client.upload_blob("folder/blob", "text")
+        blob_client = self.container_client.upload_blob(
+            "folder/image", b"\x00" * 10, metadata={"compression": "none"}
+        )
+        downloader = blob_client.download_blob()
+        self.assertEqual(downloader.size, 10)
+        self.assertEqual(downloader.readall(), b"\x00" * 10)
+        self.assertEqual(downloader.properties.metadata, {"compression": "none"})
+        self.assertEqual(
+            self.container_client.get_blob_client("folder/blob").download_blob().readall(),
+            b"text",
+        )
+        with self.assertRaises(ResourceExistsError):
+            self.container_client.upload_blob("folder/blob", b"again")
+        self.container_client.upload_blob("folder/blob", b"", overwrite=True)
+        downloader = self.container_client.get_blob_client("folder/blob").download_blob()
+        self.assertEqual(downloader.readall(), b"")
+        self.assertEqual(list(downloader.chunks()), [])
+        with self.assertRaises(ResourceNotFoundError):
+            self.container_client.get_blob_client("folder/missing").download_blob()
+        with self.assertRaises(local_storage_api.LocalStorageError):
+            self.container_client.upload_blob("../escape", b"data")
+
+    def test_download_reads_the_content_at_its_start(self):
+        self.container_client.upload_blob("blob", b"old")
+        with self.container_client.get_blob_client("blob").download_blob() as downloader:
+            self.container_client.upload_blob("blob", b"replaced", overwrite=True)
+            self.assertEqual(downloader.size, 3)
+            self.assertEqual(downloader.readall(), b"old")
+            self.assertEqual(b"".join(downloader.chunks()), b"old")
+
+    def test_chunks_readinto(self):
+        data = os.urandom(local_storage_api.CHUNK_SIZE + 100)
+        self.container_client.upload_blob("big", data)
+        downloader = self.container_client.get_blob_client("big").download_blob()
+        chunks = list(downloader.chunks())
+        self.assertEqual([len(c) for c in chunks], [local_storage_api.CHUNK_SIZE, 100])
+        self.assertEqual(b"".join(chunks), data)
+
+        # A file is written with sendfile, any other stream by chunks
+        path = os.path.join(self.directory.name, "download")
+        with open(path, "wb") as file:
+            file.write(b"head")
+            self.assertEqual(downloader.readinto(file), len(data))
+            file.write(b"tail")
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), b"head" + data + b"tail")
+        stream = io.BytesIO()
+        self.assertEqual(downloader.readinto(stream), len(data))
+        self.assertEqual(stream.getvalue(), data)
+
+    def test_list_blobs(self):
+        for name in ["b/2", "a.json", "a/1", "a/c/3", "ab"]:
+            self.container_client.upload_blob(name, b"x")
+        self.container_client.get_blob_client("a/1").set_blob_tags({"set": "one"})
+
+        # The order of Azure: by name
+        self.assertEqual(
+            [b.name for b in self.container_client.list_blobs()],
+            ["a.json", "a/1", "a/c/3", "ab", "b/2"],
+        )
+        self.assertEqual(
+            [b.name for b in self.container_client.list_blobs(name_starts_with="a/")],
+            ["a/1", "a/c/3"],
+        )
+        self.assertEqual(
+            [b.name for b in self.container_client.list_blobs(name_starts_with="a")],
+            ["a.json", "a/1", "a/c/3", "ab"],
+        )
+        self.assertEqual(list(self.container_client.list_blobs(name_starts_with="z/")), [])
+
+        blobs = {b.name: b for b in self.container_client.list_blobs(include=["tags"])}
+        self.assertEqual(blobs["a/1"].get("tags"), {"set": "one"})
+        self.assertEqual(blobs["ab"].get("tags"), {})
+        self.assertIsNone(next(self.container_client.list_blobs()).get("tags"))
+        self.assertEqual(
+            [b.name for b in self.container_client.find_blobs_by_tags("\"set\"='one'")],
+            ["a/1"],
+        )
+
+    def test_tags_delete(self):
+        blob_client = self.container_client.upload_blob("a/b/c", b"x")
+        blob_client.set_blob_tags({"picture_set_uuid": "1"})
+        self.assertEqual(blob_client.get_blob_tags(), {"picture_set_uuid": "1"})
+        # An upload replaces the tags
+        blob_client.upload_blob(b"y", overwrite=True)
+        self.assertEqual(blob_client.get_blob_tags(), {})
+
+        self.container_client.delete_blob("a/b/c")
+        self.assertFalse(blob_client.exists())
+        self.assertEqual(list(self.container_client.list_blobs()), [])
+        # The empty directories are removed
+        self.assertEqual(
+            os.listdir(os.path.join(self.directory.name, "test-container")),
+            [local_storage_api.INDEX_FOLDER],
+        )
+        with self.assertRaises(ResourceNotFoundError):
+            self.container_client.delete_blob("a/b/c")
+
+    def test_match_condition(self):
+        blob_client = self.container_client.upload_blob("blob", b"old")
+        etag = blob_client.download_blob().properties.etag
+        blob_client.upload_blob(
+            b"new", etag=etag, match_condition=MatchConditions.IfNotModified
+        )
+        with self.assertRaises(ResourceModifiedError):
+            blob_client.upload_blob(
+                b"newer", etag=etag, match_condition=MatchConditions.IfNotModified
+            )
+        self.assertEqual(blob_client.download_blob().readall(), b"new")
+
+    def test_storage_api(self):
+        # The functions of azure_storage_api run on the local storage
+        user_uuid = str(uuid.uuid4())
+        container_client = asyncio.run(
+            azure_storage.mount_container(self.connection_string, user_uuid, True)
+        )
+        self.assertIsInstance(container_client, local_storage_api.LocalContainerClient)
+        folder_uuid = str(uuid.uuid4())
+        asyncio.run(azure_storage.create_folder(container_client, folder_uuid, "set"))
+        self.assertEqual(
+            asyncio.run(azure_storage.get_folder_names(container_client)),
+            {"General", "set"},
+        )
+        self.assertEqual(
+            asyncio.run(azure_storage.get_folder_uuid(container_client, "set")),
+            folder_uuid,
+        )
+        picture_uuid = str(uuid.uuid4())
+        blob_name = asyncio.run(
+            azure_storage.upload_image(
+                container_client, "set", folder_uuid, b"picture", picture_uuid
+            )
+        )
+        self.assertEqual(
+            asyncio.run(azure_storage.get_blob(container_client, blob_name)), b"picture"
+        )
+        self.assertEqual(
+            asyncio.run(azure_storage.get_image_count(container_client, "set")), 1
+        )
+
+        other_client = self.service_client.create_container("other")
+        asyncio.run(
+            azure_storage.copy_blob(
+                blob_name, "General/copy", "general", container_client, other_client
+            )
+        )
+        self.assertEqual(
+            other_client.get_blob_client("General/copy").get_blob_tags(),
+            {"picture_set_uuid": "general"},
+        )
+
+        self.assertTrue(asyncio.run(azure_storage.delete_folder(container_client, folder_uuid)))
+        self.assertEqual(
+            asyncio.run(azure_storage.get_folder_names(container_client)), {"General"}
+        )
+        folder = json.loads(
+            asyncio.run(azure_storage.get_blob(container_client, "General/General.json"))
+        )
+        self.assertEqual(folder["folder_name"], "General")
+
+        # Mounted again, the container is not created twice
+        self.assertEqual(
+            asyncio.run(
+                azure_storage.mount_container(self.connection_string, user_uuid, False)
+            ).url,
+            container_client.url,
+        )
+
+    def test_delete_objects_after_commit(self):
+        class Connection:
+            def __init__(self):
+                self.callbacks = []
+
+            def on_commit(self, callback):
+                self.callbacks.append(callback)
+
+        class Cursor:
+            connection = Connection()
+
+        content = b"picture"
+        checksum = azure_storage.compute_checksum(content)
+        # The same checksum whatever the way the picture is given
+        self.assertEqual(
+            azure_storage.compute_checksum(base64.b64encode(content).decode()), checksum
+        )
+        object_name = azure_storage.build_object_name(checksum)
+        self.container_client.upload_blob(object_name, content)
+
+        cursor = Cursor()
+        azure_storage.delete_objects_after_commit(
+            cursor, self.container_client, [checksum]
+        )
+        # Nothing is deleted before the commit
+        self.assertTrue(self.container_client.get_blob_client(object_name).exists())
+        for callback in cursor.connection.callbacks:
+            callback()
+        self.assertFalse(self.container_client.get_blob_client(object_name).exists())
+
+    def test_delete_objects_after_commit_guard(self):
+        class Connection:
+            def __init__(self):
+                self.callbacks = []
+
+            def on_commit(self, callback):
+                self.callbacks.append(callback)
+
+        class Cursor:
+            connection = Connection()
+
+        names = {}
+        for content in (b"unreferenced", b"referenced again"):
+            checksum = azure_storage.compute_checksum(content)
+            names[checksum] = azure_storage.build_object_name(checksum)
+            self.container_client.upload_blob(names[checksum], content)
+        unreferenced, referenced = names
+        guarded = []
+
+        @contextlib.contextmanager
+        def guard(checksums):
+            guarded.append(checksums)
+            # An upload committed meanwhile references the second object again
+            yield [unreferenced]
+
+        cursor = Cursor()
+        azure_storage.delete_objects_after_commit(
+            cursor, self.container_client, list(names), guard
+        )
+        self.assertEqual(guarded, [])
+        for callback in cursor.connection.callbacks:
+            callback()
+        self.assertEqual(guarded, [list(names)])
+        self.assertFalse(
+            self.container_client.get_blob_client(names[unreferenced]).exists()
+        )
+        self.assertTrue(self.container_client.get_blob_client(names[referenced]).exists())
+
+    def test_compress_container(self):
+        image = Image.new("RGB", (256, 256), "blue")
+        for name, format in (("set/tiff", "TIFF"), ("set/png", "PNG")):
+            output = io.BytesIO()
+            image.save(output, format=format)
+            self.container_client.upload_blob(name, output.getvalue())
+
+        report = asyncio.run(
+            compress_container.compress_container(self.container_client, workers=1)
+        )
+        self.assertEqual((report["pictures"], report["compressed"]), (2, 1))
+        png = self.container_client.get_blob_client("set/png").get_blob_properties()
+        self.assertEqual(png.metadata["compression"], compress_container.UNCOMPRESSIBLE)
+        # Both are skipped by the next runs
+        self.assertEqual(compress_container.list_pictures(self.container_client), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
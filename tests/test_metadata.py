@@ -1,11 +1,16 @@
 import base64
+import hashlib
 import io
 import json
+import os
+import pathlib
+import tempfile
 import unittest
 import uuid
 from datetime import date
+from unittest.mock import patch
 
-from PIL import Image
+from PIL import Image, TiffImagePlugin
 
 import datastore.db.metadata.picture_set as picture_set_data
 import nachet.db.metadata.picture as picture_data
@@ -53,7 +58,9 @@ class test_picture_functions(unittest.TestCase):
                 "source": PIC_LINK,
             },
             "quality_check": {
-                "image_checksum": "",
+                "image_checksum": hashlib.sha256(
+                    self.image_byte_array.getvalue()
+                ).hexdigest(),
                 "upload_check": True,
                 "valid_data": True,
                 "error_type": "",
@@ -80,6 +87,41 @@ class test_picture_functions(unittest.TestCase):
         )
 
 
+    def test_get_image_properties_sources(self):
+        """
+        This test checks that raw bytes, a memoryview and a file path give the same
+        properties as the base64 string
+        """
+        raw = self.image_byte_array.getvalue()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "test_image.tiff")
+            with open(path, "wb") as file:
+                file.write(raw)
+            for source in (raw, memoryview(raw), path, pathlib.Path(path)):
+                self.assertEqual(
+                    picture_data.get_image_properties(source), (1980, 1080, "TIFF")
+                )
+                picture = json.loads(
+                    picture_data.build_picture(
+                        source, self.link, self.nb_seeds, self.zoom
+                    )
+                )
+                self.assertEqual(
+                    picture["quality_check"]["image_checksum"],
+                    hashlib.sha256(raw).hexdigest(),
+                )
+
+    def test_get_image_properties_header_only(self):
+        """
+        This test checks that the pixel data is not decoded to read the properties
+        """
+        with patch.object(TiffImagePlugin.TiffImageFile, "load") as load:
+            picture_data.build_picture(
+                self.image_byte_array.getvalue(), self.link, self.nb_seeds, self.zoom
+            )
+        load.assert_not_called()
+
+
 class test_picture_set_functions(unittest.TestCase):
     def setUp(self):
         self.nb_pictures = 1
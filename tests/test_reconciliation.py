@@ -0,0 +1,203 @@
+"""
+This is a test script for the reconciliation of the database with the blob
+storage. The container is a local storage and the database rows are mocked, it
+needs neither Azure nor the database.
+"""
+
+import asyncio
+import datetime
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import datastore.blob.azure_storage_api as azure_storage
+from datastore import reconciliation
+from datastore.blob import local_storage_api
+
+
+class test_reconciliation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        service_client = local_storage_api.LocalBlobServiceClient.from_connection_string(
+            "file://" + self.directory.name
+        )
+        self.container_client = service_client.create_container("user-1")
+        # (picture_set_id, folder_name, picture_id, checksum, link)
+        self.rows = [
+            ("s0", "General", "p0", "abc", "objects/abc"),
+            ("s0", "General", "p1", None, None),
+            ("s1", "set", "p2", None, "https://account/user-1/set/p2"),
+            ("s1", "set", "p3", "missing", None),
+            # Mass-imported: the link is the path of the file, not a blob name
+            ("s1", "set", "p6", None, "set/IMG_0001.tif"),
+            ("s2", "empty", None, None, None),
+        ]
+        for name in [
+            "General/General.json",
+            "set/set.json",
+            "objects/abc",
+            "objects/abc.thumbnail.jpg",
+            "General/p1",
+            "set/p2",
+            "objects/orphan",
+            "objects/orphan.preview.jpg",
+            "deleted/deleted.json",
+        ]:
+            self.container_client.upload_blob(name, b"x")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_picture_blob_name(self):
+        checksum = "0123456789abcdef" * 4
+        self.assertEqual(
+            reconciliation.picture_blob_name("set", "p", "abc", None), "objects/abc"
+        )
+        self.assertEqual(reconciliation.picture_blob_name("set", "p", None, None), "set/p")
+        for link, blob_name in [
+            ("set/p", "set/p"),
+            ("set/p.tiff", "set/p.tiff"),
+            ("https://a/user-1/set/p", "set/p"),
+            ("objects/" + checksum, "objects/" + checksum),
+            ("https://a/user-1/objects/" + checksum, "objects/" + checksum),
+            # Neither an object nor the blob of the picture in its folder
+            ("dev/set/p", None),
+            ("set/x", None),
+            ("set/IMG_0001.tif", None),
+            ("/data/set/p.tiff", None),
+            ("objects/abc", None),
+            ("https://a/set/x", None),
+        ]:
+            with self.subTest(link):
+                self.assertEqual(
+                    reconciliation.picture_blob_name("set", "p", None, link), blob_name
+                )
+        self.assertEqual(
+            reconciliation.picture_blob_name("user-1/set", "p", None, "user-1/set/p"),
+            "user-1/set/p",
+        )
+        # An object link does not tell the folder of the picture_set
+        self.assertEqual(reconciliation.folder_path("set", "objects/abc"), "set")
+        self.assertEqual(
+            reconciliation.rendition_source(
+                azure_storage.build_rendition_name("objects/abc", "thumbnail")
+            ),
+            "objects/abc",
+        )
+        self.assertIsNone(reconciliation.rendition_source("set/p"))
+
+    def test_diff_storage(self):
+        blobs = reconciliation.list_container(self.container_client)
+        report = reconciliation.diff_storage(self.rows, blobs)
+        self.assertEqual(
+            report["orphaned_blobs"],
+            ["objects/orphan", "objects/orphan.preview.jpg"],
+        )
+        # The folder of a deleted picture_set is reported, not orphaned
+        self.assertEqual(report["unreferenced_folders"], ["deleted/deleted.json"])
+        self.assertEqual(report["dangling_pictures"], [("p3", "objects/missing")])
+        # Reported, never counted dangling
+        self.assertEqual(report["unknown_links"], [("p6", "set/IMG_0001.tif")])
+        self.assertEqual(report["missing_folders"], [("s2", "empty", "empty")])
+
+    @patch("datastore.reconciliation.picture")
+    def test_reconcile_container(self, picture):
+        picture.get_user_picture_storage.return_value = self.rows
+        picture.delete_pictures.return_value = 1
+        cursor = MagicMock()
+
+        report = asyncio.run(
+            reconciliation.reconcile_container(cursor, self.container_client, "1")
+        )
+        self.assertEqual(report["blobs"], 9)
+        self.assertEqual(report["pictures"], 5)
+        self.assertEqual(report["deleted_blobs"], 0)
+        # Just uploaded: too recent to be deleted
+        self.assertEqual(len(report["recent_blobs"]), 2)
+        picture.delete_pictures.assert_not_called()
+
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            hours=2
+        )
+        report = asyncio.run(
+            reconciliation.reconcile_container(
+                cursor,
+                self.container_client,
+                "1",
+                repair=True,
+                delete_pictures=True,
+                now=later,
+            )
+        )
+        self.assertEqual(report["recent_blobs"], [])
+        self.assertEqual(report["deleted_blobs"], 2)
+        self.assertEqual(report["created_folders"], 1)
+        self.assertEqual(report["deleted_pictures"], 1)
+        picture.delete_pictures.assert_called_once_with(cursor, ["p3"])
+
+        # Once repaired, only the dangling picture (mocked) is left
+        report = asyncio.run(
+            reconciliation.reconcile_container(cursor, self.container_client, "1")
+        )
+        self.assertEqual(report["orphaned_blobs"], [])
+        self.assertEqual(report["missing_folders"], [])
+        names = [blob.name for blob in self.container_client.list_blobs()]
+        self.assertIn("empty/empty.json", names)
+        self.assertIn("deleted/deleted.json", names)
+
+    @patch("datastore.reconciliation.picture")
+    def test_reconcile_archived_picture_set(self, picture):
+        # The dev container: the sets archived by user-1 are in its folder
+        picture.get_user_picture_storage.return_value = [
+            ("s3", "set", "p4", None, "user-1/set/p4"),
+            ("s4", "other", "p5", None, "user-1/other/p5"),
+        ]
+        self.container_client.delete_container()
+        self.container_client.create_container()
+        for name in [
+            "user-1/user-1.json",
+            "user-1/set/set.json",
+            "user-1/set/p4",
+            "user-1/other/p5",
+        ]:
+            # The folders are listed from their json files when created
+            data = b'{"folder_name": "x"}' if name.endswith(".json") else b"x"
+            self.container_client.upload_blob(name, data)
+
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            hours=2
+        )
+        report = asyncio.run(
+            reconciliation.reconcile_container(
+                MagicMock(), self.container_client, "dev", repair=True, now=later
+            )
+        )
+        self.assertEqual(report["orphaned_blobs"], [])
+        self.assertEqual(report["unreferenced_folders"], ["user-1/user-1.json"])
+        self.assertEqual(report["dangling_pictures"], [])
+        self.assertEqual(report["missing_folders"], [("s4", "other", "user-1/other")])
+        self.assertEqual(report["deleted_blobs"], 0)
+        self.assertEqual(report["created_folders"], 1)
+
+        names = [blob.name for blob in self.container_client.list_blobs()]
+        self.assertIn("user-1/user-1.json", names)
+        self.assertIn("user-1/set/set.json", names)
+        self.assertIn("user-1/other/other.json", names)
+        self.assertNotIn("other/other.json", names)
+
+    @patch("datastore.reconciliation.picture")
+    def test_reconcile_missing_container(self, picture):
+        picture.get_user_picture_storage.return_value = self.rows
+        self.container_client.delete_container()
+        report = asyncio.run(
+            reconciliation.reconcile_container(
+                MagicMock(), self.container_client, "1", repair=True
+            )
+        )
+        self.assertEqual(report["blobs"], 0)
+        self.assertEqual(len(report["dangling_pictures"]), 4)
+        self.assertEqual(report["created_folders"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+This is a test script for the routing between the primary and the replica.
+The replica defaults to the primary itself when NACHET_DB_REPLICA_URL is not set.
+"""
+
+import asyncio
+import os
+import unittest
+import uuid
+
+import psycopg
+
+from datastore.db.queries import user
+from datastore.db.replica import Database, is_read_only, read_only
+
+DB_CONNECTION_STRING = os.environ.get("NACHET_DB_URL")
+if DB_CONNECTION_STRING is None or DB_CONNECTION_STRING == "":
+    raise ValueError("NACHET_DB_URL_TESTING is not set")
+
+DB_SCHEMA = os.environ.get("NACHET_SCHEMA_TESTING")
+if DB_SCHEMA is None or DB_SCHEMA == "":
+    raise ValueError("NACHET_SCHEMA_TESTING is not set")
+
+DB_REPLICA_CONNECTION_STRING = (
+    os.environ.get("NACHET_DB_REPLICA_URL") or DB_CONNECTION_STRING
+)
+
+
+@read_only
+async def read_server(cursor):
+    cursor.execute("SELECT pg_is_in_recovery()")
+    return cursor.connection
+
+
+async def write_server(cursor):
+    return cursor.connection
+
+
+class test_replica(unittest.TestCase):
+    def setUp(self):
+        self.database = Database(
+            DB_CONNECTION_STRING, DB_SCHEMA, DB_REPLICA_CONNECTION_STRING
+        )
+        self.session = self.database.session()
+        self.email = f"replica-{uuid.uuid4()}@email.gouv.ca"
+
+    def tearDown(self):
+        with self.session.write() as cursor:
+            cursor.execute("DELETE FROM users WHERE email = %s", (self.email,))
+        self.database.close()
+
+    def test_read_only_marker(self):
+        self.assertTrue(is_read_only(read_server))
+        self.assertFalse(is_read_only(write_server))
+
+    def test_read_your_writes(self):
+        with self.session.write() as cursor:
+            user_id = user.register_user(cursor, self.email)
+        self.assertIsNotNone(self.session.lsn)
+
+        with self.session.read() as cursor:
+            self.assertEqual(str(user.get_user_id(cursor, self.email)), str(user_id))
+
+    def test_run_routes_by_marker(self):
+        connection = asyncio.run(self.session.run(read_server))
+        self.assertTrue(connection.read_only)
+        connection = asyncio.run(self.session.run(write_server))
+        self.assertFalse(connection.read_only)
+
+    def test_replica_is_read_only(self):
+        with self.assertRaises(psycopg.errors.ReadOnlySqlTransaction):
+            with self.session.read() as cursor:
+                cursor.execute("INSERT INTO users (email) VALUES (%s)", (self.email,))
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        # A position the replica can not have replayed yet
+        self.session.lsn = "FFFFFFFF/FFFFFFFF"
+        connection = asyncio.run(self.session.run(read_server))
+        self.assertFalse(connection.read_only)
+
+    def test_no_replica(self):
+        database = Database(DB_CONNECTION_STRING, DB_SCHEMA)
+        try:
+            connection = asyncio.run(database.session().run(read_server))
+            self.assertFalse(connection.read_only)
+        finally:
+            database.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""
+This is a test script for the single-flight layer of the read entry points.
+"""
+
+import asyncio
+import unittest
+import uuid
+
+from datastore.single_flight import SingleFlight, single_flight
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class test_single_flight(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.release = None
+        self.clock = FakeClock()
+
+        async def get_thing(cursor, thing_id, detail=None):
+            self.calls.append((cursor, thing_id, detail))
+            if self.release is not None:
+                await self.release.wait()
+            return {"id": thing_id, "detail": detail}
+
+        self.get_thing = SingleFlight(get_thing, ttl=5.0, clock=self.clock)
+
+    def test_concurrent_calls_are_collapsed(self):
+        async def run():
+            self.release = asyncio.Event()
+            callers = [
+                asyncio.ensure_future(self.get_thing(f"cursor-{i}", 1))
+                for i in range(10)
+            ]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await asyncio.gather(*callers)
+
+        results = asyncio.run(run())
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results, [{"id": 1, "detail": None}] * 10)
+        stats = self.get_thing.stats()[(("thing_id", 1), ("detail", None))]
+        self.assertEqual((stats.misses, stats.coalesced), (1, 9))
+
+    def test_results_are_copies(self):
+        first = asyncio.run(self.get_thing("cursor", 1))
+        first["id"] = 2
+        second = asyncio.run(self.get_thing("cursor", 1))
+        self.assertEqual(second["id"], 1)
+
+    def test_ttl(self):
+        asyncio.run(self.get_thing("cursor", 1))
+        self.clock.now = 4.9
+        asyncio.run(self.get_thing("cursor", 1))
+        self.assertEqual(len(self.calls), 1)
+        self.clock.now = 5.0
+        asyncio.run(self.get_thing("cursor", 1))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_key_ignores_cursor_and_normalizes_arguments(self):
+        thing_id = uuid.uuid4()
+        asyncio.run(self.get_thing("cursor-1", thing_id))
+        asyncio.run(self.get_thing("cursor-2", thing_id=str(thing_id)))
+        asyncio.run(self.get_thing("cursor-3", thing_id, detail="full"))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_invalidate_matching_keys(self):
+        asyncio.run(self.get_thing("cursor", 1))
+        asyncio.run(self.get_thing("cursor", 1, detail="full"))
+        asyncio.run(self.get_thing("cursor", 2))
+        self.get_thing.invalidate(thing_id=1)
+        for args in ((1,), (1, "full"), (2,)):
+            asyncio.run(self.get_thing("cursor", *args))
+        self.assertEqual(len(self.calls), 5)
+
+    def test_invalidate_during_flight_is_not_cached(self):
+        async def run():
+            self.release = asyncio.Event()
+            caller = asyncio.ensure_future(self.get_thing("cursor", 1))
+            await asyncio.sleep(0)
+            self.get_thing.invalidate()
+            self.release.set()
+            await caller
+            self.release = None
+            await self.get_thing("cursor", 1)
+
+        asyncio.run(run())
+        self.assertEqual(len(self.calls), 2)
+
+    def test_invalidate_until_the_transaction_ends(self):
+        class Connection:
+            def __init__(self):
+                self.callbacks = []
+
+            def on_transaction_end(self, callback):
+                self.callbacks.append(callback)
+
+            def commit(self):
+                for callback in self.callbacks:
+                    callback()
+                self.callbacks = []
+
+        class Cursor:
+            connection = Connection()
+
+        writer = Cursor()
+        asyncio.run(self.get_thing("cursor", 1))
+        self.get_thing.invalidate(writer, thing_id=1)
+        # Before the commit: read again, but not cached
+        asyncio.run(self.get_thing("cursor", 1))
+        asyncio.run(self.get_thing("cursor", 1))
+        asyncio.run(self.get_thing("cursor", 2))
+        asyncio.run(self.get_thing("cursor", 2))
+        self.assertEqual(len(self.calls), 4)
+        writer.connection.commit()
+        asyncio.run(self.get_thing("cursor", 1))
+        asyncio.run(self.get_thing("cursor", 1))
+        self.assertEqual(len(self.calls), 5)
+
+    def test_invalidate_until_the_transaction_ends_is_not_collapsed(self):
+        class Connection:
+            def on_transaction_end(self, callback):
+                self.callback = callback
+
+        class Cursor:
+            connection = Connection()
+
+        writer = Cursor()
+        self.get_thing.invalidate(writer, thing_id=1)
+
+        async def run():
+            self.release = asyncio.Event()
+            # The writer reads its own changes while another connection reads
+            calls = [
+                asyncio.ensure_future(self.get_thing(writer, 1)),
+                asyncio.ensure_future(self.get_thing("reader", 1)),
+            ]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await asyncio.gather(*calls)
+
+        asyncio.run(run())
+        self.assertEqual([call[0] for call in self.calls], [writer, "reader"])
+        stats = self.get_thing.stats()[(("thing_id", 1), ("detail", None))]
+        self.assertEqual(stats.coalesced, 0)
+
+    def test_key_includes_database_and_schema(self):
+        class Cursor:
+            def __init__(self, schema):
+                self.connection = type("Connection", (), {"schema": schema})()
+
+        asyncio.run(self.get_thing(Cursor("schema_1"), 1))
+        asyncio.run(self.get_thing(Cursor("schema_1"), 1))
+        asyncio.run(self.get_thing(Cursor("schema_2"), 1))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_errors_are_shared_and_not_cached(self):
+        @single_flight(ttl=5.0)
+        async def fail(cursor):
+            self.calls.append(cursor)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(fail("a"), fail("b"), return_exceptions=True)
+
+        errors = asyncio.run(run())
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(len(self.calls), 1)
+        with self.assertRaises(ValueError):
+            asyncio.run(fail("c"))
+        self.assertEqual(fail.stats()[()].errors, 2)
+
+    def test_cancelled_caller_does_not_cancel_the_others(self):
+        async def run():
+            self.release = asyncio.Event()
+            first = asyncio.ensure_future(self.get_thing("cursor-1", 1))
+            second = asyncio.ensure_future(self.get_thing("cursor-2", 1))
+            await asyncio.sleep(0)
+            first.cancel()
+            self.release.set()
+            return await second
+
+        self.assertEqual(asyncio.run(run()), {"id": 1, "detail": None})
+        self.assertEqual(len(self.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()